@@ -0,0 +1,45 @@
+"""Forward + backward of a classification head's pooling: the global and adaptive
+pooling ops against their emulation with Tensor.mean / max over the spatial dims and
+with fixed-kernel pools.
+
+python benchmarks/bench_adaptive_pool.py
+"""
+
+from yadll.autodiff import Tensor
+from yadll.nn import (
+    AdaptiveAvgPool2d,
+    AdaptiveMaxPool2d,
+    AvgPool2d,
+    GlobalAvgPool,
+    GlobalMaxPool,
+    MaxPool2d,
+)
+from common import timeit
+
+CALLS = 50
+SHAPE = (32, 64, 14, 14)
+
+
+def per_call_us(fn, x: Tensor) -> float:
+    def run():
+        for _ in range(CALLS):
+            fn(x).sum().backward()
+
+    return timeit(run) * 1000 / CALLS
+
+
+if __name__ == "__main__":
+    x = Tensor.random(SHAPE)
+    cases = {
+        "global avg": (GlobalAvgPool(), lambda x: x.mean((2, 3))),
+        "global max": (GlobalMaxPool(), lambda x: x.max(-1).max(-1)),
+        "adaptive avg 7x7": (AdaptiveAvgPool2d(7), AvgPool2d((2, 2))),
+        "adaptive max 7x7": (AdaptiveMaxPool2d(7), MaxPool2d((2, 2))),
+    }
+    print(f"input {SHAPE}")
+    for name, (op, emulation) in cases.items():
+        new = per_call_us(op, x)
+        old = per_call_us(emulation, x)
+        print(
+            f"{name:18s} op {new:8.1f} us  emulation {old:8.1f} us  {old / new:4.2f}x"
+        )
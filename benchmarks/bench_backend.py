@@ -0,0 +1,51 @@
+"""Forward + backward of the kernels the backend dispatches, NumPy against Numba.
+
+python benchmarks/bench_backend.py
+"""
+
+from yadll.nn import *
+from yadll.backend import set_backend
+from common import timeit
+
+
+def conv_step(layer: Conv2d, x: Tensor):
+    layer(x).sum().backward()
+
+
+def norm_step(layer: BatchNorm2d, x: Tensor):
+    layer(x).relu().sum().backward()
+
+
+def embedding_step(layer: Embedding, indices: Tensor):
+    # dense weight.grad, the rows are scatter-added into it
+    layer(indices).relu().sum().backward()
+
+
+if __name__ == "__main__":
+    cases = {
+        "conv 3x3 32->32 (16, 32, 32, 32)": (
+            conv_step,
+            Conv2d(32, 32, (3, 3), padding=((1, 1), (1, 1))),
+            Tensor.random((16, 32, 32, 32)),
+        ),
+        "batch norm + relu (32, 64, 32, 32)": (
+            norm_step,
+            BatchNorm2d(64),
+            Tensor.random((32, 64, 32, 32)),
+        ),
+        "embedding 10k x 128, 4096 ids": (
+            embedding_step,
+            Embedding(10_000, 128),
+            Tensor(np.random.randint(0, 10_000, 4096)),
+        ),
+    }
+    for name, (step, layer, x) in cases.items():
+        times = {}
+        for backend in ("numpy", "numba"):
+            set_backend(backend)
+            times[backend] = timeit(lambda: step(layer, x))
+        print(
+            f"{name:36s}  numpy {times['numpy']:8.2f} ms  "
+            f"numba {times['numba']:8.2f} ms  "
+            f"speedup {times['numpy'] / times['numba']:4.1f}x"
+        )
@@ -0,0 +1,46 @@
+"""Per call time of layers on small inputs, where the Python overhead of the call
+path and of the per call shape computations dominates the arithmetic.
+
+python benchmarks/bench_call_overhead.py
+"""
+
+from yadll.autodiff import Tensor, no_grad
+from yadll.nn import AvgPool2d, Conv2d, Linear, MaxPool1d, MaxPool2d, ReLU, Sequential
+from common import timeit
+
+CALLS = 1000
+
+
+def per_call_us(fn, x: Tensor) -> float:
+    def run():
+        for _ in range(CALLS):
+            fn(x)
+
+    return timeit(run) * 1000 / CALLS
+
+
+if __name__ == "__main__":
+    cases = {
+        "ReLU (4, 8)": (ReLU(), (4, 8)),
+        "Linear 8->8 (4, 8)": (Linear(8, 8), (4, 8)),
+        "Conv2d 2->4 3x3 (1, 2, 6, 6)": (Conv2d(2, 4, (3, 3)), (1, 2, 6, 6)),
+        "MaxPool1d 2 (1, 2, 8)": (MaxPool1d(2), (1, 2, 8)),
+        "MaxPool2d 2x2 (1, 2, 6, 6)": (MaxPool2d((2, 2)), (1, 2, 6, 6)),
+        "AvgPool2d 2x2 pad 1 (1, 2, 6, 6)": (
+            AvgPool2d((2, 2), (2, 2), ((1, 1), (1, 1))),
+            (1, 2, 6, 6),
+        ),
+        "Sequential of 10 ReLU (4, 8)": (
+            Sequential(*(ReLU() for _ in range(10))),
+            (4, 8),
+        ),
+    }
+    with no_grad():
+        for name, (layer, shape) in cases.items():
+            x = Tensor.random(shape)
+            call = per_call_us(layer, x)
+            forward = per_call_us(layer.forward, x)
+            print(
+                f"{name:36s} layer(x) {call:7.1f} us  forward(x) {forward:7.1f} us  "
+                f"call overhead {call - forward:5.2f} us"
+            )
@@ -0,0 +1,55 @@
+"""Gradient clipping and zeroing on a model with many parameters: a per-parameter
+loop that allocates temporaries against the in place passes of clip_grad_norm_, with
+and without a GradBucket holding every grad in one flat buffer.
+
+python benchmarks/bench_clip.py
+"""
+
+import numpy as np
+from yadll.nn import Linear, Sequential
+from yadll.optimizers import GradBucket, clip_grad_norm_
+from common import timeit
+
+LAYERS, WIDTH = 200, 128
+
+
+def naive_clip(params, max_norm: float):
+    # norm of every grad, then a scaled copy of every grad
+    norm = np.linalg.norm(np.stack([np.linalg.norm(p.grad) for p in params]))
+    coef = max_norm / (norm + 1e-6)
+    if coef < 1:
+        for p in params:
+            p.grad = p.grad * coef
+    return norm
+
+
+def naive_zero(params):
+    for p in params:
+        p.grad = np.zeros_like(p.data)
+
+
+if __name__ == "__main__":
+    model = Sequential(*(Linear(WIDTH, WIDTH) for _ in range(LAYERS)))
+    params = list(model.parameters())
+    for p in params:
+        p.grad[...] = np.random.randn(*p.shape)
+    print(f"{len(params)} parameters, {sum(p.data.size for p in params)} values")
+    loop = {
+        "clip": timeit(lambda: naive_clip(params, 1e-3), 20),
+        "zero": timeit(lambda: naive_zero(params), 20),
+    }
+    fused = {
+        "clip": timeit(lambda: clip_grad_norm_(params, 1e-3), 20),
+        "zero": timeit(lambda: [p.zero_grad() for p in params], 20),
+    }
+    bucket = GradBucket(params)
+    bucketed = {
+        "clip": timeit(lambda: clip_grad_norm_(bucket, 1e-3), 20),
+        "zero": timeit(bucket.zero_, 20),
+    }
+    for op in ("clip", "zero"):
+        print(
+            f"{op}  per-parameter temporaries {loop[op]:7.3f} ms  "
+            f"in place {fused[op]:7.3f} ms  bucket {bucketed[op]:7.3f} ms  "
+            f"speedup {loop[op] / bucketed[op]:5.1f}x"
+        )
@@ -0,0 +1,40 @@
+"""Grouped and depthwise convolution against the dense path.
+
+Without `groups`, a grouped conv has to be emulated by a dense conv whose weight
+is block diagonal, which does `groups` times the work.
+
+    python benchmarks/bench_conv_groups.py
+"""
+
+from yadll.nn import *
+from common import timeit
+
+
+def block_diagonal(conv: Conv2d) -> Conv2d:
+    dense = Conv2d(conv.in_channels, conv.out_channels, conv.kernel_size)
+    dense.weight.data[:] = 0
+    c_in, c_out = conv.in_channels // conv.groups, conv.out_channels // conv.groups
+    for g in range(conv.groups):
+        dense.weight.data[g * c_out : (g + 1) * c_out, g * c_in : (g + 1) * c_in] = (
+            conv.weight.data[g * c_out : (g + 1) * c_out]
+        )
+    dense.b.data[:] = conv.b.data
+    return dense
+
+
+def run(x: Tensor, conv: Conv2d):
+    out = conv(x)
+    out.sum().backward()
+
+
+if __name__ == "__main__":
+    x = Tensor.random((8, 64, 32, 32))
+    for groups in (1, 4, 16, 64):
+        conv = Conv2d(64, 64, (3, 3), groups=groups)
+        dense = block_diagonal(conv)
+        grouped_ms = timeit(lambda: run(x, conv))
+        dense_ms = timeit(lambda: run(x, dense))
+        print(
+            f"groups={groups:3d}  grouped {grouped_ms:8.1f} ms  "
+            f"dense {dense_ms:8.1f} ms  speedup {dense_ms / grouped_ms:5.1f}x"
+        )
@@ -0,0 +1,38 @@
+"""Transposed convolution (GEMM + col2im) against zero-stuffing the input into a Conv.
+
+python benchmarks/bench_conv_transpose.py
+"""
+
+from yadll.nn import *
+from yadll.nn.functional import conv
+from common import timeit
+
+
+def zero_stuffed(x: Tensor, layer: ConvTranspose2d) -> Tensor:
+    # insert stride - 1 zeros between inputs, pad by k - 1 - p and correlate with the
+    # flipped, in/out swapped kernel
+    s, k, p = layer.stride[2:], layer.kernel_size, layer.padding
+    stuffed = np.zeros(
+        x.shape[:2] + tuple((d - 1) * st + 1 for d, st in zip(x.shape[2:], s))
+    )
+    stuffed[:, :, :: s[0], :: s[1]] = x.data
+    weight = Tensor(np.flip(layer.weight.data, (2, 3)).transpose(1, 0, 2, 3).copy())
+    padding = tuple(
+        (kk - 1 - pp[0], kk - 1 - pp[1] + op)
+        for kk, pp, op in zip(k, p, layer.output_padding)
+    )
+    return conv(Tensor(stuffed, True), weight, layer.b, padding=padding)
+
+
+if __name__ == "__main__":
+    x = Tensor.random((8, 64, 16, 16))
+    for stride in (1, 2, 4):
+        layer = ConvTranspose2d(64, 32, 4, stride=stride, padding=1)
+        assert np.allclose(layer(x).data, zero_stuffed(x, layer).data)
+        col2im_ms = timeit(lambda: layer(x))
+        stuffed_ms = timeit(lambda: zero_stuffed(x, layer))
+        print(
+            f"stride={stride}  col2im {col2im_ms:8.1f} ms  "
+            f"zero-stuffing {stuffed_ms:8.1f} ms  "
+            f"speedup {stuffed_ms / col2im_ms:5.1f}x"
+        )
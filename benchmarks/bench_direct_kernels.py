@@ -0,0 +1,49 @@
+"""Forward + backward of pooling and thin convolutions: the window paths of the NumPy
+backend against the direct Numba kernels that read the input in place.
+
+python benchmarks/bench_direct_kernels.py
+"""
+
+from yadll.nn import *
+from yadll.backend import set_backend
+from common import timeit
+
+
+def step(layer: Module, x: Tensor):
+    layer(x).sum().backward()
+
+
+if __name__ == "__main__":
+    cases = {
+        "MaxPool1d 3 (64, 64, 256)": (MaxPool1d(3), (64, 64, 256)),
+        "MaxPool2d 2x2 (32, 64, 32, 32)": (MaxPool2d((2, 2)), (32, 64, 32, 32)),
+        "MaxPool2d 3x3/2 pad 1 (32, 64, 32, 32)": (
+            MaxPool2d((3, 3), (2, 2), ((1, 1), (1, 1))),
+            (32, 64, 32, 32),
+        ),
+        "AvgPool2d 2x2 (32, 64, 32, 32)": (AvgPool2d((2, 2)), (32, 64, 32, 32)),
+        "MaxPool3d 2x2x2 (8, 16, 32, 32, 32)": (
+            MaxPool3d((2, 2, 2)),
+            (8, 16, 32, 32, 32),
+        ),
+        "Conv2d 1->8 5x5 (32, 1, 64, 64)": (Conv2d(1, 8, (5, 5)), (32, 1, 64, 64)),
+        "Conv2d depthwise 32 3x3 (16, 32, 32, 32)": (
+            Conv2d(32, 32, (3, 3), groups=32),
+            (16, 32, 32, 32),
+        ),
+        "Conv3d 1->8 5x5x5 (4, 1, 48, 48, 48)": (
+            Conv3d(1, 8, (5, 5, 5)),
+            (4, 1, 48, 48, 48),
+        ),
+    }
+    for name, (layer, shape) in cases.items():
+        x = Tensor.random(shape)
+        times = {}
+        for backend in ("numpy", "numba"):
+            set_backend(backend)
+            times[backend] = timeit(lambda: step(layer, x))
+        print(
+            f"{name:42s}  numpy {times['numpy']:8.2f} ms  "
+            f"numba {times['numba']:8.2f} ms  "
+            f"speedup {times['numpy'] / times['numba']:5.1f}x"
+        )
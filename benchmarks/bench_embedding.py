@@ -0,0 +1,39 @@
+"""Training step of a sparse Embedding against a one-hot matmul as the vocabulary grows.
+
+python benchmarks/bench_embedding.py
+"""
+
+from yadll.nn import *
+from yadll.optimizers import SGD
+from common import timeit
+
+BATCH, DIM = 256, 64
+
+
+def one_hot_step(indices: np.ndarray, weight: Tensor, optim: SGD):
+    one_hot = np.zeros((len(indices), weight.shape[0]))
+    one_hot[np.arange(len(indices)), indices] = 1
+    weight.grad[:] = 0
+    (Tensor(one_hot, True) @ weight).sum().backward()
+    optim.step()
+
+
+def sparse_step(indices: np.ndarray, layer: Embedding, optim: SGD):
+    layer.weight.grad = None
+    layer(Tensor(indices)).sum().backward()
+    optim.step()
+
+
+if __name__ == "__main__":
+    for vocab in (1_000, 10_000, 100_000):
+        indices = np.random.randint(0, vocab, BATCH)
+        weight = Tensor.random((vocab, DIM))
+        layer = Embedding(vocab, DIM, sparse=True)
+        one_hot_ms = timeit(lambda: one_hot_step(indices, weight, SGD([weight], 0.1)))
+        sparse_ms = timeit(
+            lambda: sparse_step(indices, layer, SGD([layer.weight], 0.1))
+        )
+        print(
+            f"vocab={vocab:7d}  one-hot {one_hot_ms:8.2f} ms  "
+            f"sparse {sparse_ms:6.2f} ms  speedup {one_hot_ms / sparse_ms:6.1f}x"
+        )
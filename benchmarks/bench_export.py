@@ -0,0 +1,48 @@
+"""Latency of an exported graph on the runtime against eager Module.__call__.
+
+python benchmarks/bench_export.py
+"""
+
+from yadll.nn import *
+from yadll.runtime import Runtime, export
+from common import timeit
+
+
+def cnn() -> Module:
+    return Sequential(
+        Conv2d(3, 32, (3, 3), padding=((1, 1), (1, 1))),
+        BatchNorm2d(32),
+        ReLU(),
+        MaxPool2d((2, 2)),
+        Conv2d(32, 64, (3, 3), padding=((1, 1), (1, 1))),
+        BatchNorm2d(64),
+        ReLU(),
+        AvgPool2d((8, 8)),
+    )
+
+
+def mlp() -> Module:
+    return Sequential(
+        Linear(256, 512), ReLU(), Linear(512, 512), ReLU(), Linear(512, 10)
+    )
+
+
+def compare(name: str, model: Module, x: Tensor) -> None:
+    runtime = Runtime(export(model, x))
+    for module in [model, *model]:
+        module.eval()
+    eager_ms = timeit(lambda: model(x), 20)
+    with no_grad():
+        no_grad_ms = timeit(lambda: model(x), 20)
+    runtime_ms = timeit(lambda: runtime(x.data), 20)
+    print(
+        f"{name:4s} batch {x.shape[0]:3d}  eager {eager_ms:8.3f} ms  "
+        f"no_grad {no_grad_ms:8.3f} ms  runtime {runtime_ms:8.3f} ms  "
+        f"speedup {eager_ms / runtime_ms:5.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    for batch in (1, 32):
+        compare("cnn", cnn(), Tensor.random((batch, 3, 32, 32)))
+        compare("mlp", mlp(), Tensor.random((batch, 256)))
@@ -0,0 +1,36 @@
+"""Conv -> BatchNorm -> ReLU stacks in eval mode before and after fuse_modules.
+
+python benchmarks/bench_fusion.py
+"""
+
+from yadll.nn import *
+from common import timeit
+
+
+def block(c_in: int, c_out: int) -> list:
+    return [
+        Conv2d(c_in, c_out, (3, 3), padding=((1, 1), (1, 1)), bias=False),
+        BatchNorm2d(c_out),
+        ReLU(),
+    ]
+
+
+if __name__ == "__main__":
+    for batch, channels, size in ((1, 32, 56), (8, 64, 32), (32, 64, 16)):
+        model = Sequential(*block(3, channels), *block(channels, channels))
+        for module in model:
+            module.eval()
+            if isinstance(module, BatchNorm):
+                module.running_mean = Tensor(np.random.randn(channels), False)
+                module.running_var = Tensor(np.random.rand(channels) + 0.5, False)
+        fused = fuse_modules(model)
+        x = Tensor.random((batch, 3, size, size))
+        with no_grad():
+            eager_ms = timeit(lambda: model(x))
+            fused_ms = timeit(lambda: fused(x))
+            error = abs(fused(x).data - model(x).data).max()
+        print(
+            f"batch {batch:2d} channels {channels:2d} {size}x{size}  "
+            f"unfused {eager_ms:8.2f} ms  fused {fused_ms:8.2f} ms  "
+            f"speedup {eager_ms / fused_ms:4.2f}x  max error {error:.1e}"
+        )
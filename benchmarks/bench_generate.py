@@ -0,0 +1,31 @@
+"""Autoregressive decoding with the key/value cache against recomputing the prefix.
+
+Reports generated tokens per second of a decoder only stack for growing lengths.
+
+    python benchmarks/bench_generate.py
+"""
+
+import time
+from yadll.nn import *
+
+VOCAB, D_MODEL, HEADS, LAYERS, BATCH, PROMPT = 1000, 128, 4, 4, 4, 16
+
+
+def tokens_per_second(decoder, embed, head, prompt, new_tokens, use_cache) -> float:
+    start = time.perf_counter()
+    decoder.generate(prompt, embed, head, new_tokens, use_cache=use_cache)
+    return BATCH * new_tokens / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    embed, head = Embedding(VOCAB, D_MODEL), Linear(D_MODEL, VOCAB)
+    layer = TransformerDecoderLayer(D_MODEL, HEADS, 4 * D_MODEL, batch_first=True)
+    decoder = TransformerDecoder(layer, LAYERS)
+    prompt = np.random.randint(0, VOCAB, (BATCH, PROMPT))
+    for new_tokens in (32, 128, 256):
+        cached = tokens_per_second(decoder, embed, head, prompt, new_tokens, True)
+        recomputed = tokens_per_second(decoder, embed, head, prompt, new_tokens, False)
+        print(
+            f"{new_tokens:4d} new tokens  cache {cached:8.1f} tok/s  "
+            f"recompute {recomputed:8.1f} tok/s  speedup {cached / recomputed:5.1f}x"
+        )
@@ -0,0 +1,50 @@
+"""Hessian-vector products of an MLP loss: forward-over-reverse vs central differences.
+
+python benchmarks/bench_hvp.py
+"""
+
+import numpy as np
+from yadll.autodiff import Tensor
+from yadll.autograd import grad, hvp
+from common import timeit
+
+
+def finite_difference_hvp(fn, params, v, eps=1e-4):
+    # (grad(p + eps v) - grad(p - eps v)) / 2 eps, two gradient evaluations
+    def gradient(sign):
+        shifted = [
+            Tensor(p.data + sign * eps * t.data, True) for p, t in zip(params, v)
+        ]
+        return grad(fn(*shifted), shifted)
+
+    return [(a.data - b.data) / (2 * eps) for a, b in zip(gradient(1), gradient(-1))]
+
+
+if __name__ == "__main__":
+    for batch, width in ((64, 64), (256, 256), (256, 1024)):
+        x = Tensor.random((batch, width), False)
+        y = Tensor.random((batch, 10), False)
+
+        def loss(w1, w2):
+            h = x.linear(w1)
+            h = (h * 0.5).exp().log() * h  # smooth, non-quadratic activation
+            return ((h.linear(w2) - y) ** 2).mean()
+
+        params = [
+            Tensor(np.random.randn(width, width) * 0.05, True),
+            Tensor.random((10, width)),
+        ]
+        v = [Tensor.random(p.shape, False) for p in params]
+        exact = hvp(loss, params, v)
+        approx = finite_difference_hvp(loss, params, v)
+        error = max(
+            abs(a - e.data).max() / abs(e.data).max() for a, e in zip(approx, exact)
+        )
+        grad_ms = timeit(lambda: grad(loss(*params), params))
+        hvp_ms = timeit(lambda: hvp(loss, params, v))
+        fd_ms = timeit(lambda: finite_difference_hvp(loss, params, v))
+        print(
+            f"batch {batch:3d} width {width:4d}  grad {grad_ms:7.2f} ms  "
+            f"hvp {hvp_ms:7.2f} ms ({hvp_ms / grad_ms:3.1f}x grad)  "
+            f"finite differences {fd_ms:7.2f} ms  fd relative error {error:.1e}"
+        )
@@ -0,0 +1,40 @@
+"""Conv net training steps with and without a per-step BufferPool arena.
+
+python benchmarks/bench_memory.py
+"""
+
+from yadll.nn import *
+from yadll.memory import BufferPool
+from common import timeit
+
+if __name__ == "__main__":
+    for batch, channels, size in ((8, 32, 32), (32, 64, 32), (16, 128, 16)):
+        model = Sequential(
+            Conv2d(3, channels, (3, 3), padding=((1, 1), (1, 1))),
+            ReLU(),
+            Conv2d(channels, channels, (3, 3), padding=((1, 1), (1, 1))),
+            ReLU(),
+            Conv2d(channels, channels, (3, 3), stride=(2, 2)),
+        )
+        x = Tensor.random((batch, 3, size, size))
+
+        def step():
+            for p in model.parameters():
+                p.grad[...] = 0
+            model(x).sum().backward()
+
+        pool = BufferPool()
+
+        def pooled_step():
+            with pool.arena():
+                step()
+
+        eager_ms = timeit(step)
+        pooled_ms = timeit(pooled_step)
+        stats = pool.stats()
+        print(
+            f"batch {batch:2d} channels {channels:3d} {size}x{size}  "
+            f"numpy {eager_ms:8.2f} ms  pool {pooled_ms:8.2f} ms  "
+            f"speedup {eager_ms / pooled_ms:4.2f}x  hits {stats['hits']} "
+            f"misses {stats['misses']} held {stats['bytes_held'] / 2**20:.1f} MiB"
+        )
@@ -0,0 +1,68 @@
+"""Per-example gradients: one vmapped backward pass vs a backward pass per example.
+
+python benchmarks/bench_per_sample_grad.py
+"""
+
+import numpy as np
+from yadll.autodiff import Tensor
+from yadll.batching import per_sample_grad
+from yadll.nn import Conv2d, Linear, MaxPool2d, ReLU, Sequential
+from common import timeit
+
+
+def loss_fn(out, y):
+    return ((out.flatten(1) - y) ** 2).mean()
+
+
+def loop(model, x, y):
+    # the backward of x[i : i + 1] accumulates into x.grad
+    x, y = Tensor(x.data, True), Tensor(y.data, True)
+    params = list(model.parameters())
+    grads = [np.empty((x.shape[0],) + p.shape) for p in params]
+    for i in range(x.shape[0]):
+        for p in params:
+            p.grad = np.zeros_like(p.data)
+        loss_fn(model(x[i : i + 1]), y[i : i + 1]).backward()
+        for g, p in zip(grads, params):
+            g[i] = p.grad
+    return grads
+
+
+if __name__ == "__main__":
+    models = {
+        "mlp 64-128-10": (
+            Sequential(Linear(64, 128), ReLU(), Linear(128, 10)),
+            (64,),
+        ),
+        "mlp 784-256-10": (
+            Sequential(Linear(784, 256), ReLU(), Linear(256, 10)),
+            (784,),
+        ),
+        "cnn 1x28x28": (
+            Sequential(
+                Conv2d(1, 8, (3, 3), padding=((1, 1), (1, 1))),
+                ReLU(),
+                MaxPool2d((2, 2)),
+                Conv2d(8, 10, (3, 3), padding=((1, 1), (1, 1))),
+                MaxPool2d((14, 14)),
+            ),
+            (1, 28, 28),
+        ),
+    }
+    for name, (model, shape) in models.items():
+        for batch in (16, 64):
+            x = Tensor.random((batch,) + shape, False)
+            y = Tensor.random((batch, 10), False)
+            error = max(
+                abs(a - b).max()
+                for a, b in zip(
+                    per_sample_grad(model, loss_fn, (x, y)), loop(model, x, y)
+                )
+            )
+            vmap_ms = timeit(lambda: per_sample_grad(model, loss_fn, (x, y)), repeat=3)
+            loop_ms = timeit(lambda: loop(model, x, y), repeat=3)
+            print(
+                f"{name:15s} batch {batch:3d}  vmap {vmap_ms:8.2f} ms  "
+                f"loop {loop_ms:8.2f} ms  speedup {loop_ms / vmap_ms:5.1f}x  "
+                f"max difference {error:.1e}"
+            )
@@ -0,0 +1,57 @@
+"""Repeated forward + backward of Conv and Pool layers on a fixed input shape, with the
+per shape plans of the layers (hits after the first call) and with a plan built on
+every call, as the functional ops do without one.
+
+python benchmarks/bench_plans.py
+"""
+
+from yadll.autodiff import Tensor
+from yadll.nn import AvgPool2d, Conv2d, MaxPool2d
+from common import timeit
+
+CALLS = 200
+
+
+def per_call_us(layer, x: Tensor) -> float:
+    def run():
+        for _ in range(CALLS):
+            layer(x).sum().backward()
+
+    return timeit(run) * 1000 / CALLS
+
+
+def without_cache(layer):
+    # a cache that never hits
+    layer.plans.get = lambda key, build: build()
+    return layer
+
+
+if __name__ == "__main__":
+    cases = {
+        "Conv2d 8->16 3x3 pad 1 (4, 8, 8, 8)": (
+            lambda: Conv2d(8, 16, (3, 3), padding=((1, 1), (1, 1))),
+            (4, 8, 8, 8),
+        ),
+        "Conv2d depthwise 8 3x3 (4, 8, 8, 8)": (
+            lambda: Conv2d(8, 8, (3, 3), groups=8),
+            (4, 8, 8, 8),
+        ),
+        "MaxPool2d 3x3 stride 2 pad 1 (4, 8, 16, 16)": (
+            lambda: MaxPool2d((3, 3), (2, 2), ((1, 1), (1, 1))),
+            (4, 8, 16, 16),
+        ),
+        "AvgPool2d 2x2 (4, 8, 16, 16)": (
+            lambda: AvgPool2d((2, 2)),
+            (4, 8, 16, 16),
+        ),
+    }
+    for name, (make, shape) in cases.items():
+        x = Tensor.random(shape)
+        cached_layer = make()
+        cached = per_call_us(cached_layer, x)
+        rebuilt = per_call_us(without_cache(make()), x)
+        print(
+            f"{name:44s} cached plan {cached:7.1f} us  "
+            f"plan per call {rebuilt:7.1f} us  "
+            f"{cached_layer.plans.stats()}"
+        )
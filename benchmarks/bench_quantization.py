@@ -0,0 +1,50 @@
+"""int8 post-training quantization against the float64 path for an MLP and a small CNN.
+
+Reports weight memory, inference time and the relative error of the outputs.
+
+    python benchmarks/bench_quantization.py
+"""
+
+from yadll.nn import *
+from yadll.quantization import quantize_model
+from common import timeit
+
+
+def weight_bytes(model: Module) -> int:
+    arrays = []
+    for module in model.modules():
+        for value in vars(module).values():
+            if isinstance(value, Tensor):
+                arrays.append(value.data)
+            elif isinstance(value, np.ndarray):
+                arrays.append(value)
+    return sum(a.nbytes for a in arrays)
+
+
+def compare(name: str, model: Module, x: Tensor) -> None:
+    quantized = quantize_model(model, [x])
+    with no_grad():
+        float_ms = timeit(lambda: model(x))
+        int8_ms = timeit(lambda: quantized(x))
+        expected = model(x).data
+        error = abs(quantized(x).data - expected).max() / abs(expected).max()
+    float_mib, int8_mib = weight_bytes(model) / 2**20, weight_bytes(quantized) / 2**20
+    print(
+        f"{name:4s} weights {float_mib:6.2f} -> {int8_mib:5.2f} MiB "
+        f"({float_mib / int8_mib:4.1f}x)  float {float_ms:7.2f} ms  "
+        f"int8 {int8_ms:7.2f} ms ({float_ms / int8_ms:4.1f}x)  rel. error {error:.4f}"
+    )
+
+
+if __name__ == "__main__":
+    mlp = Sequential(
+        Linear(1024, 1024), ReLU(), Linear(1024, 1024), ReLU(), Linear(1024, 10)
+    )
+    compare("mlp", mlp, Tensor.random((256, 1024)))
+    cnn = Sequential(
+        Conv2d(16, 64, (3, 3), padding=((1, 1), (1, 1))),
+        ReLU(),
+        Conv2d(64, 64, (3, 3), padding=((1, 1), (1, 1))),
+        ReLU(),
+    )
+    compare("cnn", cnn, Tensor.random((8, 16, 32, 32)))
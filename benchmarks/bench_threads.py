@@ -0,0 +1,42 @@
+"""Scaling of large elementwise ops and reductions, forward + backward, with the
+number of intra-op threads.
+
+python benchmarks/bench_threads.py
+"""
+
+import os
+import numpy as np
+from yadll.backend import set_num_threads
+from yadll.autodiff import Tensor
+from common import timeit
+
+
+def elementwise_step(x: Tensor, w: Tensor):
+    ((x * w).relu().exp() + (x * x).log()).sum().backward()
+
+
+def reduction_step(x: Tensor):
+    (x.sum(0) + x.sum((1, 2))[:, None, None].sum(0)).max().backward()
+
+
+if __name__ == "__main__":
+    x = Tensor(np.random.rand(64, 256, 256) + 0.1, True)
+    w = Tensor.random((64, 256, 256))
+    cores = os.cpu_count()
+    threads = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    print(f"{cores} cores, ops on {x.data.size:,} elements")
+    base = {}
+    for n in threads:
+        set_num_threads(n)
+        times = {
+            "elementwise": timeit(lambda: elementwise_step(x, w), repeat=3),
+            "reduction": timeit(lambda: reduction_step(x), repeat=3),
+        }
+        base = base or times
+        print(
+            f"threads {n:2d}  "
+            + "  ".join(
+                f"{name} {ms:8.2f} ms ({base[name] / ms:3.1f}x)"
+                for name, ms in times.items()
+            )
+        )
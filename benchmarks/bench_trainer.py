@@ -0,0 +1,87 @@
+"""Samples/s of a serial training loop against the pipelined Trainer, with a loader
+that reads (simulated latency) and augments every batch.
+
+python benchmarks/bench_trainer.py
+"""
+
+import time
+import numpy as np
+from yadll.autodiff import Tensor
+from yadll.nn import Conv2d, Linear, MaxPool2d, Module, ReLU, Sequential
+from yadll.optimizers import SGD
+from yadll.train import Trainer
+
+BATCH, STEPS = 32, 20
+READ_SECONDS = 0.03  # per batch
+
+
+class Flatten(Module):
+    def forward(self, x: Tensor) -> Tensor:
+        return x.reshape((x.shape[0], -1))
+
+
+def make_model():
+    np.random.seed(0)
+    return Sequential(
+        Conv2d(3, 16, (3, 3), padding=((1, 1), (1, 1))),
+        ReLU(),
+        MaxPool2d((2, 2)),
+        Conv2d(16, 32, (3, 3), padding=((1, 1), (1, 1))),
+        ReLU(),
+        MaxPool2d((2, 2)),
+        Flatten(),
+        Linear(32 * 8 * 8, 10),
+    )
+
+
+def loss_fn(out: Tensor, y: Tensor) -> Tensor:
+    return ((out - y) ** 2).mean()
+
+
+def load(i: int):
+    time.sleep(READ_SECONDS)  # disk / network read
+    rng = np.random.default_rng(i)
+    x = rng.normal(size=(BATCH, 3, 36, 36))
+    # random crop and flip
+    top, left = rng.integers(0, 5, 2)
+    x = x[:, :, top : top + 32, left : left + 32][..., ::-1].copy()
+    return x, rng.normal(size=(BATCH, 10))
+
+
+def batches():
+    return (load(i) for i in range(STEPS))
+
+
+def serial():
+    model = make_model()
+    optim = SGD(model.parameters(), 1e-4, 0.9)
+    params = list(model.parameters())
+    start = time.perf_counter()
+    for x, y in batches():
+        loss_fn(model(Tensor(x)), Tensor(y)).backward()
+        optim.step()
+        for p in params:
+            p.grad[:] = 0
+    return BATCH * STEPS / (time.perf_counter() - start)
+
+
+def pipelined(overlap_optimizer: bool):
+    model = make_model()
+    trainer = Trainer(
+        model,
+        SGD(model.parameters(), 1e-4, 0.9),
+        loss_fn,
+        overlap_optimizer=overlap_optimizer,
+    )
+    report = trainer.fit(batches())
+    trainer.close()
+    return report["samples_per_second"]
+
+
+if __name__ == "__main__":
+    base = serial()
+    print(f"serial loop                          {base:8.1f} samples/s")
+    for overlap in (False, True):
+        rate = pipelined(overlap)
+        name = "Trainer, prefetch" + (" + optimizer overlap" if overlap else "")
+        print(f"{name:36s} {rate:8.1f} samples/s ({rate / base:3.1f}x)")
@@ -0,0 +1,13 @@
+import time
+
+
+def timeit(fn, repeat: int = 5, warmup: int = 1) -> float:
+    """Best wall time of `repeat` calls to fn, in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
@@ -1 +1,23 @@
-# empty to avoid path issue
+# at the root to avoid path issues
+from yadll.backend import set_backend, set_num_threads
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--backend",
+        default="numpy",
+        choices=("numpy", "numba"),
+        help="array backend the yadll ops run on",
+    )
+    parser.addoption(
+        "--num-threads",
+        type=int,
+        default=None,
+        help="intra-op threads of the elementwise ops and reductions",
+    )
+
+
+def pytest_configure(config):
+    set_backend(config.getoption("--backend"))
+    if config.getoption("--num-threads"):
+        set_num_threads(config.getoption("--num-threads"))
@@ -8,11 +8,12 @@ setup(
     author="Frederic Pelletier",
     license="MIT",
     packages=["yadll", "yadll.nn"],
-    install_requires=["numpy", "scikit-image"],
+    install_requires=["numpy", "scikit-image", "scipy"],
     python_requires=">=3.9",
     extras_require={
         "testing": ["torch", "pytest"],
         "formatting": ["ruff", "pre-commit"],
+        "numba": ["numba"],
     },
     include_package_data=True,
 )
@@ -0,0 +1,106 @@
+from yadll.autodiff import *
+from yadll.nn import *
+from yadll.optimizers import *
+from yadll.pruning import *
+from yadll.train import Trainer
+import numpy as np
+import pytest
+
+
+def test_magnitude_mask():
+    w = np.random.randn(8, 10)
+    mask = magnitude_mask(w, 0.8)
+    assert mask.sum() == 16
+    assert abs(w[mask]).min() >= abs(w[~mask]).max()
+
+
+def test_n_m_mask():
+    w = np.random.randn(4, 2, 2, 2)
+    mask = n_m_mask(w, 2, 4).reshape(4, -1, 4)
+    assert np.all(mask.sum(axis=-1) == 2)
+    blocks = abs(w).reshape(4, -1, 4)
+    assert np.all(
+        np.where(mask, blocks, np.inf).min(-1) >= np.where(mask, 0, blocks).max(-1)
+    )
+
+
+def test_pruner_masks_grads():
+    model = Sequential(Linear(6, 8), ReLU(), Linear(8, 2))
+    pruner = Pruner(model)
+    pruner.prune("magnitude", 0.5)
+    assert abs(pruner.sparsity() - 0.5) < 0.01
+    optim = SGD(list(model.parameters()), 0.1)
+    model(Tensor.random((4, 6))).sum().backward()
+    pruner.mask_grads()
+    optim.step()
+    for weight, mask in pruner.masks.items():
+        assert np.all(weight.data[~mask] == 0)
+
+
+@pytest.mark.parametrize("overlap", [False, True])
+def test_pruned_weights_stay_zero_with_momentum(overlap):
+    model = Sequential(Linear(6, 8), ReLU(), Linear(8, 2))
+    optim = SGD(list(model.parameters()), 0.1, momentum=0.9)
+    x, y = Tensor.random((4, 6), False), Tensor.random((4, 2), False)
+
+    def loss_fn(out, y):
+        return ((out - y) ** 2).mean()
+
+    # momentum built up before pruning
+    for _ in range(3):
+        loss_fn(model(x), y).backward()
+        optim.step()
+        optim.zero_grad()
+    # the Trainer hooks come first, the masking hooks still run before the updates
+    trainer = Trainer(model, optim, loss_fn, overlap_optimizer=overlap)
+    pruner = Pruner(model, optim)
+    pruner.prune("magnitude", 0.5)
+    for _ in range(3):
+        trainer.train_step((x, y))
+    trainer.close()
+    for weight, mask in pruner.masks.items():
+        assert np.all(weight.data[~mask] == 0)
+
+
+def test_export_pruned_linear():
+    model = Sequential(Linear(16, 32), ReLU(), Linear(32, 8))
+    pruner = Pruner(model)
+    pruner.prune("channel", 0.25, modules=[model[0]])
+    pruner.prune("n:m", modules=[model[2]])
+    exported = export_pruned(model, sparse_threshold=0.5)
+    assert isinstance(exported[0], CompactLinear)
+    assert isinstance(exported[2], SparseLinear)
+    assert exported[0].weight.shape == (24, 16)
+    assert exported[2].weight.nnz == 128
+    x = Tensor.random((5, 16))
+    assert np.all(abs(exported(x).data - model(x).data) < 1e-10)
+
+
+def test_export_pruned_conv():
+    model = Sequential(
+        Conv2d(3, 8, (3, 3), padding=((1, 1), (1, 1)), dilation=2),
+        ReLU(),
+        Conv2d(8, 8, (3, 3), stride=2),
+    )
+    pruner = Pruner(model)
+    pruner.prune("channel", 0.5, modules=[model[0]])
+    pruner.prune("magnitude", 0.8, modules=[model[2]])
+    exported = export_pruned(model, sparse_threshold=0.75)
+    assert isinstance(exported[0], CompactConv)
+    assert isinstance(exported[2], SparseConv)
+    x = Tensor.random((2, 3, 12, 12))
+    assert np.all(abs(exported(x).data - model(x).data) < 1e-10)
+
+
+def test_export_pruned_fused_conv_relu():
+    model = fuse_modules(
+        Sequential(Conv2d(3, 8, (3, 3)), ReLU(), Conv2d(8, 8, (3, 3)), ReLU())
+    )
+    pruner = Pruner(model)
+    pruner.prune("channel", 0.5, modules=[model[0]])
+    pruner.prune("magnitude", 0.8, modules=[model[1]])
+    exported = export_pruned(model, sparse_threshold=0.75)
+    assert isinstance(exported[0], CompactConv)
+    assert isinstance(exported[1], SparseConv)
+    x = Tensor.random((2, 3, 12, 12))
+    assert np.all(abs(exported(x).data - model(x).data) < 1e-10)
@@ -0,0 +1,71 @@
+from yadll.autodiff import *
+from yadll.nn import *
+from yadll.quantization import *
+import numpy as np
+
+
+def relative_error(out, expected):
+    return abs(out - expected).max() / abs(expected).max()
+
+
+def test_int8_matmul_is_exact():
+    # K spans several chunks and the extreme values maximize every partial sum
+    a = np.random.randint(-128, 128, (3, 5, 3000)).astype(np.int8)
+    b = np.random.randint(-127, 128, (3000, 7)).astype(np.int8)
+    a[0] = -128
+    b[:, 0] = -127
+    out = int8_matmul(a, b)
+    assert out.dtype == np.int32
+    assert np.all(out == a.astype(np.int64) @ b.astype(np.int64))
+
+
+def test_quantize_per_channel():
+    w = np.random.randn(4, 3, 2)
+    q, scale = quantize_per_channel(w)
+    assert q.dtype == np.int8 and scale.shape == (4,)
+    assert np.all(abs(q.astype(np.float64) * scale[:, None, None] - w) <= scale.max())
+
+
+def test_quantized_linear():
+    model = Sequential(Linear(20, 30), ReLU(), Linear(30, 5))
+    x = Tensor.random((16, 20))
+    quantized = quantize_model(model, [x])
+    assert isinstance(quantized[0], QuantizedLinear)
+    assert isinstance(model[0], Linear)
+    assert quantized[0].weight.dtype == np.int8
+    assert relative_error(quantized(x).data, model(x).data) < 0.05
+
+
+def test_quantized_conv():
+    model = Sequential(
+        Conv2d(3, 8, (3, 3), padding=((1, 1), (2, 0)), dilation=2),
+        ReLU(),
+        Conv2d(8, 8, (3, 3), stride=2, groups=4),
+    )
+    x = Tensor.random((2, 3, 12, 12))
+    quantized = quantize_model(model, [x])
+    assert isinstance(quantized[2], QuantizedConv)
+    out = quantized(x).data
+    assert out.shape == model(x).shape
+    assert relative_error(out, model(x).data) < 0.05
+
+
+def test_quantize_model_drops_float_weights():
+    layer = TransformerEncoderLayer(16, 2, 32)
+    x = Tensor.random((5, 2, 16))
+    quantized = quantize_model(layer, [x])
+    assert isinstance(quantized.linear1, QuantizedLinear)
+    assert isinstance(quantized.self_attn.out_proj, QuantizedLinear)
+    assert len(quantized.parameters()) == len(layer.parameters()) - 6
+    assert relative_error(quantized(x).data, layer(x).data) < 0.05
+
+
+def test_quantize_fused_conv_relu():
+    model = fuse_modules(Sequential(Conv2d(3, 8, (3, 3)), ReLU()))
+    assert model[0].fused_relu
+    x = Tensor.random((2, 3, 10, 10))
+    quantized = quantize_model(model, [x])
+    assert isinstance(quantized[0], QuantizedConv)
+    out = quantized(x).data
+    assert out.min() >= 0
+    assert relative_error(out, model(x).data) < 0.05
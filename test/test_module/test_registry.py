@@ -0,0 +1,144 @@
+from yadll.autodiff import *
+from yadll.nn import *
+import numpy as np
+import pytest
+import torch
+
+
+class Block(Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.scale = Tensor.ones((4,))
+        self.proj = Linear(3, 4)
+        self.norm = BatchNorm1d(4)
+
+    def forward(self, x: Tensor) -> Tensor:
+        return self.norm(self.proj(x)) * self.scale
+
+
+class Model(Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.blocks = ModuleList([Block(), Block()])
+        self.head = Sequential(ReLU(), Linear(4, 2, bias=False))
+
+    def forward(self, x: Tensor) -> Tensor:
+        return self.head(self.blocks[0](x) + self.blocks[1](x))
+
+
+def test_named_parameters_and_modules():
+    model = Model()
+    block = [
+        "scale",
+        "proj.weight",
+        "proj.b",
+        "norm.gamma",
+        "norm.beta",
+    ]
+    assert [name for name, _ in model.named_parameters()] == [
+        f"blocks.{i}.{name}" for i in range(2) for name in block
+    ] + ["head.1.weight"]
+    assert [p for _, p in model.named_parameters()] == model.parameters()
+    assert [name for name, _ in model.named_modules()] == [
+        "",
+        "blocks",
+        "blocks.0",
+        "blocks.0.proj",
+        "blocks.0.norm",
+        "blocks.1",
+        "blocks.1.proj",
+        "blocks.1.norm",
+        "head",
+        "head.0",
+        "head.1",
+    ]
+    assert [name for name, _ in model.named_buffers()] == [
+        f"blocks.{i}.norm.{name}"
+        for i in range(2)
+        for name in ("running_mean", "running_var")
+    ]
+    assert [name for name, _ in model.blocks[0].named_parameters(recurse=False)] == [
+        "scale"
+    ]
+
+
+def test_parameters_cache_invalidation():
+    model = Model()
+    params = model.parameters()
+    assert model.parameters() is params
+    model.head.append(Linear(2, 2))
+    assert len(model.parameters()) == len(params) + 2
+    weight = model.blocks[1].proj.weight
+    model.blocks[1].proj.weight = Tensor.random(weight.shape)
+    assert weight not in model.parameters()
+    del model.blocks[1].proj.b
+    assert len(model.parameters()) == len(params) + 1
+    # tensors that do not require grad are buffers
+    model.blocks[0].scale = Tensor.ones((4,), False)
+    assert [name for name, _ in model.blocks[0].named_parameters(recurse=False)] == []
+    assert "scale" in dict(model.blocks[0].named_buffers())
+
+
+def test_shared_parameters_once():
+    linear = Linear(3, 3)
+    model = Sequential(linear, ReLU(), linear)
+    assert len(model.parameters()) == 2
+    assert len(list(model.modules())) == 3
+
+
+def test_forward_hooks():
+    layer = Linear(3, 2)
+    x = Tensor.random((5, 3))
+    expected = layer(x).data
+    calls = []
+    remove_pre = layer.register_forward_pre_hook(
+        lambda module, args: calls.append("pre") or (args[0] * 2,)
+    )
+    remove_post = layer.register_forward_hook(
+        lambda module, args, output: calls.append("post") or output + 1
+    )
+    # Sequential calls its layers through __call__, the hooks run
+    assert np.allclose(Sequential(layer)(x).data, layer.forward(x * 2).data + 1)
+    assert calls == ["pre", "post"]
+    remove_pre()
+    remove_post()
+    assert np.allclose(layer(x).data, expected)
+
+
+def test_train_eval_recursive():
+    model = Model()
+    model.eval()
+    assert all(m.eval_mode for m in model.modules())
+    model.train()
+    assert not any(m.eval_mode for m in model.modules())
+
+
+@pytest.mark.parametrize("affine", [True, False])
+def test_layer_norm_parameters(affine):
+    layer = LayerNorm((4,), elementwise_affine=affine)
+    torch_layer = torch.nn.LayerNorm((4,), elementwise_affine=affine)
+    assert len(layer.parameters()) == len(list(torch_layer.parameters()))
+
+
+def test_transformer_parameters():
+    layer = TransformerEncoderLayer(8, 2, 16)
+    model = TransformerEncoder(layer, 3, LayerNorm((8,)))
+    torch_layer = torch.nn.TransformerEncoderLayer(8, 2, 16)
+    torch_model = torch.nn.TransformerEncoder(
+        torch_layer, 3, torch.nn.LayerNorm((8,)), enable_nested_tensor=False
+    )
+    shapes = [p.shape for p in model.parameters()]
+    torch_shapes = [tuple(p.shape) for p in torch_model.parameters()]
+    assert [np.prod(s) for s in shapes] == [np.prod(s) for s in torch_shapes]
+
+
+def test_call_forwards_arguments():
+    class Scale(Module):
+        def forward(self, x: Tensor, factor: float, shift: float = 0.0) -> Tensor:
+            return x * factor + shift
+
+    layer = Scale()
+    x = Tensor.random((2, 3))
+    assert np.allclose(layer(x, 2.0, shift=1.0).data, x.data * 2 + 1)
+    layer.register_forward_hook(lambda module, args, output: None)
+    assert np.allclose(layer(x, 3.0).data, x.data * 3)
@@ -0,0 +1,117 @@
+from yadll.autodiff import *
+from yadll.nn import *
+from yadll.runtime import *
+import yadll
+import numpy as np
+import pytest
+
+
+class Net(Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.features = Sequential(
+            Conv2d(3, 8, (3, 3), padding=((1, 1), (1, 1))),
+            BatchNorm2d(8),
+            ReLU(),
+            MaxPool2d((2, 2)),
+            Conv2d(8, 8, (3, 3), groups=2),
+            BatchNorm2d(8),
+            ReLU(),
+            AvgPool2d((3, 3)),
+        )
+        self.fc = Linear(8, 4)
+        self.norm = LayerNorm((4,))
+
+    def forward(self, x: Tensor) -> Tensor:
+        h = self.features(x)
+        h = h.reshape((h.shape[0], -1)).permute((1, 0)).permute((1, 0))
+        out = self.norm(self.fc(h))
+        return (out * 2).exp().sum(-1) - out.var(-1)
+
+
+def random_batch_norm_stats(model):
+    for module in model.features:
+        if isinstance(module, BatchNorm):
+            module.running_mean = Tensor(np.random.randn(8), False)
+            module.running_var = Tensor(np.random.rand(8) + 0.5, False)
+            module.gamma.data[:] = np.random.randn(8)
+            module.beta.data[:] = np.random.randn(8)
+
+
+def eager(model, x):
+    for module in [model, model.features, *model.features]:
+        module.eval()
+    return model(x).data
+
+
+def test_export_matches_eager():
+    model = Net()
+    random_batch_norm_stats(model)
+    x = Tensor.random((2, 3, 12, 12))
+    graph = yadll.export(model, x)
+    ops = [node.op for node in graph.nodes]
+    # both BatchNorms are folded and the permutes cancel out
+    assert "scale_shift" not in ops and "permute" not in ops and "relu" not in ops
+    assert ops.count("conv") == 2 and ops.count("reshape") == 1
+    runtime = Runtime(graph)
+    expected = eager(model, x)
+    assert np.all(abs(runtime(x.data) - expected) < 1e-10)
+    # buffers are reused between calls
+    assert np.all(abs(runtime(x.data) - expected) < 1e-10)
+
+
+def test_export_save_load(tmp_path):
+    model = Sequential(Linear(6, 8), ReLU(), Linear(8, 3))
+    x = Tensor.random((4, 6))
+    path = str(tmp_path / "model.npz")
+    export(model, x, path)
+    runtime = Runtime.load(path)
+    assert np.all(abs(runtime(x.data) - model(x).data) < 1e-12)
+
+
+def test_export_folds_constants():
+    class Scaled(Module):
+        def __init__(self) -> None:
+            super().__init__()
+            self.linear = Linear(3, 3)
+            self.scale = Tensor.random((3,))
+
+        def forward(self, x: Tensor) -> Tensor:
+            # dead, removed from the graph
+            x.exp()
+            return self.linear(x) * (self.scale.exp() + 1) + x.sum() * 0
+
+    model = Scaled()
+    x = Tensor.random((2, 3))
+    graph = export(model, x)
+    assert [node.op for node in graph.nodes] == ["linear", "mul", "sum", "mul", "add"]
+    assert np.all(abs(Runtime(graph)(x.data) - model(x).data) < 1e-12)
+
+
+def test_export_unsupported_op():
+    class Slice(Module):
+        def forward(self, x: Tensor) -> Tensor:
+            return x[:, :2].relu()
+
+    with pytest.raises(NotImplementedError):
+        export(Slice(), Tensor.random((2, 3)))
+
+
+def test_export_pooling_options():
+    model = Sequential(
+        MaxPool2d((3, 3), (2, 2), ((1, 1), (1, 1)), ceil_mode=True),
+        AvgPool2d((3, 3), (2, 2), ((1, 1), (1, 1)), True, count_include_pad=False),
+        AdaptiveMaxPool2d((3, 2)),
+        AdaptiveAvgPool2d((2, None)),
+        GlobalAvgPool(),
+    )
+    x = Tensor.random((2, 3, 17, 16))
+    graph = yadll.export(model, x)
+    assert [node.op for node in graph.nodes] == [
+        "max_pool",
+        "avg_pool",
+        "adaptive_max_pool",
+        "adaptive_avg_pool",
+        "adaptive_avg_pool",
+    ]
+    assert np.allclose(Runtime(graph)(x.data), model(x).data)
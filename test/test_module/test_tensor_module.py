@@ -42,6 +42,22 @@ def test_linear_layer_backward():
     assert np.all(layer.weight.grad == torch_layer.weight.grad.detach().numpy())
 
 
+def test_linear_layer_bias_only_backward():
+    x = Tensor.random((4, 10), requires_grad=False)
+    layer = Linear(10, 3)
+    layer.weight.requires_grad = False
+    torch_layer = torch.nn.Linear(10, 3, dtype=torch.float64)
+    torch_layer.weight = torch.nn.Parameter(
+        torch.tensor(layer.weight.data, dtype=torch.float64), requires_grad=False
+    )
+    torch_layer.bias = torch.nn.Parameter(
+        torch.tensor(layer.b.data, dtype=torch.float64)
+    )
+    layer.forward(x).relu().sum().backward()
+    torch_layer(torch.tensor(x.data)).relu().sum().backward()
+    assert np.allclose(layer.b.grad, torch_layer.bias.grad.numpy())
+
+
 def test_multidim_linear_layer_backward():
     x = Tensor.random((4, 3, 10))
     layer = Linear(10, 10)
@@ -217,6 +233,20 @@ def test_conv2d_all_features_backward():
     assert np.all(abs(conv.b.grad - torch_conv.bias.grad.detach().numpy()) < 0.00000001)
 
 
+def test_conv2d_bias_only_backward():
+    x = Tensor.random((2, 2, 6, 6), requires_grad=False)
+    conv = Conv2d(2, 3, (3, 3))
+    conv.weight.requires_grad = False
+    torch_conv = torch.nn.Conv2d(2, 3, 3, dtype=torch.float64)
+    torch_conv.weight = torch.nn.Parameter(
+        torch.tensor(conv.weight.data), requires_grad=False
+    )
+    torch_conv.bias = torch.nn.Parameter(torch.tensor(conv.b.data))
+    (conv(x) ** 2).sum().backward()
+    (torch_conv(torch.tensor(x.data)) ** 2).sum().backward()
+    assert np.allclose(conv.b.grad, torch_conv.bias.grad.numpy())
+
+
 def test_conv1d_output_with_bias():
     x = Tensor.random((32, 3, 8))
     conv = Conv1d(3, 6, 2)
@@ -492,6 +522,127 @@ def test_avgpool3d_with_padding_and_stride_forward_pass():
     ), "result not equal"
 
 
+def test_pool_int_arguments_and_shape_plans():
+    pool = MaxPool2d(2, 1)
+    torch_pool = torch.nn.MaxPool2d(2, 1)
+    for shape in [(2, 3, 8, 8), (2, 3, 8, 8), (1, 3, 5, 7)]:
+        x = Tensor.random(shape)
+        out = pool(x)
+        assert np.allclose(out.data, torch_pool(torch.tensor(x.data)).numpy())
+    # one plan per input shape
+    assert pool.plans.stats() == {"hits": 1, "misses": 2, "evictions": 0, "size": 2}
+
+
+@pytest.mark.parametrize(
+    "layer, torch_layer, shape",
+    [
+        (
+            MaxPool2d((3, 3), (2, 2), ((1, 1), (1, 1))),
+            torch.nn.MaxPool2d(3, 2, 1),
+            (2, 3, 9, 8),
+        ),
+        (AvgPool1d(4, 1, ((2, 2),)), torch.nn.AvgPool1d(4, 1, 2), (2, 3, 11)),
+        (
+            Conv2d(4, 6, (3, 3), (2, 1), ((1, 1), (2, 2)), dilation=2, groups=2),
+            torch.nn.Conv2d(4, 6, 3, (2, 1), (1, 2), dilation=2, groups=2),
+            (2, 4, 9, 8),
+        ),
+        (
+            Conv2d(3, 6, (3, 3), padding=((1, 1), (1, 1)), groups=3),
+            torch.nn.Conv2d(3, 6, 3, padding=1, groups=3),
+            (2, 3, 5, 5),
+        ),
+    ],
+)
+def test_plans_reused_across_calls(layer, torch_layer, shape):
+    # overlapping windows and the GEMM and depthwise convolutions
+    if isinstance(layer, Conv):
+        torch_layer.weight = torch.nn.Parameter(torch.tensor(layer.weight.data))
+        torch_layer.bias = torch.nn.Parameter(torch.tensor(layer.b.data))
+    for _ in range(3):
+        x = Tensor.random(shape)
+        torch_x = torch.tensor(x.data, requires_grad=True)
+        (layer(x) ** 2).sum().backward()
+        (torch_layer(torch_x) ** 2).sum().backward()
+        assert np.allclose(x.grad, torch_x.grad.numpy())
+    if isinstance(layer, Conv):
+        assert np.allclose(layer.weight.grad, torch_layer.weight.grad.numpy())
+    assert layer.plans.stats()["misses"] == 1 and layer.plans.stats()["hits"] == 2
+
+
+@pytest.mark.parametrize("mode", ["max", "avg"])
+@pytest.mark.parametrize(
+    "shape, output_size",
+    [
+        ((2, 3, 7), 3),
+        ((2, 3, 7, 10), (3, 4)),
+        ((2, 3, 8, 8), (4, None)),
+        ((1, 2, 5, 6, 7), (2, 3, 4)),
+        ((2, 3, 6, 5), 1),
+    ],
+)
+def test_adaptive_pool(mode, shape, output_size):
+    n = len(shape) - 2
+    layer = globals()[f"Adaptive{mode.capitalize()}Pool{n}d"](output_size)
+    torch_layer = getattr(torch.nn, f"Adaptive{mode.capitalize()}Pool{n}d")(output_size)
+    x = Tensor.random(shape)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    out = layer(x)
+    torch_out = torch_layer(torch_x)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.allclose(out.data, torch_out.detach().numpy())
+    assert np.allclose(x.grad, torch_x.grad.numpy())
+
+
+@pytest.mark.parametrize("mode", ["max", "avg"])
+def test_global_pool(mode):
+    layer = GlobalMaxPool() if mode == "max" else GlobalAvgPool()
+    x = Tensor.random((2, 3, 5, 4, 3))
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    out = layer(x)
+    torch_out = torch_x.amax((2, 3, 4)) if mode == "max" else torch_x.mean((2, 3, 4))
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert out.shape == (2, 3)
+    assert np.allclose(out.data, torch_out.detach().numpy())
+    assert np.allclose(x.grad, torch_x.grad.numpy())
+
+
+@pytest.mark.parametrize("ceil_mode", [True, False])
+@pytest.mark.parametrize("count_include_pad", [True, False])
+@pytest.mark.parametrize("n", [1, 2, 3])
+def test_pool_ceil_mode_and_count_include_pad(ceil_mode, count_include_pad, n):
+    shape = (2, 2) + (9, 8, 7)[:n]
+    avg = globals()[f"AvgPool{n}d"](
+        (3,) * n, (2,) * n, ((1, 1),) * n, ceil_mode, count_include_pad
+    )
+    max_pool = globals()[f"MaxPool{n}d"]((3,) * n, (2,) * n, ((1, 1),) * n, ceil_mode)
+    torch_avg = getattr(torch.nn, f"AvgPool{n}d")(3, 2, 1, ceil_mode, count_include_pad)
+    torch_max = getattr(torch.nn, f"MaxPool{n}d")(3, 2, 1, ceil_mode=ceil_mode)
+    for layer, torch_layer in ((avg, torch_avg), (max_pool, torch_max)):
+        x = Tensor.random(shape)
+        torch_x = torch.tensor(x.data, requires_grad=True)
+        out = layer(x)
+        torch_out = torch_layer(torch_x)
+        (out**2).sum().backward()
+        (torch_out**2).sum().backward()
+        assert out.shape == tuple(torch_out.shape)
+        assert np.allclose(out.data, torch_out.detach().numpy())
+        assert np.allclose(x.grad, torch_x.grad.numpy())
+
+
+def test_plan_cache_lru():
+    layer = Conv1d(2, 2, 3)
+    for length in (5, 6, 7, 5, 8):
+        layer(Tensor.random((1, 2, length)))
+    layer.plans.maxsize = 2
+    layer(Tensor.random((1, 2, 9)))
+    # the least recently used shapes went first
+    assert [key[0][2] for key in layer.plans.plans] == [8, 9]
+    assert layer.plans.stats() == {"hits": 1, "misses": 5, "evictions": 3, "size": 2}
+
+
 def test_batchnorm2d_no_tracking_affine_forward_pass():
     x = Tensor.random((3, 3, 16, 16))
     norm = BatchNorm2d(3, track_running_stats=False)
@@ -805,3 +956,445 @@ def test_layernorm_backward_pass():
     assert np.all(
         abs(norm.gamma.grad.data - torch_norm.weight.grad.detach().numpy()) < 1e-7
     ), "weight grad incorrect"
+
+
+def test_conv2d_groups_backward_pass():
+    x = Tensor.random((2, 4, 6, 6))
+    conv = Conv2d(4, 6, (3, 3), stride=(2, 1), padding=((1, 1), (0, 0)), groups=2)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_conv = torch.nn.Conv2d(
+        4, 6, 3, stride=(2, 1), padding=(1, 0), groups=2, dtype=torch.float64
+    )
+    torch_conv.weight = torch.nn.Parameter(torch.tensor(conv.weight.data))
+    torch_conv.bias = torch.nn.Parameter(torch.tensor(conv.b.data))
+    out = conv(x)
+    torch_out = torch_conv(torch_x)
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-8)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.weight.grad - torch_conv.weight.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.b.grad - torch_conv.bias.grad.numpy()) < 1e-8)
+
+
+def test_conv2d_depthwise_backward_pass():
+    x = Tensor.random((2, 3, 7, 7))
+    conv = Conv2d(3, 6, (3, 3), stride=(2, 2), padding=((1, 1), (1, 1)), groups=3)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_conv = torch.nn.Conv2d(
+        3, 6, 3, stride=2, padding=1, groups=3, dtype=torch.float64
+    )
+    torch_conv.weight = torch.nn.Parameter(torch.tensor(conv.weight.data))
+    torch_conv.bias = torch.nn.Parameter(torch.tensor(conv.b.data))
+    out = conv(x)
+    torch_out = torch_conv(torch_x)
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-8)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.weight.grad - torch_conv.weight.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.b.grad - torch_conv.bias.grad.numpy()) < 1e-8)
+
+
+def test_conv1d_dilation_backward_pass():
+    x = Tensor.random((2, 2, 12))
+    conv = Conv1d(2, 3, 3, stride=2, padding=2, dilation=2)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_conv = torch.nn.Conv1d(
+        2, 3, 3, stride=2, padding=2, dilation=2, dtype=torch.float64
+    )
+    torch_conv.weight = torch.nn.Parameter(torch.tensor(conv.weight.data))
+    torch_conv.bias = torch.nn.Parameter(torch.tensor(conv.b.data))
+    out = conv(x)
+    torch_out = torch_conv(torch_x)
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-8)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.weight.grad - torch_conv.weight.grad.numpy()) < 1e-8)
+
+
+def test_conv3d_dilation_groups_backward_pass():
+    x = Tensor.random((1, 4, 6, 6, 6))
+    conv = Conv3d(
+        4, 2, (2, 2, 2), padding=((1, 1), (0, 0), (1, 0)), dilation=(2, 1, 2), groups=2
+    )
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_conv = torch.nn.Conv3d(
+        4, 2, 2, dilation=(2, 1, 2), groups=2, dtype=torch.float64
+    )
+    torch_conv.weight = torch.nn.Parameter(torch.tensor(conv.weight.data))
+    torch_conv.bias = torch.nn.Parameter(torch.tensor(conv.b.data))
+    out = conv(x)
+    torch_out = torch_conv(torch.nn.functional.pad(torch_x, (1, 0, 0, 0, 1, 1)))
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-8)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.weight.grad - torch_conv.weight.grad.numpy()) < 1e-8)
+
+
+def test_conv_transpose1d_backward_pass():
+    x = Tensor.random((2, 3, 7))
+    conv = ConvTranspose1d(3, 2, 3, stride=2, padding=1, output_padding=1)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_conv = torch.nn.ConvTranspose1d(
+        3, 2, 3, stride=2, padding=1, output_padding=1, dtype=torch.float64
+    )
+    torch_conv.weight = torch.nn.Parameter(torch.tensor(conv.weight.data))
+    torch_conv.bias = torch.nn.Parameter(torch.tensor(conv.b.data))
+    out = conv(x)
+    torch_out = torch_conv(torch_x)
+    assert out.shape == torch_out.shape
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-8)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.weight.grad - torch_conv.weight.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.b.grad - torch_conv.bias.grad.numpy()) < 1e-8)
+
+
+def test_conv_transpose2d_groups_backward_pass():
+    x = Tensor.random((2, 4, 5, 6))
+    conv = ConvTranspose2d(
+        4, 6, (3, 2), stride=(2, 3), padding=((1, 1), (0, 0)), groups=2, dilation=2
+    )
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_conv = torch.nn.ConvTranspose2d(
+        4,
+        6,
+        (3, 2),
+        stride=(2, 3),
+        padding=(1, 0),
+        groups=2,
+        dilation=2,
+        dtype=torch.float64,
+    )
+    torch_conv.weight = torch.nn.Parameter(torch.tensor(conv.weight.data))
+    torch_conv.bias = torch.nn.Parameter(torch.tensor(conv.b.data))
+    out = conv(x)
+    torch_out = torch_conv(torch_x)
+    assert out.shape == torch_out.shape
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-8)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.weight.grad - torch_conv.weight.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.b.grad - torch_conv.bias.grad.numpy()) < 1e-8)
+
+
+def test_conv_transpose3d_backward_pass():
+    x = Tensor.random((1, 2, 3, 4, 3))
+    conv = ConvTranspose3d(2, 3, 2, stride=2, output_padding=(1, 0, 1), bias=False)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_conv = torch.nn.ConvTranspose3d(
+        2, 3, 2, stride=2, output_padding=(1, 0, 1), bias=False, dtype=torch.float64
+    )
+    torch_conv.weight = torch.nn.Parameter(torch.tensor(conv.weight.data))
+    out = conv(x)
+    torch_out = torch_conv(torch_x)
+    assert out.shape == torch_out.shape
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-8)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.weight.grad - torch_conv.weight.grad.numpy()) < 1e-8)
+
+
+def test_conv_transpose2d_bias_only_backward():
+    x = Tensor.random((2, 2, 4, 4), requires_grad=False)
+    conv = ConvTranspose2d(2, 3, (3, 3), stride=(2, 2))
+    conv.weight.requires_grad = False
+    torch_conv = torch.nn.ConvTranspose2d(2, 3, 3, stride=2, dtype=torch.float64)
+    torch_conv.weight = torch.nn.Parameter(
+        torch.tensor(conv.weight.data), requires_grad=False
+    )
+    torch_conv.bias = torch.nn.Parameter(torch.tensor(conv.b.data))
+    (conv(x) ** 2).sum().backward()
+    (torch_conv(torch.tensor(x.data)) ** 2).sum().backward()
+    assert np.allclose(conv.b.grad, torch_conv.bias.grad.numpy())
+
+
+def test_embedding_backward_pass():
+    indices = np.array([[1, 3, 1], [0, 9, 3]])
+    layer = Embedding(10, 4, padding_idx=0)
+    torch_layer = torch.nn.Embedding(10, 4, padding_idx=0, dtype=torch.float64)
+    torch_layer.weight = torch.nn.Parameter(torch.tensor(layer.weight.data))
+    out = layer(Tensor(indices))
+    torch_out = torch_layer(torch.tensor(indices))
+    assert np.all(out.data == torch_out.detach().numpy())
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(layer.weight.grad - torch_layer.weight.grad.numpy()) < 1e-10)
+
+
+def test_sparse_embedding_backward_pass():
+    indices = np.array([[1, 3, 1], [0, 9, 3]])
+    layer = Embedding(10, 4, sparse=True)
+    torch_layer = torch.nn.Embedding(10, 4, sparse=True, dtype=torch.float64)
+    torch_layer.weight = torch.nn.Parameter(torch.tensor(layer.weight.data))
+    (layer(Tensor(indices)) ** 2).sum().backward()
+    (torch_layer(torch.tensor(indices)) ** 2).sum().backward()
+    grad = layer.weight.grad.coalesce()
+    torch_grad = torch_layer.weight.grad.coalesce()
+    assert np.all(grad.indices == torch_grad.indices().numpy())
+    assert np.all(abs(grad.values - torch_grad.values().numpy()) < 1e-10)
+
+
+def test_embedding_bag_with_offsets_backward_pass():
+    indices = np.array([2, 4, 4, 1, 0, 7, 3])
+    offsets = np.array([0, 3, 3, 5])
+    for mode in ("sum", "mean"):
+        layer = EmbeddingBag(8, 3, mode=mode, sparse=True)
+        torch_layer = torch.nn.EmbeddingBag(
+            8, 3, mode=mode, sparse=True, dtype=torch.float64
+        )
+        torch_layer.weight = torch.nn.Parameter(torch.tensor(layer.weight.data))
+        out = layer(Tensor(indices), Tensor(offsets))
+        torch_out = torch_layer(torch.tensor(indices), torch.tensor(offsets))
+        assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-10)
+        (out**2).sum().backward()
+        (torch_out**2).sum().backward()
+        dense_grad = layer.weight.grad.to_dense()
+        assert np.all(
+            abs(dense_grad - torch_layer.weight.grad.to_dense().numpy()) < 1e-10
+        )
+
+
+def copy_rnn_weights(rnn, torch_rnn):
+    for names in rnn.weight_names:
+        for name in names:
+            getattr(torch_rnn, name).data.copy_(torch.tensor(getattr(rnn, name).data))
+
+
+def test_lstm_bidirectional_backward_pass():
+    x = Tensor.random((6, 3, 4))
+    h0, c0 = Tensor.random((4, 3, 5)), Tensor.random((4, 3, 5))
+    lstm = LSTM(4, 5, num_layers=2, bidirectional=True)
+    torch_lstm = torch.nn.LSTM(
+        4, 5, num_layers=2, bidirectional=True, dtype=torch.float64
+    )
+    copy_rnn_weights(lstm, torch_lstm)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_h0 = torch.tensor(h0.data, requires_grad=True)
+    torch_c0 = torch.tensor(c0.data, requires_grad=True)
+    out, (h_n, c_n) = lstm(x, (h0, c0))
+    torch_out, (torch_h_n, torch_c_n) = torch_lstm(torch_x, (torch_h0, torch_c0))
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-10)
+    assert np.all(abs(h_n.data - torch_h_n.detach().numpy()) < 1e-10)
+    assert np.all(abs(c_n.data - torch_c_n.detach().numpy()) < 1e-10)
+    ((out**2).sum() + (h_n * 2).sum() + (c_n**2).sum()).backward()
+    ((torch_out**2).sum() + (torch_h_n * 2).sum() + (torch_c_n**2).sum()).backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-10)
+    assert np.all(abs(h0.grad - torch_h0.grad.numpy()) < 1e-10)
+    assert np.all(abs(c0.grad - torch_c0.grad.numpy()) < 1e-10)
+    for names in lstm.weight_names:
+        for name in names:
+            torch_grad = getattr(torch_lstm, name).grad.numpy()
+            assert np.all(abs(getattr(lstm, name).grad - torch_grad) < 1e-10), name
+
+
+def test_gru_batch_first_backward_pass():
+    x = Tensor.random((3, 7, 4))
+    gru = GRU(4, 6, num_layers=2, batch_first=True)
+    torch_gru = torch.nn.GRU(4, 6, num_layers=2, batch_first=True, dtype=torch.float64)
+    copy_rnn_weights(gru, torch_gru)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    out, h_n = gru(x)
+    torch_out, torch_h_n = torch_gru(torch_x)
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-10)
+    assert np.all(abs(h_n.data - torch_h_n.detach().numpy()) < 1e-10)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-10)
+    for names in gru.weight_names:
+        for name in names:
+            torch_grad = getattr(torch_gru, name).grad.numpy()
+            assert np.all(abs(getattr(gru, name).grad - torch_grad) < 1e-10), name
+
+
+def test_rnn_relu_no_bias_backward_pass():
+    x = Tensor.random((5, 2, 3))
+    rnn = RNN(3, 4, nonlinearity="relu", bias=False, bidirectional=True)
+    torch_rnn = torch.nn.RNN(
+        3, 4, nonlinearity="relu", bias=False, bidirectional=True, dtype=torch.float64
+    )
+    copy_rnn_weights(rnn, torch_rnn)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    out, h_n = rnn(x)
+    torch_out, torch_h_n = torch_rnn(torch_x)
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-10)
+    (out.sum() + (h_n**2).sum()).backward()
+    (torch_out.sum() + (torch_h_n**2).sum()).backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-10)
+    for names in rnn.weight_names:
+        for name in names:
+            torch_grad = getattr(torch_rnn, name).grad.numpy()
+            assert np.all(abs(getattr(rnn, name).grad - torch_grad) < 1e-10), name
+
+
+def copy_attention_weights(attn, torch_attn):
+    torch_attn.in_proj_weight.data.copy_(torch.tensor(attn.in_proj_weight.data))
+    torch_attn.in_proj_bias.data.copy_(torch.tensor(attn.in_proj_bias.data))
+    torch_attn.out_proj.weight.data.copy_(torch.tensor(attn.out_proj.weight.data))
+    torch_attn.out_proj.bias.data.copy_(torch.tensor(attn.out_proj.b.data[0]))
+
+
+def copy_transformer_layer_weights(layer, torch_layer):
+    copy_attention_weights(layer.self_attn, torch_layer.self_attn)
+    if hasattr(layer, "multihead_attn"):
+        copy_attention_weights(layer.multihead_attn, torch_layer.multihead_attn)
+    for name in ("linear1", "linear2"):
+        getattr(torch_layer, name).weight.data.copy_(
+            torch.tensor(getattr(layer, name).weight.data)
+        )
+        getattr(torch_layer, name).bias.data.copy_(
+            torch.tensor(getattr(layer, name).b.data[0])
+        )
+
+
+def test_multihead_attention_backward_pass():
+    query, key = Tensor.random((5, 2, 8)), Tensor.random((7, 2, 8))
+    attn_mask = np.random.rand(5, 7) > 0.7
+    attn_mask[:, 0] = False
+    key_padding_mask = np.zeros((2, 7), dtype=bool)
+    key_padding_mask[1, -2:] = True
+    attn = MultiheadAttention(8, 2)
+    torch_attn = torch.nn.MultiheadAttention(8, 2, dtype=torch.float64)
+    copy_attention_weights(attn, torch_attn)
+    torch_query = torch.tensor(query.data, requires_grad=True)
+    torch_key = torch.tensor(key.data, requires_grad=True)
+    out, _ = attn(query, key, key, key_padding_mask, attn_mask=attn_mask)
+    torch_out, _ = torch_attn(
+        torch_query,
+        torch_key,
+        torch_key,
+        torch.tensor(key_padding_mask),
+        need_weights=False,
+        attn_mask=torch.tensor(attn_mask),
+    )
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-10)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(query.grad - torch_query.grad.numpy()) < 1e-10)
+    assert np.all(abs(key.grad - torch_key.grad.numpy()) < 1e-10)
+    assert np.all(
+        abs(attn.in_proj_weight.grad - torch_attn.in_proj_weight.grad.numpy()) < 1e-10
+    )
+
+
+def test_transformer_encoder_layer_causal_backward_pass():
+    x = Tensor.random((2, 6, 8))
+    layer = TransformerEncoderLayer(8, 2, 16, batch_first=True)
+    torch_layer = torch.nn.TransformerEncoderLayer(
+        8, 2, 16, dropout=0.0, batch_first=True, dtype=torch.float64
+    )
+    copy_transformer_layer_weights(layer, torch_layer)
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    out = layer(x, is_causal=True)
+    torch_out = torch_layer(
+        torch_x,
+        torch.nn.Transformer.generate_square_subsequent_mask(6, dtype=torch.float64),
+        is_causal=True,
+    )
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-10)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-10)
+    assert np.all(
+        abs(layer.linear1.weight.grad - torch_layer.linear1.weight.grad.numpy()) < 1e-10
+    )
+
+
+def test_transformer_decoder_norm_first_backward_pass():
+    tgt, memory = Tensor.random((4, 3, 8)), Tensor.random((6, 3, 8))
+    layer = TransformerDecoderLayer(8, 4, 16, norm_first=True)
+    torch_layer = torch.nn.TransformerDecoderLayer(
+        8, 4, 16, dropout=0.0, norm_first=True, dtype=torch.float64
+    )
+    copy_transformer_layer_weights(layer, torch_layer)
+    decoder = TransformerDecoder(layer, 2)
+    torch_decoder = torch.nn.TransformerDecoder(torch_layer, 2)
+    torch_tgt = torch.tensor(tgt.data, requires_grad=True)
+    torch_memory = torch.tensor(memory.data, requires_grad=True)
+    out = decoder(tgt, memory, tgt_is_causal=True)
+    torch_out = torch_decoder(
+        torch_tgt,
+        torch_memory,
+        torch.nn.Transformer.generate_square_subsequent_mask(4, dtype=torch.float64),
+        tgt_is_causal=True,
+    )
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-10)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(tgt.grad - torch_tgt.grad.numpy()) < 1e-10)
+    assert np.all(abs(memory.grad - torch_memory.grad.numpy()) < 1e-10)
+
+
+def test_transformer_decoder_kv_cache():
+    tgt, memory = Tensor.random((7, 2, 8)), Tensor.random((5, 2, 8))
+    decoder = TransformerDecoder(TransformerDecoderLayer(8, 2, 16), 2)
+    full = decoder(tgt, memory, tgt_is_causal=True)
+    # small capacity so the buffers have to grow while decoding
+    cache = [(KVCache(2), KVCache(static=True)) for _ in decoder.layers]
+    with no_grad():
+        steps = [decoder(tgt[:3], memory, tgt_is_causal=True, cache=cache)]
+        for t in range(3, 7):
+            steps.append(
+                decoder(tgt[t : t + 1], memory, tgt_is_causal=True, cache=cache)
+            )
+    assert not steps[-1].requires_grad
+    assert np.all(abs(Tensor.cat(steps, 0).data - full.data) < 1e-10)
+
+
+def test_transformer_decoder_generate():
+    embed, head = Embedding(11, 8), Linear(8, 11)
+    decoder = TransformerDecoder(TransformerDecoderLayer(8, 2, 16, batch_first=True), 2)
+    tokens = np.random.randint(0, 11, (2, 3))
+    cached = decoder.generate(tokens, embed, head, 5)
+    recomputed = decoder.generate(tokens, embed, head, 5, use_cache=False)
+    assert cached.shape == (2, 8)
+    assert np.all(cached == recomputed)
+    assert np.all(cached[:, :3] == tokens)
+
+
+def test_conv2d_fused_relu_backward_pass():
+    x = Tensor.random((2, 4, 6, 6))
+    conv = Conv2d(4, 6, (3, 3), padding=((1, 1), (1, 1)), groups=2)
+    conv.fused_relu = True
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_conv = torch.nn.Conv2d(4, 6, 3, padding=1, groups=2, dtype=torch.float64)
+    torch_conv.weight = torch.nn.Parameter(torch.tensor(conv.weight.data))
+    torch_conv.bias = torch.nn.Parameter(torch.tensor(conv.b.data))
+    out = conv(x)
+    torch_out = torch.relu(torch_conv(torch_x))
+    assert np.all(abs(out.data - torch_out.detach().numpy()) < 1e-8)
+    (out**2).sum().backward()
+    (torch_out**2).sum().backward()
+    assert np.all(abs(x.grad - torch_x.grad.numpy()) < 1e-8)
+    assert np.all(abs(conv.weight.grad - torch_conv.weight.grad.numpy()) < 1e-8)
+
+
+def test_fuse_modules():
+    model = Sequential(
+        Conv2d(3, 8, (3, 3), padding=((1, 1), (1, 1)), bias=False),
+        BatchNorm2d(8),
+        ReLU(),
+        Conv2d(8, 8, (3, 3), groups=8),
+        BatchNorm2d(8),
+        Conv2d(8, 4, (1, 1)),
+        ReLU(),
+    )
+    for module in model:
+        module.eval()
+        if isinstance(module, BatchNorm):
+            module.running_mean = Tensor(np.random.randn(8), False)
+            module.running_var = Tensor(np.random.rand(8) + 0.5, False)
+            module.gamma.data[:] = np.random.randn(8)
+            module.beta.data[:] = np.random.randn(8)
+    fused = fuse_modules(model)
+    assert [type(m) for m in fused] == [Conv2d] * 3
+    assert [m.fused_relu for m in fused] == [True, False, True]
+    assert len(model) == 7
+    x = Tensor.random((2, 3, 9, 9))
+    assert np.all(abs(fused(x).data - model(x).data) < 1e-10)
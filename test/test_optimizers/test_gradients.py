@@ -0,0 +1,109 @@
+from yadll.autodiff import *
+from yadll.optimizers import *
+from yadll.nn import *
+import numpy as np
+import pytest
+import torch
+
+
+def make_models():
+    model = Sequential(Linear(4, 8), ReLU(), Linear(8, 3))
+    torch_model = torch.nn.Sequential(
+        torch.nn.Linear(4, 8, dtype=torch.float64),
+        torch.nn.ReLU(),
+        torch.nn.Linear(8, 3, dtype=torch.float64),
+    )
+    with torch.no_grad():
+        for p, torch_p in zip(model.parameters(), torch_model.parameters()):
+            torch_p.copy_(torch.tensor(p.data.reshape(torch_p.shape)))
+    return model, torch_model
+
+
+def backward(model, torch_model, x):
+    model(Tensor(x)).sum().backward()
+    torch_model(torch.tensor(x)).sum().backward()
+
+
+def assert_grads_equal(model, torch_model):
+    for p, torch_p in zip(model.parameters(), torch_model.parameters()):
+        assert np.allclose(p.grad.reshape(torch_p.shape), torch_p.grad.numpy())
+
+
+@pytest.mark.parametrize("norm_type", [2.0, 1.0, 3.0, np.inf])
+@pytest.mark.parametrize("bucket", [True, False])
+def test_clip_grad_norm(norm_type, bucket):
+    model, torch_model = make_models()
+    backward(model, torch_model, np.random.randn(5, 4))
+    params = GradBucket(model.parameters()) if bucket else model.parameters()
+    norm = clip_grad_norm_(params, 0.5, norm_type)
+    torch_norm = torch.nn.utils.clip_grad_norm_(
+        torch_model.parameters(), 0.5, norm_type
+    )
+    assert np.isclose(norm, torch_norm.item())
+    assert_grads_equal(model, torch_model)
+
+
+@pytest.mark.parametrize("bucket", [True, False])
+def test_clip_grad_value(bucket):
+    model, torch_model = make_models()
+    backward(model, torch_model, np.random.randn(5, 4))
+    clip_grad_value_(
+        GradBucket(model.parameters()) if bucket else model.parameters(), 0.3
+    )
+    torch.nn.utils.clip_grad_value_(torch_model.parameters(), 0.3)
+    assert_grads_equal(model, torch_model)
+
+
+def test_clip_grad_norm_sparse():
+    indices = np.array([[1, 3, 1], [0, 9, 3]])
+    layer = Embedding(10, 4, sparse=True)
+    torch_layer = torch.nn.Embedding(10, 4, sparse=True, dtype=torch.float64)
+    torch_layer.weight = torch.nn.Parameter(torch.tensor(layer.weight.data))
+    (layer(Tensor(indices)) ** 2).sum().backward()
+    (torch_layer(torch.tensor(indices)) ** 2).sum().backward()
+    norm = clip_grad_norm_(layer.parameters(), 1.0)
+    dense = torch_layer.weight.grad.to_dense()
+    assert np.isclose(norm, dense.norm().item())
+    assert np.allclose(layer.weight.grad.to_dense(), dense.numpy() / (norm + 1e-6))
+
+
+@pytest.mark.parametrize("set_to_none", [True, False])
+def test_zero_grad_accumulation(set_to_none):
+    model, torch_model = make_models()
+    optim = SGD(model.parameters(), 0.1, 0.9)
+    torch_optim = torch.optim.SGD(torch_model.parameters(), 0.1, 0.9)
+    for _ in range(3):
+        # two micro-batches per step
+        for _ in range(2):
+            backward(model, torch_model, np.random.randn(5, 4))
+        assert_grads_equal(model, torch_model)
+        optim.step()
+        torch_optim.step()
+        optim.zero_grad(set_to_none)
+        torch_optim.zero_grad(set_to_none)
+        for p in model.parameters():
+            assert p.grad is None if set_to_none else not p.grad.any()
+    for p, torch_p in zip(model.parameters(), torch_model.parameters()):
+        assert np.allclose(p.data.reshape(torch_p.shape), torch_p.detach().numpy())
+
+
+def test_grad_bucket_zero_and_reattach():
+    model, _ = make_models()
+    params = list(model.parameters())
+    bucket = GradBucket(params)
+    model(Tensor.random((5, 4))).sum().backward()
+    assert all(
+        np.shares_memory(p.grad, bucket.flats[np.dtype("float64")]) for p in params
+    )
+    for p in params:
+        p.zero_grad(set_to_none=True)
+    model(Tensor.random((5, 4))).sum().backward()
+    # grads reallocated by backward are copied back in
+    assert np.isclose(
+        clip_grad_norm_(bucket, np.inf), total_norm([p.grad for p in params])
+    )
+    assert all(
+        np.shares_memory(p.grad, bucket.flats[np.dtype("float64")]) for p in params
+    )
+    bucket.zero_()
+    assert not any(p.grad.any() for p in params)
@@ -0,0 +1,107 @@
+from yadll.autodiff import *
+from yadll.optimizers import *
+from yadll.nn import *
+import numpy as np
+import pytest
+import torch
+
+
+def make_optimizers(momentum=0.9):
+    layers = [Linear(3, 4), ReLU(), Linear(4, 2)]
+    model = Sequential(*layers)
+    first, second = [list(layer.parameters()) for layer in layers[::2]]
+    optim = SGD([{"params": first}, {"params": second, "lr": 0.01}], 0.1, momentum)
+    torch_params = [torch.nn.Parameter(torch.tensor(p.data)) for p in first + second]
+    torch_optim = torch.optim.SGD(
+        [{"params": torch_params[:2]}, {"params": torch_params[2:], "lr": 0.01}],
+        0.1,
+        momentum,
+    )
+    return model, optim, torch_params, torch_optim
+
+
+SCHEDULERS = {
+    "step": lambda lib, o: lib.StepLR(o, 3, 0.5),
+    "cosine": lambda lib, o: lib.CosineAnnealingLR(o, 7, 1e-3),
+    "warmup": lambda lib, o: lib.LinearLR(o, 0.1, total_iters=4),
+    "warmup_cosine": lambda lib, o: lib.SequentialLR(
+        o, [lib.LinearLR(o, 0.1, total_iters=3), lib.CosineAnnealingLR(o, 8)], [3]
+    ),
+    "one_cycle": lambda lib, o: lib.OneCycleLR(o, [1.0, 0.5], 12),
+    "one_cycle_linear": lambda lib, o: lib.OneCycleLR(
+        o, 1.0, 12, pct_start=0.25, anneal_strategy="linear", cycle_momentum=False
+    ),
+}
+
+
+@pytest.mark.parametrize("name", SCHEDULERS)
+def test_scheduler(name):
+    import yadll.optimizers.lr_scheduler as yadll_lib
+
+    _, optim, _, torch_optim = make_optimizers()
+    scheduler = SCHEDULERS[name](yadll_lib, optim)
+    torch_scheduler = SCHEDULERS[name](torch.optim.lr_scheduler, torch_optim)
+    for _ in range(11):
+        assert np.allclose(scheduler.get_last_lr(), torch_scheduler.get_last_lr())
+        for group, torch_group in zip(optim.param_groups, torch_optim.param_groups):
+            assert np.isclose(group["momentum"], torch_group["momentum"])
+        torch_optim.step()
+        scheduler.step()
+        torch_scheduler.step()
+
+
+@pytest.mark.parametrize("mode", ["min", "max"])
+@pytest.mark.parametrize("threshold_mode", ["rel", "abs"])
+def test_reduce_lr_on_plateau(mode, threshold_mode):
+    _, optim, _, torch_optim = make_optimizers()
+    kwargs = dict(
+        mode=mode,
+        factor=0.5,
+        patience=2,
+        threshold=0.05,
+        threshold_mode=threshold_mode,
+        cooldown=1,
+        min_lr=[0.02, 0.001],
+    )
+    scheduler = ReduceLROnPlateau(optim, **kwargs)
+    torch_scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(torch_optim, **kwargs)
+    metrics = np.random.default_rng(0).normal(size=30)
+    for metric in metrics:
+        scheduler.step(metric)
+        torch_scheduler.step(metric)
+        assert np.allclose(scheduler.get_last_lr(), torch_scheduler.get_last_lr())
+
+
+def test_param_groups_training_with_scheduler():
+    model, optim, torch_params, torch_optim = make_optimizers()
+    scheduler = StepLR(optim, 2, 0.5)
+    torch_scheduler = torch.optim.lr_scheduler.StepLR(torch_optim, 2, 0.5)
+    params = list(model.parameters())
+    for _ in range(5):
+        x = Tensor.random((5, 3))
+        model(x).sum().backward()
+        w1, b1, w2, b2 = torch_params
+        (torch.relu(torch.tensor(x.data) @ w1.T + b1) @ w2.T + b2).sum().backward()
+        optim.step()
+        torch_optim.step()
+        optim.zero_grad()
+        torch_optim.zero_grad()
+        scheduler.step()
+        torch_scheduler.step()
+    for p, torch_p in zip(params, torch_params):
+        assert np.allclose(p.data, torch_p.detach().numpy())
+    # the scheduler did not touch the optimizer state
+    assert len(optim.velocities) == 4
+
+
+def test_add_param_group_defaults():
+    model, optim, _, _ = make_optimizers(momentum=0)
+    extra = Tensor.random((2, 2))
+    optim.add_param_group({"params": [extra], "momentum": 0.5})
+    assert (
+        optim.param_groups[-1]["lr"] == 0.1
+        and optim.param_groups[-1]["momentum"] == 0.5
+    )
+    assert optim.params[-1] is extra and optim.groups[extra] is optim.param_groups[-1]
+    with pytest.raises(AssertionError):
+        optim.add_param_group({"params": [extra]})
@@ -48,3 +48,17 @@ def test_sgd_with_momentum():
     assert np.all(
         abs(model.weight.data - torch_model.weight.detach().numpy()) < 1e-8
     ), "weight not equal after step"
+
+
+def test_sgd_sparse_step():
+    indices = np.array([[1, 3, 1], [0, 9, 3]])
+    layer = Embedding(10, 4, sparse=True)
+    torch_layer = torch.nn.Embedding(10, 4, sparse=True, dtype=torch.float64)
+    torch_layer.weight = torch.nn.Parameter(torch.tensor(layer.weight.data))
+    optim = SGD(layer.parameters(), 0.1)
+    torch_optim = torch.optim.SGD(torch_layer.parameters(), 0.1)
+    (layer(Tensor(indices)) ** 2).sum().backward()
+    (torch_layer(torch.tensor(indices)) ** 2).sum().backward()
+    optim.step()
+    torch_optim.step()
+    assert np.all(abs(layer.weight.data - torch_layer.weight.detach().numpy()) < 1e-10)
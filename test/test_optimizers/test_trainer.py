@@ -0,0 +1,106 @@
+from yadll.autodiff import *
+from yadll.optimizers import *
+from yadll.nn import *
+from yadll.train import Trainer, load_checkpoint, prefetch
+import numpy as np
+import pytest
+
+
+def make_model():
+    np.random.seed(0)
+    return Sequential(
+        Conv2d(2, 4, (3, 3)), ReLU(), MaxPool2d((2, 2)), Conv2d(4, 3, (2, 2))
+    )
+
+
+def loss_fn(out, y):
+    return ((out.reshape((out.shape[0], -1)) - y) ** 2).mean()
+
+
+def batches(n=5):
+    rng = np.random.default_rng(1)
+    return [(rng.normal(size=(4, 2, 9, 9)), rng.normal(size=(4, 12))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("accumulation_steps", [1, 2])
+@pytest.mark.parametrize("overlap", [True, False])
+def test_trainer_matches_serial_loop(accumulation_steps, overlap):
+    model = make_model()
+    optim = SGD(model.parameters(), 1e-4, 0.9)
+    for i, (x, y) in enumerate(batches()):
+        loss = loss_fn(model(Tensor(x)), Tensor(y)) / float(accumulation_steps)
+        loss.backward()
+        if (i + 1) % accumulation_steps == 0 or i == 4:
+            optim.step()
+            for p in model.parameters():
+                p.grad[:] = 0
+
+    trained = make_model()
+    trainer = Trainer(
+        trained,
+        SGD(trained.parameters(), 1e-4, 0.9),
+        loss_fn,
+        accumulation_steps=accumulation_steps,
+        overlap_optimizer=overlap,
+    )
+    report = trainer.fit(batches())
+    trainer.close()
+    assert report["samples"] == 20 and report["steps"] == (
+        5 if accumulation_steps == 1 else 3
+    )
+    for p, expected in zip(trained.parameters(), model.parameters()):
+        assert np.allclose(p.data, expected.data)
+        assert not p.grad.any()
+
+
+def test_trainer_hooks_logging_and_checkpoints(tmp_path):
+    model = make_model()
+    logged, events = [], []
+    trainer = Trainer(
+        model,
+        SGD(model.parameters(), 1e-4),
+        loss_fn,
+        transform=lambda batch: (batch[0] * 2, batch[1]),
+        log_fn=logged.append,
+        checkpoint_path=str(tmp_path / "step{step}.npz"),
+        checkpoint_every=2,
+    )
+    trainer.register_hook("step_end", lambda t, metrics: events.append(metrics["step"]))
+    trainer.register_hook("epoch_end", lambda t, epoch: events.append(f"epoch {epoch}"))
+    report = trainer.fit(batches(3), epochs=2)
+    trainer.close()
+    assert events == [1, 2, 3, "epoch 0", 4, 5, 6, "epoch 1"]
+    assert [m["step"] for m in logged] == [1, 2, 3, 4, 5, 6]
+    assert report["samples_per_second"] > 0
+    restored = make_model()
+    load_checkpoint(restored, str(tmp_path / "step6.npz"))
+    for p, expected in zip(restored.parameters(), model.parameters()):
+        assert np.all(p.data == expected.data)
+    assert (tmp_path / "step2.npz").exists() and (tmp_path / "step4.npz").exists()
+
+
+def test_prefetch_raises_loader_errors():
+    def data():
+        yield 1
+        raise ValueError("broken batch")
+
+    loader = prefetch(data())
+    assert next(loader) == 1
+    with pytest.raises(ValueError):
+        next(loader)
+
+
+def test_post_accumulate_grad_hook():
+    x, w = Tensor.random((3, 4)), Tensor.random((4, 2))
+    seen = []
+    remove = w.register_post_accumulate_grad_hook(lambda t: seen.append(t.grad.copy()))
+    ((x @ w) * (x @ w)).sum().backward()
+    assert len(seen) == 1 and np.all(seen[0] == w.grad)
+    remove()
+    (x @ w).sum().backward()
+    assert len(seen) == 1
+    order = []
+    w.register_post_accumulate_grad_hook(lambda t: order.append("first"))
+    w.register_post_accumulate_grad_hook(lambda t: order.append("prepended"), True)
+    (x @ w).sum().backward()
+    assert order == ["prepended", "first"]
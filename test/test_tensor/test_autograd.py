@@ -0,0 +1,201 @@
+from yadll.autodiff import *
+from yadll.autograd import grad, hvp, jvp, jacfwd
+from yadll.nn import *
+from yadll.nn.functional import *
+from yadll.sparse import CSRTensor
+import numpy as np
+import pytest
+import torch
+
+
+def f(x, w, b, lib=np):
+    # touches matmul, linear, getitem, pow, exp, log, max, mean and broadcasting
+    h = x.linear(w, b) if lib is np else torch.nn.functional.linear(x, w, b)
+    h = (h**2 + 1).log() + (h * 0.1).exp()
+    return (h[:, :3] @ h[:, 1:4].T).mean() + h.max() + (h * x[:, :1]).sum()
+
+
+def inputs():
+    return Tensor.random((4, 5)), Tensor.random((6, 5)), Tensor.random((6,))
+
+
+def test_grad():
+    x, w, b = inputs()
+    torch_inputs = [torch.tensor(t.data, requires_grad=True) for t in (x, w, b)]
+    expected = torch.autograd.grad(f(*torch_inputs, lib=torch), torch_inputs)
+    for g, e in zip(grad(f(x, w, b), (x, w, b)), expected):
+        assert np.allclose(g.data, e.numpy())
+    assert x.grad.sum() == 0, "grad() does not accumulate into .grad"
+
+
+def test_grad_of_grad():
+    x, w, b = inputs()
+    (gx,) = grad(f(x, w, b), x, create_graph=True)
+    penalty = (gx**2).sum()
+    torch_inputs = [torch.tensor(t.data, requires_grad=True) for t in (x, w, b)]
+    (torch_gx,) = torch.autograd.grad(
+        f(*torch_inputs, lib=torch), torch_inputs[0], create_graph=True
+    )
+    assert np.allclose(penalty.data, (torch_gx**2).sum().item())
+    expected = torch.autograd.grad((torch_gx**2).sum(), torch_inputs)
+    for g, e in zip(grad(penalty, (x, w, b)), expected):
+        assert np.allclose(g.data, e.numpy())
+
+
+def test_hvp():
+    x, w, b = inputs()
+    v = tuple(Tensor.random(t.shape) for t in (x, w, b))
+    _, expected = torch.autograd.functional.hvp(
+        lambda *t: f(*t, lib=torch),
+        tuple(torch.tensor(t.data) for t in (x, w, b)),
+        tuple(torch.tensor(t.data) for t in v),
+    )
+    for h, e in zip(hvp(f, (x, w, b), v), expected):
+        assert np.allclose(h.data, e.numpy())
+
+
+def test_backward_create_graph():
+    x, w, b = inputs()
+    f(x, w, b).backward(create_graph=True)
+    torch_inputs = [torch.tensor(t.data, requires_grad=True) for t in (x, w, b)]
+    f(*torch_inputs, lib=torch).backward(create_graph=True)
+    assert np.allclose(w.grad, torch_inputs[1].grad.detach().numpy())
+    (w.grad_graph**2).sum().backward()
+    (torch_inputs[1].grad ** 2).sum().backward()
+    # .grad now holds the first order grad plus the grad of the penalty
+    assert np.allclose(x.grad, torch_inputs[0].grad.detach().numpy())
+
+
+def test_grad_numpy_backward_fallback():
+    conv = Conv2d(2, 3, (3, 3), padding=((1, 1), (1, 1)))
+    x = Tensor.random((2, 2, 5, 5))
+    out = (conv(x) ** 2).sum()
+    gx, gw = grad(out, (x, conv.weight))
+    out.backward()
+    assert np.allclose(gx.data, x.grad) and np.allclose(gw.data, conv.weight.grad)
+
+
+def test_jvp():
+    primals = inputs()
+    tangents = [np.random.randn(*t.shape) for t in primals]
+    out, tangent = jvp(f, primals, tangents)
+    torch_out, torch_tangent = torch.func.jvp(
+        lambda *t: f(*t, lib=torch),
+        tuple(torch.tensor(t.data) for t in primals),
+        tuple(torch.tensor(t) for t in tangents),
+    )
+    assert np.allclose(out.data, torch_out.item())
+    assert np.allclose(tangent.data, torch_tangent.item())
+    assert all(p.tangent is None for p in primals)
+
+
+def test_jacfwd():
+    def g(x, w, b):
+        return (x.linear(w, b).exp() * x[:, :1]).log()
+
+    primals = inputs()
+    expected = torch.autograd.functional.jacobian(
+        lambda x, w, b: (torch.nn.functional.linear(x, w, b).exp() * x[:, :1]).log(),
+        tuple(torch.tensor(t.data) for t in primals),
+    )
+    for chunk_size in (None, 7):
+        for j, e in zip(jacfwd(g, primals, chunk_size), expected):
+            assert j.shape == e.shape
+            assert np.allclose(j.data, e.numpy())
+
+
+model = Sequential(
+    Conv2d(2, 4, (3, 3), padding=((1, 1), (1, 1))),
+    BatchNorm2d(4),
+    ReLU(),
+    MaxPool2d((2, 2)),
+    AvgPool2d((2, 2)),
+)
+layer_norm = LayerNorm((4, 2, 2))
+
+
+w_ih, w_hh, b_ih, w_rnn = (
+    np.random.randn(*s) for s in ((12, 3), (12, 3), (12,), (4, 4))
+)
+sparse = CSRTensor.from_dense(np.random.randn(5, 6) * (np.random.rand(5, 6) > 0.5))
+
+
+@pytest.mark.parametrize(
+    "fn, shapes",
+    [
+        (
+            lambda x, w: conv(x, w, None, (2, 1), ((1, 1), (0, 2)), (1, 2), 2),
+            ((2, 4, 7, 6), (6, 2, 3, 2)),
+        ),
+        (
+            lambda x, w, b: conv(x, w, b, None, ((1, 1), (1, 1)), None, 3, True),
+            ((2, 3, 5, 5), (6, 1, 3, 3), (6,)),
+        ),
+        (
+            lambda x, w: conv_transpose(
+                x, w, None, (2, 2), ((1, 0), (0, 1)), (1, 0), 2
+            ),
+            ((2, 4, 3, 4), (4, 3, 3, 2)),
+        ),
+        (lambda w: embedding(Tensor(np.array([[1, 3], [3, 0]])), w), ((5, 4),)),
+        (
+            lambda w: embedding_bag(
+                Tensor(np.array([1, 3, 3, 0, 2])), w, Tensor(np.array([0, 2, 2]))
+            ),
+            ((5, 4),),
+        ),
+        (
+            lambda x, h, c: recurrent(
+                x, h, c, Tensor(w_ih), Tensor(w_hh), Tensor(b_ih), None, "LSTM", True
+            ),
+            ((5, 2, 3), (2, 3), (2, 3)),
+        ),
+        (
+            lambda x, w: recurrent(
+                x, None, None, w, Tensor(w_hh[:9, :3]), None, Tensor(b_ih[:9]), "GRU"
+            )[0],
+            ((5, 2, 3), (9, 3)),
+        ),
+        (
+            lambda x, h: recurrent(
+                x, h, None, Tensor(w_ih[:4]), Tensor(w_rnn), None, None, "RNN_TANH"
+            )[0],
+            ((5, 2, 3), (2, 4)),
+        ),
+        (
+            lambda q, k, v: scaled_dot_product_attention(
+                q, k, v, is_causal=True, block_size=3
+            ),
+            ((2, 7, 4), (2, 9, 4), (2, 9, 3)),
+        ),
+        (lambda x: sparse @ x, ((6, 3),)),
+        (lambda x: layer_norm(model(x)), ((2, 2, 8, 8),)),
+        (
+            lambda x: AdaptiveMaxPool2d((2, 3))(
+                AvgPool2d((3, 3), (2, 2), ((1, 1), (1, 1)), True, False)(x)
+            ),
+            ((2, 2, 9, 8),),
+        ),
+        (lambda x: GlobalAvgPool()(AdaptiveAvgPool2d((3, 2))(x)), ((2, 2, 7, 7),)),
+    ],
+)
+def test_jvp_layers(fn, shapes):
+    # the tangent of every direction is checked against central differences
+    primals = [Tensor.random(s) for s in shapes]
+    tangents = [np.random.randn(2, *s) for s in shapes]
+    out, tangent = jvp(fn, primals, tangents, batched=True)
+    eps = 1e-6
+    for i in range(2):
+        with no_grad():
+            plus = fn(*[Tensor(p.data + eps * t[i]) for p, t in zip(primals, tangents)])
+            minus = fn(
+                *[Tensor(p.data - eps * t[i]) for p, t in zip(primals, tangents)]
+            )
+        for o, t, a, b in zip(
+            _tuple(out), _tuple(tangent), _tuple(plus), _tuple(minus)
+        ):
+            assert np.allclose(t.data[i], (a.data - b.data) / (2 * eps), atol=1e-5)
+
+
+def _tuple(x):
+    return x if isinstance(x, tuple) else (x,)
@@ -0,0 +1,209 @@
+from yadll.autodiff import *
+from yadll import backend
+from yadll.backend import NumpyBackend, get_backend, set_backend, set_num_threads
+from yadll.nn import *
+from yadll.nn.functional import window_view, col2im, _im2col
+import numpy as np
+import pytest
+import sys
+import torch
+
+
+def test_getitem_repeated_index():
+    x = Tensor.random((5, 3))
+    index = np.array([0, 2, 2, 4, 0, 0])
+    (x[index] * Tensor(np.arange(18.0).reshape(6, 3), True)).sum().backward()
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    (
+        torch_x[index] * torch.arange(18.0, dtype=torch.float64).reshape(6, 3)
+    ).sum().backward()
+    assert np.allclose(x.grad, torch_x.grad.numpy())
+
+
+@pytest.fixture
+def numba_backend():
+    pytest.importorskip("numba")
+    previous = set_backend("numba")
+    yield get_backend()
+    set_backend(previous)
+
+
+@pytest.mark.parametrize("op", ["exp", "log", "relu"])
+def test_numba_elementwise(numba_backend, op):
+    x = np.random.randn(300, 400)
+    x = np.abs(x) if op == "log" else x
+    assert np.allclose(
+        numba_backend.elementwise(op, x), NumpyBackend().elementwise(op, x)
+    )
+
+
+@pytest.mark.parametrize(
+    "shape, axis, keepdims",
+    [((4, 3, 5, 6), (0, 2, 3), False), ((4, 3, 5), (1, 2), True), ((6, 7), 0, False)],
+)
+def test_numba_reduce(numba_backend, shape, axis, keepdims):
+    x = np.random.randn(*shape)
+    out = numba_backend.reduce("sum", x, axis, keepdims)
+    assert np.allclose(out, NumpyBackend().reduce("sum", x, axis, keepdims))
+
+
+@pytest.mark.parametrize(
+    "shape, kernel_size, stride, dilation, groups",
+    [
+        ((2, 4, 9), (3,), (2,), (1,), 2),
+        ((2, 3, 7, 8), (3, 2), (1, 2), (2, 1), 1),
+        ((1, 2, 5, 6, 5), (2, 3, 2), (1, 1, 2), (1, 1, 1), 2),
+    ],
+)
+def test_numba_windows(numba_backend, shape, kernel_size, stride, dilation, groups):
+    x = np.random.randn(*shape)
+    windows = window_view(x, kernel_size, stride, dilation)
+    cols = _im2col(windows, groups)
+    set_backend("numpy")
+    assert np.allclose(cols, _im2col(windows, groups))
+    grad = np.random.randn(*windows.shape)
+    expected = col2im(grad, x.shape, stride, dilation)
+    set_backend(numba_backend)
+    assert np.allclose(col2im(grad, x.shape, stride, dilation), expected)
+
+
+def test_numba_scatter_add(numba_backend):
+    target, expected = np.zeros((6, 3, 2)), np.zeros((6, 3, 2))
+    index = np.array([1, 5, 1, 0, 5, 5])
+    values = np.random.randn(6, 3, 2)
+    numba_backend.scatter_add(target, index, values)
+    np.add.at(expected, index, values)
+    assert np.allclose(target, expected)
+
+
+def _forward_backward(fn, *inputs):
+    inputs = [Tensor(x, True) for x in inputs]
+    out = fn(*inputs)
+    weights = np.arange(out.data.size, dtype=float).reshape(out.shape) % 7
+    (out * Tensor(weights, True)).sum().backward()
+    return [out.data] + [x.grad for x in inputs]
+
+
+@pytest.mark.parametrize(
+    "layer, shape",
+    [
+        (MaxPool1d(3, 2, ((1, 1),)), (2, 3, 11)),
+        (AvgPool1d(4), (2, 3, 12)),
+        (MaxPool2d((3, 3), (2, 2), ((1, 1), (1, 1))), (2, 3, 9, 8)),
+        (AvgPool2d((2, 3), (1, 2), ((1, 0), (1, 1))), (2, 3, 7, 8)),
+        (MaxPool3d((2, 2, 2)), (2, 2, 6, 4, 6)),
+        (AvgPool3d((3, 3, 3), (2, 2, 2), ((1, 1), (1, 1), (1, 1))), (1, 2, 7, 5, 6)),
+    ],
+)
+def test_numba_pool(numba_backend, layer, shape):
+    # ties included, the first maximum of a window gets the gradient like torch
+    x = np.round(np.random.randn(*shape), 1)
+    out, grad = _forward_backward(layer, x)
+    n = len(layer.kernel_size)
+    average = isinstance(layer, (AvgPool1d, AvgPool2d, AvgPool3d))
+    torch_x = torch.tensor(x, requires_grad=True)
+    padded = torch.nn.functional.pad(
+        torch_x,
+        tuple(p for pad in reversed(layer.padding) for p in pad),
+        value=0.0 if average else -np.inf,
+    )
+    torch_pool = getattr(torch.nn.functional, f"{'avg' if average else 'max'}_pool{n}d")
+    torch_out = torch_pool(padded, layer.kernel_size, layer.stride[2:])
+    weights = np.arange(out.size, dtype=float).reshape(out.shape) % 7
+    (torch_out * torch.tensor(weights)).sum().backward()
+    assert np.allclose(out, torch_out.detach().numpy())
+    assert np.allclose(grad, torch_x.grad.numpy())
+
+
+@pytest.mark.parametrize(
+    "shape, weight_shape, stride, padding, dilation, groups",
+    [
+        ((2, 1, 20), (4, 1, 5), (2,), ((2, 1),), (1,), 1),
+        ((2, 1, 9, 8), (3, 1, 3, 3), (1, 2), ((1, 1), (0, 2)), (2, 1), 1),
+        ((2, 4, 7, 6), (8, 1, 3, 2), (1, 1), None, (1, 1), 4),
+        ((1, 2, 5, 6, 5), (2, 1, 2, 3, 2), (1, 1, 2), None, (1, 2, 1), 2),
+    ],
+)
+def test_numba_direct_conv(
+    numba_backend, shape, weight_shape, stride, padding, dilation, groups
+):
+    def fn(x, w, b):
+        return conv(x, w, b, stride, padding, dilation, groups)
+
+    inputs = (
+        np.random.randn(*shape),
+        np.random.randn(*weight_shape),
+        np.random.randn(weight_shape[0]),
+    )
+    out = _forward_backward(fn, *inputs)
+    set_backend("numpy")
+    expected = _forward_backward(fn, *inputs)
+    assert all(np.allclose(a, b) for a, b in zip(out, expected))
+
+
+def test_missing_backend_falls_back_to_numpy(monkeypatch):
+    monkeypatch.setitem(sys.modules, "numba", None)
+    with pytest.warns(UserWarning):
+        previous = set_backend("numba")
+    assert isinstance(get_backend(), NumpyBackend)
+    set_backend(previous)
+
+
+@pytest.fixture
+def threads(monkeypatch):
+    # every op is split, however small
+    monkeypatch.setattr(backend, "MIN_PARALLEL_SIZE", 1)
+    set_num_threads(3)
+    yield
+    set_num_threads(1)
+
+
+@pytest.mark.parametrize(
+    "op, shapes",
+    [
+        ("add", ((7, 5), (7, 5))),
+        ("multiply", ((7, 5), (5,))),
+        ("multiply", ((1, 5), (4, 1, 5))),
+        ("divide", ((6, 2, 3), ())),
+        ("relu_backward", ((2, 9), (2, 9))),
+        ("exp", ((10,),)),
+    ],
+)
+def test_threaded_elementwise(threads, op, shapes):
+    args = [np.random.randn(*s) for s in shapes]
+    serial = NumpyBackend()
+    expected = serial.elementwise(op, *args)
+    assert np.allclose(get_backend().elementwise(op, *args), expected)
+    out = np.ones(expected.shape)
+    get_backend().elementwise(op, *args, out=out)
+    assert np.allclose(out, expected)
+
+
+@pytest.mark.parametrize(
+    "op, axis, keepdims",
+    [
+        ("sum", None, False),
+        ("sum", (0, 2), True),
+        ("sum", -1, False),
+        ("max", None, True),
+        ("max", 0, False),
+        ("argmax", None, False),
+        ("argmax", 1, False),
+    ],
+)
+def test_threaded_reduce(threads, op, axis, keepdims):
+    x = np.round(np.random.randn(5, 4, 3), 1)
+    expected = getattr(np, op)(x, axis, keepdims=keepdims)
+    out = get_backend().reduce(op, x, axis, keepdims)
+    assert np.shape(out) == np.shape(expected) and np.allclose(out, expected)
+
+
+def test_threaded_backward(threads):
+    x = Tensor(np.abs(np.random.randn(6, 5)) + 0.1, True)
+    w = Tensor.random((6, 5))
+    ((x * w).relu().exp() + x.log() * 2).sum(1).max().backward()
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_w = torch.tensor(w.data, requires_grad=True)
+    ((torch_x * torch_w).relu().exp() + torch_x.log() * 2).sum(1).max().backward()
+    assert np.allclose(x.grad, torch_x.grad.numpy())
+    assert np.allclose(w.grad, torch_w.grad.numpy())
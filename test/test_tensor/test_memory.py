@@ -0,0 +1,84 @@
+from yadll.autodiff import *
+from yadll.memory import *
+from yadll.nn import *
+import numpy as np
+import gc
+
+
+def test_buffer_pool_reuse():
+    pool = BufferPool(min_bytes=1024)
+    a = pool.acquire((100, 30))
+    assert a.shape == (100, 30) and a.dtype == np.float64
+    pool.release(a)
+    assert pool.stats()["bytes_held"] == BufferPool.bucket(a.nbytes)
+    # same size bucket, different shape and dtype
+    b = pool.acquire((5000,), np.float32, zero=True)
+    assert np.all(b == 0)
+    assert pool.stats()["hits"] == 1 and pool.stats()["misses"] == 1
+    # small arrays are not pooled
+    pool.acquire((10,))
+    assert pool.stats()["misses"] == 1
+    del b
+    gc.collect()
+    assert pool.stats()["bytes_in_use"] == 0
+
+
+def test_buffer_pool_lru_eviction():
+    pool = BufferPool(max_bytes=3 * 8192, min_bytes=1024)
+    arrays = [pool.acquire((1024,)) for _ in range(4)]
+    bases = [a.base for a in arrays]
+    for a in arrays:
+        pool.release(a)
+    stats = pool.stats()
+    assert stats["evictions"] == 1 and stats["bytes_held"] == 3 * 8192
+    # the least recently released buffer was evicted
+    assert all(bases[0] is not b for b in pool.free[8192])
+
+
+def test_arena_training_step():
+    np.random.seed(0)
+    model = Sequential(
+        Conv2d(3, 8, (3, 3), padding=((1, 1), (1, 1))),
+        ReLU(),
+        Conv2d(8, 4, (3, 3), stride=(2, 2)),
+    )
+    x = Tensor.random((4, 3, 16, 16))
+
+    def step() -> list:
+        for p in model.parameters():
+            p.grad[...] = 0
+        model(x).sum().backward()
+        return [p.grad.copy() for p in model.parameters()]
+
+    expected = step()
+    pool = BufferPool(min_bytes=1024)
+    for _ in range(3):
+        with pool.arena():
+            grads = step()
+        for g, e in zip(grads, expected):
+            assert np.allclose(g, e)
+    stats = pool.stats()
+    assert stats["hits"] > 0 and stats["misses"] * 2 <= stats["hits"]
+    assert stats["bytes_in_use"] == 0
+
+
+def test_released_grads_accumulate_across_arenas():
+    model = Sequential(Linear(64, 128), ReLU(), Linear(128, 64))
+    xs = [Tensor.random((32, 64)) for _ in range(2)]
+    for p in model.parameters():
+        p.zero_grad(set_to_none=True)
+    for x in xs:
+        model(x).sum().backward()
+    expected = [p.grad.copy() for p in model.parameters()]
+    pool = BufferPool(min_bytes=1024)
+    for p in model.parameters():
+        p.zero_grad(set_to_none=True)
+    # one micro-batch per arena, the grads are reallocated inside the first one
+    for x in xs:
+        with pool.arena():
+            model(x).sum().backward()
+    with pool.arena():
+        for p in model.parameters():
+            pool.acquire(p.shape).fill(1e9)
+    for p, e in zip(model.parameters(), expected):
+        assert np.allclose(p.grad, e)
@@ -0,0 +1,47 @@
+from yadll.autodiff import *
+from yadll.sparse import *
+import numpy as np
+import torch
+
+
+def test_coo_coalesce():
+    x = SparseTensor(
+        np.array([[0, 2, 0, 1], [1, 0, 1, 2]]), np.array([1.0, 2, 3, 4]), (3, 3)
+    )
+    torch_x = torch.sparse_coo_tensor(x.indices, x.values, (3, 3)).coalesce()
+    coalesced = x.coalesce()
+    assert np.all(coalesced.indices == torch_x.indices().numpy())
+    assert np.all(coalesced.values == torch_x.values().numpy())
+    assert np.all(x.to_dense() == torch_x.to_dense().numpy())
+
+
+def test_csr_from_dense():
+    data = np.random.randn(5, 6) * (np.random.rand(5, 6) > 0.6)
+    data[2] = 0
+    x = CSRTensor.from_dense(data)
+    torch_x = torch.tensor(data).to_sparse_csr()
+    assert np.all(x.indptr == torch_x.crow_indices().numpy())
+    assert np.all(x.indices == torch_x.col_indices().numpy())
+    assert np.all(x.to_dense() == data)
+
+
+def test_csr_matmul_backward_pass():
+    data = np.random.randn(6, 5) * (np.random.rand(6, 5) > 0.5)
+    data[3] = 0
+    sparse = CSRTensor.from_dense(data)
+    b = Tensor.random((5, 4))
+    c = ((sparse @ b) ** 2).sum()
+    c.backward()
+    torch_sparse = torch.tensor(data).to_sparse_csr()
+    torch_b = torch.tensor(b.data, requires_grad=True)
+    torch_c = ((torch_sparse @ torch_b) ** 2).sum()
+    torch_c.backward()
+    assert np.all(abs(c.data - torch_c.detach().numpy()) < 1e-10)
+    assert np.all(abs(b.grad - torch_b.grad.numpy()) < 1e-10)
+
+
+def test_coo_matmul_forward_pass():
+    data = np.random.randn(4, 7) * (np.random.rand(4, 7) > 0.5)
+    sparse = SparseTensor.from_dense(data)
+    b = Tensor.random((7, 3))
+    assert np.all(abs((sparse @ b).data - data @ b.data) < 1e-10)
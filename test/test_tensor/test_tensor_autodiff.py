@@ -146,6 +146,61 @@ def test_batch_matmul_backward_pass():
     assert np.all(a.grad == torch_a.grad.detach().numpy())
 
 
+def test_broadcast_batch_matmul_backward_pass():
+    a = Tensor.random((4, 3, 5, 2))
+    b = Tensor.random((2, 6))
+    c = (a @ b).sum()
+    torch_a = torch.tensor(a.data, requires_grad=True)
+    torch_b = torch.tensor(b.data, requires_grad=True)
+    torch_c = (torch_a @ torch_b).sum()
+    c.backward()
+    torch_c.backward()
+    assert np.all(abs(a.grad - torch_a.grad.detach().numpy()) < 1e-10)
+    assert np.all(abs(b.grad - torch_b.grad.detach().numpy()) < 1e-10)
+
+
+def test_partial_broadcast_matmul_backward_pass():
+    a = Tensor.random((1, 3, 5, 2))
+    b = Tensor.random((4, 1, 2, 6))
+    c = ((a @ b) ** 2).sum()
+    torch_a = torch.tensor(a.data, requires_grad=True)
+    torch_b = torch.tensor(b.data, requires_grad=True)
+    torch_c = ((torch_a @ torch_b) ** 2).sum()
+    c.backward()
+    torch_c.backward()
+    assert np.all(abs(a.grad - torch_a.grad.detach().numpy()) < 1e-10)
+    assert np.all(abs(b.grad - torch_b.grad.detach().numpy()) < 1e-10)
+
+
+def test_vector_matmul_backward_pass():
+    a = Tensor.random((3,))
+    b = Tensor.random((2, 3, 4))
+    c = (a @ b).sum()
+    torch_a = torch.tensor(a.data, requires_grad=True)
+    torch_b = torch.tensor(b.data, requires_grad=True)
+    torch_c = (torch_a @ torch_b).sum()
+    c.backward()
+    torch_c.backward()
+    assert np.all(abs(a.grad - torch_a.grad.detach().numpy()) < 1e-10)
+    assert np.all(abs(b.grad - torch_b.grad.detach().numpy()) < 1e-10)
+
+
+def test_linear_backward_pass():
+    x = Tensor.random((4, 3, 5))
+    w = Tensor.random((2, 5))
+    b = Tensor.random((2,))
+    y = (x.linear(w, b) ** 2).sum()
+    y.backward()
+    torch_x = torch.tensor(x.data, requires_grad=True)
+    torch_w = torch.tensor(w.data, requires_grad=True)
+    torch_b = torch.tensor(b.data, requires_grad=True)
+    torch_y = (torch.nn.functional.linear(torch_x, torch_w, torch_b) ** 2).sum()
+    torch_y.backward()
+    assert np.all(abs(x.grad - torch_x.grad.detach().numpy()) < 1e-10)
+    assert np.all(abs(w.grad - torch_w.grad.detach().numpy()) < 1e-10)
+    assert np.all(abs(b.grad - torch_b.grad.detach().numpy()) < 1e-10)
+
+
 def test_rmatmul_backward_pass():
     a = Tensor(np.array([[1, 2], [2, 1]]), requires_grad=True)
     b = Tensor(np.array([[2, 2], [3, 4]]), requires_grad=True)
@@ -533,3 +588,24 @@ def test_unfold_backward_pass():
     out.backward()
     torch_out.backward()
     assert np.all(x.grad == torch_x.grad.detach().numpy()), "grad incorrect"
+
+
+def test_transpose_negative_dims_backward_pass():
+    a = Tensor.random((2, 3, 4))
+    b = (a.transpose(-2, -1) * Tensor.random((2, 4, 3))).sum()
+    b.backward()
+    torch_a = torch.tensor(a.data, requires_grad=True)
+    torch_b = (
+        torch_a.transpose(-2, -1) * torch.tensor(b.parent[0].parent[1].data)
+    ).sum()
+    torch_b.backward()
+    assert np.all(abs(a.grad - torch_a.grad.numpy()) < 1e-10)
+
+
+def test_no_grad():
+    a = Tensor.random((2, 3))
+    with no_grad():
+        b = (a * 2).sum()
+    c = (a * 2).sum()
+    assert not b.requires_grad and b.grad is None and b.parent == ()
+    assert c.requires_grad
@@ -0,0 +1,195 @@
+from yadll.autodiff import *
+from yadll.batching import vmap, per_sample_grad
+from yadll.nn import *
+from yadll.nn.functional import *
+import numpy as np
+import pytest
+import threading
+
+layer_norm = LayerNorm((6,))
+linear = Linear(6, 4)
+w_ih, w_hh = np.random.randn(12, 3), np.random.randn(12, 3)
+
+
+@pytest.mark.parametrize(
+    "fn, shapes, in_dims",
+    [
+        # shapes of a single example, None for an input shared by all examples
+        (lambda x, w: (x @ w).relu().sum(0), ((5, 6), (6, 3)), (0, None)),
+        (lambda x, v: x @ v + (v * v).sum(), ((5, 6), (6,)), (0, 0)),
+        (lambda v, x: v @ x, ((5,), (5, 6)), (0, None)),
+        (
+            lambda x: (x[1:, ::2].exp() / x.max(-1).unsqueeze(1)[1:]).mean(),
+            ((4, 6),),
+            (0,),
+        ),
+        (lambda x: x.pad(((1, 0), (0, 2))).T.reshape((-1, 2)).var(0), ((4, 6),), (1,)),
+        (lambda x: layer_norm(linear(x) @ linear.weight), ((3, 6),), (0,)),
+        (
+            lambda x: Tensor.cat([x, x.log() * 2], 1).flatten().max(),
+            ((2, 3),),
+            (0,),
+        ),
+        (
+            lambda x, w, b: conv(x, w, b, (2, 1), ((1, 1), (0, 2)), (1, 2), 2, True),
+            ((2, 4, 7, 6), (6, 2, 3, 2), (6,)),
+            (0, 0, None),
+        ),
+        (
+            lambda x, w: conv(x, w, None, None, ((1, 1), (1, 1))),
+            ((2, 3, 5, 5), (4, 3, 3, 3)),
+            (None, 0),
+        ),
+        (
+            lambda x: MaxPool2d((2, 2))(AvgPool2d((2, 2), stride=(1, 1))(x)),
+            ((2, 3, 7, 7),),
+            (0,),
+        ),
+        (
+            lambda x: GlobalMaxPool()(AdaptiveAvgPool2d((3, 2))(x)),
+            ((2, 3, 7, 7),),
+            (0,),
+        ),
+        (
+            lambda x, h: recurrent(x, h, None, Tensor(w_ih), Tensor(w_hh))[0],
+            ((5, 2, 3), (2, 3)),
+            (0, 0),
+        ),
+        (
+            lambda q, k: scaled_dot_product_attention(q, k, k, is_causal=True),
+            ((2, 7, 4), (2, 9, 4)),
+            (0, None),
+        ),
+    ],
+)
+def test_vmap(fn, shapes, in_dims):
+    B = 3
+    inputs = [
+        Tensor(
+            np.abs(np.random.randn(*(s[:d] + (B,) + s[d:] if d is not None else s)))
+            + 0.1,
+            True,
+        )
+        for s, d in zip(shapes, in_dims)
+    ]
+    out = vmap(fn, in_dims)(*inputs)
+    (out * Tensor.random(out.shape)).sum().backward()
+
+    examples = [
+        Tensor(x.data if d is None else np.take(x.data, i, axis=d), True)
+        for i in range(B)
+        for x, d in zip(inputs, in_dims)
+    ]
+    n = len(inputs)
+    for i in range(B):
+        expected = fn(*examples[i * n : (i + 1) * n])
+        assert out.shape[1:] == expected.shape
+        assert np.allclose(out.data[i], expected.data)
+
+
+def test_vmap_grad():
+    def fn(x, w):
+        return ((x.linear(w) ** 2).sum(-1) + 1).log().sum()
+
+    x, w = Tensor.random((4, 6)), Tensor.random((5, 6))
+    out = vmap(fn, (0, None))(x, w)
+    out.sum().backward()
+    x_loop, w_loop = Tensor(x.data, True), Tensor(w.data, True)
+    for i in range(4):
+        fn(x_loop[i], w_loop).backward()
+    assert np.allclose(x.grad, x_loop.grad) and np.allclose(w.grad, w_loop.grad)
+    assert x.shape == (4, 6), "the shape of the inputs is restored"
+
+
+def test_vmap_is_per_thread():
+    # both threads are inside vmap at once, a third one only sees plain Tensors
+    barrier = threading.Barrier(2, timeout=10)
+    seen, outputs, errors = [], {}, []
+
+    def example(x):
+        out = (x.T @ x).sum(0).reshape((1, 1, 4, 4))
+        return conv(out, Tensor.ones((1, 1, 2, 2)))
+
+    def fn(x):
+        barrier.wait()
+        reader = threading.Thread(target=lambda: seen.append(x.shape))
+        reader.start()
+        reader.join()
+        out = example(x)
+        barrier.wait()
+        return out
+
+    def run(i, x):
+        try:
+            outputs[i] = vmap(fn)(x)
+        except Exception as e:
+            errors.append(e)
+
+    xs = [Tensor.random((3, 5, 16)) for _ in range(2)]
+    threads = [threading.Thread(target=run, args=(i, x)) for i, x in enumerate(xs)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert seen == [(3, 5, 16)] * 2
+    for i, x in enumerate(xs):
+        for b in range(3):
+            assert np.allclose(outputs[i].data[b], example(x[b]).data)
+
+
+def test_vmap_unregistered_op():
+    def tanh(x):
+        return Tensor(np.tanh(x.data), True, (x,), "tanh")
+
+    conv2d = conv
+    x, w = Tensor.random((2, 3, 5, 5)), Tensor.random((4, 3, 3, 3))
+    with pytest.raises(NotImplementedError, match="tanh"):
+        vmap(lambda x: tanh(x.exp()))(x)
+    # a functional op bound under another name still runs its batching rule
+    out = vmap(lambda x: conv2d(x.unsqueeze(0), w).reshape((4, 3, 3)))(x)
+    assert np.allclose(out.data, conv(x, w).data)
+    assert Tensor.__init__ is Tensor.__dict__["__init__"] and tanh(x).shape == x.shape
+
+
+@pytest.mark.parametrize(
+    "model, shape",
+    [
+        (Sequential(Linear(6, 8), ReLU(), Linear(8, 3)), (6,)),
+        (
+            Sequential(
+                Conv2d(2, 4, (3, 3), padding=((1, 1), (1, 1))),
+                ReLU(),
+                MaxPool2d((2, 2)),
+                Conv2d(4, 3, (3, 3)),
+                MaxPool2d((2, 2)),
+            ),
+            (2, 8, 8),
+        ),
+    ],
+)
+def test_per_sample_grad(model, shape):
+    def loss_fn(out, y):
+        return ((out.flatten(1) - y) ** 2).mean()
+
+    x = Tensor.random((5,) + shape, False)
+    y = Tensor.random((5, 3), False)
+    grads = per_sample_grad(model, loss_fn, (x, y))
+    x, y = Tensor(x.data, True), Tensor(y.data, True)
+    for i in range(5):
+        for p in model.parameters():
+            p.grad = np.zeros_like(p.data)
+        loss_fn(model(x[i : i + 1]), y[i : i + 1]).backward()
+        for g, p in zip(grads, model.parameters()):
+            assert g.shape == (5,) + p.shape
+            assert np.allclose(g[i], p.grad)
+
+
+def test_per_sample_grad_refuses_buffer_updates():
+    model = Sequential(Conv2d(2, 3, (3, 3)), BatchNorm2d(3), ReLU())
+    x = Tensor.random((8, 2, 6, 6), False)
+    mean, var = model[1].running_mean, model[1].running_var
+    with pytest.raises(NotImplementedError, match="BatchNorm"):
+        per_sample_grad(model, lambda out: out.sum(), x)
+    assert model[1].running_mean is mean and model[1].running_mean.shape == (3,)
+    assert model[1].running_var is var and np.all(var.data == 1)
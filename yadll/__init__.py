@@ -0,0 +1,16 @@
+from .runtime import export
+from .autograd import grad, hvp, jvp, jacfwd
+from .batching import vmap, per_sample_grad
+from .backend import set_num_threads, get_num_threads
+
+__all__ = [
+    "export",
+    "grad",
+    "hvp",
+    "jvp",
+    "jacfwd",
+    "vmap",
+    "per_sample_grad",
+    "set_num_threads",
+    "get_num_threads",
+]
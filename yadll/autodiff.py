@@ -1,7 +1,8 @@
 from __future__ import annotations
-from typing import Union, Tuple
+from typing import Callable, Union, Tuple
 import numpy as np
-from skimage.util.shape import view_as_windows
+from . import memory
+from .backend import get_backend
 
 
 def add_dimensions(old_shape, new_shape):
@@ -32,14 +33,67 @@ def shape_to_axis(old_shape, new_shape):
     return tuple(i for i, (a, b) in enumerate(zip(old_shape, new_shape)) if a != b)
 
 
+def reduce_matmul(lhs: np.ndarray, rhs: np.ndarray, shape: tuple) -> np.ndarray:
+    """Computes lhs @ rhs summed down to `shape`.
+
+    Batch dimensions that `shape` does not have are contracted inside the GEMM
+    instead of materializing the full batched product and summing it afterwards.
+    """
+    batch = np.broadcast_shapes(lhs.shape[:-2], rhs.shape[:-2])
+    if len(shape) == 2 and batch:
+        lhs = np.broadcast_to(lhs, batch + lhs.shape[-2:])
+        rhs = np.broadcast_to(rhs, batch + rhs.shape[-2:])
+        axes = tuple(range(len(batch)))
+        return np.tensordot(
+            lhs, rhs, axes=(axes + (len(batch) + 1,), axes + (len(batch),))
+        )
+    out = lhs @ rhs
+    lead = out.ndim - len(shape)
+    axis = tuple(range(lead)) + tuple(
+        lead + i for i, s in enumerate(shape) if s == 1 and out.shape[lead + i] != 1
+    )
+    return out.sum(axis=axis).reshape(shape) if axis else out
+
+
+_grad_enabled = True
+
+
+class no_grad:
+    """Context manager for inference, ops inside it do not record the graph
+
+    Their outputs do not require grad, allocate no gradient buffer and keep no
+    reference to their parents, so intermediate results are freed right away.
+    """
+
+    def __enter__(self) -> None:
+        global _grad_enabled
+        self.previous = _grad_enabled
+        _grad_enabled = False
+
+    def __exit__(self, *args) -> None:
+        global _grad_enabled
+        _grad_enabled = self.previous
+
+
 class Tensor:
+    # post accumulate grad hooks, a list once one is registered
+    _grad_hooks = ()
+    # dense grad released by zero_grad(set_to_none=True), reallocated by backward
+    _lazy_grad = False
+
     def __init__(
         self, data: np.array, requires_grad: bool = False, parent=(), op="", name=""
     ) -> None:
+        if parent and not _grad_enabled:
+            requires_grad, parent = False, ()
         self.data: np.array = data
         self.requires_grad: bool = requires_grad
-        self.grad: np.array = np.zeros_like(data) if requires_grad else None
+        self.grad: np.array = memory.zeros_like(data) if requires_grad else None
         self._backward = lambda: None
+        # differentiable backward rule in Tensor ops: output grad -> parent grads
+        self._vjp = None
+        # forward mode: (directions, *shape) derivative of data, see yadll.autograd.jvp
+        self.tangent: np.ndarray = None
         self.parent = parent
         self.op = op
         self.name = name
@@ -58,14 +112,26 @@ class Tensor:
         )
 
         def _backward():
-            self.grad[val] += output.grad
+            get_backend().scatter_add(self.grad, val, output.grad)
 
         output._backward = _backward
+        output._vjp = lambda grad: (_scatter(grad, self.shape, val),)
+        if self.tangent is not None:
+            output.tangent = self.tangent[_tangent_index(val)]
         return output
 
     def __setitem__(self, index, value):
         # this is really bad and should be refactored
         self.data[index] = value.data
+        if _has_tangent(self, value):
+            K = (self.tangent if self.tangent is not None else value.tangent).shape[0]
+            tangent = np.zeros((K,) + self.shape)
+            if self.tangent is not None:
+                tangent[...] = self.tangent
+            tangent[_tangent_index(index)] = (
+                value.tangent if value.tangent is not None else 0
+            )
+            self.tangent = tangent
         self.parent = (*self.parent, value)
         self.op = "setitem"
         self.name = f"{self.init_name}[{index}]"
@@ -93,7 +159,7 @@ class Tensor:
     def __add__(self, other: Tensor) -> Tensor:
         other = other if isinstance(other, Tensor) else Tensor(other, False)
         output = Tensor(
-            self.data + other.data,
+            get_backend().elementwise("add", self.data, other.data),
             requires_grad=True if self.requires_grad else False,
             parent=(self, other),
             op="add",
@@ -101,17 +167,31 @@ class Tensor:
         )
 
         def _backward():
-            self.grad += output.grad
+            _accumulate(self, output.grad)
             if other.requires_grad:
-                other.grad += (
-                    output.grad
-                    if other.shape == output.shape
-                    else output.grad.sum(
-                        axis=shape_to_axis(self.shape, other.shape), keepdims=True
-                    ).reshape(other.grad.shape)
+                _accumulate(
+                    other,
+                    (
+                        output.grad
+                        if other.shape == output.shape
+                        else get_backend()
+                        .reduce(
+                            "sum",
+                            output.grad,
+                            shape_to_axis(self.shape, other.shape),
+                            True,
+                        )
+                        .reshape(other.grad.shape)
+                    ),
                 )
 
         output._backward = _backward
+        output._vjp = lambda grad: (
+            _sum_to(grad, self.shape),
+            _sum_to(grad, np.shape(other.data)),
+        )
+        if _has_tangent(self, other):
+            output.tangent = _tangent_sum(output.shape, self.tangent, other.tangent)
         return output
 
     def __radd__(self, other: Tensor) -> Tensor:
@@ -135,7 +215,7 @@ class Tensor:
         """
         if isinstance(other, (int, float)):
             output = Tensor(
-                other * self.data,
+                get_backend().elementwise("multiply", other, self.data),
                 requires_grad=True if self.requires_grad else False,
                 parent=(self,),
                 op="mul",
@@ -143,7 +223,7 @@ class Tensor:
             )
         elif isinstance(other, Tensor):
             output = Tensor(
-                self.data * other.data,
+                get_backend().elementwise("multiply", self.data, other.data),
                 requires_grad=True if self.requires_grad else False,
                 parent=(self, other),
                 op="mul",
@@ -153,26 +233,58 @@ class Tensor:
             raise ValueError(f"Cannot multiply a tensor with a {type(other)}")
 
         def _backward():
+            backend = get_backend()
             if isinstance(other, (int, float)):
-                self.grad += other * output.grad
+                _accumulate(self, backend.elementwise("multiply", other, output.grad))
             if isinstance(other, Tensor):
-                self.grad += (
-                    (other.data * output.grad)
-                    if self.shape == output.shape
-                    else (other.data * output.grad).sum(
-                        shape_to_axis(self.shape, other.shape), keepdims=True
-                    )
+                axis = shape_to_axis(self.shape, other.shape)
+                grad = backend.elementwise("multiply", other.data, output.grad)
+                _accumulate(
+                    self,
+                    (
+                        grad
+                        if self.shape == output.shape
+                        else backend.reduce("sum", grad, axis, True)
+                    ),
                 )
-
-                other.grad += (
-                    (self.data * output.grad)
-                    if other.shape == output.shape
-                    else (self.data * output.grad).sum(
-                        axis=shape_to_axis(self.shape, other.shape), keepdims=True
-                    )
+                grad = backend.elementwise("multiply", self.data, output.grad)
+                _accumulate(
+                    other,
+                    (
+                        grad
+                        if other.shape == output.shape
+                        else backend.reduce("sum", grad, axis, True)
+                    ),
                 )
 
+        def _vjp(grad):
+            if isinstance(other, (int, float)):
+                return (grad * other,)
+            return (
+                _sum_to(grad * other, self.shape),
+                _sum_to(grad * self, other.shape),
+            )
+
         output._backward = _backward
+        output._vjp = _vjp
+        if isinstance(other, (int, float)):
+            if self.tangent is not None:
+                output.tangent = other * self.tangent
+        elif _has_tangent(self, other):
+            ndim = output.data.ndim
+            output.tangent = _tangent_sum(
+                output.shape,
+                (
+                    _lift(self.tangent, ndim) * other.data
+                    if self.tangent is not None
+                    else None
+                ),
+                (
+                    self.data * _lift(other.tangent, ndim)
+                    if other.tangent is not None
+                    else None
+                ),
+            )
         return output
 
     def __rmul__(self, other):
@@ -180,29 +292,114 @@ class Tensor:
 
     def __matmul__(self, other: Tensor) -> Tensor:
         output = Tensor(
-            self.data @ other.data,
-            requires_grad=True if self.requires_grad else False,
+            get_backend().matmul(self.data, other.data),
+            requires_grad=True if self.requires_grad or other.requires_grad else False,
             parent=(self, other),
             op="matmul",
         )
 
         def _backward():
-            self.grad += output.grad @ other.T.data
-            intermediary_grad = self.T.data @ output.grad
-            other.grad += intermediary_grad.sum(
-                shape_to_axis(intermediary_grad.shape, other.shape)
+            # promote 1d operands the same way numpy does so both grads are plain GEMMs
+            a = self.data if self.data.ndim > 1 else self.data[None]
+            b = other.data if other.data.ndim > 1 else other.data[:, None]
+            grad = output.grad
+            if self.data.ndim == 1:
+                grad = np.expand_dims(grad, -2)
+            if other.data.ndim == 1:
+                grad = np.expand_dims(grad, -1)
+            if self.requires_grad:
+                self.grad += reduce_matmul(
+                    grad, np.swapaxes(b, -1, -2), a.shape
+                ).reshape(self.shape)
+            if other.requires_grad:
+                other.grad += reduce_matmul(
+                    np.swapaxes(a, -1, -2), grad, b.shape
+                ).reshape(other.shape)
+
+        def _vjp(grad):
+            a = self if self.data.ndim > 1 else self.reshape((1,) + self.shape)
+            b = other if other.data.ndim > 1 else other.reshape(other.shape + (1,))
+            grad = grad.reshape(
+                np.broadcast_shapes(a.shape[:-2], b.shape[:-2])
+                + (a.shape[-2], b.shape[-1])
+            )
+            return (
+                _sum_to(grad @ b.transpose(-1, -2), a.shape).reshape(self.shape),
+                _sum_to(a.transpose(-1, -2) @ grad, b.shape).reshape(other.shape),
             )
 
         output._backward = _backward
+        output._vjp = _vjp
+        if _has_tangent(self, other):
+            output.tangent = _matmul_tangent(self, other)
         return output
 
     def __rmatmul__(self, other: Tensor) -> Tensor:
         return other @ self
 
+    def linear(self, weight: Tensor, bias: Tensor = None) -> Tensor:
+        """Fused x @ weight.T + bias
+
+        Args:
+            weight (Tensor): (out_features, in_features) weight
+            bias (Tensor, optional): bias holding out_features values, e.g.
+            (out_features,) or (1, out_features). Defaults to None.
+
+        Returns:
+            Tensor: New Tensor
+        """
+        out = get_backend().matmul(self.data, weight.data.T)
+        if bias is not None:
+            out = out + bias.data
+        output = Tensor(
+            out,
+            requires_grad=(
+                self.requires_grad
+                or weight.requires_grad
+                or (bias is not None and bias.requires_grad)
+            ),
+            parent=(self, weight) if bias is None else (self, weight, bias),
+            op="linear",
+        )
+
+        def _backward():
+            # every leading dim is a batch dim, so both grads are single 2d GEMMs
+            grad = output.grad.reshape(-1, weight.shape[0])
+            if self.requires_grad:
+                self.grad += (grad @ weight.data).reshape(self.shape)
+            if weight.requires_grad:
+                weight.grad += grad.T @ self.data.reshape(-1, weight.shape[1])
+            if bias is not None and bias.requires_grad:
+                bias.grad += grad.sum(axis=0).reshape(bias.shape)
+
+        def _vjp(grad):
+            grad = grad.reshape((-1, weight.shape[0]))
+            grads = (
+                (grad @ weight).reshape(self.shape),
+                grad.T @ self.reshape((-1, weight.shape[1])),
+            )
+            return grads if bias is None else grads + (grad.sum(0).reshape(bias.shape),)
+
+        output._backward = _backward
+        output._vjp = _vjp
+        if _has_tangent(self, weight, bias):
+            output.tangent = _tangent_sum(
+                output.shape,
+                self.tangent @ weight.data.T if self.tangent is not None else None,
+                (
+                    self.data
+                    @ np.swapaxes(_lift(weight.tangent, self.data.ndim), -1, -2)
+                    if weight.tangent is not None
+                    else None
+                ),
+                bias.tangent if bias is not None else None,
+            )
+        return output
+
     def __pow__(self, power: Union[int, float]) -> Tensor:
         assert isinstance(power, (int, float))
         output = Tensor(
-            self.data**power,
+            get_backend().elementwise("power", self.data, power),
             requires_grad=True if self.requires_grad else False,
             parent=(self,),
             op="pow",
@@ -213,6 +410,9 @@ class Tensor:
             self.grad += power * self.data ** (power - 1) * output.grad
 
         output._backward = _backward
+        output._vjp = lambda grad: (grad * (self ** (power - 1) * power),)
+        if self.tangent is not None:
+            output.tangent = power * self.data ** (power - 1) * self.tangent
         return output
 
     def __truediv__(self, other: Union[int, float, Tensor]) -> Tensor:
@@ -224,16 +424,21 @@ class Tensor:
         output = Tensor(self.data.transpose(order), True, (self,), "permute", self.name)
 
         def _backward():
-            print(f"{self.grad.shape=}, {output.grad.shape=}, {order=}")
             self.grad += np.transpose(
                 output.grad, np.argsort(order)
             )  # using argsort transpose output.grad back to initial shape
 
         output._backward = _backward
+        output._vjp = lambda grad: (grad.permute(tuple(np.argsort(order))),)
+        if self.tangent is not None:
+            output.tangent = self.tangent.transpose(
+                (0,) + tuple(o % len(self.shape) + 1 for o in order)
+            )
         return output
 
     def transpose(self, dim0: int, dim1: int) -> Tensor:
         permutation = [i for i in range(len(self.shape))]
+        dim0, dim1 = dim0 % len(self.shape), dim1 % len(self.shape)
         permutation[dim0] = dim1
         permutation[dim1] = dim0
         return self.permute(permutation)
@@ -247,14 +452,18 @@ class Tensor:
             name=f"{self.name}.pad()",
         )
 
+        slices = tuple(
+            slice(p[0], -p[1] if p[1] != 0 else output.shape[i], None)
+            for i, p in enumerate(pad)
+        )
+
         def _backward():
-            slices = [
-                slice(p[0], -p[1] if p[1] != 0 else output.shape[i], None)
-                for i, p in enumerate(pad)
-            ]
-            self.grad += output.grad[np.s_[tuple(slices)]]
+            self.grad += output.grad[slices]
 
         output._backward = _backward
+        output._vjp = lambda grad: (grad[slices],)
+        if self.tangent is not None:
+            output.tangent = np.pad(self.tangent, ((0, 0),) + tuple(pad))
         return output
 
     def reshape(self, dim: tuple[int]) -> Tensor:
@@ -270,6 +479,9 @@ class Tensor:
             self.grad += np.reshape(output.grad, self.shape)
 
         output._backward = _backward
+        output._vjp = lambda grad: (grad.reshape(self.shape),)
+        if self.tangent is not None:
+            output.tangent = self.tangent.reshape(self.tangent.shape[:1] + output.shape)
         return output
 
     def expand(self, dim: tuple[int]) -> Tensor:
@@ -283,6 +495,9 @@ class Tensor:
             ).reshape(self.shape)
 
         output._backward = _backward
+        output._vjp = lambda grad: (_sum_to(grad, self.shape),)
+        if self.tangent is not None:
+            output.tangent = _tangent_sum(output.shape, self.tangent)
         return output
 
     def squeeze(self, dim: Union[tuple[int], int]) -> Tensor:
@@ -350,7 +565,7 @@ class Tensor:
         # not sure if this belongs in the tensor class or elsewhere
         # should be implemented with unfold
         out = Tensor(
-            view_as_windows(np.copy(self.data), strides, stride),
+            get_backend().windows(np.copy(self.data), strides, stride),
             True,
             (self,),
             "stride",
@@ -358,20 +573,27 @@ class Tensor:
         )
 
         def _backward():
-            self.grad = view_as_windows(np.copy(self.grad), strides, stride)
+            self.grad = get_backend().windows(np.copy(self.grad), strides, stride)
             self.grad += out.grad
             self.grad = np.lib.stride_tricks.as_strided(
                 self.grad, self.shape, self.data.strides
             )
 
         out._backward = _backward
+        if self.tangent is not None:
+            step = (stride,) * len(strides) if isinstance(stride, int) else stride
+            out.tangent = (
+                get_backend()
+                .windows(self.tangent, (1,) + tuple(strides), (1,) + tuple(step))
+                .reshape(self.tangent.shape[:1] + out.shape)
+            )
         return out
 
     # end of movement operations
 
     def sum(self, dim=None, keepdim=False) -> Tensor:
         output = Tensor(
-            np.sum(self.data, axis=dim, keepdims=keepdim),
+            get_backend().reduce("sum", self.data, dim, keepdim),
             requires_grad=True if self.requires_grad else False,
             parent=(self,),
             op="sum",
@@ -379,9 +601,27 @@ class Tensor:
         )
 
         def _backward():
-            self.grad += np.expand_dims(output.grad, dim if dim and not keepdim else [])
+            _accumulate(
+                self, np.expand_dims(output.grad, dim if dim and not keepdim else [])
+            )
+
+        def _vjp(grad):
+            if not keepdim:
+                ndim = self.data.ndim
+                axes = range(ndim) if dim is None else np.atleast_1d(dim) % ndim
+                grad = grad.reshape(
+                    tuple(1 if i in axes else s for i, s in enumerate(self.shape))
+                )
+            return (grad.expand(self.shape),)
 
         output._backward = _backward
+        output._vjp = _vjp
+        if self.tangent is not None:
+            ndim = self.data.ndim
+            axis = range(ndim) if dim is None else np.atleast_1d(dim) % ndim
+            output.tangent = np.sum(
+                self.tangent, axis=tuple(a + 1 for a in axis), keepdims=keepdim
+            )
         return output
 
     def mean(self, dim=None, keepdim=False, unbiased=False) -> Tensor:
@@ -414,7 +654,7 @@ class Tensor:
 
     def max(self, dim: int = None) -> Tensor:
         # NOTE: max() != max(axis=0)
-        max_locations = np.argmax(self.data, axis=dim)
+        max_locations = get_backend().reduce("argmax", self.data, dim)
         max_value = (
             np.take_along_axis(
                 self.data, np.expand_dims(max_locations, axis=dim), axis=dim
@@ -430,7 +670,7 @@ class Tensor:
             name=f"{self.name}.max()",
         )
 
-        def _backward():
+        def _grad_matrix():
             grad_matrix = np.zeros(self.shape)
             if dim:
                 np.put_along_axis(
@@ -439,63 +679,142 @@ class Tensor:
             else:
                 grad_matrix = np.where(self.data == max_value, 1, 0)
                 grad_matrix = grad_matrix / np.sum(grad_matrix)
-            self.grad += grad_matrix * np.expand_dims(
-                output.grad, axis=dim if dim else 0
+            return grad_matrix
+
+        def _backward():
+            grad = np.expand_dims(output.grad, axis=dim if dim else 0)
+            _accumulate(
+                self, get_backend().elementwise("multiply", _grad_matrix(), grad)
             )
 
+        def _vjp(grad):
+            shape = np.expand_dims(output.data, axis=dim if dim else 0).shape
+            return (grad.reshape(shape).expand(self.shape) * _constant(_grad_matrix()),)
+
         output._backward = _backward
+        output._vjp = _vjp
+        if self.tangent is not None:
+            axis = (dim % self.data.ndim,) if dim else tuple(range(self.data.ndim))
+            output.tangent = (_grad_matrix() * self.tangent).sum(
+                axis=tuple(a + 1 for a in axis)
+            )
         return output
 
     def relu(self) -> Tensor:
         output = Tensor(
-            np.where(self.data > 0, self.data, 0),
+            get_backend().elementwise("relu", self.data),
             requires_grad=True if self.requires_grad else False,
             parent=(self,),
             op="relu",
         )
 
         def _backward():
-            self.grad += np.where(self.data > 0, output.grad, 0)
+            _accumulate(
+                self, get_backend().elementwise("relu_backward", self.data, output.grad)
+            )
 
         output._backward = _backward
+        output._vjp = lambda grad: (
+            grad * _constant((self.data > 0).astype(output.data.dtype)),
+        )
+        if self.tangent is not None:
+            output.tangent = np.where(self.data > 0, self.tangent, 0)
         return output
 
     def exp(self) -> Tensor:
         output = Tensor(
-            np.exp(self.data),
+            get_backend().elementwise("exp", self.data),
             requires_grad=True if self.requires_grad else False,
             parent=(self,),
             op="exp",
         )
 
         def _backward():
-            self.grad += np.exp(self.data) * output.grad
+            _accumulate(
+                self, get_backend().elementwise("multiply", output.data, output.grad)
+            )
 
         output._backward = _backward
+        output._vjp = lambda grad: (grad * output,)
+        if self.tangent is not None:
+            output.tangent = output.data * self.tangent
 
         return output
 
     def log(self) -> Tensor:
         output = Tensor(
-            np.log(self.data),
+            get_backend().elementwise("log", self.data),
             requires_grad=True if self.requires_grad else False,
             parent=(self,),
             op="log",
         )
 
         def _backward():
-            self.grad += self.data ** (-1) * output.grad
+            _accumulate(
+                self, get_backend().elementwise("divide", output.grad, self.data)
+            )
 
         output._backward = _backward
+        output._vjp = lambda grad: (grad * self ** (-1),)
+        if self.tangent is not None:
+            output.tangent = self.tangent / self.data
         return output
 
-    def backward(self):
+    def backward(self, create_graph: bool = False):
         topo_order = []
         visited = set()
         self.__build_topological_sort(self, visited, topo_order)
+        for v in topo_order:
+            if v._lazy_grad and v.grad is None:
+                # not from the buffer pool: the grad of a parameter outlives the
+                # arena of this backward, e.g. when micro-batches accumulate
+                v.grad = np.zeros_like(v.data)
+        if create_graph:
+            # differentiable gradients of the leaves, kept in grad_graph next to .grad
+            from .autograd import grad
+
+            leaves = [v for v in topo_order if not v.parent and v.requires_grad]
+            for v, g in zip(leaves, grad(self, leaves, create_graph=True)):
+                v.grad += g.data
+                v.grad_graph = (
+                    g if getattr(v, "grad_graph", None) is None else v.grad_graph + g
+                )
+            return
         self.grad = np.ones_like(self.data)
         for v in reversed(topo_order):
+            if v.grad is None:
+                # constants (no grad buffer) have nothing to propagate
+                continue
             v._backward()
+            # every consumer of v comes before it, its grad is final
+            for hook in v._grad_hooks:
+                hook(v)
+
+    def zero_grad(self, set_to_none: bool = False) -> None:
+        """Zeroes the dense grad in place, or releases it when set_to_none is set
+
+        A released dense grad is reallocated by the next backward() that reaches self.
+        Sparse grads always restart empty (None).
+        """
+        if isinstance(self.grad, np.ndarray):
+            if not set_to_none:
+                self.grad.fill(0)
+                return
+            self._lazy_grad = True
+        self.grad = None
+
+    def register_post_accumulate_grad_hook(
+        self, hook: Callable[[Tensor], None], prepend: bool = False
+    ) -> Callable[[], None]:
+        """Calls hook(self) during backward() as soon as the grad of self is final
+
+        The hooks run in registration order, a prepended hook runs before the others.
+        Returns a function that removes the hook.
+        """
+        if not self._grad_hooks:
+            self._grad_hooks = []
+        self._grad_hooks.insert(0 if prepend else len(self._grad_hooks), hook)
+        return lambda: self._grad_hooks.remove(hook)
 
     def __build_topological_sort(self, v, visited, topo_order):
         if v not in visited:
@@ -527,3 +846,96 @@ class Tensor:
     @staticmethod
     def zeros(dim: tuple, requires_grad: bool = True, name="") -> Tensor:
         return Tensor(np.zeros(dim), requires_grad, op="zeros", name=name)
+
+
+def _constant(data: np.ndarray) -> Tensor:
+    # constant operand of a backward rule, only tracked when building a double backward
+    # graph
+    return Tensor(data, _grad_enabled)
+
+
+def _accumulate(tensor: Tensor, grad: np.ndarray) -> None:
+    # tensor.grad += grad, through the backend so that large grads are split over
+    # the intra-op threads
+    if isinstance(tensor.grad, np.ndarray):
+        get_backend().elementwise("add", tensor.grad, grad, out=tensor.grad)
+    else:
+        tensor.grad += grad
+
+
+def _sum_to(grad: Tensor, shape: tuple) -> Tensor:
+    """Sums a broadcast grad back down to `shape`"""
+    shape = tuple(shape)
+    if grad.shape == shape:
+        return grad
+    lead = len(grad.shape) - len(shape)
+    axis = tuple(range(lead)) + tuple(
+        lead + i for i, s in enumerate(shape) if s == 1 and grad.shape[lead + i] != 1
+    )
+    return grad.sum(axis, keepdim=True).reshape(shape)
+
+
+def _scatter(grad: Tensor, shape: tuple, index) -> Tensor:
+    """Zeros shaped `shape` with grad added at index, the adjoint of getitem"""
+    data = np.zeros(shape, dtype=grad.data.dtype)
+    get_backend().scatter_add(data, index, grad.data)
+    output = Tensor(
+        data,
+        requires_grad=True if grad.requires_grad else False,
+        parent=(grad,),
+        op="scatter",
+    )
+
+    def _backward():
+        grad.grad += output.grad[index]
+
+    output._backward = _backward
+    output._vjp = lambda g: (g[index],)
+    if grad.tangent is not None:
+        output.tangent = np.zeros(grad.tangent.shape[:1] + tuple(shape))
+        output.tangent[_tangent_index(index)] += grad.tangent
+    return output
+
+
+def _has_tangent(*tensors) -> bool:
+    return any(isinstance(t, Tensor) and t.tangent is not None for t in tensors)
+
+
+def _tangent_index(index) -> tuple:
+    # the same index applied behind the leading direction axis
+    return (slice(None),) + (index if isinstance(index, tuple) else (index,))
+
+
+def _lift(tangent: np.ndarray, ndim: int) -> np.ndarray:
+    """(K, *shape) -> (K, 1, ..., 1, *shape), broadcasting like a `ndim` operand"""
+    ones = (1,) * max(ndim - tangent.ndim + 1, 0)
+    return tangent.reshape(tangent.shape[:1] + ones + tangent.shape[1:])
+
+
+def _tangent_sum(shape: tuple, *tangents) -> np.ndarray:
+    """Sum of the (broadcast) tangents that are not None, shaped (K, *shape)"""
+    tangents = [_lift(t, len(shape)) for t in tangents if t is not None]
+    total = tangents[0]
+    for t in tangents[1:]:
+        total = total + t
+    return np.broadcast_to(total, total.shape[:1] + tuple(shape))
+
+
+def _matmul_tangent(a: Tensor, b: Tensor) -> np.ndarray:
+    # d(a @ b) = da @ b + a @ db, 1d operands are promoted like numpy does
+    a_data = a.data if a.data.ndim > 1 else a.data[None]
+    b_data = b.data if b.data.ndim > 1 else b.data[:, None]
+    ndim = max(a_data.ndim, b_data.ndim)
+    terms = []
+    if a.tangent is not None:
+        ta = a.tangent if a.data.ndim > 1 else a.tangent[:, None]
+        terms.append(_lift(ta, ndim) @ b_data)
+    if b.tangent is not None:
+        tb = b.tangent if b.data.ndim > 1 else b.tangent[..., None]
+        terms.append(a_data @ _lift(tb, ndim))
+    tangent = terms[0] if len(terms) == 1 else terms[0] + terms[1]
+    if a.data.ndim == 1:
+        tangent = tangent[..., 0, :]
+    if b.data.ndim == 1:
+        tangent = tangent[..., 0]
+    return tangent
@@ -0,0 +1,232 @@
+"""Functional autodiff on top of the Tensor graph
+
+grad() walks the recorded graph like Tensor.backward() but returns the gradients
+instead of accumulating them into `.grad`. With create_graph=True the backward pass
+runs through the `_vjp` rules of the ops, which are written in Tensor ops, so the
+returned gradients are recorded themselves and can be differentiated again.
+
+jvp() is forward mode: every op propagates the `tangent` of its inputs alongside
+`data` during the forward pass, nothing is recorded. Tangents carry a leading
+direction axis, so many directions (e.g. the columns of a Jacobian) share one pass.
+"""
+
+from __future__ import annotations
+from contextlib import nullcontext
+from typing import Callable, List, Sequence, Tuple, Union
+import numpy as np
+from .autodiff import Tensor, no_grad
+
+Tensors = Union[Tensor, Sequence[Tensor]]
+
+
+def _as_tuple(x: Tensors) -> Tuple[Tensor, ...]:
+    return (x,) if isinstance(x, Tensor) else tuple(x)
+
+
+def _topological_order(outputs: Tuple[Tensor, ...]) -> List[Tensor]:
+    # iterative post-order DFS, deep graphs (recurrences, long chains) would hit the
+    # recursion limit
+    order, visited = [], set()
+    for root in outputs:
+        if id(root) in visited:
+            continue
+        visited.add(id(root))
+        stack = [(root, iter(root.parent))]
+        while stack:
+            node, parents = stack[-1]
+            for parent in parents:
+                if id(parent) not in visited:
+                    visited.add(id(parent))
+                    stack.append((parent, iter(parent.parent)))
+                    break
+            else:
+                stack.pop()
+                order.append(node)
+    return order
+
+
+def _numpy_vjp(node: Tensor, grad: Tensor) -> List[Tensor]:
+    """Runs the numpy `_backward` of an op without a `_vjp` rule on scratch grads"""
+    parents = list(dict.fromkeys(node.parent))
+    saved = [p.grad for p in parents], node.grad
+    try:
+        for p in parents:
+            p.grad = np.zeros_like(p.data)
+        node.grad = grad.data
+        node._backward()
+        grads = {id(p): Tensor(p.grad) for p in parents}
+    finally:
+        for p, g in zip(parents, saved[0]):
+            p.grad = g
+        node.grad = saved[1]
+    # a parent appearing twice gets its accumulated grad once
+    return [grads.pop(id(p), None) for p in node.parent]
+
+
+def grad(
+    outputs: Tensors,
+    inputs: Tensors,
+    grad_outputs: Tensors = None,
+    create_graph: bool = False,
+) -> Tuple[Tensor, ...]:
+    """Gradients of outputs with respect to inputs
+
+    Args:
+        outputs (Tensors): Tensor or sequence of Tensors to differentiate
+        inputs (Tensors): Tensor or sequence of Tensors to differentiate with respect to
+        grad_outputs (Tensors, optional): vectors of the vector-Jacobian product, one
+        per output. Defaults to ones.
+        create_graph (bool, optional): records the backward pass so the gradients can
+        be differentiated again. Every op on the path needs a `_vjp` rule.
+        Defaults to False.
+
+    Returns:
+        Tuple[Tensor, ...]: one gradient per input, zeros for inputs outputs do not
+        depend on
+    """
+    outputs, inputs = _as_tuple(outputs), _as_tuple(inputs)
+    if grad_outputs is None:
+        grad_outputs = tuple(Tensor(np.ones_like(o.data)) for o in outputs)
+    grad_outputs = _as_tuple(grad_outputs)
+    order = _topological_order(outputs)
+    # only the nodes some input is reachable from take part in the backward pass
+    needed = {id(x) for x in inputs}
+    for node in order:
+        if any(id(p) in needed for p in node.parent):
+            needed.add(id(node))
+
+    grads = {}
+    for o, g in zip(outputs, grad_outputs):
+        if create_graph:
+            g = Tensor(g.data, True)
+        grads[id(o)] = grads[id(o)] + g if id(o) in grads else g
+    results = {}
+    with nullcontext() if create_graph else no_grad():
+        for node in reversed(order):
+            g = grads.pop(id(node), None)
+            if g is None or id(node) not in needed:
+                continue
+            if any(node is x for x in inputs):
+                results[id(node)] = g
+            if not node.parent:
+                continue
+            if node._vjp is not None:
+                parent_grads = node._vjp(g)
+            elif create_graph or node.tangent is not None or g.tangent is not None:
+                raise NotImplementedError(
+                    f"{node.op} has no differentiable backward rule (_vjp), it cannot "
+                    "be differentiated twice"
+                )
+            else:
+                parent_grads = _numpy_vjp(node, g)
+            for p, pg in zip(node.parent, parent_grads):
+                if pg is None or id(p) not in needed:
+                    continue
+                grads[id(p)] = grads[id(p)] + pg if id(p) in grads else pg
+    return tuple(
+        results[id(x)] if id(x) in results else Tensor(np.zeros_like(x.data))
+        for x in inputs
+    )
+
+
+def jvp(
+    fn: Callable[..., Tensors],
+    primals: Tensors,
+    tangents: Tensors,
+    batched: bool = False,
+) -> Tuple[Tensors, Tensors]:
+    """Jacobian-vector product of fn at primals in a single forward pass
+
+    Args:
+        fn (Callable[..., Tensors]): function of the primals returning a Tensor or
+        a tuple of Tensors
+        primals (Tensors): Tensor or sequence of Tensors
+        tangents (Tensors): one direction per primal, same shapes as the primals
+        batched (bool, optional): the tangents have a leading axis of K directions,
+        all pushed through at once. Defaults to False.
+
+    Returns:
+        Tuple[Tensors, Tensors]: fn(*primals) and its tangents, (K, *shape) if batched
+    """
+    primals = tuple(Tensor(p.data) for p in _as_tuple(primals))
+    for p, t in zip(primals, _as_tuple(tangents)):
+        t = np.asarray(t.data if isinstance(t, Tensor) else t, dtype=np.float64)
+        p.tangent = t if batched else t[None]
+    K = primals[0].tangent.shape[0]
+    with no_grad():
+        out = fn(*primals)
+    results, tangents = [], []
+    for o in _as_tuple(out):
+        tangent = (
+            np.broadcast_to(o.tangent, (K,) + o.shape)
+            if o.tangent is not None
+            else np.zeros((K,) + o.shape)
+        )
+        # fresh Tensors, the intermediate results are released on return
+        results.append(Tensor(o.data))
+        tangents.append(Tensor(np.array(tangent if batched else tangent[0])))
+    if isinstance(out, Tensor):
+        return results[0], tangents[0]
+    return tuple(results), tuple(tangents)
+
+
+def jacfwd(
+    fn: Callable[..., Tensor], inputs: Tensors, chunk_size: int = None
+) -> Tensors:
+    """Jacobian of fn by forward mode, chunk_size input directions per forward pass
+
+    Cheaper than reverse mode when the inputs are small and the outputs large.
+
+    Returns:
+        Tensors: (*out.shape, *input.shape) Jacobian per input (a single Tensor if
+        inputs is one)
+    """
+    single = isinstance(inputs, Tensor)
+    inputs = _as_tuple(inputs)
+    sizes = [x.data.size for x in inputs]
+    total = sum(sizes)
+    chunk_size = chunk_size or total
+    columns = []
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        basis = np.zeros((stop - start, total))
+        basis[np.arange(stop - start), np.arange(start, stop)] = 1.0
+        tangents = [
+            part.reshape((stop - start,) + x.shape)
+            for part, x in zip(np.split(basis, np.cumsum(sizes)[:-1], axis=1), inputs)
+        ]
+        _, tangent = jvp(fn, inputs, tangents, batched=True)
+        columns.append(tangent.data)
+    jacobian = np.moveaxis(np.concatenate(columns), 0, -1)
+    out_shape = jacobian.shape[:-1]
+    jacobians = tuple(
+        Tensor(part.reshape(out_shape + x.shape))
+        for part, x in zip(np.split(jacobian, np.cumsum(sizes)[:-1], axis=-1), inputs)
+    )
+    return jacobians[0] if single else jacobians
+
+
+def hvp(fn: Callable[..., Tensor], inputs: Tensors, v: Tensors) -> Tensors:
+    """Hessian-vector product of the scalar function fn at inputs
+
+    Forward-over-reverse: the inputs carry v as their tangent through the forward
+    pass and the backward pass, whose `_vjp` rules are Tensor ops, so the tangent of
+    the gradient is H @ v. Nothing is recorded for a second backward pass.
+
+    Returns:
+        Tensors: H @ v, a Tensor per input (a single Tensor if inputs is one)
+    """
+    single = isinstance(inputs, Tensor)
+    inputs = tuple(Tensor(x.data, True) for x in _as_tuple(inputs))
+    for x, t in zip(inputs, _as_tuple(v)):
+        x.tangent = np.asarray(t.data, dtype=np.float64)[None]
+    grads = grad(fn(*inputs), inputs)
+    products = tuple(
+        (
+            Tensor(np.array(np.broadcast_to(g.tangent[0], g.shape)))
+            if g.tangent is not None
+            else Tensor(np.zeros(g.shape))
+        )
+        for g in grads
+    )
+    return products[0] if single else products
@@ -0,0 +1,775 @@
+"""Array backends the Tensor ops run their kernels on
+
+The ops of yadll.autodiff and yadll.nn.functional do not call the array kernels
+below directly but go through the active Backend, so a kernel can be swapped
+without touching the autodiff code. NumpyBackend is the reference and the default.
+NumbaBackend compiles the kernels numpy runs as many passes or through np.add.at
+(scatter-add, overlap-add of windows, window copies, reductions over middle
+axes, relu) and falls back to numpy for everything else.
+
+Pooling and convolutions with one input channel per group also have direct Numba
+kernels that loop over the output positions and read the input in place, instead
+of materializing its windows.
+
+The backend is selected per process with set_backend() or the YADLL_BACKEND
+environment variable ("numpy" or "numba"), a backend whose package is missing
+falls back to numpy with a warning.
+"""
+
+from __future__ import annotations
+import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, Union
+import numpy as np
+from skimage.util.shape import view_as_windows
+
+
+class Backend:
+    """Kernels the ops dispatch through, every method works on np.ndarray"""
+
+    name = ""
+
+    def elementwise(
+        self, op: str, *args: np.ndarray, out: np.ndarray = None
+    ) -> np.ndarray:
+        """op is one of add, multiply, divide, power, exp, log, relu, relu_backward
+
+        The result is written to out when it is given, e.g. out=grad accumulates.
+        """
+        raise NotImplementedError
+
+    def reduce(self, op: str, x: np.ndarray, axis=None, keepdims=False) -> np.ndarray:
+        """op is sum, max or argmax"""
+        raise NotImplementedError
+
+    def matmul(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def windows(self, x: np.ndarray, window_shape: tuple, step) -> np.ndarray:
+        """Read-only view (*windows, *window_shape) of x, see skimage view_as_windows"""
+        raise NotImplementedError
+
+    def im2col(self, windows: np.ndarray, groups: int, out: np.ndarray) -> np.ndarray:
+        """Copies (N, C, *out, *k) windows into the im2col columns out
+
+        out is (groups, C // groups * prod(k), N * prod(out)).
+        """
+        raise NotImplementedError
+
+    def col2im(
+        self, cols: np.ndarray, out: np.ndarray, stride: tuple, dilation: tuple
+    ) -> np.ndarray:
+        """Overlap-adds cols (N, C, *out, *k) into out (N, C, *spatial)
+
+        The adjoint of windows, overlapping windows accumulate.
+        """
+        raise NotImplementedError
+
+    def scatter_add(self, target: np.ndarray, index, values: np.ndarray) -> None:
+        """target[index] += values where repeated indices accumulate"""
+        raise NotImplementedError
+
+    # direct kernels are optional, without them pooling and convolution run on the
+    # window views (rolling_window, im2col) of the input
+
+    def pool(
+        self, op: str, x: np.ndarray, kernel_size: tuple, stride: tuple
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Max or average ("max", "avg") of each window of the padded x (N, C, *spatial)
+
+        Returns the output and, for max, the flat spatial index of every maximum.
+        """
+        raise NotImplementedError
+
+    def pool_backward(
+        self,
+        op: str,
+        grad: np.ndarray,
+        index: Optional[np.ndarray],
+        shape: tuple,
+        kernel_size: tuple,
+        stride: tuple,
+    ) -> np.ndarray:
+        """Gradient (of `shape`) of the padded input of pool"""
+        raise NotImplementedError
+
+    def conv(
+        self,
+        x: np.ndarray,
+        weight: np.ndarray,
+        stride: tuple,
+        dilation: tuple,
+        groups: int,
+    ) -> np.ndarray:
+        """Convolution of the padded x (N, C, *spatial)
+
+        weight is (C_out, C // groups, *k).
+        """
+        raise NotImplementedError
+
+    def conv_backward(
+        self,
+        x: np.ndarray,
+        weight: np.ndarray,
+        grad: np.ndarray,
+        stride: tuple,
+        dilation: tuple,
+        groups: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Gradients of the padded x and of weight"""
+        raise NotImplementedError
+
+    def set_num_threads(self, n: int) -> None:
+        """Called by set_num_threads for backends with their own thread pool"""
+        raise NotImplementedError
+
+    def supports(self, kernel: str) -> bool:
+        """Whether the backend implements the optional kernel (pool, conv)"""
+        return getattr(type(self), kernel) is not getattr(Backend, kernel)
+
+
+def _is_basic(index) -> bool:
+    # slices, ints, None and Ellipsis select every element at most once
+    index = index if isinstance(index, tuple) else (index,)
+    return all(
+        i is None or i is Ellipsis or isinstance(i, (slice, int, np.integer))
+        for i in index
+    )
+
+
+_UFUNCS = {
+    "add": np.add,
+    "multiply": np.multiply,
+    "divide": np.divide,
+    "power": np.power,
+    "exp": np.exp,
+    "log": np.log,
+    "relu": lambda x: np.where(x > 0, x, 0),
+    "relu_backward": lambda x, grad: np.where(x > 0, grad, 0),
+}
+_REDUCTIONS = {"sum": np.sum, "max": np.max, "argmax": np.argmax}
+
+# intra-op threads, None until set_num_threads is called
+_num_threads: Optional[int] = None
+_executor: Optional[ThreadPoolExecutor] = None
+# below that many elements an op runs on the calling thread
+MIN_PARALLEL_SIZE = 1 << 17
+
+
+def set_num_threads(n: int) -> None:
+    """Number of threads large elementwise ops and reductions are split over
+
+    Numpy releases the GIL inside its loops, so the chunks of an op run in parallel
+    on a thread pool. Ops on fewer than MIN_PARALLEL_SIZE elements stay serial. The
+    Numba backend also runs its kernels on n threads.
+    """
+    global _num_threads, _executor
+    if _executor is not None:
+        _executor.shutdown()
+    _num_threads = max(1, int(n))
+    _executor = ThreadPoolExecutor(_num_threads) if _num_threads > 1 else None
+    if _backend is not None:
+        _backend.set_num_threads(_num_threads)
+
+
+def get_num_threads() -> int:
+    return _num_threads or 1
+
+
+def _threaded(*arrays) -> bool:
+    return _executor is not None and any(
+        np.size(a) >= MIN_PARALLEL_SIZE for a in arrays
+    )
+
+
+def _chunks(n: int) -> list:
+    bounds = np.linspace(0, n, _num_threads + 1).astype(int)
+    return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _parallel(fn, n: int) -> list:
+    """fn applied to the slices that split range(n) over the threads"""
+    return list(_executor.map(fn, _chunks(n)))
+
+
+def _elementwise_chunked(fn, args: tuple, out: np.ndarray) -> np.ndarray:
+    shape = np.broadcast_shapes(*(np.shape(a) for a in args))
+    if out is None:
+        out = np.empty(shape, np.result_type(*args))
+    if len(shape) == 0:
+        out[...] = fn(*args)
+        return out
+    target, inputs = out, args
+    if out.flags.c_contiguous and all(
+        np.ndim(a) == 0 or (a.shape == shape and a.flags.c_contiguous) for a in args
+    ):
+        # same shape operands are split as flat arrays
+        target = out.reshape(-1)
+        inputs = [a.reshape(-1) if np.ndim(a) else a for a in args]
+    n = len(target)
+
+    def run(chunk: slice) -> None:
+        # operands without the leading axis broadcast against every chunk
+        part = [
+            a[chunk] if np.ndim(a) == target.ndim and len(a) == n else a for a in inputs
+        ]
+        _apply(fn, part, target[chunk])
+
+    _parallel(run, n)
+    return out
+
+
+def _apply(fn, args, out: np.ndarray) -> np.ndarray:
+    if out is None:
+        return fn(*args)
+    if isinstance(fn, np.ufunc):
+        return fn(*args, out=out)
+    out[...] = fn(*args)
+    return out
+
+
+def _reduce_chunked(op: str, x: np.ndarray, axis, keepdims: bool) -> np.ndarray:
+    fn = _REDUCTIONS[op]
+    axes = (
+        tuple(range(x.ndim))
+        if axis is None
+        else tuple(sorted(int(a) % x.ndim for a in np.atleast_1d(axis)))
+    )
+    kept = [i for i in range(x.ndim) if i not in axes]
+    if kept:
+        # every thread reduces a slab of a kept axis into its part of the output
+        split = max(kept, key=lambda i: x.shape[i])
+        out_axis = split if keepdims else split - sum(a < split for a in axes)
+        index = (slice(None),) * split
+        parts = _parallel(
+            lambda chunk: fn(x[index + (chunk,)], axis, keepdims=keepdims),
+            x.shape[split],
+        )
+        return np.concatenate(parts, out_axis)
+    # every axis is reduced: the threads reduce slabs of the flat array, the
+    # partial results are combined on the calling thread
+    flat = x.reshape(-1)
+    if op == "argmax":
+        # chunks are in order, so the first maximum still wins
+        found = _parallel(lambda chunk: chunk.start + np.argmax(flat[chunk]), flat.size)
+        return found[int(np.argmax(flat[found]))]
+    out = fn(np.array(_parallel(lambda chunk: fn(flat[chunk]), flat.size)))
+    return np.reshape(out, (1,) * x.ndim) if keepdims else out
+
+
+class NumpyBackend(Backend):
+    name = "numpy"
+
+    def elementwise(
+        self, op: str, *args: np.ndarray, out: np.ndarray = None
+    ) -> np.ndarray:
+        if _threaded(*args):
+            return _elementwise_chunked(_UFUNCS[op], args, out)
+        return _apply(_UFUNCS[op], args, out)
+
+    def reduce(self, op: str, x: np.ndarray, axis=None, keepdims=False) -> np.ndarray:
+        if _threaded(x):
+            return _reduce_chunked(op, x, axis, keepdims)
+        return _REDUCTIONS[op](x, axis, keepdims=keepdims)
+
+    def set_num_threads(self, n: int) -> None:
+        pass
+
+    def matmul(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return a @ b
+
+    def windows(self, x: np.ndarray, window_shape: tuple, step) -> np.ndarray:
+        return view_as_windows(x, window_shape, step)
+
+    def im2col(self, windows: np.ndarray, groups: int, out: np.ndarray) -> np.ndarray:
+        n = (len(windows.shape) - 2) // 2
+        N, C = windows.shape[:2]
+        view = windows.reshape((N, groups, C // groups) + windows.shape[2:]).transpose(
+            (1, 2) + tuple(range(3 + n, 3 + 2 * n)) + (0,) + tuple(range(3, 3 + n))
+        )
+        np.copyto(out.reshape(view.shape), view)
+        return out
+
+    def col2im(
+        self, cols: np.ndarray, out: np.ndarray, stride: tuple, dilation: tuple
+    ) -> np.ndarray:
+        # loops over the kernel offsets only, each iteration is a vectorized strided add
+        n = len(stride)
+        out_dims, kernel_size = cols.shape[2 : 2 + n], cols.shape[2 + n :]
+        for offset in np.ndindex(*kernel_size):
+            index = (slice(None), slice(None)) + tuple(
+                slice(o * d, o * d + (od - 1) * st + 1, st)
+                for o, d, od, st in zip(offset, dilation, out_dims, stride)
+            )
+            out[index] += cols[(Ellipsis,) + offset]
+        return out
+
+    def scatter_add(self, target: np.ndarray, index, values: np.ndarray) -> None:
+        if _is_basic(index):
+            target[index] += values
+        else:
+            np.add.at(target, index, values)
+
+
+def _as_3d(x: np.ndarray, n: int, axes: Tuple[int, ...]) -> np.ndarray:
+    # inserts unit dims in front of each group of n spatial axes, 1d and 2d kernels
+    # then run the 3d loops
+    for start in sorted(axes, reverse=True):
+        x = x.reshape(x.shape[:start] + (1,) * (3 - n) + x.shape[start:])
+    return x
+
+
+def _pad_3d(values: tuple, fill: int = 1) -> np.ndarray:
+    return np.array((fill,) * (3 - len(values)) + tuple(values))
+
+
+def _split(shape: tuple, axis: tuple):
+    """(pre, kept, post) sizes when the axes that are not reduced are one block"""
+    kept = [i for i in range(len(shape)) if i not in axis]
+    if not kept or kept != list(range(kept[0], kept[-1] + 1)):
+        return None
+    return (
+        int(np.prod(shape[: kept[0]])),
+        int(np.prod(shape[kept[0] : kept[-1] + 1])),
+        int(np.prod(shape[kept[-1] + 1 :])),
+    )
+
+
+class NumbaBackend(NumpyBackend):
+    """Compiled kernels for the hot paths, numba is imported and compiled on creation"""
+
+    name = "numba"
+    # below that many elements the numpy ufuncs win over starting the parallel loop
+    min_parallel_size = 1 << 16
+
+    def __init__(self) -> None:
+        import numba
+
+        self.numba = numba
+        self.kernels = _compile(numba)
+        if _num_threads is not None:
+            self.set_num_threads(_num_threads)
+
+    def set_num_threads(self, n: int) -> None:
+        self.numba.set_num_threads(min(n, self.numba.config.NUMBA_NUM_THREADS))
+
+    def elementwise(
+        self, op: str, *args: np.ndarray, out: np.ndarray = None
+    ) -> np.ndarray:
+        # the numpy ufuncs of the other ops are already vectorized, relu is a single
+        # pass here instead of a mask and a select
+        x = args[0]
+        if (
+            op == "relu"
+            and out is None
+            and isinstance(x, np.ndarray)
+            and x.dtype == np.float64
+            and x.flags.c_contiguous
+            and x.size >= self.min_parallel_size
+        ):
+            out = np.empty_like(x)
+            self.kernels[op](x.reshape(-1), out.reshape(-1))
+            return out
+        return super().elementwise(op, *args, out=out)
+
+    def reduce(self, op: str, x: np.ndarray, axis=None, keepdims=False) -> np.ndarray:
+        # sums over the axes around a block of kept axes, e.g. (0, 2, 3) of a batch
+        # norm, are one pass per kept element instead of a pairwise sum per axis
+        if (
+            op == "sum"
+            and axis is not None
+            and x.dtype == np.float64
+            and x.flags.c_contiguous
+        ):
+            axis = tuple(sorted(int(a) % x.ndim for a in np.atleast_1d(axis)))
+            sizes = _split(x.shape, axis)
+            if sizes is not None and sizes[0] * sizes[2] > 1:
+                out = self.kernels["sum"](x.reshape(sizes))
+                out = out.reshape([s for i, s in enumerate(x.shape) if i not in axis])
+                return np.expand_dims(out, axis) if keepdims else out
+        return super().reduce(op, x, axis, keepdims)
+
+    def im2col(self, windows: np.ndarray, groups: int, out: np.ndarray) -> np.ndarray:
+        n = (windows.ndim - 2) // 2
+        if n > 3 or not out.flags.c_contiguous:
+            return super().im2col(windows, groups, out)
+        self.kernels["im2col"](_as_3d(windows, n, (2, 2 + n)), groups, out)
+        return out
+
+    def col2im(
+        self, cols: np.ndarray, out: np.ndarray, stride: tuple, dilation: tuple
+    ) -> np.ndarray:
+        n = len(stride)
+        if n > 3:
+            return super().col2im(cols, out, stride, dilation)
+        pad = (1,) * (3 - n)
+        self.kernels["col2im"](
+            _as_3d(cols, n, (2, 2 + n)),
+            _as_3d(out, n, (2,)),
+            np.array(pad + tuple(stride)),
+            np.array(pad + tuple(dilation)),
+        )
+        return out
+
+    def scatter_add(self, target: np.ndarray, index, values: np.ndarray) -> None:
+        # rows of an embedding or a gather along the first axis
+        if (
+            isinstance(index, np.ndarray)
+            and index.ndim == 1
+            and np.issubdtype(index.dtype, np.integer)
+            and target.dtype == np.float64
+            and target.flags.c_contiguous
+        ):
+            rows = target.reshape(len(target), -1)
+            self.kernels["scatter_rows"](
+                rows,
+                index,
+                np.ascontiguousarray(
+                    np.broadcast_to(values, index.shape + target.shape[1:]),
+                    dtype=np.float64,
+                ).reshape(len(index), -1),
+            )
+            return
+        super().scatter_add(target, index, values)
+
+    def pool(
+        self, op: str, x: np.ndarray, kernel_size: tuple, stride: tuple
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        n = len(kernel_size)
+        out_dims = tuple(
+            (s - k) // st + 1 for s, k, st in zip(x.shape[2:], kernel_size, stride)
+        )
+        out = np.empty(x.shape[:2] + out_dims, x.dtype)
+        args = (_as_3d(x, n, (2,)), _pad_3d(kernel_size), _pad_3d(stride))
+        if op == "avg":
+            self.kernels["avg_pool"](*args, _as_3d(out, n, (2,)))
+            return out, None
+        index = np.empty(out.shape, np.int64)
+        self.kernels["max_pool"](*args, _as_3d(out, n, (2,)), _as_3d(index, n, (2,)))
+        return out, index
+
+    def pool_backward(
+        self,
+        op: str,
+        grad: np.ndarray,
+        index: Optional[np.ndarray],
+        shape: tuple,
+        kernel_size: tuple,
+        stride: tuple,
+    ) -> np.ndarray:
+        grad_x = np.zeros(shape, grad.dtype)
+        N, C = shape[:2]
+        if op == "max":
+            self.kernels["max_pool_backward"](
+                grad.reshape(N, C, -1),
+                index.reshape(N, C, -1),
+                grad_x.reshape(N, C, -1),
+            )
+            return grad_x
+        n = len(kernel_size)
+        self.kernels["avg_pool_backward"](
+            _as_3d(grad, n, (2,)),
+            _pad_3d(kernel_size),
+            _pad_3d(stride),
+            _as_3d(grad_x, n, (2,)),
+        )
+        return grad_x
+
+    def conv(
+        self,
+        x: np.ndarray,
+        weight: np.ndarray,
+        stride: tuple,
+        dilation: tuple,
+        groups: int,
+    ) -> np.ndarray:
+        n = len(stride)
+        out_dims = tuple(
+            (s - d * (k - 1) - 1) // st + 1
+            for s, k, st, d in zip(x.shape[2:], weight.shape[2:], stride, dilation)
+        )
+        out = np.zeros(
+            (x.shape[0], weight.shape[0]) + out_dims, np.result_type(x, weight)
+        )
+        self.kernels["conv"](
+            _as_3d(x, n, (2,)),
+            _as_3d(weight, n, (2,)),
+            _pad_3d(stride),
+            _pad_3d(dilation),
+            groups,
+            _as_3d(out, n, (2,)),
+        )
+        return out
+
+    def conv_backward(
+        self,
+        x: np.ndarray,
+        weight: np.ndarray,
+        grad: np.ndarray,
+        stride: tuple,
+        dilation: tuple,
+        groups: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(stride)
+        grad_x = np.zeros(x.shape, grad.dtype)
+        grad_w = np.zeros(weight.shape, grad.dtype)
+        self.kernels["conv_backward"](
+            _as_3d(x, n, (2,)),
+            _as_3d(weight, n, (2,)),
+            _as_3d(grad, n, (2,)),
+            _pad_3d(stride),
+            _pad_3d(dilation),
+            groups,
+            _as_3d(grad_x, n, (2,)),
+            _as_3d(grad_w, n, (2,)),
+        )
+        return grad_x, grad_w
+
+
+def _compile(numba) -> dict:
+    njit, prange = numba.njit, numba.prange
+
+    @njit(parallel=True, cache=True)
+    def relu(x, out):
+        for i in prange(x.size):
+            out[i] = x[i] if x[i] > 0 else 0.0
+
+    @njit(parallel=True, cache=True)
+    def sum_pre_post(x):
+        pre, kept, post = x.shape
+        out = np.zeros(kept)
+        for k in prange(kept):
+            total = 0.0
+            for i in range(pre):
+                for j in range(post):
+                    total += x[i, k, j]
+            out[k] = total
+        return out
+
+    @njit(parallel=True, cache=True)
+    def im2col(windows, groups, out):
+        # windows (N, C, O1, O2, O3, K1, K2, K3) -> out (groups, C_g * K, N * O)
+        N, C, O1, O2, O3, K1, K2, K3 = windows.shape
+        C_g = C // groups
+        for gc in prange(C):
+            g, c = gc // C_g, gc % C_g
+            for k1 in range(K1):
+                for k2 in range(K2):
+                    for k3 in range(K3):
+                        row = ((c * K1 + k1) * K2 + k2) * K3 + k3
+                        col = 0
+                        for n in range(N):
+                            for o1 in range(O1):
+                                for o2 in range(O2):
+                                    for o3 in range(O3):
+                                        out[g, row, col] = windows[
+                                            n, gc, o1, o2, o3, k1, k2, k3
+                                        ]
+                                        col += 1
+
+    @njit(parallel=True, cache=True)
+    def col2im(cols, out, stride, dilation):
+        # cols (N, C, O1, O2, O3, K1, K2, K3) overlap-added into out (N, C, S1, S2, S3)
+        N, C, O1, O2, O3, K1, K2, K3 = cols.shape
+        for nc in prange(N * C):
+            n, c = nc // C, nc % C
+            for o1 in range(O1):
+                for o2 in range(O2):
+                    for o3 in range(O3):
+                        for k1 in range(K1):
+                            i1 = o1 * stride[0] + k1 * dilation[0]
+                            for k2 in range(K2):
+                                i2 = o2 * stride[1] + k2 * dilation[1]
+                                for k3 in range(K3):
+                                    i3 = o3 * stride[2] + k3 * dilation[2]
+                                    out[n, c, i1, i2, i3] += cols[
+                                        n, c, o1, o2, o3, k1, k2, k3
+                                    ]
+
+    @njit(cache=True)
+    def scatter_rows(target, index, values):
+        # sequential, repeated rows accumulate
+        for i in range(len(index)):
+            row = index[i]
+            for j in range(target.shape[1]):
+                target[row, j] += values[i, j]
+
+    @njit(parallel=True, cache=True)
+    def max_pool(x, kernel_size, stride, out, index):
+        # the first maximum of a window wins, like torch
+        N, C, O1, O2, O3 = out.shape
+        S2, S3 = x.shape[3], x.shape[4]
+        for nc in prange(N * C):
+            n, c = nc // C, nc % C
+            for o1 in range(O1):
+                for o2 in range(O2):
+                    for o3 in range(O3):
+                        i1, i2, i3 = o1 * stride[0], o2 * stride[1], o3 * stride[2]
+                        best, at = x[n, c, i1, i2, i3], (i1 * S2 + i2) * S3 + i3
+                        for k1 in range(kernel_size[0]):
+                            for k2 in range(kernel_size[1]):
+                                for k3 in range(kernel_size[2]):
+                                    v = x[n, c, i1 + k1, i2 + k2, i3 + k3]
+                                    if v > best:
+                                        best = v
+                                        at = ((i1 + k1) * S2 + i2 + k2) * S3 + i3 + k3
+                        out[n, c, o1, o2, o3] = best
+                        index[n, c, o1, o2, o3] = at
+
+    @njit(parallel=True, cache=True)
+    def max_pool_backward(grad, index, grad_x):
+        # (N, C, -1) views, a window maximum only routes to its own channel
+        N, C, n_out = grad.shape
+        for nc in prange(N * C):
+            n, c = nc // C, nc % C
+            for o in range(n_out):
+                grad_x[n, c, index[n, c, o]] += grad[n, c, o]
+
+    @njit(parallel=True, cache=True)
+    def avg_pool(x, kernel_size, stride, out):
+        N, C, O1, O2, O3 = out.shape
+        K1, K2, K3 = kernel_size[0], kernel_size[1], kernel_size[2]
+        count = K1 * K2 * K3
+        for nc in prange(N * C):
+            n, c = nc // C, nc % C
+            for o1 in range(O1):
+                for o2 in range(O2):
+                    for o3 in range(O3):
+                        i1, i2, i3 = o1 * stride[0], o2 * stride[1], o3 * stride[2]
+                        total = 0.0
+                        for k1 in range(K1):
+                            for k2 in range(K2):
+                                for k3 in range(K3):
+                                    total += x[n, c, i1 + k1, i2 + k2, i3 + k3]
+                        out[n, c, o1, o2, o3] = total / count
+
+    @njit(parallel=True, cache=True)
+    def avg_pool_backward(grad, kernel_size, stride, grad_x):
+        N, C, O1, O2, O3 = grad.shape
+        K1, K2, K3 = kernel_size[0], kernel_size[1], kernel_size[2]
+        count = K1 * K2 * K3
+        for nc in prange(N * C):
+            n, c = nc // C, nc % C
+            for o1 in range(O1):
+                for o2 in range(O2):
+                    for o3 in range(O3):
+                        i1, i2, i3 = o1 * stride[0], o2 * stride[1], o3 * stride[2]
+                        g = grad[n, c, o1, o2, o3] / count
+                        for k1 in range(K1):
+                            for k2 in range(K2):
+                                for k3 in range(K3):
+                                    grad_x[n, c, i1 + k1, i2 + k2, i3 + k3] += g
+
+    @njit(parallel=True, cache=True)
+    def conv(x, weight, stride, dilation, groups, out):
+        # every (example, output channel) plane is accumulated from the input in place
+        N, C_out, O1, O2, O3 = out.shape
+        C_g, K1, K2, K3 = weight.shape[1:]
+        per_group = C_out // groups
+        for nco in prange(N * C_out):
+            n, co = nco // C_out, nco % C_out
+            first = co // per_group * C_g
+            for c in range(C_g):
+                for k1 in range(K1):
+                    for k2 in range(K2):
+                        for k3 in range(K3):
+                            w = weight[co, c, k1, k2, k3]
+                            for o1 in range(O1):
+                                i1 = o1 * stride[0] + k1 * dilation[0]
+                                for o2 in range(O2):
+                                    i2 = o2 * stride[1] + k2 * dilation[1]
+                                    for o3 in range(O3):
+                                        i3 = o3 * stride[2] + k3 * dilation[2]
+                                        out[n, co, o1, o2, o3] += (
+                                            w * x[n, first + c, i1, i2, i3]
+                                        )
+
+    @njit(parallel=True, cache=True)
+    def conv_backward(x, weight, grad, stride, dilation, groups, grad_x, grad_w):
+        N, C_out, O1, O2, O3 = grad.shape
+        C_g, K1, K2, K3 = weight.shape[1:]
+        per_group = C_out // groups
+        # weight gradient, one output channel per thread
+        for co in prange(C_out):
+            first = co // per_group * C_g
+            for c in range(C_g):
+                for k1 in range(K1):
+                    for k2 in range(K2):
+                        for k3 in range(K3):
+                            total = 0.0
+                            for n in range(N):
+                                for o1 in range(O1):
+                                    i1 = o1 * stride[0] + k1 * dilation[0]
+                                    for o2 in range(O2):
+                                        i2 = o2 * stride[1] + k2 * dilation[1]
+                                        for o3 in range(O3):
+                                            i3 = o3 * stride[2] + k3 * dilation[2]
+                                            total += (
+                                                grad[n, co, o1, o2, o3]
+                                                * x[n, first + c, i1, i2, i3]
+                                            )
+                            grad_w[co, c, k1, k2, k3] = total
+        # input gradient, the channels of one (example, group) per thread
+        for ng in prange(N * groups):
+            n, g = ng // groups, ng % groups
+            for co in range(g * per_group, (g + 1) * per_group):
+                for c in range(C_g):
+                    for k1 in range(K1):
+                        for k2 in range(K2):
+                            for k3 in range(K3):
+                                w = weight[co, c, k1, k2, k3]
+                                for o1 in range(O1):
+                                    i1 = o1 * stride[0] + k1 * dilation[0]
+                                    for o2 in range(O2):
+                                        i2 = o2 * stride[1] + k2 * dilation[1]
+                                        for o3 in range(O3):
+                                            i3 = o3 * stride[2] + k3 * dilation[2]
+                                            grad_x[n, g * C_g + c, i1, i2, i3] += (
+                                                w * grad[n, co, o1, o2, o3]
+                                            )
+
+    return {
+        "max_pool": max_pool,
+        "max_pool_backward": max_pool_backward,
+        "avg_pool": avg_pool,
+        "avg_pool_backward": avg_pool_backward,
+        "conv": conv,
+        "conv_backward": conv_backward,
+        "relu": relu,
+        "sum": sum_pre_post,
+        "im2col": im2col,
+        "col2im": col2im,
+        "scatter_rows": scatter_rows,
+    }
+
+
+BACKENDS = {"numpy": NumpyBackend, "numba": NumbaBackend}
+_backend: Backend = None
+
+
+def _create(name: str) -> Backend:
+    try:
+        return BACKENDS[name]()
+    except ImportError:
+        warnings.warn(f"the {name} backend is not installed, using numpy")
+        return NumpyBackend()
+
+
+def get_backend() -> Backend:
+    global _backend
+    if _backend is None:
+        _backend = _create(os.environ.get("YADLL_BACKEND", "numpy"))
+    return _backend
+
+
+def set_backend(backend: Union[str, Backend]) -> Backend:
+    """Selects the backend of the process, returns the previous one
+
+    Args:
+        backend (Union[str, Backend]): "numpy", "numba" or a Backend instance
+    """
+    global _backend
+    previous = get_backend()
+    _backend = _create(backend) if isinstance(backend, str) else backend
+    return previous
@@ -0,0 +1,659 @@
+"""Vectorizing map: runs a function written for a single example on a whole batch
+
+vmap(fn) calls fn once. Its batched inputs carry the batch as a hidden leading axis
+of `data` while `shape` reports the per-example shape, so fn and the Modules it calls
+see a single example. While fn runs, the Tensor ops and the functional ops are
+replaced by batching rules: they rewrite their arguments for the batch axis (dims
+shifted by one, operands aligned behind it, per-example conv weights as the groups
+of one grouped conv, ...) and run the original op once on the whole batch. The
+recorded graph is the one of the batched ops, a single backward pass serves every
+example. The rules are per thread: the other threads keep running the plain ops.
+An op without a batching rule raises instead of treating the batch as a data axis.
+"""
+
+from __future__ import annotations
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Sequence, Union
+import numpy as np
+from .autodiff import Tensor, no_grad, _tangent_index
+from .autograd import Tensors, _as_tuple
+from .nn import functional
+from .nn.module import Module
+from .sparse import CSRTensor
+
+
+class _State(threading.local):
+    # whether this thread runs vmap, and inside how many _physical blocks
+    active = False
+    depth = 0
+
+
+_state = _State()
+# the batching ops stay installed while a vmap runs in any thread
+_lock = threading.Lock()
+_installs = 0
+_patched: list = []
+
+
+def _is_batched(x: Any) -> bool:
+    return isinstance(x, Tensor) and getattr(x, "_batched", False)
+
+
+def _mark(x: Tensor) -> Tensor:
+    x._batched = True
+    return _constant(x) if not x.parent else x
+
+
+def _constant(x: Tensor) -> Tensor:
+    # an op under no_grad keeps its backward, as a parent in a graph it must not run
+    x._backward = lambda: None
+    return x
+
+
+def _shape(self: Tensor) -> tuple:
+    # Tensor.shape while vmap runs, batching rules and the ops they call see the data
+    if _state.active and _state.depth == 0 and getattr(self, "_batched", False):
+        return self.data.shape[1:]
+    return self.data.shape
+
+
+@contextmanager
+def _physical(*inputs: Tensor):
+    """Ops inside run on the batched data as is, their batching rules are skipped"""
+    grad = any(isinstance(t, Tensor) and t.requires_grad for t in inputs)
+    _state.depth += 1
+    try:
+        # the movement ops always record, constants would get a backward they cannot run
+        with nullcontext() if grad else no_grad():
+            yield
+    finally:
+        _state.depth -= 1
+
+
+def _apply(x: Tensor, method: str, *args) -> Tensor:
+    if x.requires_grad:
+        return getattr(x, method)(*args)
+    with no_grad():
+        return _constant(getattr(x, method)(*args))
+
+
+def _view(x: Tensor, shape: tuple, expand: bool = False) -> Tensor:
+    shape = tuple(shape)
+    if np.shape(x.data) == shape:
+        return x
+    return _apply(x, "expand" if expand else "reshape", shape)
+
+
+def _align(x: Tensor, batched: bool, ndim: int) -> Tensor:
+    """Batch axis (or 1 for a shared Tensor) followed by ndim dims, like broadcasting"""
+    shape = np.shape(x.data)
+    batch, shape = (shape[:1], shape[1:]) if batched else ((1,), shape)
+    return _view(x, batch + (1,) * (ndim - len(shape)) + shape)
+
+
+def _with_batch(x: Tensor, B: int) -> Tensor:
+    """x with its batch axis, a Tensor shared by all examples is broadcast"""
+    if _is_batched(x):
+        return x
+    return _view(_align(x, False, x.data.ndim), (B,) + x.data.shape, expand=True)
+
+
+def _fold(x: Tensor) -> Tensor:
+    # (B, N, ...) -> (B * N, ...), the examples join the batch dim of the op
+    return _view(x, (-1,) + x.data.shape[2:])
+
+
+def _unfold(x: Tensor, B: int) -> Tensor:
+    return _view(x, (B, -1) + x.data.shape[1:])
+
+
+# batching rules of the Tensor methods: (original, *args) -> batched output
+
+
+def _unary_rule(original: Callable, self: Tensor, *args) -> Tensor:
+    with _physical(self):
+        return _mark(original(self, *args))
+
+
+def _elementwise_rule(original: Callable, self: Tensor, other: Any) -> Tensor:
+    if not isinstance(other, Tensor):
+        return _unary_rule(original, self, other)
+    ndim = max(len(self.shape), len(other.shape))
+    with _physical(self, other):
+        a = _align(self, _is_batched(self), ndim)
+        b = _align(other, _is_batched(other), ndim)
+        if b.requires_grad and not a.requires_grad:
+            # add and mul are commutative, their grads only flow through when self
+            # requires it
+            a, b = b, a
+        # the backward of add and mul expects self to be of the output shape
+        a = _view(a, np.broadcast_shapes(a.shape, b.shape), expand=True)
+        return _mark(original(a, b))
+
+
+def _matmul_rule(original: Callable, self: Tensor, other: Tensor) -> Tensor:
+    batched = _is_batched(self), _is_batched(other)
+    ndim_a, ndim_b = len(self.shape), len(other.shape)
+    with _physical(self, other):
+        # 1d operands are promoted like numpy does, the added dim is dropped again
+        a = (
+            self
+            if ndim_a > 1
+            else _view(self, self.data.shape[:-1] + (1, self.shape[-1]))
+        )
+        b = other if ndim_b > 1 else _view(other, other.data.shape + (1,))
+        ndim = max(ndim_a, ndim_b, 2)
+        out = original(_align(a, batched[0], ndim), _align(b, batched[1], ndim))
+        shape = out.shape
+        if ndim_a == 1:
+            shape = shape[:-2] + shape[-1:]
+        if ndim_b == 1:
+            shape = shape[:-1]
+        return _mark(_view(out, shape))
+
+
+def _linear_rule(
+    original: Callable, self: Tensor, weight: Tensor, bias: Tensor = None
+) -> Tensor:
+    if _is_batched(weight) or _is_batched(bias):
+        # per-example weights, a batched matmul. weight on the left keeps its grad
+        # in the layout of weight, only the small activations are transposed
+        out = (
+            weight @ self
+            if len(self.shape) == 1
+            else (weight @ self.transpose(-1, -2)).transpose(-1, -2)
+        )
+        return out if bias is None else out + bias
+    with _physical(self, weight, bias):
+        return _mark(original(self, weight, bias))
+
+
+def _getitem_rule(original: Callable, self: Tensor, index) -> Tensor:
+    with _physical(self):
+        return _mark(original(self, _tangent_index(index)))
+
+
+def _setitem_rule(original: Callable, self: Tensor, index, value) -> None:
+    raise NotImplementedError("in-place assignment is not supported by vmap")
+
+
+def _permute_rule(original: Callable, self: Tensor, order: tuple) -> Tensor:
+    ndim = len(self.shape)
+    with _physical(self):
+        return _mark(original(self, (0,) + tuple(o % ndim + 1 for o in order)))
+
+
+def _pad_rule(original: Callable, self: Tensor, pad, value=None) -> Tensor:
+    if isinstance(pad, int):
+        pad = ((pad, pad),) * len(self.shape)
+    with _physical(self):
+        return _mark(original(self, ((0, 0),) + tuple(pad), value))
+
+
+def _reshape_rule(original: Callable, self: Tensor, dim) -> Tensor:
+    dim = (dim,) if isinstance(dim, (int, np.integer)) else tuple(dim)
+    with _physical(self):
+        return _mark(original(self, self.data.shape[:1] + dim))
+
+
+def _expand_rule(original: Callable, self: Tensor, dim) -> Tensor:
+    dim = tuple(dim)
+    with _physical(self):
+        x = _align(self, True, len(dim))
+        return _mark(original(x, x.shape[:1] + dim))
+
+
+def _rolling_window_rule(
+    original: Callable, self: Tensor, strides: tuple, stride=1
+) -> Tensor:
+    n = len(strides)
+    step = (stride,) * n if isinstance(stride, int) else tuple(stride)
+    with _physical(self):
+        out = original(self, (1,) + tuple(strides), (1,) + step)
+        # (B, *windows, 1, *strides), the window of size 1 along the batch axis goes
+        return _mark(_view(out, out.shape[: n + 1] + out.shape[n + 2 :]))
+
+
+def _sum_rule(original: Callable, self: Tensor, dim=None, keepdim=False) -> Tensor:
+    ndim = len(self.shape)
+    axes = range(ndim) if dim is None else np.atleast_1d(dim) % ndim
+    with _physical(self):
+        return _mark(original(self, tuple(int(a) + 1 for a in axes), keepdim))
+
+
+def _mean_rule(
+    original: Callable, self: Tensor, dim=None, keepdim=False, unbiased=False
+) -> Tensor:
+    # without dims the mean divides by the size of data, batch axis included
+    if dim is None:
+        dim = tuple(range(len(self.shape)))
+    return original(self, dim, keepdim, unbiased)
+
+
+def _max_rule(original: Callable, self: Tensor, dim: int = None) -> Tensor:
+    with _physical(self):
+        if not dim:
+            # like max() of a single example, max(0) reduces every dim
+            return _mark(original(_view(self, self.data.shape[:1] + (-1,)), 1))
+        return _mark(original(self, dim % (self.data.ndim - 1) + 1))
+
+
+def _sparse_matmul_rule(original: Callable, self: CSRTensor, other: Tensor) -> Tensor:
+    # the examples ride along as extra columns of the dense operand
+    with _physical(other):
+        dense = _apply(other, "permute", tuple(range(1, other.data.ndim)) + (0,))
+        out = original(self, dense)
+        return _mark(
+            _apply(
+                out, "permute", (out.data.ndim - 1,) + tuple(range(out.data.ndim - 1))
+            )
+        )
+
+
+# batching rules of the functional ops
+
+
+def _conv_rule(
+    original: Callable,
+    x: Tensor,
+    weight: Tensor,
+    bias: Tensor = None,
+    stride: tuple = None,
+    padding: tuple = None,
+    dilation: tuple = None,
+    groups: int = 1,
+    relu: bool = False,
+    plan=None,
+) -> Tensor:
+    # the plan is the one of the per-example shape, the folded input gets its own
+    with _physical(x, weight, bias):
+        if not _is_batched(weight):
+            B = x.data.shape[0]
+            if not _is_batched(bias):
+                out = original(
+                    _fold(x), weight, bias, stride, padding, dilation, groups, relu
+                )
+                return _mark(_unfold(out, B))
+            out = _unfold(
+                original(_fold(x), weight, None, stride, padding, dilation, groups), B
+            )
+        else:
+            # per-example weights: the examples are the groups of one grouped conv
+            B = weight.data.shape[0]
+            x = _with_batch(x, B)
+            N, C = x.shape[1:3]
+            x = _apply(x, "permute", (1, 0) + tuple(range(2, x.data.ndim)))
+            x = _view(x, (N, B * C) + x.shape[3:])
+            w = _view(weight, (-1,) + weight.shape[2:])
+            out = original(x, w, None, stride, padding, dilation, groups * B)
+            out = _view(out, (N, B, -1) + out.shape[2:])
+            out = _apply(out, "permute", (1, 0) + tuple(range(2, out.data.ndim)))
+        if bias is not None:
+            batch = bias.shape[:1] if _is_batched(bias) else (1,)
+            out = out + _view(bias, batch + (1, -1) + (1,) * (out.data.ndim - 3))
+        return _mark(out.relu() if relu else out)
+
+
+def _conv_transpose_rule(
+    original: Callable, x: Tensor, weight: Tensor, bias: Tensor = None, *args, **kwargs
+) -> Tensor:
+    if _is_batched(weight) or _is_batched(bias):
+        raise NotImplementedError("vmap of conv_transpose needs shared weights")
+    with _physical(x, weight, bias):
+        out = original(_fold(x), weight, bias, *args, **kwargs)
+        return _mark(_unfold(out, x.data.shape[0]))
+
+
+def _pool_rule(
+    original: Callable,
+    x: Tensor,
+    mode: str,
+    kernel_size: tuple,
+    stride: tuple = None,
+    padding: tuple = None,
+    ceil_mode: bool = False,
+    count_include_pad: bool = True,
+    plan=None,
+) -> Tensor:
+    with _physical(x):
+        out = original(
+            _fold(x), mode, kernel_size, stride, padding, ceil_mode, count_include_pad
+        )
+        return _mark(_unfold(out, x.data.shape[0]))
+
+
+def _adaptive_pool_rule(
+    original: Callable,
+    x: Tensor,
+    mode: str,
+    output_size,
+    keepdim: bool = True,
+    plan=None,
+) -> Tensor:
+    with _physical(x):
+        out = original(_fold(x), mode, output_size, keepdim)
+        return _mark(_unfold(out, x.data.shape[0]))
+
+
+def _embedding_rule(
+    original: Callable, input: Tensor, weight: Tensor, padding_idx: int = None
+) -> Tensor:
+    if _is_batched(weight):
+        raise NotImplementedError("vmap of embedding needs shared weights")
+    # the lookup takes indices of any shape
+    with _physical(weight):
+        return _mark(original(input, weight, padding_idx))
+
+
+def _embedding_bag_rule(
+    original: Callable,
+    input: Tensor,
+    weight: Tensor,
+    offsets: Tensor = None,
+    mode: str = "mean",
+) -> Tensor:
+    if _is_batched(weight) or input.data.ndim != 3:
+        raise NotImplementedError(
+            "vmap of embedding_bag needs shared weights and 2d inputs"
+        )
+    with _physical(weight):
+        out = original(
+            input.data.reshape((-1,) + input.data.shape[2:]), weight, None, mode
+        )
+        return _mark(_unfold(out, input.data.shape[0]))
+
+
+def _recurrent_rule(
+    original: Callable,
+    x: Tensor,
+    h0: Tensor,
+    c0: Tensor,
+    weight_ih: Tensor,
+    weight_hh: Tensor,
+    bias_ih: Tensor = None,
+    bias_hh: Tensor = None,
+    mode: str = "LSTM",
+    reverse: bool = False,
+) -> tuple:
+    if any(_is_batched(w) for w in (weight_ih, weight_hh, bias_ih, bias_hh)):
+        raise NotImplementedError("vmap of recurrent needs shared weights")
+    B = next(t.data.shape[0] for t in (x, h0, c0) if _is_batched(t))
+    with _physical(x, h0, c0, weight_ih, weight_hh, bias_ih, bias_hh):
+        # the examples join the batch dim N: (B, T, N, I) -> (T, B * N, I)
+        x = _with_batch(x, B)
+        T, N = x.shape[1:3]
+        x = _view(_apply(x, "permute", (1, 0, 2, 3)), (T, B * N, -1))
+        h0, c0 = (_fold(_with_batch(s, B)) if s is not None else None for s in (h0, c0))
+        out, c = original(
+            x, h0, c0, weight_ih, weight_hh, bias_ih, bias_hh, mode, reverse
+        )
+        out = _apply(_view(out, (T, B, N, -1)), "permute", (1, 0, 2, 3))
+        return _mark(out), _mark(_unfold(c, B)) if c is not None else None
+
+
+def _attention_rule(
+    original: Callable,
+    query: Tensor,
+    key: Tensor,
+    value: Tensor,
+    attn_mask: np.ndarray = None,
+    is_causal: bool = False,
+    block_size: int = 128,
+) -> Tensor:
+    # every leading dim is a batch dim already
+    B = next(t.data.shape[0] for t in (query, key, value) if _is_batched(t))
+    with _physical(query, key, value):
+        query, key, value = (_with_batch(t, B) for t in (query, key, value))
+        return _mark(original(query, key, value, attn_mask, is_causal, block_size))
+
+
+METHOD_RULES: Dict[type, Dict[str, Callable]] = {
+    Tensor: {
+        "__getitem__": _getitem_rule,
+        "__setitem__": _setitem_rule,
+        "__add__": _elementwise_rule,
+        "__mul__": _elementwise_rule,
+        "__matmul__": _matmul_rule,
+        "linear": _linear_rule,
+        "__pow__": _unary_rule,
+        "relu": _unary_rule,
+        "exp": _unary_rule,
+        "log": _unary_rule,
+        "permute": _permute_rule,
+        "pad": _pad_rule,
+        "reshape": _reshape_rule,
+        "expand": _expand_rule,
+        "rolling_window": _rolling_window_rule,
+        "sum": _sum_rule,
+        "mean": _mean_rule,
+        "max": _max_rule,
+    },
+    CSRTensor: {"__matmul__": _sparse_matmul_rule},
+}
+# the other Tensor methods (sub, div, transpose, squeeze, cat, var, ...) are written
+# in terms of these and the per-example shape
+
+FUNCTION_RULES: Dict[str, Callable] = {
+    "conv": _conv_rule,
+    "conv_transpose": _conv_transpose_rule,
+    "pool": _pool_rule,
+    "adaptive_pool": _adaptive_pool_rule,
+    "embedding": _embedding_rule,
+    "embedding_bag": _embedding_bag_rule,
+    "recurrent": _recurrent_rule,
+    "scaled_dot_product_attention": _attention_rule,
+}
+
+
+def _batching_op(original: Callable, rule: Callable) -> Callable:
+    def op(*args, **kwargs):
+        if (
+            not _state.active
+            or _state.depth > 0
+            or not any(_is_batched(a) for a in args + tuple(kwargs.values()))
+        ):
+            return original(*args, **kwargs)
+        return rule(original, *args, **kwargs)
+
+    return op
+
+
+def _checked_init(original: Callable) -> Callable:
+    # an op computing on batched data outside of a batching rule has none, it would
+    # treat the batch axis as a data axis
+    def __init__(self, data, requires_grad=False, parent=(), op="", name="") -> None:
+        if _state.active and _state.depth == 0 and any(map(_is_batched, parent)):
+            raise NotImplementedError(f"vmap has no batching rule for {op or 'an op'}")
+        original(self, data, requires_grad, parent, op, name)
+
+    return __init__
+
+
+def _dispatch(name: str, original: Callable, args: tuple, kwargs: dict) -> Any:
+    # the functional ops call this while the rules are installed, original is the
+    # undecorated op
+    return _batching_op(original, FUNCTION_RULES[name])(*args, **kwargs)
+
+
+def _install() -> None:
+    _patched.append((Tensor, "shape", Tensor.__dict__["shape"]))
+    Tensor.shape = property(_shape)
+    _patched.append((Tensor, "__init__", Tensor.__dict__["__init__"]))
+    Tensor.__init__ = _checked_init(Tensor.__dict__["__init__"])
+    for cls, rules in METHOD_RULES.items():
+        for name, rule in rules.items():
+            original = cls.__dict__[name]
+            _patched.append((cls, name, original))
+            setattr(cls, name, _batching_op(original, rule))
+    functional._batching_rule = _dispatch
+
+
+def _uninstall() -> None:
+    for cls, name, original in _patched:
+        setattr(cls, name, original)
+    functional._batching_rule = None
+    _patched.clear()
+
+
+@contextmanager
+def _batching():
+    """Enables the batching rules in the calling thread
+
+    The rules are installed on Tensor and in the functional ops while a vmap runs in
+    any thread. They run the original ops in the other threads.
+    """
+    global _installs
+    if _state.active:
+        raise NotImplementedError("nested vmap is not supported")
+    with _lock:
+        if _installs == 0:
+            _install()
+        _installs += 1
+    _state.active = True
+    try:
+        yield
+    finally:
+        _state.active = False
+        with _lock:
+            _installs -= 1
+            if _installs == 0:
+                _uninstall()
+
+
+def vmap(
+    fn: Callable[..., Tensors], in_dims: Union[int, Sequence[int]] = 0
+) -> Callable[..., Tensors]:
+    """Vectorizes fn, a function of single examples, over a batch axis of its inputs
+
+    fn is called once on the whole batch. It can use the ops with a batching rule,
+    the methods of Tensor listed in METHOD_RULES (indexing, +, *, @, linear, **,
+    relu, exp, log, permute, pad, reshape, expand, rolling_window, sum, mean, max,
+    and @ of CSRTensor) and the functional ops listed in FUNCTION_RULES (conv,
+    conv_transpose, pool, adaptive_pool, embedding, embedding_bag, recurrent,
+    scaled_dot_product_attention), the Tensor methods composed of them (-, /,
+    transpose, T, squeeze, unsqueeze, flatten, unfold, cat, var) and the functions
+    and Modules built on all of these. An op computing on a batched Tensor without a
+    rule raises NotImplementedError, so does assigning into one.
+
+    Args:
+        fn (Callable[..., Tensors]): function of single examples returning a Tensor
+        or a tuple of Tensors
+        in_dims (Union[int, Sequence[int]], optional): batch axis of every input, None
+        for an input shared by all examples. Defaults to 0.
+
+    Returns:
+        Callable[..., Tensors]: function of the batched inputs, the outputs have the
+        batch axis first
+    """
+
+    def batched(*args):
+        dims = in_dims if isinstance(in_dims, (tuple, list)) else (in_dims,) * len(args)
+        inputs, batched_inputs = [], []
+        for x, dim in zip(args, dims):
+            if dim is not None and isinstance(x, Tensor):
+                dim = dim % x.data.ndim
+                if dim:
+                    order = (dim,) + tuple(i for i in range(x.data.ndim) if i != dim)
+                    x = _apply(x, "permute", order)
+                batched_inputs.append(x)
+            inputs.append(x)
+        sizes = {x.data.shape[0] for x in batched_inputs}
+        assert len(sizes) == 1, "vmap needs batched inputs of one batch size"
+        B = sizes.pop()
+
+        with _batching():
+            for x in batched_inputs:
+                x._batched = True
+            try:
+                out = fn(*inputs)
+            finally:
+                for x in batched_inputs:
+                    x._batched = False
+        outputs = tuple(_with_batch(o, B) for o in _as_tuple(out))
+        for o in outputs:
+            o._batched = False
+        return outputs[0] if isinstance(out, Tensor) else outputs
+
+    return batched
+
+
+@contextmanager
+def _parameters_replaced(model: Module, replacements: Dict[int, Tensor]):
+    # swaps the registered parameters of every submodule
+    swapped = [
+        (module, name, p)
+        for module in model.modules()
+        for name, p in module.named_parameters(recurse=False)
+        if id(p) in replacements
+    ]
+    for module, name, p in swapped:
+        setattr(module, name, replacements[id(p)])
+    try:
+        yield
+    finally:
+        for module, name, p in swapped:
+            setattr(module, name, p)
+
+
+@contextmanager
+def _buffers_kept(model: Module):
+    """Restores the buffers of every submodule, raises if model updated any of them"""
+    saved = [
+        (module, name, b, b.data.copy())
+        for module in model.modules()
+        for name, b in module.named_buffers(recurse=False)
+    ]
+    try:
+        yield
+    finally:
+        changed = []
+        for module, name, b, data in saved:
+            if getattr(module, name) is not b or not np.array_equal(b.data, data):
+                changed.append(name)
+                b.data = data
+                setattr(module, name, b)
+    if changed:
+        raise NotImplementedError(
+            f"per_sample_grad cannot run modules that update their buffers "
+            f"({', '.join(changed)}), e.g. BatchNorm in train mode"
+        )
+
+
+def per_sample_grad(
+    model: Module, loss_fn: Callable[..., Tensor], batch: Tensors
+) -> List[np.ndarray]:
+    """Gradient of the loss of every example with respect to every parameter of model
+
+    One forward and one backward pass over the whole batch instead of one per
+    example: under vmap every parameter is replaced by a copy broadcast over the
+    examples, so each example has its own weights and their gradients are not summed.
+    Linear layers become a batched matmul, convolutions a grouped conv with one group
+    per example.
+
+    Args:
+        model (Module): the parameters are restored on return, .grad is not touched.
+        Modules that update their buffers, e.g. BatchNorm in train mode, are refused
+        loss_fn (Callable[..., Tensor]): loss_fn(model(x), *targets) -> scalar, called
+        with a batch of a single example
+        batch (Tensors): x or (x, *targets) with the examples along the first axis
+
+    Returns:
+        List[np.ndarray]: (B, *param.shape) gradients in the order of model.parameters()
+    """
+    batch = _as_tuple(batch)
+    params = list(model.parameters())
+    B = batch[0].data.shape[0]
+    weights = [
+        Tensor(np.broadcast_to(p.data, (B,) + p.data.shape), True) for p in params
+    ]
+
+    def loss(*args):
+        examples = [x.unsqueeze(0) for x in args[: len(batch)]]
+        replacements = {id(p): w for p, w in zip(params, args[len(batch) :])}
+        with _parameters_replaced(model, replacements):
+            return loss_fn(model(examples[0]), *examples[1:])
+
+    with _buffers_kept(model):
+        vmap(loss)(*batch, *weights).sum().backward()
+    return [w.grad for w in weights]
@@ -0,0 +1,176 @@
+"""Pool of reusable numpy buffers
+
+Every training step allocates the same large arrays (gradients, im2col columns,
+backward temporaries) and frees them again. For arrays above the mmap threshold of
+the allocator every allocation maps fresh pages and faults them in. A BufferPool
+keeps the freed buffers and hands them out again.
+
+    pool = BufferPool()
+    for x, y in data:
+        with pool.arena():
+            loss(model(x), y).backward()
+            optim.step()
+
+Buffers are handed out as views of pooled flat buffers. They go back to the pool
+when the array is garbage collected (its graph node was released), when release()
+is called on it, or when the arena they were acquired in exits. Views of a pooled
+array must not outlive it.
+"""
+
+from __future__ import annotations
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List
+import weakref
+import numpy as np
+
+_pool: BufferPool = None
+
+
+class _Lease:
+    __slots__ = ("id", "key", "base", "ref", "active")
+
+
+class BufferPool:
+    def __init__(self, max_bytes: int = 1 << 30, min_bytes: int = 1 << 16) -> None:
+        """
+        Args:
+            max_bytes (int, optional): cap on the bytes of free buffers kept, the least
+            recently released ones are evicted above it. Defaults to 1 GiB.
+            min_bytes (int, optional): smaller arrays are not pooled, the allocator
+            serves them cheaply. Defaults to 64 KiB.
+        """
+        self.max_bytes = max_bytes
+        self.min_bytes = min_bytes
+        # free buffers per size bucket and the global release order for LRU eviction
+        self.free: Dict[int, List[np.ndarray]] = {}
+        self.lru: OrderedDict = OrderedDict()
+        self.leases: Dict[int, _Lease] = {}
+        self.arenas: List[List[_Lease]] = []
+        self.hits = self.misses = self.evictions = 0
+        self.bytes_held = self.bytes_in_use = 0
+
+    @staticmethod
+    def bucket(nbytes: int) -> int:
+        # power of two size classes, a buffer serves any request in its class
+        return 1 << max(int(nbytes - 1).bit_length(), 0)
+
+    def acquire(self, shape: tuple, dtype=np.float64, zero: bool = False) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        shape = tuple(shape)
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        if nbytes < self.min_bytes:
+            return np.zeros(shape, dtype) if zero else np.empty(shape, dtype)
+        key = self.bucket(nbytes)
+        if self.free.get(key):
+            base = self.free[key].pop()
+            del self.lru[id(base)]
+            self.bytes_held -= key
+            self.hits += 1
+        else:
+            base = np.empty(key, np.uint8)
+            self.misses += 1
+        array = base[:nbytes].view(dtype).reshape(shape)
+        if zero:
+            array.fill(0)
+        lease = _Lease()
+        lease.id, lease.key, lease.base, lease.active = id(array), key, base, True
+        lease.ref = weakref.ref(array, lambda _, lease=lease: self._return(lease))
+        self.leases[lease.id] = lease
+        self.bytes_in_use += key
+        if self.arenas:
+            self.arenas[-1].append(lease)
+        return array
+
+    def release(self, array: np.ndarray) -> None:
+        """Returns a buffer to the pool before it is garbage collected"""
+        lease = self.leases.get(id(array))
+        if lease is not None and lease.ref() is array:
+            self._return(lease)
+
+    def _return(self, lease: _Lease) -> None:
+        if not lease.active:
+            return
+        lease.active = False
+        if self.leases.get(lease.id) is lease:
+            del self.leases[lease.id]
+        self.bytes_in_use -= lease.key
+        self.free.setdefault(lease.key, []).append(lease.base)
+        self.lru[id(lease.base)] = lease.key
+        self.bytes_held += lease.key
+        lease.base = None
+        while self.bytes_held > self.max_bytes:
+            base_id, key = self.lru.popitem(last=False)
+            bucket = self.free[key]
+            bucket.pop(next(i for i, b in enumerate(bucket) if id(b) == base_id))
+            self.bytes_held -= key
+            self.evictions += 1
+
+    @contextmanager
+    def arena(self):
+        """Per step arena: everything acquired inside is returned when it exits
+
+        The pool is active inside the arena. Arrays acquired in it, e.g. the
+        gradients of intermediate Tensors, must not be used after it exits.
+        """
+        self.arenas.append([])
+        with use_pool(self):
+            try:
+                yield self
+            finally:
+                for lease in self.arenas.pop():
+                    self._return(lease)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes_held": self.bytes_held,
+            "bytes_in_use": self.bytes_in_use,
+        }
+
+    def clear(self) -> None:
+        self.free.clear()
+        self.lru.clear()
+        self.bytes_held = 0
+
+
+def get_pool() -> BufferPool:
+    return _pool
+
+
+def set_pool(pool: BufferPool) -> None:
+    global _pool
+    _pool = pool
+
+
+@contextmanager
+def use_pool(pool: BufferPool):
+    previous = get_pool()
+    set_pool(pool)
+    try:
+        yield pool
+    finally:
+        set_pool(previous)
+
+
+def empty(shape: tuple, dtype=np.float64) -> np.ndarray:
+    return _pool.acquire(shape, dtype) if _pool is not None else np.empty(shape, dtype)
+
+
+def zeros(shape: tuple, dtype=np.float64) -> np.ndarray:
+    if _pool is not None:
+        return _pool.acquire(shape, dtype, zero=True)
+    return np.zeros(shape, dtype)
+
+
+def zeros_like(x: np.ndarray) -> np.ndarray:
+    if _pool is not None:
+        return _pool.acquire(np.shape(x), np.result_type(x), zero=True)
+    return np.zeros_like(x)
+
+
+def release(array: np.ndarray) -> None:
+    if _pool is not None and array is not None:
+        _pool.release(array)
@@ -3,3 +3,7 @@ from .module import *
 from .normalization import *
 from .convolution import *
 from .pooling import *
+from .embedding import *
+from .recurrent import *
+from .transformer import *
+from .fusion import *
@@ -1,6 +1,8 @@
 from .module import Module
 from ..autodiff import *
-from .helper import compute_out_dims_for_pooling_ops
+from ..backend import get_backend
+from .functional import ConvPlan, conv, conv_transpose
+from .helper import PlanCache
 
 
 class Conv(Module):
@@ -12,52 +14,55 @@ class Conv(Module):
         stride: tuple[int],
         padding: tuple[tuple],
         bias: bool = True,
+        dilation: tuple[int] = 1,
+        groups: int = 1,
     ) -> None:
         super().__init__()
+        assert in_channels % groups == 0, "in_channels must be divisible by groups"
+        assert out_channels % groups == 0, "out_channels must be divisible by groups"
+        if isinstance(dilation, int):
+            dilation = (dilation,) * len(kernel_size)
         self.in_channels = in_channels
         self.out_channels = out_channels
         self.kernel_size = kernel_size
         self.stride = stride
         self.padding = padding
+        self.dilation = dilation
+        self.groups = groups
         self.bias = bias
-        self.weight = Tensor.random((out_channels, in_channels, *kernel_size))
-        self.params.append(self.weight)
+        # set by fuse_modules when a ReLU follows
+        self.fused_relu = False
+        self.weight = Tensor.random((out_channels, in_channels // groups, *kernel_size))
         if bias:
             self.b = Tensor.random((out_channels,))
-            self.params.append(self.b)
+        # execution plan per input shape, see ConvPlan
+        self.plans = PlanCache()
 
     def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
         # NOTE this is a general implementation and works for 1d,2d,3d
-        padded_x = (
-            x.pad(((0, 0), (0, 0), *self.padding))
-            if any(pad > 0 for tup in self.padding for pad in tup)
-            else x
+        backend = get_backend()
+        plan = self.plans.get(
+            (x.shape, self.weight.shape, backend.name),
+            lambda: ConvPlan(
+                x.shape,
+                self.weight.shape,
+                self.stride[2:],
+                self.padding,
+                self.dilation,
+                self.groups,
+                backend,
+            ),
         )
-        input_shape = tuple(x.shape[-i] for i in reversed(range(1, len(x.shape) - 1)))
-        out_dim = compute_out_dims_for_pooling_ops(
-            *input_shape,
-            padding=self.padding,
-            kernel_size=self.kernel_size,
-            stride=self.stride
-        )
-        window = padded_x.rolling_window(
-            (padded_x.shape[0], padded_x.shape[1], *self.kernel_size), self.stride
-        )
-        out = (
-            window.reshape(
-                out_dim
-                + (padded_x.shape[0], padded_x.shape[1] * np.prod(self.kernel_size))
-            )
-            @ self.weight.flatten(1).T
-        )
-        out_order = tuple(i for i in range(len(out.shape) - 2, len(out.shape))) + tuple(
-            i for i in range(len(out.shape) - 2)
-        )
-        out = out.permute((out_order))
-        return (
-            out + self.b.reshape((-1,) + tuple(1 for i in range(len(out.shape) - 2)))
-            if self.bias
-            else out
+        return conv(
+            x,
+            self.weight,
+            self.b if self.bias else None,
+            self.stride[2:],
+            self.padding,
+            self.dilation,
+            self.groups,
+            self.fused_relu,
+            plan,
         )
 
 
@@ -71,6 +76,8 @@ class Conv1d(Conv):
         stride: tuple[int] = (1, 1, 1),
         padding: tuple[tuple] = ((0, 0),),
         bias: bool = True,
+        dilation: tuple[int] = 1,
+        groups: int = 1,
     ) -> None:
         if isinstance(stride, int):
             stride = (stride,)
@@ -80,7 +87,16 @@ class Conv1d(Conv):
             kernel_size = (kernel_size,)
         if isinstance(padding, int):
             padding = ((padding, padding),)
-        super().__init__(in_channels, out_channels, kernel_size, stride, padding, bias)
+        super().__init__(
+            in_channels,
+            out_channels,
+            kernel_size,
+            stride,
+            padding,
+            bias,
+            dilation,
+            groups,
+        )
 
 
 class Conv2d(Conv):
@@ -92,12 +108,23 @@ class Conv2d(Conv):
         stride: tuple[int] = (1, 1, 1, 1),
         padding: tuple[tuple] = ((0, 0), (0, 0)),
         bias: bool = True,
+        dilation: tuple[int] = 1,
+        groups: int = 1,
     ) -> None:
         if isinstance(stride, int):
             stride = (stride,) * 2
         if len(stride) != 4:
             stride = (1, 1) + stride
-        super().__init__(in_channels, out_channels, kernel_size, stride, padding, bias)
+        super().__init__(
+            in_channels,
+            out_channels,
+            kernel_size,
+            stride,
+            padding,
+            bias,
+            dilation,
+            groups,
+        )
 
 
 class Conv3d(Conv):
@@ -109,9 +136,161 @@ class Conv3d(Conv):
         stride: tuple[int] = (1, 1, 1, 1, 1),
         padding: tuple[tuple] = ((0, 0), (0, 0), (0, 0)),
         bias: bool = True,
+        dilation: tuple[int] = 1,
+        groups: int = 1,
     ) -> None:
         if isinstance(stride, int):
             stride = (stride,) * 3
         if len(stride) != 5:
             stride = (1, 1) + stride
-        super().__init__(in_channels, out_channels, kernel_size, stride, padding, bias)
+        super().__init__(
+            in_channels,
+            out_channels,
+            kernel_size,
+            stride,
+            padding,
+            bias,
+            dilation,
+            groups,
+        )
+
+
+class ConvTranspose(Module):
+    def __init__(
+        self,
+        in_channels: int,
+        out_channels: int,
+        kernel_size: tuple[int],
+        stride: tuple[int] = 1,
+        padding: tuple[tuple] = 0,
+        output_padding: tuple[int] = 0,
+        groups: int = 1,
+        bias: bool = True,
+        dilation: tuple[int] = 1,
+    ) -> None:
+        super().__init__()
+        assert in_channels % groups == 0, "in_channels must be divisible by groups"
+        assert out_channels % groups == 0, "out_channels must be divisible by groups"
+        n = len(kernel_size)
+        if isinstance(stride, int):
+            stride = (stride,) * n
+        if len(stride) != n + 2:
+            stride = (1, 1) + stride
+        if isinstance(padding, int):
+            padding = ((padding, padding),) * n
+        if isinstance(output_padding, int):
+            output_padding = (output_padding,) * n
+        if isinstance(dilation, int):
+            dilation = (dilation,) * n
+        assert all(
+            op < max(st, d) for op, st, d in zip(output_padding, stride[2:], dilation)
+        ), "output_padding must be smaller than either stride or dilation"
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        self.kernel_size = kernel_size
+        self.stride = stride
+        self.padding = padding
+        self.output_padding = output_padding
+        self.groups = groups
+        self.dilation = dilation
+        self.bias = bias
+        self.weight = Tensor.random((in_channels, out_channels // groups, *kernel_size))
+        if bias:
+            self.b = Tensor.random((out_channels,))
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        return conv_transpose(
+            x,
+            self.weight,
+            self.b if self.bias else None,
+            self.stride[2:],
+            self.padding,
+            self.output_padding,
+            self.groups,
+            self.dilation,
+        )
+
+
+# NOTE: like Conv1d, Conv2d, Conv3d these only expand int arguments for ConvTranspose
+class ConvTranspose1d(ConvTranspose):
+    def __init__(
+        self,
+        in_channels: int,
+        out_channels: int,
+        kernel_size: tuple[int],
+        stride: tuple[int] = 1,
+        padding: tuple[tuple] = 0,
+        output_padding: tuple[int] = 0,
+        groups: int = 1,
+        bias: bool = True,
+        dilation: tuple[int] = 1,
+    ) -> None:
+        if isinstance(kernel_size, int):
+            kernel_size = (kernel_size,)
+        super().__init__(
+            in_channels,
+            out_channels,
+            kernel_size,
+            stride,
+            padding,
+            output_padding,
+            groups,
+            bias,
+            dilation,
+        )
+
+
+class ConvTranspose2d(ConvTranspose):
+    def __init__(
+        self,
+        in_channels: int,
+        out_channels: int,
+        kernel_size: tuple[int],
+        stride: tuple[int] = 1,
+        padding: tuple[tuple] = 0,
+        output_padding: tuple[int] = 0,
+        groups: int = 1,
+        bias: bool = True,
+        dilation: tuple[int] = 1,
+    ) -> None:
+        if isinstance(kernel_size, int):
+            kernel_size = (kernel_size,) * 2
+        super().__init__(
+            in_channels,
+            out_channels,
+            kernel_size,
+            stride,
+            padding,
+            output_padding,
+            groups,
+            bias,
+            dilation,
+        )
+
+
+class ConvTranspose3d(ConvTranspose):
+    def __init__(
+        self,
+        in_channels: int,
+        out_channels: int,
+        kernel_size: tuple[int],
+        stride: tuple[int] = 1,
+        padding: tuple[tuple] = 0,
+        output_padding: tuple[int] = 0,
+        groups: int = 1,
+        bias: bool = True,
+        dilation: tuple[int] = 1,
+    ) -> None:
+        if isinstance(kernel_size, int):
+            kernel_size = (kernel_size,) * 3
+        super().__init__(
+            in_channels,
+            out_channels,
+            kernel_size,
+            stride,
+            padding,
+            output_padding,
+            groups,
+            bias,
+            dilation,
+        )
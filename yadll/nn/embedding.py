@@ -0,0 +1,49 @@
+from ..autodiff import *
+from .module import Module
+from .functional import embedding, embedding_bag
+
+
+class Embedding(Module):
+    def __init__(
+        self,
+        num_embeddings: int,
+        embedding_dim: int,
+        padding_idx: int = None,
+        sparse: bool = False,
+    ) -> None:
+        super().__init__()
+        self.num_embeddings = num_embeddings
+        self.embedding_dim = embedding_dim
+        self.padding_idx = padding_idx
+        self.sparse = sparse
+        self.weight = Tensor.random((num_embeddings, embedding_dim), name="weight")
+        if padding_idx is not None:
+            self.weight.data[padding_idx] = 0
+        if sparse:
+            # no dense (num_embeddings, embedding_dim) gradient, backward stores the
+            # touched rows
+            self.weight.grad = None
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        return embedding(x, self.weight, self.padding_idx)
+
+
+class EmbeddingBag(Module):
+    def __init__(
+        self,
+        num_embeddings: int,
+        embedding_dim: int,
+        mode: str = "mean",
+        sparse: bool = False,
+    ) -> None:
+        super().__init__()
+        self.num_embeddings = num_embeddings
+        self.embedding_dim = embedding_dim
+        self.mode = mode
+        self.sparse = sparse
+        self.weight = Tensor.random((num_embeddings, embedding_dim), name="weight")
+        if sparse:
+            self.weight.grad = None
+
+    def forward(self, x: Tensor, offsets: Tensor = None, *args, **kwargs) -> Tensor:
+        return embedding_bag(x, self.weight, offsets, self.mode)
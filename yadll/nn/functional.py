@@ -1 +1,1394 @@
 from ..autodiff import *
+from ..autodiff import _has_tangent
+from ..sparse import SparseTensor
+from .. import memory
+from ..backend import Backend, get_backend
+from typing import Callable, Tuple, Union
+import functools
+
+# set by yadll.vmap while it runs: (name, op, args, kwargs) -> output
+_batching_rule: Callable = None
+
+
+def _batchable(op: Callable) -> Callable:
+    """Lets yadll.vmap dispatch op to its batching rule, however op was imported"""
+
+    @functools.wraps(op)
+    def dispatch(*args, **kwargs):
+        if _batching_rule is None:
+            return op(*args, **kwargs)
+        return _batching_rule(op.__name__, op, args, kwargs)
+
+    return dispatch
+
+
+def window_view(
+    x: np.ndarray, kernel_size: tuple, stride: tuple, dilation: tuple
+) -> np.ndarray:
+    """Read-only strided view of x (N, C, *spatial) shaped (N, C, *out, *kernel_size).
+
+    Nothing is copied, window i along a spatial dim starts at i * stride and its
+    elements are dilation apart.
+    """
+    n = len(kernel_size)
+    out = tuple(
+        (s - d * (k - 1) - 1) // st + 1
+        for s, k, st, d in zip(x.shape[2:], kernel_size, stride, dilation)
+    )
+    strides = (
+        x.strides[:2]
+        + tuple(x.strides[2 + i] * stride[i] for i in range(n))
+        + tuple(x.strides[2 + i] * dilation[i] for i in range(n))
+    )
+    return np.lib.stride_tricks.as_strided(
+        x, x.shape[:2] + out + tuple(kernel_size), strides, writeable=False
+    )
+
+
+def col2im(cols: np.ndarray, shape: tuple, stride: tuple, dilation: tuple):
+    """Adjoint of window_view: overlap-adds cols (N, C, *out, *k) into `shape`."""
+    return get_backend().col2im(cols, memory.zeros(shape, cols.dtype), stride, dilation)
+
+
+def _unpad(x: np.ndarray, padding: tuple[tuple]) -> np.ndarray:
+    return x[
+        (slice(None), slice(None))
+        + tuple(slice(p[0], s - p[1]) for p, s in zip(padding, x.shape[2:]))
+    ]
+
+
+def _pad(x: np.ndarray, padding: tuple[tuple], value: float = 0) -> np.ndarray:
+    if not any(p > 0 for pad in padding for p in pad):
+        return x
+    shape = x.shape[:2] + tuple(s + p[0] + p[1] for s, p in zip(x.shape[2:], padding))
+    if value == 0:
+        out = memory.zeros(shape, x.dtype)
+    else:
+        out = memory.empty(shape, x.dtype)
+        out.fill(value)
+    out[
+        (slice(None), slice(None))
+        + tuple(slice(p[0], p[0] + s) for p, s in zip(padding, x.shape[2:]))
+    ] = x
+    return out
+
+
+class _WindowPlan:
+    """Shapes of the padding and of the strided window view of an (N, C, *spatial)
+    input, computed once per input shape"""
+
+    def __init__(
+        self,
+        x_shape: tuple,
+        kernel_size: tuple,
+        stride: tuple,
+        padding: tuple[tuple],
+        dilation: tuple,
+    ) -> None:
+        n = len(kernel_size)
+        self.kernel_size = tuple(kernel_size)
+        self.stride = tuple(stride)
+        self.padding = padding
+        self.dilation = tuple(dilation)
+        # None without padding, the input is then used as is
+        self.padded_shape = None
+        self.interior = (slice(None),) * (2 + n)
+        if any(p > 0 for pad in padding for p in pad):
+            self.padded_shape = x_shape[:2] + tuple(
+                s + p[0] + p[1] for s, p in zip(x_shape[2:], padding)
+            )
+            self.interior = (slice(None), slice(None)) + tuple(
+                slice(p[0], p[0] + s) for p, s in zip(padding, x_shape[2:])
+            )
+        padded_dims = (self.padded_shape or x_shape)[2:]
+        self.out_dims = tuple(
+            (s - d * (k - 1) - 1) // st + 1
+            for s, k, st, d in zip(padded_dims, kernel_size, stride, dilation)
+        )
+        self.window_shape = x_shape[:2] + self.out_dims + self.kernel_size
+        self.window_steps = self.stride + self.dilation
+
+    def pad(self, x: np.ndarray, value: float = 0) -> np.ndarray:
+        if self.padded_shape is None:
+            return x
+        shape = x.shape[:2] + self.padded_shape[2:]
+        if value == 0:
+            out = memory.zeros(shape, x.dtype)
+        else:
+            out = memory.empty(shape, x.dtype)
+            out.fill(value)
+        out[self.interior] = x
+        return out
+
+    def unpad(self, x: np.ndarray) -> np.ndarray:
+        return x if self.padded_shape is None else x[self.interior]
+
+    def windows(self, padded: np.ndarray) -> np.ndarray:
+        """window_view of the padded input, for any size of its first two dims"""
+        n = len(self.kernel_size)
+        strides = padded.strides[:2] + tuple(
+            padded.strides[2 + i % n] * step for i, step in enumerate(self.window_steps)
+        )
+        return np.lib.stride_tricks.as_strided(
+            padded, padded.shape[:2] + self.window_shape[2:], strides, writeable=False
+        )
+
+
+class ConvPlan(_WindowPlan):
+    def __init__(
+        self,
+        x_shape: tuple,
+        weight_shape: tuple,
+        stride: tuple = None,
+        padding: tuple[tuple] = None,
+        dilation: tuple = None,
+        groups: int = 1,
+        backend: Backend = None,
+    ) -> None:
+        """Everything conv derives from the shapes: the padding, the window view, the
+        kernel it runs (direct, depthwise or im2col GEMM) and the shapes and
+        permutations of its operands. The Conv layers keep one per input shape."""
+        n = len(weight_shape) - 2
+        super().__init__(
+            x_shape,
+            weight_shape[2:],
+            stride if stride else (1,) * n,
+            padding if padding else ((0, 0),) * n,
+            dilation if dilation else (1,) * n,
+        )
+        N, C = x_shape[:2]
+        C_out, C_g = weight_shape[:2]
+        assert C == C_g * groups, "in_channels must equal weight.shape[1] * groups"
+        assert C_out % groups == 0, "out_channels must be divisible by groups"
+        backend = backend if backend else get_backend()
+        out_dims, kernel_size = self.out_dims, self.kernel_size
+        self.groups = groups
+        self.sum_axes = (0,) + tuple(range(2, 2 + n))
+        self.bias_shape = (-1,) + (1,) * n
+        # with one input channel per group the GEMM is too thin to pay for the im2col
+        # copy
+        if C_g == 1 and backend.supports("conv"):
+            self.kernel = "direct"
+        elif groups == C and C_g == 1:
+            # direct strided multiply-accumulate, no im2col buffer
+            self.kernel = "depthwise"
+            m = C_out // C
+            self.depthwise_shape = (N, C, m) + out_dims
+            self.w_shape = (C, m, -1)
+            self.tap_shape = (C, m) + (1,) * n
+            # (flat kernel offset, window index, slice of the padded grad) per tap
+            self.taps = [
+                (
+                    i,
+                    (Ellipsis,) + offset,
+                    (slice(None), slice(None))
+                    + tuple(
+                        slice(o * d, o * d + (od - 1) * st + 1, st)
+                        for o, d, od, st in zip(
+                            offset, self.dilation, out_dims, self.stride
+                        )
+                    ),
+                )
+                for i, offset in enumerate(np.ndindex(*kernel_size))
+            ]
+            dims = "xyz"[:n]
+            self.grad_w_spec = f"ncm{dims},nc{dims}->cm"
+            self.grad_x_spec = f"ncm{dims},cm->nc{dims}"
+        else:
+            # im2col laid out per group, the whole conv is one batched GEMM over groups
+            self.kernel = "gemm"
+            C_og = C_out // groups
+            self.w_shape = (groups, C_og, -1)
+            self.cols_shape = (
+                groups,
+                C_g * int(np.prod(kernel_size)),
+                N * int(np.prod(out_dims)),
+            )
+            # _from_groups, _to_groups and _col2windows with the shapes precomputed
+            self.gemm_shape = (groups, C_og, N) + out_dims
+            self.gemm_order = (2, 0, 1) + tuple(range(3, 3 + n))
+            self.grad_shape = (N, groups, C_og, -1)
+            self.grad_cols_shape = (groups, -1) + kernel_size + (N,) + out_dims
+            self.grad_cols_order = (
+                (2 + n, 0, 1) + tuple(range(3 + n, 3 + 2 * n)) + tuple(range(2, 2 + n))
+            )
+            self.grad_windows_shape = (N, -1) + out_dims + kernel_size
+        self.out_shape = (N, C_out) + out_dims
+
+
+class PoolPlan(_WindowPlan):
+    def __init__(
+        self,
+        x_shape: tuple,
+        mode: str,
+        kernel_size: tuple,
+        stride: tuple = None,
+        padding: tuple[tuple] = None,
+        ceil_mode: bool = False,
+        count_include_pad: bool = True,
+        backend: Backend = None,
+    ) -> None:
+        """The padding, window view and reduction of pool. The Pool layers keep one
+        per input shape.
+
+        ceil_mode adds the padding the last, partial windows need at the end of every
+        dim, it never counts towards an average. The divisor of every average is
+        precomputed, a scalar unless padding is excluded or windows are partial.
+        """
+        assert mode in ("max", "avg"), f"mode {mode} is not supported"
+        n = len(kernel_size)
+        stride = stride if stride else tuple(kernel_size)
+        padding = padding if padding else ((0, 0),) * n
+        padded, counts = [], []
+        for s, k, st, (before, after) in zip(x_shape[2:], kernel_size, stride, padding):
+            size = s + before + after
+            out = (size - k) // st + 1
+            if ceil_mode and (size - k) % st:
+                # a partial window must start in the input or the padding before it
+                out += out * st < s + before
+            padded.append((before, after + max((out - 1) * st + k - size, 0)))
+            lo, hi = (0, size) if count_include_pad else (before, before + s)
+            starts = np.arange(out) * st
+            counts.append(np.minimum(starts + k, hi) - np.maximum(starts, lo))
+        super().__init__(x_shape, kernel_size, stride, tuple(padded), (1,) * n)
+        backend = backend if backend else get_backend()
+        self.mode = mode
+        self.direct = backend.supports("pool")
+        self.pad_value = -np.inf if mode == "max" else 0
+        self.kernel_axes = tuple(range(2 + n, 2 + 2 * n))
+        self.count = int(np.prod(self.kernel_size))
+        divisor = counts[0]
+        for c in counts[1:]:
+            divisor = np.multiply.outer(divisor, c)
+        # scale turns the average over the whole kernel (of the pool kernels) into
+        # the one over divisor elements
+        self.divisor, self.scale = self.count, None
+        if mode == "avg" and (divisor != self.count).any():
+            self.divisor = divisor.astype(np.float64)
+            self.scale = self.count / self.divisor
+        # the windows with their elements flattened, and grad broadcast to them
+        self.flat_shape = self.window_shape[: 2 + n] + (self.count,)
+        self.grad_shape = self.window_shape[: 2 + n] + (1,) * n
+
+
+class AdaptivePoolPlan:
+    def __init__(
+        self,
+        x_shape: tuple,
+        mode: str,
+        output_size: Union[int, tuple],
+        keepdim: bool = True,
+    ) -> None:
+        """The bins of adaptive_pool, like torch output bin i of a dim of size s spans
+        [floor(i * s / o), ceil((i + 1) * s / o)), neighbouring bins may overlap
+
+        Average pooling is separable: one (o, s) averaging matrix per dim. Max pooling
+        gathers the flat input index of every element of every output bin, bins
+        shorter than the longest repeat their last index. Global pooling (every
+        output size 1) reduces the input directly.
+        """
+        assert mode in ("max", "avg"), f"mode {mode} is not supported"
+        dims = x_shape[2:]
+        n = len(dims)
+        if isinstance(output_size, int) or output_size is None:
+            output_size = (output_size,) * n
+        assert len(output_size) == n, f"output_size {output_size} for {n}d input"
+        # None keeps the size of the input
+        self.out_dims = tuple(o if o else s for o, s in zip(output_size, dims))
+        self.mode = mode
+        self.spatial = tuple(range(2, 2 + n))
+        self.size = int(np.prod(dims))
+        self.flat_shape = x_shape[:2] + (self.size,)
+        self.full_shape = x_shape[:2] + self.out_dims
+        self.out_shape = self.full_shape if keepdim else x_shape[:2]
+        self.is_global = all(o == 1 for o in self.out_dims)
+        bins = [
+            [((i * s) // o, -(-(i + 1) * s // o)) for i in range(o)]
+            for s, o in zip(dims, self.out_dims)
+        ]
+        if mode == "avg":
+            self.matrices = []
+            for s, o, dim_bins in zip(dims, self.out_dims, bins):
+                matrix = np.zeros((o, s))
+                for i, (start, end) in enumerate(dim_bins):
+                    matrix[i, start:end] = 1 / (end - start)
+                self.matrices.append(matrix)
+            return
+        # the flat input index of every element of every bin: (prod(out), longest)
+        index = np.zeros((1, 1), np.int64)
+        for s, dim_bins in zip(dims, bins):
+            longest = max(end - start for start, end in dim_bins)
+            steps = np.arange(longest)
+            rows = np.array(
+                [np.minimum(start + steps, end - 1) for start, end in dim_bins]
+            )
+            index = (index[:, None, :, None] * s + rows[None, :, None, :]).reshape(
+                index.shape[0] * len(dim_bins), -1
+            )
+        self.gather = index
+        self.rows = np.arange(index.shape[0])
+
+
+def _to_groups(x: np.ndarray, groups: int) -> np.ndarray:
+    """(N, C, *dims) -> (groups, C // groups, N * prod(dims)) GEMM operand"""
+    N, C = x.shape[:2]
+    return (
+        x.reshape(N, groups, C // groups, -1)
+        .transpose(1, 2, 0, 3)
+        .reshape(groups, C // groups, -1)
+    )
+
+
+def _from_groups(x: np.ndarray, N: int, dims: tuple) -> np.ndarray:
+    """(groups, C // groups, N * prod(dims)) -> (N, C, *dims)"""
+    groups, C_g = x.shape[:2]
+    return (
+        x.reshape((groups, C_g, N) + dims)
+        .transpose((2, 0, 1) + tuple(range(3, 3 + len(dims))))
+        .reshape((N, groups * C_g) + dims)
+    )
+
+
+def _im2col(windows: np.ndarray, groups: int) -> np.ndarray:
+    """(N, C, *out, *k) windows -> (groups, C // groups * prod(k), N * prod(out))"""
+    n = (len(windows.shape) - 2) // 2
+    N, C = windows.shape[:2]
+    # the buffer is acquired in its final shape, a pooled array must own its views
+    cols = memory.empty(
+        (
+            groups,
+            C // groups * int(np.prod(windows.shape[2 + n :])),
+            N * int(np.prod(windows.shape[2 : 2 + n])),
+        ),
+        windows.dtype,
+    )
+    return get_backend().im2col(windows, groups, cols)
+
+
+def _col2windows(
+    cols: np.ndarray, N: int, out_dims: tuple, kernel_size: tuple
+) -> np.ndarray:
+    """Inverse of _im2col: (groups, C_g * prod(k), N * prod(out)) -> (N, C, *out, *k)"""
+    n = len(kernel_size)
+    groups = cols.shape[0]
+    return (
+        cols.reshape((groups, -1) + kernel_size + (N,) + out_dims)
+        .transpose(
+            (2 + n, 0, 1) + tuple(range(3 + n, 3 + 2 * n)) + tuple(range(2, 2 + n))
+        )
+        .reshape((N, -1) + out_dims + kernel_size)
+    )
+
+
+@_batchable
+def conv(
+    x: Tensor,
+    weight: Tensor,
+    bias: Tensor = None,
+    stride: tuple = None,
+    padding: tuple[tuple] = None,
+    dilation: tuple = None,
+    groups: int = 1,
+    relu: bool = False,
+    plan: ConvPlan = None,
+) -> Tensor:
+    """N-dimensional grouped and dilated convolution (cross-correlation like torch)
+
+    Args:
+        x (Tensor): (N, C_in, *spatial) input
+        weight (Tensor): (C_out, C_in // groups, *kernel_size) weight
+        bias (Tensor, optional): (C_out,) bias. Defaults to None.
+        stride (tuple, optional): stride of every spatial dim. Defaults to 1.
+        padding (tuple[tuple], optional): (before, after) zero padding of every
+        spatial dim. Defaults to 0.
+        dilation (tuple, optional): spacing between kernel elements. Defaults to 1.
+        groups (int, optional): number of blocked connections from input to output
+        channels. Defaults to 1.
+        relu (bool, optional): applies ReLU in place on the output. Defaults to False.
+        plan (ConvPlan, optional): plan of these arguments for the shape of x, built
+        when not given. Defaults to None.
+
+    Returns:
+        Tensor: (N, C_out, *out) Tensor
+    """
+    if plan is None:
+        plan = ConvPlan(x.shape, weight.shape, stride, padding, dilation, groups)
+    backend = get_backend()
+    padded = plan.pad(x.data)
+    windows = plan.windows(padded)
+    kernel = plan.kernel
+
+    if kernel == "direct":
+        out = backend.conv(padded, weight.data, plan.stride, plan.dilation, groups)
+    elif kernel == "depthwise":
+        w = weight.data.reshape(plan.w_shape)
+        out = np.zeros(plan.depthwise_shape, dtype=np.result_type(x.data, w))
+        for i, index, _ in plan.taps:
+            out += windows[index][:, :, None] * w[:, :, i].reshape(plan.tap_shape)
+        out = out.reshape(plan.out_shape)
+    else:
+        # the buffer is acquired in its final shape, a pooled array must own its views
+        cols = backend.im2col(
+            windows, groups, memory.empty(plan.cols_shape, windows.dtype)
+        )
+        w = weight.data.reshape(plan.w_shape)
+        out = (
+            (w @ cols)
+            .reshape(plan.gemm_shape)
+            .transpose(plan.gemm_order)
+            .reshape(plan.out_shape)
+        )
+    if bias is not None:
+        out += bias.data.reshape(plan.bias_shape)
+    if relu:
+        np.maximum(out, 0, out=out)
+
+    output = Tensor(
+        out,
+        requires_grad=(
+            x.requires_grad
+            or weight.requires_grad
+            or (bias is not None and bias.requires_grad)
+        ),
+        parent=(x, weight) if bias is None else (x, weight, bias),
+        op="conv",
+    )
+    if _has_tangent(x, weight, bias):
+        output.tangent = _linear_op_tangent(
+            conv,
+            x,
+            weight,
+            bias,
+            out.shape,
+            groups,
+            plan.stride,
+            plan.padding,
+            plan.dilation,
+            groups,
+        )
+        if relu:
+            output.tangent = output.tangent * (out > 0)
+
+    def _backward():
+        grad = output.grad * (out > 0) if relu else output.grad
+        if bias is not None and bias.requires_grad:
+            bias.grad += grad.sum(axis=plan.sum_axes).reshape(bias.shape)
+        if kernel == "direct":
+            grad_x, grad_w = backend.conv_backward(
+                padded, weight.data, grad, plan.stride, plan.dilation, groups
+            )
+            if weight.requires_grad:
+                weight.grad += grad_w
+            if x.requires_grad:
+                x.grad += plan.unpad(grad_x)
+            return
+        if kernel == "depthwise":
+            grad = grad.reshape(plan.depthwise_shape)
+            grad_w = np.empty_like(w)
+            grad_x = memory.zeros(padded.shape, grad.dtype)
+            for i, index, grad_index in plan.taps:
+                grad_w[:, :, i] = np.einsum(plan.grad_w_spec, grad, windows[index])
+                grad_x[grad_index] += np.einsum(plan.grad_x_spec, grad, w[:, :, i])
+            if weight.requires_grad:
+                weight.grad += grad_w.reshape(weight.shape)
+            if x.requires_grad:
+                x.grad += plan.unpad(grad_x)
+            return
+        grad = grad.reshape(plan.grad_shape).transpose(1, 2, 0, 3).reshape(plan.w_shape)
+        if weight.requires_grad:
+            weight.grad += (grad @ cols.transpose(0, 2, 1)).reshape(weight.shape)
+        if x.requires_grad:
+            grad_cols = (
+                (w.transpose(0, 2, 1) @ grad)
+                .reshape(plan.grad_cols_shape)
+                .transpose(plan.grad_cols_order)
+                .reshape(plan.grad_windows_shape)
+            )
+            grad_x = col2im(grad_cols, padded.shape, plan.stride, plan.dilation)
+            x.grad += plan.unpad(grad_x)
+
+    output._backward = _backward
+    return output
+
+
+@_batchable
+def conv_transpose(
+    x: Tensor,
+    weight: Tensor,
+    bias: Tensor = None,
+    stride: tuple = None,
+    padding: tuple[tuple] = None,
+    output_padding: tuple = None,
+    groups: int = 1,
+    dilation: tuple = None,
+) -> Tensor:
+    """N-dimensional transposed convolution, the adjoint of conv
+
+    Computed as one GEMM per group followed by a col2im overlap-add, so no work is
+    spent on the zeros a stride > 1 would otherwise stuff into the input.
+
+    Args:
+        x (Tensor): (N, C_in, *spatial) input
+        weight (Tensor): (C_in, C_out // groups, *kernel_size) weight
+        bias (Tensor, optional): (C_out,) bias. Defaults to None.
+        stride (tuple, optional): stride of every spatial dim. Defaults to 1.
+        padding (tuple[tuple], optional): (before, after) amount cropped from every
+        spatial dim of the output. Defaults to 0.
+        output_padding (tuple, optional): extra size added at the end of every
+        spatial dim of the output. Defaults to 0.
+        groups (int, optional): number of blocked connections from input to output
+        channels. Defaults to 1.
+        dilation (tuple, optional): spacing between kernel elements. Defaults to 1.
+
+    Returns:
+        Tensor: (N, C_out, *out) Tensor
+    """
+    n = len(weight.shape) - 2
+    stride = stride if stride else (1,) * n
+    padding = padding if padding else ((0, 0),) * n
+    output_padding = output_padding if output_padding else (0,) * n
+    dilation = dilation if dilation else (1,) * n
+    kernel_size = weight.shape[2:]
+    N, C = x.shape[:2]
+    assert C == weight.shape[0], "in_channels must equal weight.shape[0]"
+    assert C % groups == 0, "in_channels must be divisible by groups"
+    C_out = weight.shape[1] * groups
+    in_dims = x.shape[2:]
+    full_shape = (N, C_out) + tuple(
+        (s - 1) * st + d * (k - 1) + 1 + op
+        for s, st, d, k, op in zip(
+            in_dims, stride, dilation, kernel_size, output_padding
+        )
+    )
+    spatial = tuple(range(2, 2 + n))
+
+    w = weight.data.reshape(groups, C // groups, -1)
+    rows = _to_groups(x.data, groups)
+    cols = _col2windows(w.transpose(0, 2, 1) @ rows, N, in_dims, kernel_size)
+    out = _unpad(col2im(cols, full_shape, stride, dilation), padding)
+    if bias is not None:
+        out += bias.data.reshape((-1,) + (1,) * n)
+
+    output = Tensor(
+        out,
+        requires_grad=(
+            x.requires_grad
+            or weight.requires_grad
+            or (bias is not None and bias.requires_grad)
+        ),
+        parent=(x, weight) if bias is None else (x, weight, bias),
+        op="conv_transpose",
+    )
+    if _has_tangent(x, weight, bias):
+        output.tangent = _linear_op_tangent(
+            conv_transpose,
+            x,
+            weight,
+            bias,
+            out.shape,
+            groups,
+            stride,
+            padding,
+            output_padding,
+            groups,
+            dilation,
+        )
+
+    def _backward():
+        grad = output.grad
+        if bias is not None and bias.requires_grad:
+            bias.grad += grad.sum(axis=(0,) + spatial).reshape(bias.shape)
+        # the adjoint of col2im is the strided window view used by conv
+        windows = window_view(_pad(grad, padding), kernel_size, stride, dilation)
+        windows = windows[
+            (slice(None), slice(None)) + tuple(slice(0, s) for s in in_dims)
+        ]
+        grad_cols = _im2col(windows, groups)
+        if weight.requires_grad:
+            weight.grad += (rows @ grad_cols.transpose(0, 2, 1)).reshape(weight.shape)
+        if x.requires_grad:
+            x.grad += _from_groups(w @ grad_cols, N, in_dims)
+
+    output._backward = _backward
+    return output
+
+
+def _linear_op_tangent(
+    op, x: Tensor, weight: Tensor, bias: Tensor, shape: tuple, groups: int, *args
+) -> np.ndarray:
+    """Tangent of conv or conv_transpose, which are linear in x and in weight
+
+    All directions of x go through one op call with the directions folded into the
+    batch, all directions of weight through one call with the directions stacked as
+    extra output channels of every group.
+    """
+    N, C_out = shape[:2]
+    terms = []
+    with no_grad():
+        if x.tangent is not None:
+            K = x.tangent.shape[0]
+            tx = Tensor(x.tangent.reshape((K * N,) + x.shape[1:]))
+            terms.append(
+                op(tx, Tensor(weight.data), None, *args).data.reshape((K,) + shape)
+            )
+        if weight.tangent is not None:
+            K = weight.tangent.shape[0]
+            if op is conv:
+                # (C_out, ...) -> (groups * K * C_out // groups, ...)
+                tw = weight.tangent.reshape((K, groups, -1) + weight.shape[1:])
+                tw = tw.swapaxes(0, 1).reshape((-1,) + weight.shape[1:])
+            else:
+                # (C_in, C_out // groups, ...) -> (C_in, K * C_out // groups, ...)
+                tw = np.moveaxis(weight.tangent, 0, 1)
+                tw = tw.reshape((weight.shape[0], -1) + weight.shape[2:])
+            out = op(Tensor(x.data), Tensor(tw), None, *args).data
+            out = out.reshape((N, groups, K, C_out // groups) + shape[2:])
+            terms.append(np.moveaxis(out, 2, 0).reshape((K,) + shape))
+    if bias is not None and bias.tangent is not None:
+        terms.append(bias.tangent.reshape((-1, 1, C_out) + (1,) * (len(shape) - 2)))
+    tangent = terms[0]
+    for t in terms[1:]:
+        tangent = tangent + t
+    return np.broadcast_to(tangent, tangent.shape[:1] + shape)
+
+
+@_batchable
+def pool(
+    x: Tensor,
+    mode: str,
+    kernel_size: tuple,
+    stride: tuple = None,
+    padding: tuple[tuple] = None,
+    ceil_mode: bool = False,
+    count_include_pad: bool = True,
+    plan: PoolPlan = None,
+) -> Tensor:
+    """N-dimensional max or average pooling
+
+    The pool kernel of the backend reads the windows of the input in place and max
+    pooling keeps the index of every maximum for backward. Without one the windows
+    are a strided view of the input reduced over the kernel dims, and backward
+    overlap-adds the gradient of the windows back with col2im.
+
+    Args:
+        x (Tensor): (N, C, *spatial) input
+        mode (str): "max" or "avg", padding counts towards the average like torch
+        kernel_size (tuple): size of the windows
+        stride (tuple, optional): stride of every spatial dim. Defaults to kernel_size.
+        padding (tuple[tuple], optional): (before, after) padding of every spatial
+        dim, -inf for max and 0 for avg. Defaults to 0.
+        ceil_mode (bool, optional): rounds the output size up, the last windows of a
+        dim may then be partial. Defaults to False.
+        count_include_pad (bool, optional): padding counts towards the average.
+        Defaults to True.
+        plan (PoolPlan, optional): plan of these arguments for the shape of x, built
+        when not given. Defaults to None.
+
+    Returns:
+        Tensor: (N, C, *out) Tensor
+    """
+    if plan is None:
+        plan = PoolPlan(
+            x.shape, mode, kernel_size, stride, padding, ceil_mode, count_include_pad
+        )
+    backend = get_backend()
+    padded = plan.pad(x.data, plan.pad_value)
+    if plan.direct:
+        out, index = backend.pool(mode, padded, plan.kernel_size, plan.stride)
+        if plan.scale is not None:
+            out *= plan.scale
+    else:
+        windows = plan.windows(padded)
+        if mode == "max":
+            out = windows.max(axis=plan.kernel_axes)
+        else:
+            out = windows.sum(axis=plan.kernel_axes) / plan.divisor
+
+    def argmax() -> np.ndarray:
+        # the position of every maximum in its window, only needed by the derivatives
+        return windows.reshape(plan.flat_shape).argmax(-1)[..., None]
+
+    output = Tensor(
+        out,
+        requires_grad=True if x.requires_grad else False,
+        parent=(x,),
+        op=f"{mode}_pool",
+    )
+    if x.tangent is not None:
+        K, (N, C) = x.tangent.shape[0], x.shape[:2]
+        tangent = plan.pad(x.tangent.reshape((K * N,) + x.shape[1:]))
+        if plan.direct and mode == "max":
+            tangent = np.take_along_axis(
+                tangent.reshape(K, N, C, -1), index.reshape(1, N, C, -1), -1
+            )
+        elif plan.direct:
+            tangent = backend.pool(mode, tangent, plan.kernel_size, plan.stride)[0]
+            if plan.scale is not None:
+                tangent *= plan.scale
+        elif mode == "max":
+            tangent = plan.windows(tangent).reshape((K,) + plan.flat_shape)
+            tangent = np.take_along_axis(tangent, argmax()[None], -1)
+        else:
+            tangent = plan.windows(tangent).sum(axis=plan.kernel_axes) / plan.divisor
+        output.tangent = tangent.reshape((K,) + out.shape)
+
+    def _backward():
+        if plan.direct:
+            grad = output.grad if plan.scale is None else output.grad * plan.scale
+            grad = backend.pool_backward(
+                mode, grad, index, padded.shape, plan.kernel_size, plan.stride
+            )
+        else:
+            if mode == "max":
+                cols = np.zeros(plan.flat_shape, output.grad.dtype)
+                np.put_along_axis(cols, argmax(), output.grad[..., None], -1)
+                cols = cols.reshape(plan.window_shape)
+            else:
+                cols = np.broadcast_to(
+                    (output.grad / plan.divisor).reshape(plan.grad_shape),
+                    plan.window_shape,
+                )
+            grad = col2im(cols, padded.shape, plan.stride, plan.dilation)
+        x.grad += plan.unpad(grad)
+
+    output._backward = _backward
+    return output
+
+
+def _adaptive_avg(x: np.ndarray, matrices: list) -> np.ndarray:
+    # one (o, s) averaging matrix per spatial dim, applied along it
+    for axis, matrix in enumerate(matrices, 2):
+        x = np.moveaxis(np.moveaxis(x, axis, -1) @ matrix.T, -1, axis)
+    return x
+
+
+@_batchable
+def adaptive_pool(
+    x: Tensor,
+    mode: str,
+    output_size: Union[int, tuple],
+    keepdim: bool = True,
+    plan: AdaptivePoolPlan = None,
+) -> Tensor:
+    """N-dimensional adaptive max or average pooling to a fixed output size
+
+    One op on the bins of the plan, global pooling (output_size 1) reduces every
+    channel directly. Backward of max scatters the gradient to the index of every
+    maximum with a single bincount, backward of avg applies the transposed
+    averaging matrices.
+
+    Args:
+        x (Tensor): (N, C, *spatial) input
+        mode (str): "max" or "avg"
+        output_size (Union[int, tuple]): size of every spatial dim of the output, None
+        keeps the size of the input
+        keepdim (bool, optional): without it the output of global pooling is (N, C).
+        Defaults to True.
+        plan (AdaptivePoolPlan, optional): plan of these arguments for the shape of
+        x, built when not given. Defaults to None.
+
+    Returns:
+        Tensor: (N, C, *output_size) Tensor
+    """
+    if plan is None:
+        plan = AdaptivePoolPlan(x.shape, mode, output_size, keepdim)
+    assert keepdim or plan.is_global, "keepdim=False needs an output_size of 1"
+    derivatives = x.requires_grad or x.tangent is not None
+    index = None
+    if mode == "avg":
+        if plan.is_global:
+            out = x.data.mean(axis=plan.spatial, keepdims=True)
+        else:
+            out = _adaptive_avg(x.data, plan.matrices)
+    else:
+        flat = x.data.reshape(plan.flat_shape)
+        windows = flat[:, :, None, :] if plan.is_global else flat[:, :, plan.gather]
+        if derivatives:
+            position = windows.argmax(-1)
+            out = np.take_along_axis(windows, position[..., None], -1)
+            # the flat spatial index of every maximum
+            index = position if plan.is_global else plan.gather[plan.rows, position]
+        else:
+            out = windows.max(-1)
+    output = Tensor(
+        out.reshape(plan.out_shape),
+        requires_grad=True if x.requires_grad else False,
+        parent=(x,),
+        op=f"adaptive_{mode}_pool",
+    )
+    if x.tangent is not None:
+        K = x.tangent.shape[0]
+        if mode == "max":
+            tangent = np.take_along_axis(
+                x.tangent.reshape((K,) + plan.flat_shape), index[None], -1
+            )
+        elif plan.is_global:
+            tangent = x.tangent.mean(axis=tuple(d + 1 for d in plan.spatial))
+        else:
+            tangent = _adaptive_avg(
+                x.tangent.reshape((-1,) + x.shape[1:]), plan.matrices
+            )
+        output.tangent = tangent.reshape((K,) + plan.out_shape)
+
+    def _backward():
+        grad = output.grad.reshape(plan.full_shape)
+        if mode == "max":
+            N, C, size = plan.flat_shape
+            offsets = np.arange(N * C).reshape(N, C, 1) * size
+            grad_x = np.bincount(
+                (index.reshape(N, C, -1) + offsets).ravel(),
+                grad.ravel(),
+                N * C * size,
+            )
+            x.grad += grad_x.reshape(x.shape)
+        elif plan.is_global:
+            x.grad += grad / plan.size
+        else:
+            x.grad += _adaptive_avg(grad, [m.T for m in plan.matrices])
+
+    output._backward = _backward
+    return output
+
+
+def _accumulate_rows(weight: Tensor, rows: np.ndarray, values: np.ndarray):
+    # a weight without a dense grad buffer gets a row-sparse (COO) gradient
+    if weight.grad is None or isinstance(weight.grad, SparseTensor):
+        grad = SparseTensor(rows.reshape(1, -1), values, weight.shape)
+        weight.grad = grad if weight.grad is None else weight.grad + grad
+    else:
+        get_backend().scatter_add(weight.grad, rows, values)
+
+
+@_batchable
+def embedding(input: Tensor, weight: Tensor, padding_idx: int = None) -> Tensor:
+    """Looks up rows of weight
+
+    The gradient of weight is row-sparse when weight.grad is None or already a
+    SparseTensor, only the rows that were looked up are stored.
+
+    Args:
+        input (Tensor): integer indices of any shape
+        weight (Tensor): (num_embeddings, embedding_dim) weight
+        padding_idx (int, optional): index whose row does not receive gradient.
+        Defaults to None.
+
+    Returns:
+        Tensor: (*input.shape, embedding_dim) Tensor
+    """
+    indices = input.data if isinstance(input, Tensor) else np.asarray(input)
+    output = Tensor(
+        weight.data[indices],
+        requires_grad=True if weight.requires_grad else False,
+        parent=(weight,),
+        op="embedding",
+    )
+    if weight.tangent is not None:
+        output.tangent = weight.tangent[:, indices]
+
+    def _backward():
+        rows = indices.reshape(-1)
+        values = output.grad.reshape(-1, weight.shape[1])
+        if padding_idx is not None:
+            keep = rows != padding_idx
+            rows, values = rows[keep], values[keep]
+        _accumulate_rows(weight, rows, values)
+
+    output._backward = _backward
+    return output
+
+
+@_batchable
+def embedding_bag(
+    input: Tensor,
+    weight: Tensor,
+    offsets: Tensor = None,
+    mode: str = "mean",
+) -> Tensor:
+    """Sums or averages bags of embeddings as a single op
+
+    The looked up rows are gathered into one temporary that is reduced per bag, the
+    graph only keeps the (B, embedding_dim) output and the indices.
+
+    Args:
+        input (Tensor): (B, L) indices for B bags of size L, or 1d indices with offsets
+        weight (Tensor): (num_embeddings, embedding_dim) weight
+        offsets (Tensor, optional): start of every bag in a 1d input. Defaults to None.
+        mode (str, optional): "sum" or "mean". Defaults to "mean".
+
+    Returns:
+        Tensor: (B, embedding_dim) Tensor
+    """
+    assert mode in ("sum", "mean"), f"mode {mode} is not supported"
+    indices = input.data if isinstance(input, Tensor) else np.asarray(input)
+    if indices.ndim == 2:
+        offsets = np.arange(0, indices.size, indices.shape[1])
+        indices = indices.reshape(-1)
+    else:
+        offsets = offsets.data if isinstance(offsets, Tensor) else np.asarray(offsets)
+    counts = np.diff(np.append(offsets, len(indices)))
+    nonempty = counts > 0
+    out = np.zeros((len(offsets), weight.shape[1]), dtype=weight.data.dtype)
+    if len(indices):
+        out[nonempty] = np.add.reduceat(weight.data[indices], offsets[nonempty])
+    scale = 1.0 / np.maximum(counts, 1) if mode == "mean" else None
+    if scale is not None:
+        out *= scale[:, None]
+    output = Tensor(
+        out,
+        requires_grad=True if weight.requires_grad else False,
+        parent=(weight,),
+        op="embedding_bag",
+    )
+    if weight.tangent is not None:
+        tangent = np.zeros(weight.tangent.shape[:1] + out.shape)
+        if len(indices):
+            tangent[:, nonempty] = np.add.reduceat(
+                weight.tangent[:, indices], offsets[nonempty], axis=1
+            )
+        output.tangent = tangent if scale is None else tangent * scale[:, None]
+
+    def _backward():
+        grad = output.grad if scale is None else output.grad * scale[:, None]
+        _accumulate_rows(weight, indices, np.repeat(grad, counts, axis=0))
+
+    output._backward = _backward
+    return output
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+@_batchable
+def recurrent(
+    x: Tensor,
+    h0: Tensor,
+    c0: Tensor,
+    weight_ih: Tensor,
+    weight_hh: Tensor,
+    bias_ih: Tensor = None,
+    bias_hh: Tensor = None,
+    mode: str = "LSTM",
+    reverse: bool = False,
+) -> Tuple[Tensor, Tensor]:
+    """One layer and one direction of an RNN_TANH, RNN_RELU, GRU or LSTM as a single op
+
+    The input projections of the whole sequence are one GEMM and every step does one
+    GEMM against weight_hh. Backward through time only keeps the per-step gate
+    activations, the gradients of the weights are one GEMM each at the end.
+
+    Args:
+        x (Tensor): (T, N, input_size) input
+        h0 (Tensor): (N, hidden_size) initial hidden state, zeros if None
+        c0 (Tensor): (N, hidden_size) initial cell state of an LSTM, zeros if None
+        weight_ih (Tensor): (gates * hidden_size, input_size) weight, torch gate order
+        weight_hh (Tensor): (gates * hidden_size, hidden_size) weight
+        bias_ih (Tensor, optional): (gates * hidden_size,) bias. Defaults to None.
+        bias_hh (Tensor, optional): (gates * hidden_size,) bias. Defaults to None.
+        mode (str, optional): "RNN_TANH", "RNN_RELU", "GRU" or "LSTM".
+        Defaults to "LSTM".
+        reverse (bool, optional): process the sequence from the end. Defaults to False.
+
+    Returns:
+        Tuple[Tensor, Tensor]: (T, N, hidden_size) hidden states and the
+        (N, hidden_size) last cell state, which is None if mode is not LSTM
+    """
+    T, N, _ = x.shape
+    H = weight_hh.shape[1]
+    xs = x.data[::-1] if reverse else x.data
+    h = h0.data if h0 is not None else np.zeros((N, H))
+    c = c0.data if c0 is not None else np.zeros((N, H))
+    w_hh = weight_hh.data.T
+    b_hh = bias_hh.data if bias_hh is not None else 0.0
+    projections = xs @ weight_ih.data.T
+    if bias_ih is not None:
+        projections += bias_ih.data
+
+    hs = np.empty((T + 1, N, H))
+    hs[0] = h
+    if mode == "LSTM":
+        gates, cs = np.empty((T, N, 4 * H)), np.empty((T + 1, N, H))
+        cs[0] = c
+    elif mode == "GRU":
+        gates, hidden_n = np.empty((T, N, 3 * H)), np.empty((T, N, H))
+    for t in range(T):
+        hidden = hs[t] @ w_hh + b_hh
+        if mode == "GRU":
+            # the candidate gate sees r * (W_hn h + b_hn), so the GEMMs can't be summed
+            rz = _sigmoid(projections[t, :, : 2 * H] + hidden[:, : 2 * H])
+            r, z = rz[:, :H], rz[:, H:]
+            n = np.tanh(projections[t, :, 2 * H :] + r * hidden[:, 2 * H :])
+            hs[t + 1] = (1 - z) * n + z * hs[t]
+            gates[t, :, : 2 * H], gates[t, :, 2 * H :] = rz, n
+            hidden_n[t] = hidden[:, 2 * H :]
+            continue
+        a = projections[t] + hidden
+        if mode == "LSTM":
+            a[:, : 2 * H] = _sigmoid(a[:, : 2 * H])
+            a[:, 2 * H : 3 * H] = np.tanh(a[:, 2 * H : 3 * H])
+            a[:, 3 * H :] = _sigmoid(a[:, 3 * H :])
+            i, f, g, o = np.split(a, 4, axis=1)
+            cs[t + 1] = f * cs[t] + i * g
+            hs[t + 1] = o * np.tanh(cs[t + 1])
+            gates[t] = a
+        elif mode == "RNN_TANH":
+            hs[t + 1] = np.tanh(a)
+        else:
+            hs[t + 1] = np.maximum(a, 0)
+
+    parents = tuple(
+        t for t in (x, h0, c0, weight_ih, weight_hh, bias_ih, bias_hh) if t is not None
+    )
+    output = Tensor(
+        hs[:0:-1] if reverse else hs[1:],
+        requires_grad=True if any(t.requires_grad for t in parents) else False,
+        parent=parents,
+        op=mode.lower(),
+    )
+    # c_n only orders itself after output in the graph, output's backward reads its grad
+    c_n = (
+        Tensor(cs[-1], output.requires_grad, (output,), "cell_state")
+        if mode == "LSTM"
+        else None
+    )
+    if _has_tangent(*parents):
+        tangent_h, tangent_c = _recurrent_tangent(
+            x,
+            h0,
+            c0,
+            weight_ih,
+            weight_hh,
+            bias_ih,
+            bias_hh,
+            mode,
+            reverse,
+            xs,
+            hs,
+            gates if mode in ("LSTM", "GRU") else None,
+            cs if mode == "LSTM" else None,
+            hidden_n if mode == "GRU" else None,
+        )
+        output.tangent = tangent_h
+        if c_n is not None:
+            c_n.tangent = tangent_c
+
+    def _backward():
+        grad_hs = output.grad[::-1] if reverse else output.grad
+        grad_h = np.zeros((N, H))
+        grad_c = c_n.grad.copy() if c_n is not None else None
+        grad_a = np.empty_like(projections)
+        grad_hidden = grad_a if mode != "GRU" else np.empty_like(projections)
+        for t in reversed(range(T)):
+            dh = grad_hs[t] + grad_h
+            if mode == "LSTM":
+                i, f, g, o = np.split(gates[t], 4, axis=1)
+                tanh_c = np.tanh(cs[t + 1])
+                grad_c += dh * o * (1 - tanh_c**2)
+                grad_a[t] = np.concatenate(
+                    [
+                        grad_c * g * i * (1 - i),
+                        grad_c * cs[t] * f * (1 - f),
+                        grad_c * i * (1 - g**2),
+                        dh * tanh_c * o * (1 - o),
+                    ],
+                    axis=1,
+                )
+                grad_c = grad_c * f
+                grad_h = grad_a[t] @ weight_hh.data
+            elif mode == "GRU":
+                r, z, n = np.split(gates[t], 3, axis=1)
+                grad_n = dh * (1 - z) * (1 - n**2)
+                grad_r = grad_n * hidden_n[t] * r * (1 - r)
+                grad_z = dh * (hs[t] - n) * z * (1 - z)
+                grad_a[t] = np.concatenate([grad_r, grad_z, grad_n], axis=1)
+                grad_hidden[t] = np.concatenate([grad_r, grad_z, grad_n * r], axis=1)
+                grad_h = dh * z + grad_hidden[t] @ weight_hh.data
+            else:
+                grad_a[t] = (
+                    dh * (1 - hs[t + 1] ** 2)
+                    if mode == "RNN_TANH"
+                    else dh * (hs[t + 1] > 0)
+                )
+                grad_h = grad_a[t] @ weight_hh.data
+        flat_a = grad_a.reshape(T * N, -1)
+        flat_hidden = grad_hidden.reshape(T * N, -1)
+        if x.requires_grad:
+            grad_x = grad_a @ weight_ih.data
+            x.grad += grad_x[::-1] if reverse else grad_x
+        if weight_ih.requires_grad:
+            weight_ih.grad += flat_a.T @ xs.reshape(T * N, -1)
+        if weight_hh.requires_grad:
+            weight_hh.grad += flat_hidden.T @ hs[:-1].reshape(T * N, H)
+        if bias_ih is not None and bias_ih.requires_grad:
+            bias_ih.grad += flat_a.sum(axis=0)
+        if bias_hh is not None and bias_hh.requires_grad:
+            bias_hh.grad += flat_hidden.sum(axis=0)
+        if h0 is not None and h0.requires_grad:
+            h0.grad += grad_h
+        if c0 is not None and c0.requires_grad:
+            c0.grad += grad_c
+
+    output._backward = _backward
+    return output, c_n
+
+
+def _recurrent_tangent(
+    x,
+    h0,
+    c0,
+    weight_ih,
+    weight_hh,
+    bias_ih,
+    bias_hh,
+    mode,
+    reverse,
+    xs,
+    hs,
+    gates,
+    cs,
+    hidden_n,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # forward mode through time, the same recurrence on the tangents of the states
+    tangents = [
+        t.tangent
+        for t in (x, h0, c0, weight_ih, weight_hh, bias_ih, bias_hh)
+        if t is not None and t.tangent is not None
+    ]
+    K = tangents[0].shape[0]
+    T, N, H = hs.shape[0] - 1, hs.shape[1], hs.shape[2]
+    tp = np.zeros((K, T, N, weight_ih.shape[0]))
+    if x.tangent is not None:
+        tp += (x.tangent[:, ::-1] if reverse else x.tangent) @ weight_ih.data.T
+    if weight_ih.tangent is not None:
+        tp += xs @ np.swapaxes(weight_ih.tangent, -1, -2)[:, None]
+    if bias_ih is not None and bias_ih.tangent is not None:
+        tp += bias_ih.tangent[:, None, None]
+    th = np.zeros((K, N, H))
+    if h0 is not None and h0.tangent is not None:
+        th = th + h0.tangent
+    tc = np.zeros((K, N, H))
+    if c0 is not None and c0.tangent is not None:
+        tc = tc + c0.tangent
+    t_hs = np.empty((K, T, N, H))
+    for t in range(T):
+        t_hidden = th @ weight_hh.data.T
+        if weight_hh.tangent is not None:
+            t_hidden += hs[t] @ np.swapaxes(weight_hh.tangent, -1, -2)
+        if bias_hh is not None and bias_hh.tangent is not None:
+            t_hidden += bias_hh.tangent[:, None]
+        if mode == "GRU":
+            r, z, n = np.split(gates[t], 3, axis=1)
+            rz = gates[t, :, : 2 * H]
+            t_rz = rz * (1 - rz) * (tp[:, t, :, : 2 * H] + t_hidden[..., : 2 * H])
+            tr, tz = t_rz[..., :H], t_rz[..., H:]
+            tn = (1 - n**2) * (
+                tp[:, t, :, 2 * H :] + tr * hidden_n[t] + r * t_hidden[..., 2 * H :]
+            )
+            th = (1 - z) * tn + tz * (hs[t] - n) + z * th
+        else:
+            ta = tp[:, t] + t_hidden
+            if mode == "LSTM":
+                i, f, g, o = np.split(gates[t], 4, axis=1)
+                ti, tf, tg, to = np.split(ta, 4, axis=-1)
+                tc = (
+                    tf * f * (1 - f) * cs[t]
+                    + f * tc
+                    + ti * i * (1 - i) * g
+                    + i * (1 - g**2) * tg
+                )
+                tanh_c = np.tanh(cs[t + 1])
+                th = to * o * (1 - o) * tanh_c + o * (1 - tanh_c**2) * tc
+            elif mode == "RNN_TANH":
+                th = (1 - hs[t + 1] ** 2) * ta
+            else:
+                th = (hs[t + 1] > 0) * ta
+        t_hs[:, t] = th
+    return t_hs[:, ::-1] if reverse else t_hs, tc
+
+
+def _attention_tangent(
+    q, k, v, tq, tk, tv, mask, is_causal, block_size, out, lse
+) -> np.ndarray:
+    # dO = sum_j P_ij dS_ij v_j - (sum_j P_ij dS_ij) O_i + sum_j P_ij dv_j, one pass
+    # over the tiles with the saved log-sum-exp like the backward
+    K = next(t for t in (tq, tk, tv) if t is not None).shape[0]
+    Tq, Tk = q.shape[-2], k.shape[-2]
+    safe_lse = np.where(np.isfinite(lse), lse, np.inf)
+    tangent = np.zeros((K,) + out.shape)
+    row_dot = np.zeros((K,) + out.shape[:-1])
+    for q_slice, k_slices in _attention_blocks(Tq, Tk, block_size, is_causal):
+        for k_slice in k_slices:
+            s = _attention_scores(q, k, mask, is_causal, q_slice, k_slice)
+            p = np.exp(s - safe_lse[..., q_slice, None])
+            ts = 0.0
+            if tq is not None:
+                ts = ts + tq[..., q_slice, :] @ np.swapaxes(k[..., k_slice, :], -1, -2)
+            if tk is not None:
+                ts = ts + q[..., q_slice, :] @ np.swapaxes(tk[..., k_slice, :], -1, -2)
+            if tq is not None or tk is not None:
+                pts = p * ts
+                tangent[..., q_slice, :] += pts @ v[..., k_slice, :]
+                row_dot[..., q_slice] += pts.sum(axis=-1)
+            if tv is not None:
+                tangent[..., q_slice, :] += p @ tv[..., k_slice, :]
+    return tangent - row_dot[..., None] * out
+
+
+def _attention_scores(
+    q: np.ndarray,
+    k: np.ndarray,
+    mask: np.ndarray,
+    is_causal: bool,
+    q_slice: slice,
+    k_slice: slice,
+) -> np.ndarray:
+    # scores of one (query block, key block) tile, masked entries are -inf
+    s = q[..., q_slice, :] @ np.swapaxes(k[..., k_slice, :], -1, -2)
+    if is_causal:
+        # aligned to the bottom right: query i sees the keys up to i + Tk - Tq
+        rows = (
+            np.arange(q_slice.start, q_slice.stop)[:, None] + k.shape[-2] - q.shape[-2]
+        )
+        s = np.where(np.arange(k_slice.start, k_slice.stop) <= rows, s, -np.inf)
+    if mask is not None:
+        block = mask[..., q_slice, k_slice]
+        s = np.where(block, s, -np.inf) if block.dtype == bool else s + block
+    return s
+
+
+def _attention_blocks(Tq: int, Tk: int, block_size: int, is_causal: bool):
+    for qs in range(0, Tq, block_size):
+        q_slice = slice(qs, min(qs + block_size, Tq))
+        # with a causal mask the key blocks right of the diagonal are never visited
+        last_key = q_slice.stop + Tk - Tq if is_causal else Tk
+        yield q_slice, [
+            slice(ks, min(ks + block_size, Tk))
+            for ks in range(0, max(last_key, 0), block_size)
+        ]
+
+
+def _flash_attention(
+    q: np.ndarray,
+    k: np.ndarray,
+    v: np.ndarray,
+    mask: np.ndarray,
+    is_causal: bool,
+    block_size: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    # streams over key blocks with an online softmax, returns the output and the
+    # log-sum-exp of every query row which is all the backward needs
+    Tq, Tk = q.shape[-2], k.shape[-2]
+    out = np.zeros(q.shape[:-1] + v.shape[-1:], dtype=np.result_type(q, v))
+    lse = np.full(q.shape[:-1], -np.inf)
+    for q_slice, k_slices in _attention_blocks(Tq, Tk, block_size, is_causal):
+        row_max = np.full(q.shape[:-2] + (q_slice.stop - q_slice.start,), -np.inf)
+        row_sum = np.zeros_like(row_max)
+        acc = out[..., q_slice, :]
+        for k_slice in k_slices:
+            s = _attention_scores(q, k, mask, is_causal, q_slice, k_slice)
+            new_max = np.maximum(row_max, s.max(axis=-1))
+            safe_max = np.where(np.isfinite(new_max), new_max, 0.0)
+            p = np.exp(s - safe_max[..., None])
+            correction = np.exp(row_max - safe_max)
+            row_sum = row_sum * correction + p.sum(axis=-1)
+            acc *= correction[..., None]
+            acc += p @ v[..., k_slice, :]
+            row_max = new_max
+        acc /= np.where(row_sum > 0, row_sum, 1.0)[..., None]
+        with np.errstate(divide="ignore"):
+            lse[..., q_slice] = row_max + np.log(row_sum)
+    return out, lse
+
+
+@_batchable
+def scaled_dot_product_attention(
+    query: Tensor,
+    key: Tensor,
+    value: Tensor,
+    attn_mask: np.ndarray = None,
+    is_causal: bool = False,
+    block_size: int = 128,
+) -> Tensor:
+    """softmax(query @ key^T / sqrt(d) + mask) @ value without materializing the scores
+
+    The (Tq, Tk) score matrix is computed one (block_size, block_size) tile at a time
+    with an online softmax, so memory is O(T) instead of O(T^2). Backward recomputes
+    the tiles from the saved log-sum-exp of every row.
+
+    Args:
+        query (Tensor): (..., Tq, d) queries
+        key (Tensor): (..., Tk, d) keys
+        value (Tensor): (..., Tk, d_v) values
+        attn_mask (np.ndarray, optional): broadcastable to (..., Tq, Tk), either bool
+        where True takes part in attention or a float added to the scores.
+        Defaults to None.
+        is_causal (bool, optional): query i only attends to keys up to i + Tk - Tq.
+        Defaults to False.
+        block_size (int, optional): tile size. Defaults to 128.
+
+    Returns:
+        Tensor: (..., Tq, d_v) Tensor
+    """
+    scale = 1.0 / np.sqrt(query.shape[-1])
+    q, k, v = query.data * scale, key.data, value.data
+    Tq, Tk = q.shape[-2], k.shape[-2]
+    mask = (
+        np.broadcast_to(attn_mask, attn_mask.shape[:-2] + (Tq, Tk))
+        if attn_mask is not None
+        else None
+    )
+    out, lse = _flash_attention(q, k, v, mask, is_causal, block_size)
+    output = Tensor(
+        out,
+        requires_grad=(
+            True
+            if query.requires_grad or key.requires_grad or value.requires_grad
+            else False
+        ),
+        parent=(query, key, value),
+        op="attention",
+    )
+    if _has_tangent(query, key, value):
+        output.tangent = _attention_tangent(
+            q,
+            k,
+            v,
+            query.tangent * scale if query.tangent is not None else None,
+            key.tangent,
+            value.tangent,
+            mask,
+            is_causal,
+            block_size,
+            out,
+            lse,
+        )
+
+    def _backward():
+        grad = output.grad
+        delta = (grad * out).sum(axis=-1)
+        safe_lse = np.where(np.isfinite(lse), lse, np.inf)
+        grad_q, grad_k, grad_v = np.zeros_like(q), np.zeros_like(k), np.zeros_like(v)
+        for q_slice, k_slices in _attention_blocks(Tq, Tk, block_size, is_causal):
+            for k_slice in k_slices:
+                s = _attention_scores(q, k, mask, is_causal, q_slice, k_slice)
+                p = np.exp(s - safe_lse[..., q_slice, None])
+                grad_v[..., k_slice, :] += (
+                    np.swapaxes(p, -1, -2) @ grad[..., q_slice, :]
+                )
+                grad_s = p * (
+                    grad[..., q_slice, :] @ np.swapaxes(v[..., k_slice, :], -1, -2)
+                    - delta[..., q_slice, None]
+                )
+                grad_q[..., q_slice, :] += grad_s @ k[..., k_slice, :]
+                grad_k[..., k_slice, :] += (
+                    np.swapaxes(grad_s, -1, -2) @ q[..., q_slice, :]
+                )
+        if query.requires_grad:
+            query.grad += grad_q * scale
+        if key.requires_grad:
+            key.grad += grad_k
+        if value.requires_grad:
+            value.grad += grad_v
+
+    output._backward = _backward
+    return output
@@ -0,0 +1,55 @@
+from ..autodiff import *
+from .module import Module, Sequential, ReLU
+from .convolution import Conv
+from .normalization import BatchNorm
+from .helper import fold_batch_norm
+import copy
+
+
+def fuse_modules(model: Module, inplace: bool = False) -> Module:
+    """Fuses Conv -> BatchNorm -> ReLU runs of every Sequential into a single Conv
+
+    The eval mode BatchNorm is folded into the weight and bias of the Conv and the
+    ReLU is applied in place on the Conv output, so the fused layer does one pass
+    over the activation instead of three. The BatchNorm and ReLU are both optional,
+    a Conv followed by a ReLU is fused as well. The result is meant for inference,
+    the BatchNorms no longer update their running statistics.
+    """
+    model = model if inplace else copy.deepcopy(model)
+    for module in list(model.modules()):
+        if isinstance(module, Sequential):
+            layers = _fuse(list(module))
+            del module[:]
+            for layer in layers:
+                module.append(layer)
+    return model
+
+
+def _fuse(layers: list) -> list:
+    fused = []
+    i = 0
+    while i < len(layers):
+        layer = layers[i]
+        i += 1
+        if not isinstance(layer, Conv) or layer.fused_relu:
+            fused.append(layer)
+            continue
+        if (
+            i < len(layers)
+            and isinstance(layers[i], BatchNorm)
+            and layers[i].track_running_stats
+        ):
+            weight, bias = fold_batch_norm(
+                layer.weight.data, layer.b.data if layer.bias else None, layers[i]
+            )
+            layer.weight.data = weight
+            if not layer.bias:
+                layer.bias = True
+                layer.b = Tensor(bias, True)
+            layer.b.data = bias
+            i += 1
+        if i < len(layers) and isinstance(layers[i], ReLU):
+            layer.fused_relu = True
+            i += 1
+        fused.append(layer)
+    return fused
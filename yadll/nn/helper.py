@@ -1,7 +1,50 @@
 from ..autodiff import *
+from .module import Module
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Tuple
 import numpy as np
 
 
+class PlanCache:
+    def __init__(self, maxsize: int = 8) -> None:
+        """LRU cache of the execution plans of a layer, one per input shape
+
+        Steady state training sees a single shape per layer, the bound only matters
+        when the shapes vary (e.g. the last batch of an epoch, variable image sizes).
+        """
+        self.maxsize = maxsize
+        self.plans: OrderedDict = OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """The plan of key, build() on a miss"""
+        plan = self.plans.get(key)
+        if plan is not None:
+            self.hits += 1
+            self.plans.move_to_end(key)
+            return plan
+        self.misses += 1
+        plan = self.plans[key] = build()
+        while len(self.plans) > self.maxsize:
+            self.plans.popitem(last=False)
+            self.evictions += 1
+        return plan
+
+    def __len__(self) -> int:
+        return len(self.plans)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self.plans),
+        }
+
+    def clear(self) -> None:
+        self.plans.clear()
+
+
 def compute_out_dims_for_pooling_ops(*dims, padding: tuple[tuple], kernel_size, stride):
     pad = [sum(pad) for pad in padding]
     out_dims = tuple(
@@ -9,3 +52,47 @@ def compute_out_dims_for_pooling_ops(*dims, padding: tuple[tuple], kernel_size,
         for i, dim in enumerate(dims)
     )
     return out_dims
+
+
+def replace_modules(model: Module, convert: Callable[[Module], Module]) -> Module:
+    """Swaps every module reachable from model for convert(module), in place
+
+    Returns the new model, which is convert(model) if that changed.
+    """
+    replaced = {}
+    for module in list(model.modules()):
+        new = convert(module)
+        if new is not module:
+            replaced[id(module)] = new
+    if id(model) in replaced:
+        return replaced[id(model)]
+    for module in list(model.modules()):
+        for name, child in list(module.named_children()):
+            if id(child) in replaced:
+                setattr(module, name, replaced[id(child)])
+    return model
+
+
+def batch_norm_scale_shift(batch_norm) -> Tuple[np.ndarray, np.ndarray]:
+    """Per channel scale and shift that an eval mode BatchNorm applies"""
+    assert batch_norm.track_running_stats, "only BatchNorm with running stats folds"
+    scale = 1 / np.sqrt(batch_norm.running_var.data + batch_norm.eps)
+    shift = -batch_norm.running_mean.data * scale
+    if batch_norm.affine:
+        scale = batch_norm.gamma.data * scale
+        shift = batch_norm.gamma.data * shift + batch_norm.beta.data
+    return scale, shift
+
+
+def fold_scale_shift(
+    weight: np.ndarray, bias: np.ndarray, scale: np.ndarray, shift: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Weight and bias of a Linear/Conv whose output channels (dim 0 of weight) are
+    then multiplied by scale and shifted by shift"""
+    weight = weight * scale.reshape((-1,) + (1,) * (weight.ndim - 1))
+    bias = (bias.reshape(-1) if bias is not None else 0) * scale + shift
+    return weight, bias
+
+
+def fold_batch_norm(weight: np.ndarray, bias: np.ndarray, batch_norm):
+    return fold_scale_shift(weight, bias, *batch_norm_scale_shift(batch_norm))
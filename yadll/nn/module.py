@@ -1,28 +1,164 @@
+from __future__ import annotations
 from ..autodiff import *
-from typing import Any, List, Generator
+from typing import Any, Callable, Iterable, Iterator, List, Tuple, Union
 from abc import abstractmethod, ABCMeta
 
+# bumped whenever a parameter or submodule of any module is added, replaced or
+# removed, the cached parameter lists are rebuilt when it moved
+_structure_version = 0
+
+
+def _structure_changed() -> None:
+    global _structure_version
+    _structure_version += 1
+
 
 class Module(metaclass=ABCMeta):
     def __init__(self) -> None:
-        self.params: List[Tensor] = []
+        # registries filled by __setattr__ in assignment order: Tensors that require
+        # grad are parameters, other Tensors buffers. The values stay in __dict__ as
+        # well, attribute reads do not go through the registries
+        object.__setattr__(self, "_parameters", {})
+        object.__setattr__(self, "_buffers", {})
+        object.__setattr__(self, "_modules", {})
+        object.__setattr__(self, "_forward_pre_hooks", [])
+        object.__setattr__(self, "_forward_hooks", [])
+        object.__setattr__(self, "_parameters_cache", (-1, []))
         self.eval_mode = False
 
-    def parameters(self) -> Generator[Tensor, Any, Any]:
-        return self.params
+    def __setattr__(self, name: str, value: Any) -> None:
+        if isinstance(value, Module):
+            registry = self._modules
+        elif isinstance(value, Tensor):
+            registry = self._parameters if value.requires_grad else self._buffers
+        else:
+            registry = None
+        for other in (self._parameters, self._buffers, self._modules):
+            if other is not registry and name in other:
+                del other[name]
+                if other is not self._buffers:
+                    _structure_changed()
+        if registry is not None:
+            if registry is not self._buffers and registry.get(name) is not value:
+                _structure_changed()
+            registry[name] = value
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name: str) -> None:
+        for registry in (self._parameters, self._buffers, self._modules):
+            if name in registry:
+                del registry[name]
+                if registry is not self._buffers:
+                    _structure_changed()
+        object.__delattr__(self, name)
+
+    def named_modules(self, prefix: str = "") -> Iterator[Tuple[str, Module]]:
+        """self and every module below it, depth first in registration order"""
+        seen, stack = set(), [(prefix, self)]
+        while stack:
+            name, module = stack.pop()
+            if id(module) in seen:
+                continue
+            seen.add(id(module))
+            yield name, module
+            stack.extend(
+                (f"{name}.{child}" if name else child, m)
+                for child, m in reversed(module._modules.items())
+            )
+
+    def modules(self) -> Iterator[Module]:
+        for _, module in self.named_modules():
+            yield module
+
+    def named_children(self) -> Iterator[Tuple[str, Module]]:
+        return iter(self._modules.items())
+
+    def children(self) -> Iterator[Module]:
+        return iter(self._modules.values())
+
+    def named_parameters(
+        self, prefix: str = "", recurse: bool = True
+    ) -> Iterator[Tuple[str, Tensor]]:
+        """(dotted name, parameter) pairs, a parameter shared by modules comes once"""
+        return self._named("_parameters", prefix, recurse)
+
+    def named_buffers(
+        self, prefix: str = "", recurse: bool = True
+    ) -> Iterator[Tuple[str, Tensor]]:
+        return self._named("_buffers", prefix, recurse)
+
+    def _named(
+        self, registry: str, prefix: str, recurse: bool
+    ) -> Iterator[Tuple[str, Tensor]]:
+        seen = set()
+        modules = self.named_modules(prefix) if recurse else [(prefix, self)]
+        for module_prefix, module in modules:
+            for name, tensor in getattr(module, registry).items():
+                if id(tensor) not in seen:
+                    seen.add(id(tensor))
+                    yield (f"{module_prefix}.{name}" if module_prefix else name), tensor
+
+    def parameters(self) -> List[Tensor]:
+        """Every parameter of self and of its submodules, in named_parameters order
+
+        The list is cached until the structure of a module changes, it is shared and
+        must not be modified.
+        """
+        version, params = self._parameters_cache
+        if version != _structure_version:
+            params = [p for _, p in self.named_parameters()]
+            object.__setattr__(self, "_parameters_cache", (_structure_version, params))
+        return params
+
+    def buffers(self) -> List[Tensor]:
+        return [b for _, b in self.named_buffers()]
+
+    def register_forward_pre_hook(
+        self, hook: Callable[[Module, tuple], Union[tuple, None]]
+    ) -> Callable[[], None]:
+        """Calls hook(module, args) before forward, a returned tuple replaces args
+
+        Returns a function that removes the hook.
+        """
+        self._forward_pre_hooks.append(hook)
+        return lambda: self._forward_pre_hooks.remove(hook)
+
+    def register_forward_hook(
+        self, hook: Callable[[Module, tuple, Any], Any]
+    ) -> Callable[[], None]:
+        """Calls hook(module, args, output) after forward, a returned value other than
+        None replaces output
+
+        Returns a function that removes the hook.
+        """
+        self._forward_hooks.append(hook)
+        return lambda: self._forward_hooks.remove(hook)
 
     @abstractmethod
     def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
         raise NotImplementedError("You should override this method in a subclass")
 
-    def __call__(self, x: Tensor, *args: Any, **kwds: Any) -> Any:
-        return self.forward(x)
+    def __call__(self, *args: Any, **kwds: Any) -> Any:
+        if not (self._forward_pre_hooks or self._forward_hooks):
+            return self.forward(*args, **kwds)
+        for hook in self._forward_pre_hooks:
+            result = hook(self, args)
+            if result is not None:
+                args = result if isinstance(result, tuple) else (result,)
+        output = self.forward(*args, **kwds)
+        for hook in self._forward_hooks:
+            result = hook(self, args, output)
+            if result is not None:
+                output = result
+        return output
 
     def train(self):
-        self.eval_mode = False
+        for module in self.modules():
+            module.eval_mode = False
 
     def eval(self):
-        self.eval_mode = True
+        for module in self.modules():
+            module.eval_mode = True
 
 
 class Linear(Module):
@@ -32,18 +168,12 @@ class Linear(Module):
         self.out_features = out_features
         self.bias = bias
         self.weight = Tensor.random((out_features, in_features), True)
-        self.params.append(self.weight)
         if bias:
             self.b = Tensor.random((1, out_features), True)
-            self.params.append(self.b)
 
     def forward(self, x: Tensor) -> Tensor:
         assert x.shape[-1] == self.in_features
-        output = x @ self.weight.T + self.b if self.bias else x @ self.weight.T
-        return output
-
-    def __call__(self, x: Tensor) -> Tensor:
-        return self.forward(x)
+        return x.linear(self.weight, self.b if self.bias else None)
 
 
 class Sum(Module):
@@ -53,9 +183,6 @@ class Sum(Module):
     def forward(self, x: Tensor) -> Tensor:
         return x.sum()
 
-    def __call__(self, x: Tensor) -> Tensor:
-        return self.forward(x)
-
 
 class Mean(Module):
     def __init__(self) -> None:
@@ -97,23 +224,44 @@ class Log(Module):
         return x.log()
 
 
-class Sequential(Module):
-    def __init__(self, *args) -> None:
+class ModuleList(Module):
+    def __init__(self, modules: Iterable[Module] = ()) -> None:
+        """Holds submodules registered as "0", "1", ..."""
         super().__init__()
-        for arg in args:
-            assert isinstance(arg, Module)
-            self.params.append(arg)
-
-    def parameters(self) -> Generator[Tensor, Any, Any]:
-        for module in self.params:
-            for param in module.parameters():
-                yield param
+        for module in modules:
+            self.append(module)
 
     def append(self, module: Module) -> None:
-        self.params.append(module)
+        assert isinstance(module, Module)
+        setattr(self, str(len(self._modules)), module)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Module, List[Module]]:
+        return list(self._modules.values())[index]
+
+    def __delitem__(self, index: Union[int, slice]) -> None:
+        modules = list(self._modules.values())
+        del modules[index]
+        for name in list(self._modules):
+            delattr(self, name)
+        for module in modules:
+            self.append(module)
+
+    def __len__(self) -> int:
+        return len(self._modules)
+
+    def __iter__(self) -> Iterator[Module]:
+        return iter(self._modules.values())
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        raise NotImplementedError("a ModuleList has no forward, iterate it")
+
+
+class Sequential(ModuleList):
+    def __init__(self, *args) -> None:
+        super().__init__(args)
 
     def forward(self, x: Tensor) -> Tensor:
         out = x
-        for layer in self.params:
+        for layer in self._modules.values():
             out = layer(out)
         return out
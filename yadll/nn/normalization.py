@@ -20,8 +20,6 @@ class BatchNorm(Module):
         if affine:
             self.gamma = Tensor.ones((num_features,), name="gamma")
             self.beta = Tensor.zeros((num_features,), name="beta")
-            self.params.append(self.gamma)
-            self.params.append(self.beta)
         self.running_mean = (
             Tensor.zeros((num_features,), False, "running_mean")
             if track_running_stats
@@ -44,12 +42,19 @@ class BatchNorm(Module):
                 mean = self.running_mean.reshape(shape)
                 var = self.running_var.reshape(shape)
             else:
-                self.running_mean = (
-                    1.0 - self.momentum
-                ) * self.running_mean + self.momentum * current_mean
-                self.running_var = (
-                    1.0 - self.momentum
-                ) * self.running_var + self.momentum * x.var(axis, unbiased=True)
+                # plain arrays, the running statistics carry no graph and no tangent
+                self.running_mean = Tensor(
+                    (1.0 - self.momentum) * self.running_mean.data
+                    + self.momentum * current_mean.data,
+                    False,
+                    name="running_mean",
+                )
+                self.running_var = Tensor(
+                    (1.0 - self.momentum) * self.running_var.data
+                    + self.momentum * x.var(axis, unbiased=True).data,
+                    False,
+                    name="running_var",
+                )
         gamma = self.gamma if self.affine else Tensor.ones((self.num_features,))
         beta = self.beta if self.affine else Tensor.zeros((self.num_features,))
         return gamma.reshape(shape) * (x - mean) / (var + self.eps) ** (
@@ -87,11 +92,9 @@ class LayerNorm(Module):
         self.eps = eps
         self.affine = elementwise_affine
 
-        self.gamma = Tensor.ones(normalized_shape, name="gamma")
-        self.beta = Tensor.zeros(normalized_shape, name="beta")
-        if elementwise_affine:
-            self.params.append(self.gamma)
-            self.params.append(self.beta)
+        # constants without elementwise_affine, they are then buffers
+        self.gamma = Tensor.ones(normalized_shape, elementwise_affine, name="gamma")
+        self.beta = Tensor.zeros(normalized_shape, elementwise_affine, name="beta")
 
     def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
         axis = tuple(
@@ -1,57 +1,81 @@
 from yadll.autodiff import Tensor
-from .helper import compute_out_dims_for_pooling_ops
+from yadll.backend import get_backend
+from .functional import AdaptivePoolPlan, PoolPlan, adaptive_pool, pool
+from .helper import PlanCache
 from .module import Module
-from typing import Callable, Any
+from typing import Union
 import numpy as np
 
 
 class Pool(Module):
     def __init__(
-        self, kernel_size: tuple, stride: tuple, padding: tuple[tuple], pad_value=0
+        self,
+        mode: str,
+        n: int,
+        kernel_size: tuple,
+        stride: tuple = None,
+        padding: tuple[tuple] = None,
+        ceil_mode: bool = False,
+        count_include_pad: bool = True,
     ) -> None:
+        """
+        Args:
+            mode (str): "max" or "avg"
+            n (int): number of spatial dims
+            kernel_size (tuple): size of the windows, an int for every dim
+            stride (tuple, optional): stride of every spatial dim, an int for every
+            dim, or of every dim with the batch and channel dims first. Defaults to
+            kernel_size.
+            padding (tuple[tuple], optional): (before, after) padding of every spatial
+            dim. Defaults to 0.
+            ceil_mode (bool, optional): rounds the output size up. Defaults to False.
+            count_include_pad (bool, optional): padding counts towards the average.
+            Defaults to True.
+        """
         super().__init__()
-        self.kernel_size = kernel_size
+        assert mode in ("max", "avg"), f"mode {mode} is not supported"
         if isinstance(kernel_size, int):
-            kernel_size = (kernel_size,)
-        self.stride = stride
-        self.padding = padding
-        self.pad_value = pad_value
-
-    def forward(self, x: Tensor, op: Callable = None, *args, **kwargs) -> Tensor:
-        padded_x = (
-            x.pad(((0, 0), (0, 0), *self.padding), self.pad_value)
-            if any(pad > 0 for tup in self.padding for pad in tup)
-            else x
-        )
-        input_shape = tuple(x.shape[-i] for i in reversed(range(1, len(x.shape) - 1)))
-        out_dim = compute_out_dims_for_pooling_ops(
-            *input_shape,
-            padding=self.padding,
-            kernel_size=self.kernel_size,
-            stride=self.stride
-        )
-        window = padded_x.rolling_window(
-            (padded_x.shape[0], padded_x.shape[1], *self.kernel_size), self.stride
+            kernel_size = (kernel_size,) * n
+        stride = stride if stride else kernel_size
+        if isinstance(stride, int):
+            stride = (stride,) * n
+        if len(stride) == n:
+            stride = (1, 1) + tuple(stride)
+        self.mode = mode
+        self.kernel_size = tuple(kernel_size)
+        self.stride = tuple(stride)
+        self.padding = padding if padding else ((0, 0),) * n
+        self.ceil_mode = ceil_mode
+        self.count_include_pad = count_include_pad
+        self.pad_value = -np.inf if mode == "max" else 0
+        # execution plan per input shape, see PoolPlan
+        self.plans = PlanCache()
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        backend = get_backend()
+        plan = self.plans.get(
+            (x.shape, backend.name),
+            lambda: PoolPlan(
+                x.shape,
+                self.mode,
+                self.kernel_size,
+                self.stride[2:],
+                self.padding,
+                self.ceil_mode,
+                self.count_include_pad,
+                backend,
+            ),
         )
-        out = op(window, *args, **kwargs).reshape(out_dim + (x.shape[0], x.shape[1]))
-        out_order = tuple(i for i in range(len(out.shape) - 2, len(out.shape))) + tuple(
-            i for i in range(len(out.shape) - 2)
+        return pool(
+            x,
+            self.mode,
+            self.kernel_size,
+            self.stride[2:],
+            self.padding,
+            self.ceil_mode,
+            self.count_include_pad,
+            plan,
         )
-        return out.permute(out_order)
-
-
-def max_pool(x: Tensor, *args, **kwargs):
-    n = kwargs["n"]
-    out = x
-    for _ in range(n):
-        out = out.max(-1)
-    return out
-
-
-def avg_pool(x: Tensor, *args, **kwargs):
-    kernel_size = kwargs["kernel_size"]
-    dim = kwargs["dim"]
-    return x.sum(dim) / float(np.prod(kernel_size))
 
 
 class AvgPool1d(Pool):
@@ -60,18 +84,12 @@ class AvgPool1d(Pool):
         kernel_size: tuple,
         stride: tuple = None,
         padding: tuple[tuple] = ((0, 0),),
+        ceil_mode: bool = False,
+        count_include_pad: bool = True,
     ) -> None:
-        if isinstance(kernel_size, int):
-            kernel_size = (kernel_size,)
-        stride = stride if stride else kernel_size
-        if isinstance(stride, int):
-            stride = (stride,)
-        if len(stride) != 3:
-            stride = (1, 1) + stride
-        super().__init__(kernel_size, stride, padding)
-
-    def forward(self, x: Tensor, op: Callable = None, *args, **kwargs) -> Tensor:
-        return super().forward(x, op=avg_pool, dim=(-1,), kernel_size=self.kernel_size)
+        super().__init__(
+            "avg", 1, kernel_size, stride, padding, ceil_mode, count_include_pad
+        )
 
 
 class AvgPool2d(Pool):
@@ -80,20 +98,12 @@ class AvgPool2d(Pool):
         kernel_size: tuple,
         stride: tuple = None,
         padding: tuple[tuple] = ((0, 0), (0, 0)),
+        ceil_mode: bool = False,
+        count_include_pad: bool = True,
     ) -> None:
-        if isinstance(kernel_size, int):
-            kernel_size = (kernel_size,) * 2
-        stride = stride if stride else kernel_size
-        if isinstance(stride, int):
-            stride = (stride,)
-        if len(stride) != 4:
-            stride = (1, 1) + stride
-        super().__init__(kernel_size, stride, padding)
-
-    def forward(
-        self, x: Tensor, op: Callable[..., Any] = None, *args, **kwargs
-    ) -> Tensor:
-        return super().forward(x, avg_pool, dim=(-1, -2), kernel_size=self.kernel_size)
+        super().__init__(
+            "avg", 2, kernel_size, stride, padding, ceil_mode, count_include_pad
+        )
 
 
 class AvgPool3d(Pool):
@@ -102,21 +112,11 @@ class AvgPool3d(Pool):
         kernel_size: tuple,
         stride: tuple = None,
         padding: tuple[tuple] = ((0, 0), (0, 0), (0, 0)),
+        ceil_mode: bool = False,
+        count_include_pad: bool = True,
     ) -> None:
-        if isinstance(kernel_size, int):
-            kernel_size = (kernel_size,) * 3
-        stride = stride if stride else kernel_size
-        if isinstance(stride, int):
-            stride = (stride,)
-        if len(stride) != 5:
-            stride = (1, 1) + stride
-        super().__init__(kernel_size, stride, padding)
-
-    def forward(
-        self, x: Tensor, op: Callable[..., Any] = None, *args, **kwargs
-    ) -> Tensor:
-        return super().forward(
-            x, avg_pool, dim=(-1, -2, -3), kernel_size=self.kernel_size
+        super().__init__(
+            "avg", 3, kernel_size, stride, padding, ceil_mode, count_include_pad
         )
 
 
@@ -126,18 +126,9 @@ class MaxPool1d(Pool):
         kernel_size: tuple,
         stride: tuple = None,
         padding: tuple[tuple] = ((0, 0),),
+        ceil_mode: bool = False,
     ) -> None:
-        if isinstance(kernel_size, int):
-            kernel_size = (kernel_size,)
-        stride = stride if stride else kernel_size
-        if isinstance(stride, int):
-            stride = (stride,) * 3
-        if len(stride) < 3:
-            stride = (1, 1) + stride
-        super().__init__(kernel_size, stride, padding, -np.inf)
-
-    def forward(self, x: Tensor, op: Callable = None, *args, **kwargs) -> Tensor:
-        return super().forward(x, op=max_pool, n=1)
+        super().__init__("max", 1, kernel_size, stride, padding, ceil_mode)
 
 
 class MaxPool2d(Pool):
@@ -146,18 +137,9 @@ class MaxPool2d(Pool):
         kernel_size: tuple,
         stride: tuple = None,
         padding: tuple[tuple] = ((0, 0), (0, 0)),
+        ceil_mode: bool = False,
     ) -> None:
-        if isinstance(kernel_size, int):
-            kernel_size = (kernel_size,)
-        stride = stride if stride else kernel_size
-        if isinstance(stride, int):
-            stride = (stride,) * 4
-        if len(stride) != 4:
-            stride = (1, 1) + stride
-        super().__init__(kernel_size, stride, padding, -np.inf)
-
-    def forward(self, x: Tensor, op: Callable = None, *args, **kwargs) -> Tensor:
-        return super().forward(x, op=max_pool, n=2)
+        super().__init__("max", 2, kernel_size, stride, padding, ceil_mode)
 
 
 class MaxPool3d(Pool):
@@ -166,15 +148,84 @@ class MaxPool3d(Pool):
         kernel_size: tuple,
         stride: tuple = None,
         padding: tuple[tuple] = ((0, 0), (0, 0), (0, 0)),
+        ceil_mode: bool = False,
     ) -> None:
-        if isinstance(kernel_size, int):
-            kernel_size = (kernel_size,)
-        stride = stride if stride else kernel_size
-        if isinstance(stride, int):
-            stride = (stride,) * 5
-        if len(stride) != 5:
-            stride = (1, 1) + stride
-        super().__init__(kernel_size, stride, padding, -np.inf)
+        super().__init__("max", 3, kernel_size, stride, padding, ceil_mode)
+
+
+class AdaptivePool(Module):
+    def __init__(
+        self, mode: str, n: int, output_size: Union[int, tuple], keepdim: bool = True
+    ) -> None:
+        """
+        Args:
+            mode (str): "max" or "avg"
+            n (int): number of spatial dims, None for any
+            output_size (Union[int, tuple]): size of every spatial dim of the output,
+            None keeps the size of the input
+            keepdim (bool, optional): without it the output of global pooling is
+            (N, C). Defaults to True.
+        """
+        super().__init__()
+        assert mode in ("max", "avg"), f"mode {mode} is not supported"
+        self.mode = mode
+        self.n = n
+        self.output_size = output_size
+        self.keepdim = keepdim
+        # bins per input shape, see AdaptivePoolPlan
+        self.plans = PlanCache()
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        assert self.n is None or len(x.shape) == self.n + 2, (
+            f"{type(self).__name__} expects (N, C) and {self.n} spatial dims, "
+            f"got {x.shape}"
+        )
+        plan = self.plans.get(
+            x.shape,
+            lambda: AdaptivePoolPlan(
+                x.shape, self.mode, self.output_size, self.keepdim
+            ),
+        )
+        return adaptive_pool(x, self.mode, self.output_size, self.keepdim, plan)
+
+
+class AdaptiveAvgPool1d(AdaptivePool):
+    def __init__(self, output_size: Union[int, tuple]) -> None:
+        super().__init__("avg", 1, output_size)
+
+
+class AdaptiveAvgPool2d(AdaptivePool):
+    def __init__(self, output_size: Union[int, tuple]) -> None:
+        super().__init__("avg", 2, output_size)
+
+
+class AdaptiveAvgPool3d(AdaptivePool):
+    def __init__(self, output_size: Union[int, tuple]) -> None:
+        super().__init__("avg", 3, output_size)
+
+
+class AdaptiveMaxPool1d(AdaptivePool):
+    def __init__(self, output_size: Union[int, tuple]) -> None:
+        super().__init__("max", 1, output_size)
+
+
+class AdaptiveMaxPool2d(AdaptivePool):
+    def __init__(self, output_size: Union[int, tuple]) -> None:
+        super().__init__("max", 2, output_size)
+
+
+class AdaptiveMaxPool3d(AdaptivePool):
+    def __init__(self, output_size: Union[int, tuple]) -> None:
+        super().__init__("max", 3, output_size)
+
+
+# NOTE: the global pools take any number of spatial dims, (N, C, *spatial) -> (N, C)
+# for a classification head unless keepdim
+class GlobalAvgPool(AdaptivePool):
+    def __init__(self, keepdim: bool = False) -> None:
+        super().__init__("avg", None, 1, keepdim)
+
 
-    def forward(self, x: Tensor, op: Callable = None, *args, **kwargs) -> Tensor:
-        return super().forward(x, op=max_pool, n=3)
+class GlobalMaxPool(AdaptivePool):
+    def __init__(self, keepdim: bool = False) -> None:
+        super().__init__("max", None, 1, keepdim)
@@ -0,0 +1,152 @@
+from ..autodiff import *
+from .module import Module
+from .functional import recurrent
+
+
+class RNNBase(Module):
+    def __init__(
+        self,
+        mode: str,
+        input_size: int,
+        hidden_size: int,
+        num_layers: int = 1,
+        bias: bool = True,
+        batch_first: bool = False,
+        bidirectional: bool = False,
+    ) -> None:
+        super().__init__()
+        self.mode = mode
+        self.input_size = input_size
+        self.hidden_size = hidden_size
+        self.num_layers = num_layers
+        self.bias = bias
+        self.batch_first = batch_first
+        self.bidirectional = bidirectional
+        self.num_directions = 2 if bidirectional else 1
+        gates = {"LSTM": 4, "GRU": 3}.get(mode, 1)
+        bound = 1 / np.sqrt(hidden_size)
+        # same names and initialization as torch so state can be copied over by name
+        self.weight_names = []
+        for layer in range(num_layers):
+            layer_input = (
+                input_size if layer == 0 else hidden_size * self.num_directions
+            )
+            for direction in range(self.num_directions):
+                suffix = f"_l{layer}" + ("_reverse" if direction == 1 else "")
+                shapes = [
+                    ("weight_ih", (gates * hidden_size, layer_input)),
+                    ("weight_hh", (gates * hidden_size, hidden_size)),
+                ]
+                if bias:
+                    shapes += [
+                        ("bias_ih", (gates * hidden_size,)),
+                        ("bias_hh", (gates * hidden_size,)),
+                    ]
+                names = []
+                for name, shape in shapes:
+                    param = Tensor(
+                        np.random.uniform(-bound, bound, shape),
+                        True,
+                        name=name + suffix,
+                    )
+                    setattr(self, name + suffix, param)
+                    names.append(name + suffix)
+                self.weight_names.append(names)
+
+    def forward(self, x: Tensor, hx=None, *args, **kwargs):
+        if self.batch_first:
+            x = x.permute((1, 0, 2))
+        h0, c0 = hx if self.mode == "LSTM" and hx is not None else (hx, None)
+        h_n, c_n = [], []
+        out = x
+        for layer in range(self.num_layers):
+            outputs = []
+            for direction in range(self.num_directions):
+                index = layer * self.num_directions + direction
+                weights = [getattr(self, name) for name in self.weight_names[index]]
+                if not self.bias:
+                    weights += [None, None]
+                hidden, cell = recurrent(
+                    out,
+                    h0[index] if h0 is not None else None,
+                    c0[index] if c0 is not None else None,
+                    *weights,
+                    mode=self.mode,
+                    reverse=direction == 1,
+                )
+                outputs.append(hidden)
+                h_n.append(hidden[0 if direction == 1 else -1].unsqueeze(0))
+                if cell is not None:
+                    c_n.append(cell.unsqueeze(0))
+            out = outputs[0] if len(outputs) == 1 else Tensor.cat(outputs, 2)
+        if self.batch_first:
+            out = out.permute((1, 0, 2))
+        h_n = h_n[0] if len(h_n) == 1 else Tensor.cat(h_n, 0)
+        if self.mode != "LSTM":
+            return out, h_n
+        return out, (h_n, c_n[0] if len(c_n) == 1 else Tensor.cat(c_n, 0))
+
+
+class RNN(RNNBase):
+    def __init__(
+        self,
+        input_size: int,
+        hidden_size: int,
+        num_layers: int = 1,
+        nonlinearity: str = "tanh",
+        bias: bool = True,
+        batch_first: bool = False,
+        bidirectional: bool = False,
+    ) -> None:
+        assert nonlinearity in ("tanh", "relu"), f"unknown nonlinearity {nonlinearity}"
+        super().__init__(
+            "RNN_TANH" if nonlinearity == "tanh" else "RNN_RELU",
+            input_size,
+            hidden_size,
+            num_layers,
+            bias,
+            batch_first,
+            bidirectional,
+        )
+
+
+class GRU(RNNBase):
+    def __init__(
+        self,
+        input_size: int,
+        hidden_size: int,
+        num_layers: int = 1,
+        bias: bool = True,
+        batch_first: bool = False,
+        bidirectional: bool = False,
+    ) -> None:
+        super().__init__(
+            "GRU",
+            input_size,
+            hidden_size,
+            num_layers,
+            bias,
+            batch_first,
+            bidirectional,
+        )
+
+
+class LSTM(RNNBase):
+    def __init__(
+        self,
+        input_size: int,
+        hidden_size: int,
+        num_layers: int = 1,
+        bias: bool = True,
+        batch_first: bool = False,
+        bidirectional: bool = False,
+    ) -> None:
+        super().__init__(
+            "LSTM",
+            input_size,
+            hidden_size,
+            num_layers,
+            bias,
+            batch_first,
+            bidirectional,
+        )
@@ -0,0 +1,433 @@
+from ..autodiff import *
+from .module import Module, ModuleList, Linear, ReLU
+from .normalization import LayerNorm
+from .functional import scaled_dot_product_attention
+from typing import Callable, List, Tuple, Union
+import copy
+
+
+def _additive_mask(mask: np.ndarray) -> np.ndarray:
+    # torch modules use True for positions that are NOT allowed to attend
+    return np.where(mask, -np.inf, 0.0) if mask.dtype == bool else mask
+
+
+class KVCache:
+    """Keys and values of the tokens decoded so far, for one attention module
+
+    The buffers are preallocated along the time axis and double when they are full,
+    so appending the keys of a new token is amortized O(1) and attending to the cache
+    reads views of it without copying. A static cache (cross attention) is filled
+    once from the memory and reused for every token.
+    """
+
+    def __init__(self, capacity: int = 64, static: bool = False) -> None:
+        self.capacity = capacity
+        self.static = static
+        self.keys: np.ndarray = None
+        self.values: np.ndarray = None
+        self.length = 0
+
+    def __len__(self) -> int:
+        return self.length
+
+    @staticmethod
+    def _allocate(like: np.ndarray, capacity: int, old: np.ndarray = None):
+        buffer = np.empty(like.shape[:-2] + (capacity, like.shape[-1]), like.dtype)
+        if old is not None:
+            buffer[..., : old.shape[-2], :] = old
+        return buffer
+
+    def append(
+        self, key: np.ndarray, value: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Stores (..., t, d) new keys and values and returns all the cached ones"""
+        end = self.length + key.shape[-2]
+        if self.keys is None:
+            capacity = max(self.capacity, end)
+            self.keys = self._allocate(key, capacity)
+            self.values = self._allocate(value, capacity)
+        elif end > self.keys.shape[-2]:
+            capacity = max(2 * self.keys.shape[-2], end)
+            self.keys = self._allocate(key, capacity, self.keys[..., : self.length, :])
+            self.values = self._allocate(
+                value, capacity, self.values[..., : self.length, :]
+            )
+        self.keys[..., self.length : end, :] = key
+        self.values[..., self.length : end, :] = value
+        self.length = end
+        return self.get()
+
+    def get(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.keys[..., : self.length, :], self.values[..., : self.length, :]
+
+    def reset(self) -> None:
+        self.length = 0
+
+
+class MultiheadAttention(Module):
+    def __init__(
+        self,
+        embed_dim: int,
+        num_heads: int,
+        bias: bool = True,
+        batch_first: bool = False,
+    ) -> None:
+        super().__init__()
+        assert embed_dim % num_heads == 0, "embed_dim must be divisible by num_heads"
+        self.embed_dim = embed_dim
+        self.num_heads = num_heads
+        self.head_dim = embed_dim // num_heads
+        self.bias = bias
+        self.batch_first = batch_first
+        bound = np.sqrt(6 / (4 * embed_dim))
+        self.in_proj_weight = Tensor(
+            np.random.uniform(-bound, bound, (3 * embed_dim, embed_dim)), True
+        )
+        if bias:
+            self.in_proj_bias = Tensor.zeros((3 * embed_dim,))
+        self.out_proj = Linear(embed_dim, embed_dim, bias)
+
+    def _project(self, x: Tensor, index: int) -> Tensor:
+        E = self.embed_dim
+        rows = slice(index * E, (index + 1) * E)
+        return x.linear(
+            self.in_proj_weight[rows, :],
+            self.in_proj_bias[rows] if self.bias else None,
+        )
+
+    def _split_heads(self, x: Tensor) -> Tensor:
+        # (B, T, E) -> (B, H, T, D)
+        return x.reshape(x.shape[:2] + (self.num_heads, self.head_dim)).permute(
+            (0, 2, 1, 3)
+        )
+
+    def forward(
+        self,
+        query: Tensor,
+        key: Tensor,
+        value: Tensor,
+        key_padding_mask: np.ndarray = None,
+        need_weights: bool = False,
+        attn_mask: np.ndarray = None,
+        is_causal: bool = False,
+        cache: KVCache = None,
+    ):
+        """With a cache only the keys and values of the new tokens are projected, the
+        queries attend to everything cached so far. The cache is for inference, no
+        gradient flows into the cached keys and values."""
+        assert not need_weights, "attention weights are never materialized"
+        self_attention = query is key and key is value
+        if not self.batch_first:
+            query, key, value = (t.permute((1, 0, 2)) for t in (query, key, value))
+        B, T = query.shape[:2]
+        if self_attention:
+            # self attention, a single GEMM for the three projections
+            qkv = query.linear(
+                self.in_proj_weight, self.in_proj_bias if self.bias else None
+            )
+            E = self.embed_dim
+            q, k, v = qkv[..., :E], qkv[..., E : 2 * E], qkv[..., 2 * E :]
+        elif cache is not None and cache.static and len(cache):
+            q, k, v = self._project(query, 0), None, None
+        else:
+            q, k, v = (self._project(t, i) for i, t in enumerate((query, key, value)))
+        if cache is None:
+            k, v = self._split_heads(k), self._split_heads(v)
+        else:
+            keys, values = (
+                cache.get()
+                if k is None
+                else cache.append(self._split_heads(k).data, self._split_heads(v).data)
+            )
+            k, v = Tensor(keys), Tensor(values)
+        mask = None
+        if attn_mask is not None:
+            mask = _additive_mask(attn_mask)
+            if mask.ndim == 3:
+                mask = mask.reshape((B, self.num_heads) + mask.shape[1:])
+        if key_padding_mask is not None:
+            padding = _additive_mask(key_padding_mask)[:, None, None, :]
+            mask = padding if mask is None else mask + padding
+        out = scaled_dot_product_attention(self._split_heads(q), k, v, mask, is_causal)
+        out = self.out_proj(out.permute((0, 2, 1, 3)).reshape((B, T, self.embed_dim)))
+        return (out if self.batch_first else out.permute((1, 0, 2))), None
+
+
+class TransformerEncoderLayer(Module):
+    def __init__(
+        self,
+        d_model: int,
+        nhead: int,
+        dim_feedforward: int = 2048,
+        activation: Union[str, Callable] = "relu",
+        layer_norm_eps: float = 1e-5,
+        batch_first: bool = False,
+        norm_first: bool = False,
+        bias: bool = True,
+    ) -> None:
+        super().__init__()
+        self.self_attn = MultiheadAttention(d_model, nhead, bias, batch_first)
+        self.linear1 = Linear(d_model, dim_feedforward, bias)
+        self.linear2 = Linear(dim_feedforward, d_model, bias)
+        self.norm1 = LayerNorm((d_model,), layer_norm_eps)
+        self.norm2 = LayerNorm((d_model,), layer_norm_eps)
+        self.activation = ReLU() if activation == "relu" else activation
+        self.norm_first = norm_first
+
+    def _self_attention(self, x, mask, key_padding_mask, is_causal) -> Tensor:
+        return self.self_attn(
+            x,
+            x,
+            x,
+            key_padding_mask=key_padding_mask,
+            attn_mask=mask,
+            is_causal=is_causal,
+        )[0]
+
+    def _feed_forward(self, x: Tensor) -> Tensor:
+        return self.linear2(self.activation(self.linear1(x)))
+
+    def forward(
+        self,
+        src: Tensor,
+        src_mask: np.ndarray = None,
+        src_key_padding_mask: np.ndarray = None,
+        is_causal: bool = False,
+    ) -> Tensor:
+        x = src
+        if self.norm_first:
+            x = x + self._self_attention(
+                self.norm1(x), src_mask, src_key_padding_mask, is_causal
+            )
+            return x + self._feed_forward(self.norm2(x))
+        x = self.norm1(
+            x + self._self_attention(x, src_mask, src_key_padding_mask, is_causal)
+        )
+        return self.norm2(x + self._feed_forward(x))
+
+
+class TransformerDecoderLayer(Module):
+    def __init__(
+        self,
+        d_model: int,
+        nhead: int,
+        dim_feedforward: int = 2048,
+        activation: Union[str, Callable] = "relu",
+        layer_norm_eps: float = 1e-5,
+        batch_first: bool = False,
+        norm_first: bool = False,
+        bias: bool = True,
+    ) -> None:
+        super().__init__()
+        self.self_attn = MultiheadAttention(d_model, nhead, bias, batch_first)
+        self.multihead_attn = MultiheadAttention(d_model, nhead, bias, batch_first)
+        self.linear1 = Linear(d_model, dim_feedforward, bias)
+        self.linear2 = Linear(dim_feedforward, d_model, bias)
+        self.norm1 = LayerNorm((d_model,), layer_norm_eps)
+        self.norm2 = LayerNorm((d_model,), layer_norm_eps)
+        self.norm3 = LayerNorm((d_model,), layer_norm_eps)
+        self.activation = ReLU() if activation == "relu" else activation
+        self.norm_first = norm_first
+
+    def _self_attention(
+        self, x, mask, key_padding_mask, is_causal, cache=None
+    ) -> Tensor:
+        return self.self_attn(
+            x,
+            x,
+            x,
+            key_padding_mask=key_padding_mask,
+            attn_mask=mask,
+            is_causal=is_causal,
+            cache=cache,
+        )[0]
+
+    def _cross_attention(
+        self, x, memory, mask, key_padding_mask, is_causal, cache=None
+    ) -> Tensor:
+        if memory is None:
+            # decoder only stack, there is nothing to attend to
+            return Tensor.zeros(x.shape, False)
+        return self.multihead_attn(
+            x,
+            memory,
+            memory,
+            key_padding_mask=key_padding_mask,
+            attn_mask=mask,
+            is_causal=is_causal,
+            cache=cache,
+        )[0]
+
+    def _feed_forward(self, x: Tensor) -> Tensor:
+        return self.linear2(self.activation(self.linear1(x)))
+
+    def forward(
+        self,
+        tgt: Tensor,
+        memory: Tensor,
+        tgt_mask: np.ndarray = None,
+        memory_mask: np.ndarray = None,
+        tgt_key_padding_mask: np.ndarray = None,
+        memory_key_padding_mask: np.ndarray = None,
+        tgt_is_causal: bool = False,
+        memory_is_causal: bool = False,
+        cache: Tuple[KVCache, KVCache] = None,
+    ) -> Tensor:
+        """memory may be None for a decoder only stack, the cross attention is skipped.
+        cache is a (self attention, cross attention) pair for incremental decoding."""
+        self_cache, cross_cache = cache if cache is not None else (None, None)
+        x = tgt
+        if self.norm_first:
+            x = x + self._self_attention(
+                self.norm1(x), tgt_mask, tgt_key_padding_mask, tgt_is_causal, self_cache
+            )
+            x = x + self._cross_attention(
+                self.norm2(x),
+                memory,
+                memory_mask,
+                memory_key_padding_mask,
+                memory_is_causal,
+                cross_cache,
+            )
+            return x + self._feed_forward(self.norm3(x))
+        x = self.norm1(
+            x
+            + self._self_attention(
+                x, tgt_mask, tgt_key_padding_mask, tgt_is_causal, self_cache
+            )
+        )
+        x = self.norm2(
+            x
+            + self._cross_attention(
+                x,
+                memory,
+                memory_mask,
+                memory_key_padding_mask,
+                memory_is_causal,
+                cross_cache,
+            )
+        )
+        return self.norm3(x + self._feed_forward(x))
+
+
+class TransformerEncoder(Module):
+    def __init__(
+        self, encoder_layer: TransformerEncoderLayer, num_layers: int, norm=None
+    ) -> None:
+        super().__init__()
+        self.layers = ModuleList(
+            copy.deepcopy(encoder_layer) for _ in range(num_layers)
+        )
+        self.num_layers = num_layers
+        self.norm = norm
+
+    def forward(
+        self,
+        src: Tensor,
+        mask: np.ndarray = None,
+        src_key_padding_mask: np.ndarray = None,
+        is_causal: bool = False,
+    ) -> Tensor:
+        out = src
+        for layer in self.layers:
+            out = layer(out, mask, src_key_padding_mask, is_causal)
+        return self.norm(out) if self.norm is not None else out
+
+
+class TransformerDecoder(Module):
+    def __init__(
+        self, decoder_layer: TransformerDecoderLayer, num_layers: int, norm=None
+    ) -> None:
+        super().__init__()
+        self.layers = ModuleList(
+            copy.deepcopy(decoder_layer) for _ in range(num_layers)
+        )
+        self.num_layers = num_layers
+        self.norm = norm
+
+    def forward(
+        self,
+        tgt: Tensor,
+        memory: Tensor,
+        tgt_mask: np.ndarray = None,
+        memory_mask: np.ndarray = None,
+        tgt_key_padding_mask: np.ndarray = None,
+        memory_key_padding_mask: np.ndarray = None,
+        tgt_is_causal: bool = False,
+        memory_is_causal: bool = False,
+        cache: List[Tuple[KVCache, KVCache]] = None,
+    ) -> Tensor:
+        out = tgt
+        for i, layer in enumerate(self.layers):
+            out = layer(
+                out,
+                memory,
+                tgt_mask,
+                memory_mask,
+                tgt_key_padding_mask,
+                memory_key_padding_mask,
+                tgt_is_causal,
+                memory_is_causal,
+                cache[i] if cache is not None else None,
+            )
+        return self.norm(out) if self.norm is not None else out
+
+    def generate(
+        self,
+        tokens: np.ndarray,
+        embed: Callable,
+        head: Callable,
+        max_new_tokens: int,
+        memory: Tensor = None,
+        temperature: float = 0.0,
+        use_cache: bool = True,
+    ) -> np.ndarray:
+        """Autoregressively extends (B, T) integer tokens by max_new_tokens
+
+        The prompt is run through the stack once, after that every step only feeds
+        the newest token and attends to the cached keys and values, so a step costs
+        O(T) instead of recomputing the whole O(T^2) prefix.
+
+        Args:
+            tokens (np.ndarray): (B, T) prompt
+            embed (Callable): maps (B, t) tokens to (B, t, d_model) Tensors,
+            e.g. Embedding
+            head (Callable): maps (B, d_model) Tensors to (B, vocab) logits, e.g. Linear
+            max_new_tokens (int): number of tokens to generate
+            memory (Tensor, optional): encoder output, None for a decoder only stack.
+            Defaults to None.
+            temperature (float, optional): sampling temperature, 0 picks the argmax.
+            Defaults to 0.0.
+            use_cache (bool, optional): recompute the full prefix every step when False.
+            Defaults to True.
+
+        Returns:
+            np.ndarray: (B, T + max_new_tokens) tokens
+        """
+        batch_first = self.layers[0].self_attn.batch_first
+        tokens = np.asarray(tokens)
+        capacity = tokens.shape[1] + max_new_tokens
+        cache = (
+            [(KVCache(capacity), KVCache(static=True)) for _ in self.layers]
+            if use_cache
+            else None
+        )
+        new_tokens = tokens
+        with no_grad():
+            for _ in range(max_new_tokens):
+                x = embed(new_tokens if use_cache else tokens)
+                out = self.forward(
+                    x if batch_first else x.permute((1, 0, 2)),
+                    memory,
+                    tgt_is_causal=True,
+                    cache=cache,
+                )
+                logits = head(out[:, -1] if batch_first else out[-1]).data
+                if temperature > 0:
+                    # Gumbel max trick, samples from softmax(logits / temperature)
+                    logits = logits / temperature - np.log(
+                        -np.log(np.random.uniform(size=logits.shape))
+                    )
+                new_tokens = logits.argmax(axis=-1)[:, None]
+                tokens = np.concatenate([tokens, new_tokens], axis=1)
+        return tokens
@@ -1 +1,3 @@
 from .optimizer import *
+from .gradients import *
+from .lr_scheduler import *
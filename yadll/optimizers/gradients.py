@@ -0,0 +1,148 @@
+"""Gradient buckets and gradient clipping
+
+Clipping by the global norm reads every gradient once for the norm and once more to
+scale it. A GradBucket stores the dense gradients of many parameters as views of one
+flat buffer per dtype, so the norm is a single dot product and scaling, clipping and
+zeroing are single in place passes, whatever the number of parameters:
+
+    bucket = GradBucket(model.parameters())
+    for x, y in data:
+        loss_fn(model(x), y).backward()
+        clip_grad_norm_(bucket, 1.0)
+        optim.step()
+        bucket.zero_()
+
+Without a bucket the clipping functions make one in place pass per gradient, no
+per-parameter temporaries are allocated in either case.
+"""
+
+from __future__ import annotations
+from typing import Dict, Iterable, List, Tuple, Union
+import numpy as np
+from ..autodiff import Tensor
+from ..backend import get_backend
+from ..sparse import SparseTensor
+
+
+class GradBucket:
+    def __init__(self, params: Iterable[Tensor]) -> None:
+        """Moves the dense grads of params into flat buffers, one per dtype
+
+        Parameters with a sparse gradient (e.g. Embedding(sparse=True)) keep it and are
+        handled separately.
+        """
+        params = [p for p in params if p.requires_grad]
+        # grads released by zero_grad(set_to_none=True) are dense too
+        dense = [p for p in params if isinstance(p.grad, np.ndarray) or p._lazy_grad]
+        dense_ids = {id(p) for p in dense}
+        self.sparse: List[Tensor] = [p for p in params if id(p) not in dense_ids]
+        sizes: Dict[np.dtype, int] = {}
+        for p in dense:
+            sizes[p.data.dtype] = sizes.get(p.data.dtype, 0) + p.data.size
+        self.flats: Dict[np.dtype, np.ndarray] = {
+            dtype: np.zeros(size, dtype) for dtype, size in sizes.items()
+        }
+        offsets = dict.fromkeys(sizes, 0)
+        self.views: List[Tuple[Tensor, np.ndarray]] = []
+        for p in dense:
+            start = offsets[p.data.dtype]
+            offsets[p.data.dtype] += p.data.size
+            flat = self.flats[p.data.dtype]
+            self.views.append(
+                (p, flat[start : offsets[p.data.dtype]].reshape(p.data.shape))
+            )
+        self.attach()
+
+    def attach(self) -> None:
+        """Copies grads that are not views of the bucket (e.g. reallocated after
+        zero_grad(set_to_none=True)) back into it, released grads count as zero"""
+        for p, view in self.views:
+            if p.grad is view:
+                continue
+            if p.grad is None:
+                view.fill(0)
+            else:
+                view[...] = p.grad
+                p.grad = view
+
+    def zero_(self) -> None:
+        """Zeroes every grad, one fill per flat buffer"""
+        for flat in self.flats.values():
+            flat.fill(0)
+        for p, view in self.views:
+            if p.grad is not None:
+                p.grad = view
+        for p in self.sparse:
+            p.zero_grad()
+
+    def grads(self) -> List[np.ndarray]:
+        """The flat buffers followed by the values of the sparse grads"""
+        self.attach()
+        return list(self.flats.values()) + _sparse_values(self.sparse)
+
+
+def _sparse_values(params: Iterable[Tensor]) -> List[np.ndarray]:
+    values = []
+    for p in params:
+        if isinstance(p.grad, SparseTensor):
+            # duplicated rows are summed first, the norm is the one of the dense grad
+            p.grad = p.grad.coalesce()
+            values.append(p.grad.values)
+    return values
+
+
+def _grads(parameters: Union[GradBucket, Iterable[Tensor], Tensor]) -> List[np.ndarray]:
+    if isinstance(parameters, GradBucket):
+        return parameters.grads()
+    if isinstance(parameters, Tensor):
+        parameters = [parameters]
+    parameters = list(parameters)
+    dense = [p.grad for p in parameters if isinstance(p.grad, np.ndarray)]
+    return dense + _sparse_values(parameters)
+
+
+def total_norm(grads: List[np.ndarray], norm_type: float = 2.0) -> float:
+    """norm_type norm of the concatenation of grads, without concatenating them"""
+    if norm_type == np.inf:
+        return float(max((max(g.max(), -g.min()) for g in grads if g.size), default=0))
+    if norm_type == 2:
+        flats = (g.reshape(-1) for g in grads)
+        return float(np.sqrt(sum(np.dot(g, g) for g in flats)))
+    return float(
+        sum(np.sum(np.abs(g) ** norm_type) for g in grads) ** (1.0 / norm_type)
+    )
+
+
+def clip_grad_norm_(
+    parameters: Union[GradBucket, Iterable[Tensor], Tensor],
+    max_norm: float,
+    norm_type: float = 2.0,
+) -> float:
+    """Scales the grads in place so that their global norm is at most max_norm
+
+    Args:
+        parameters (Union[GradBucket, Iterable[Tensor], Tensor]): parameters or the
+        bucket holding their grads
+        max_norm (float): largest global norm
+        norm_type (float, optional): p of the norm, np.inf for the max norm.
+        Defaults to 2.0.
+
+    Returns:
+        float: the global norm before clipping
+    """
+    grads = _grads(parameters)
+    norm = total_norm(grads, float(norm_type))
+    coef = max_norm / (norm + 1e-6)
+    if coef < 1:
+        backend = get_backend()
+        for g in grads:
+            backend.elementwise("multiply", g, coef, out=g)
+    return norm
+
+
+def clip_grad_value_(
+    parameters: Union[GradBucket, Iterable[Tensor], Tensor], clip_value: float
+) -> None:
+    """Clamps every gradient entry to [-clip_value, clip_value] in place"""
+    for g in _grads(parameters):
+        np.clip(g, -clip_value, clip_value, out=g)
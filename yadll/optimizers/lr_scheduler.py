@@ -0,0 +1,289 @@
+"""Learning rate schedulers
+
+A scheduler rewrites the hyperparameters of the optimizer param_groups, O(groups) per
+step, and never touches the parameters or the optimizer state (e.g. the SGD
+velocities), so one optimizer serves a whole training run or sweep:
+
+    optim = SGD(model.parameters(), 0.1, 0.9)
+    scheduler = SequentialLR(
+        optim, [LinearLR(optim, 0.01, total_iters=5), CosineAnnealingLR(optim, 95)], [5]
+    )
+    for epoch in range(100):
+        train(model, optim)
+        scheduler.step()
+
+Except for ReduceLROnPlateau the learning rates are closed form functions of the
+step count and of the lr of every group when its first scheduler was created
+(group["initial_lr"]).
+"""
+
+from __future__ import annotations
+from bisect import bisect_right
+from typing import List, Sequence, Union
+import math
+from .optimizer import Optimizer
+
+
+class LRScheduler:
+    def __init__(self, optimizer: Optimizer, last_epoch: int = -1) -> None:
+        self.optimizer = optimizer
+        for group in optimizer.param_groups:
+            group.setdefault("initial_lr", group["lr"])
+        self.base_lrs: List[float] = [
+            group["initial_lr"] for group in optimizer.param_groups
+        ]
+        self.last_epoch = last_epoch
+        self.step()
+
+    def get_lr(self, epoch: int) -> List[float]:
+        """Learning rate of every group at epoch"""
+        raise NotImplementedError
+
+    def step(self) -> None:
+        self.last_epoch += 1
+        self._apply(self.last_epoch)
+
+    def _apply(self, epoch: int) -> None:
+        for group, lr in zip(self.optimizer.param_groups, self.get_lr(epoch)):
+            group["lr"] = lr
+
+    def get_last_lr(self) -> List[float]:
+        return [group["lr"] for group in self.optimizer.param_groups]
+
+
+class StepLR(LRScheduler):
+    def __init__(
+        self, optimizer: Optimizer, step_size: int, gamma: float = 0.1, last_epoch=-1
+    ) -> None:
+        """Multiplies the learning rate by gamma every step_size epochs"""
+        self.step_size = step_size
+        self.gamma = gamma
+        super().__init__(optimizer, last_epoch)
+
+    def get_lr(self, epoch: int) -> List[float]:
+        return [lr * self.gamma ** (epoch // self.step_size) for lr in self.base_lrs]
+
+
+class LinearLR(LRScheduler):
+    def __init__(
+        self,
+        optimizer: Optimizer,
+        start_factor: float = 1.0 / 3,
+        end_factor: float = 1.0,
+        total_iters: int = 5,
+        last_epoch=-1,
+    ) -> None:
+        """Scales the learning rate by a factor going linearly from start_factor to
+        end_factor in total_iters epochs, a warmup with the default end_factor"""
+        self.start_factor = start_factor
+        self.end_factor = end_factor
+        self.total_iters = total_iters
+        super().__init__(optimizer, last_epoch)
+
+    def get_lr(self, epoch: int) -> List[float]:
+        progress = min(epoch, self.total_iters) / self.total_iters
+        factor = self.start_factor + (self.end_factor - self.start_factor) * progress
+        return [lr * factor for lr in self.base_lrs]
+
+
+class CosineAnnealingLR(LRScheduler):
+    def __init__(
+        self, optimizer: Optimizer, T_max: int, eta_min: float = 0, last_epoch=-1
+    ) -> None:
+        """Anneals the learning rate to eta_min along a half cosine of T_max epochs"""
+        self.T_max = T_max
+        self.eta_min = eta_min
+        super().__init__(optimizer, last_epoch)
+
+    def get_lr(self, epoch: int) -> List[float]:
+        cosine = (1 + math.cos(math.pi * epoch / self.T_max)) / 2
+        return [self.eta_min + (lr - self.eta_min) * cosine for lr in self.base_lrs]
+
+
+class SequentialLR(LRScheduler):
+    def __init__(
+        self,
+        optimizer: Optimizer,
+        schedulers: Sequence[LRScheduler],
+        milestones: Sequence[int],
+        last_epoch=-1,
+    ) -> None:
+        """Runs schedulers[i] from milestones[i - 1], e.g. a warmup then a decay
+
+        Every scheduler counts its epochs from the milestone it starts at.
+        """
+        assert len(milestones) == len(schedulers) - 1
+        self.schedulers = list(schedulers)
+        self.milestones = list(milestones)
+        super().__init__(optimizer, last_epoch)
+
+    def get_lr(self, epoch: int) -> List[float]:
+        i = bisect_right(self.milestones, epoch)
+        return self.schedulers[i].get_lr(epoch - (self.milestones[i - 1] if i else 0))
+
+
+class OneCycleLR(LRScheduler):
+    def __init__(
+        self,
+        optimizer: Optimizer,
+        max_lr: Union[float, Sequence[float]],
+        total_steps: int,
+        pct_start: float = 0.3,
+        anneal_strategy: str = "cos",
+        cycle_momentum: bool = True,
+        base_momentum: float = 0.85,
+        max_momentum: float = 0.95,
+        div_factor: float = 25.0,
+        final_div_factor: float = 1e4,
+        last_epoch=-1,
+    ) -> None:
+        """1cycle policy, stepped after every batch
+
+        The learning rate rises from max_lr / div_factor to max_lr in the first
+        pct_start of total_steps, then anneals to max_lr / div_factor /
+        final_div_factor. With cycle_momentum the momentum moves the opposite way,
+        between max_momentum and base_momentum.
+        """
+        assert anneal_strategy in ("cos", "linear")
+        groups = optimizer.param_groups
+        max_lrs = (
+            list(max_lr)
+            if isinstance(max_lr, (list, tuple))
+            else [max_lr] * len(groups)
+        )
+        for group, lr in zip(groups, max_lrs):
+            # the cycle ignores the lr the groups were created with
+            group["initial_lr"] = lr / div_factor
+        self.max_lrs = max_lrs
+        self.total_steps = total_steps
+        self.div_factor = div_factor
+        self.final_div_factor = final_div_factor
+        # (last step of the phase, lr start and end, momentum start and end)
+        self.phases = [
+            (float(pct_start * total_steps) - 1, "initial", "max", "max", "base"),
+            (total_steps - 1, "max", "min", "base", "max"),
+        ]
+        self.anneal = self._cos if anneal_strategy == "cos" else self._linear
+        self.cycle_momentum = cycle_momentum
+        self.momentums = {"base": base_momentum, "max": max_momentum}
+        super().__init__(optimizer, last_epoch)
+
+    @staticmethod
+    def _cos(start: float, end: float, pct: float) -> float:
+        return end + (start - end) / 2 * (math.cos(math.pi * pct) + 1)
+
+    @staticmethod
+    def _linear(start: float, end: float, pct: float) -> float:
+        return (end - start) * pct + start
+
+    def _phase(self, step: int):
+        start = 0
+        for i, (end, *values) in enumerate(self.phases):
+            if step <= end or i == len(self.phases) - 1:
+                return (step - start) / (end - start), values
+            start = end
+
+    def get_lr(self, epoch: int) -> List[float]:
+        assert (
+            epoch < self.total_steps
+        ), f"stepped {epoch + 1} times, {self.total_steps} at most"
+        pct, (lr_start, lr_end, _, _) = self._phase(epoch)
+        lrs = []
+        for max_lr in self.max_lrs:
+            initial = max_lr / self.div_factor
+            points = {
+                "initial": initial,
+                "max": max_lr,
+                "min": initial / self.final_div_factor,
+            }
+            lrs.append(self.anneal(points[lr_start], points[lr_end], pct))
+        return lrs
+
+    def _apply(self, epoch: int) -> None:
+        super()._apply(epoch)
+        if self.cycle_momentum:
+            pct, (_, _, start, end) = self._phase(epoch)
+            momentum = self.anneal(self.momentums[start], self.momentums[end], pct)
+            for group in self.optimizer.param_groups:
+                group["momentum"] = momentum
+
+
+class ReduceLROnPlateau:
+    def __init__(
+        self,
+        optimizer: Optimizer,
+        mode: str = "min",
+        factor: float = 0.1,
+        patience: int = 10,
+        threshold: float = 1e-4,
+        threshold_mode: str = "rel",
+        cooldown: int = 0,
+        min_lr: Union[float, Sequence[float]] = 0,
+        eps: float = 1e-8,
+    ) -> None:
+        """Multiplies the learning rate by factor once the metric passed to step()
+        has not improved for more than patience epochs
+
+        Args:
+            optimizer (Optimizer): optimizer whose groups are updated
+            mode (str, optional): "min" or "max", the direction of an improvement.
+            Defaults to "min".
+            factor (float, optional): multiplier of the learning rate. Defaults to 0.1.
+            patience (int, optional): epochs without improvement tolerated.
+            Defaults to 10.
+            threshold (float, optional): smallest significant improvement.
+            Defaults to 1e-4.
+            threshold_mode (str, optional): "rel" (relative to the best metric) or
+            "abs". Defaults to "rel".
+            cooldown (int, optional): epochs without counting after a reduction.
+            Defaults to 0.
+            min_lr (Union[float, Sequence[float]], optional): lower bound, per group.
+            Defaults to 0.
+            eps (float, optional): smaller reductions are skipped. Defaults to 1e-8.
+        """
+        assert mode in ("min", "max") and threshold_mode in ("rel", "abs")
+        self.optimizer = optimizer
+        self.mode = mode
+        self.factor = factor
+        self.patience = patience
+        self.threshold = threshold
+        self.threshold_mode = threshold_mode
+        self.cooldown = cooldown
+        self.min_lrs = (
+            list(min_lr)
+            if isinstance(min_lr, (list, tuple))
+            else [min_lr] * len(optimizer.param_groups)
+        )
+        self.eps = eps
+        self.best = math.inf if mode == "min" else -math.inf
+        self.num_bad_epochs = 0
+        self.cooldown_counter = 0
+        self.last_epoch = 0
+
+    def is_better(self, metric: float) -> bool:
+        sign = 1 if self.mode == "min" else -1
+        if self.threshold_mode == "rel":
+            return sign * metric < sign * self.best * (1 - sign * self.threshold)
+        return sign * metric < sign * self.best - self.threshold
+
+    def step(self, metric: float) -> None:
+        metric = float(metric)
+        self.last_epoch += 1
+        if self.is_better(metric):
+            self.best = metric
+            self.num_bad_epochs = 0
+        else:
+            self.num_bad_epochs += 1
+        if self.cooldown_counter > 0:
+            self.cooldown_counter -= 1
+            self.num_bad_epochs = 0
+        if self.num_bad_epochs > self.patience:
+            for group, min_lr in zip(self.optimizer.param_groups, self.min_lrs):
+                lr = max(group["lr"] * self.factor, min_lr)
+                if group["lr"] - lr > self.eps:
+                    group["lr"] = lr
+            self.cooldown_counter = self.cooldown
+            self.num_bad_epochs = 0
+
+    def get_last_lr(self) -> List[float]:
+        return [group["lr"] for group in self.optimizer.param_groups]
@@ -1,40 +1,106 @@
 from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Union
 import numpy as np
 from ..autodiff import Tensor
+from ..sparse import SparseTensor
 
 
 class Optimizer(ABC):
-    def __init__(self, params):
-        self.params = params
+    def __init__(
+        self, params: Union[Iterable[Tensor], Iterable[Dict[str, Any]]], defaults: dict
+    ):
+        """
+        Args:
+            params (Union[Iterable[Tensor], Iterable[Dict[str, Any]]]): parameters, or
+            groups {"params": [...], **hyperparameters} whose missing hyperparameters
+            are taken from defaults
+            defaults (dict): default hyperparameters of a group
+        """
+        self.defaults = defaults
+        self.param_groups: List[Dict[str, Any]] = []
+        # a list, Sequential.parameters() is a generator
+        self.params: List[Tensor] = []
+        # the group of every parameter, for update(p)
+        self.groups: Dict[Tensor, Dict[str, Any]] = {}
+        params = list(params)
+        for group in params if params and isinstance(params[0], dict) else [params]:
+            self.add_param_group(
+                group if isinstance(group, dict) else {"params": group}
+            )
+
+    def add_param_group(self, group: Dict[str, Any]) -> None:
+        """Adds the parameters of group, with its own hyperparameters"""
+        group = {**self.defaults, **group, "params": list(group["params"])}
+        for p in group["params"]:
+            assert p not in self.groups, "a parameter can only be in one group"
+            self.groups[p] = group
+        self.param_groups.append(group)
+        self.params.extend(group["params"])
 
     @abstractmethod
     def step(self):
         pass
 
-    def zero_grad(self):
+    def update(self, p: Tensor):
+        """Updates a single parameter, e.g. as soon as its gradient is final"""
+        raise NotImplementedError
+
+    def zero_grad(self, set_to_none: bool = False):
+        """Zeroes the grads in place so the next backward accumulates into them
+
+        With set_to_none the dense grads are released instead and reallocated by the
+        next backward, see Tensor.zero_grad.
+        """
         for p in self.params:
-            p.grad = None
+            p.zero_grad(set_to_none)
 
 
 class SGD(Optimizer):
-    def __init__(self, params, lr: float, momentum: float = 0, dampening: float = 0):
-        super().__init__(params)
-        self.lr = lr
-        self.momentum = momentum
-        self.dampening = dampening
+    def __init__(
+        self,
+        params: Union[Iterable[Tensor], Iterable[Dict[str, Any]]],
+        lr: float,
+        momentum: float = 0,
+        dampening: float = 0,
+    ):
+        super().__init__(params, dict(lr=lr, momentum=momentum, dampening=dampening))
         self.velocities = {}
 
     def step(self):
-        for p in self.params:
-            if p.grad is not None:
-                if self.momentum == 0:
-                    p.data -= self.lr * p.grad
-                else:
-                    if p not in self.velocities:
-                        self.velocities[p] = Tensor.zeros(p.shape)
-                    velocity = (self.momentum * self.velocities[p]).data + (
-                        1 - self.dampening
-                    ) * p.grad
-                    # Update the velocity
-                    self.velocities[p] = velocity
-                    p.data -= self.lr * velocity
+        for group in self.param_groups:
+            for p in group["params"]:
+                self._update(p, group)
+
+    def update(self, p: Tensor):
+        self._update(p, self.groups[p])
+
+    def _update(self, p: Tensor, group: Dict[str, Any]):
+        lr, momentum = group["lr"], group["momentum"]
+        if isinstance(p.grad, SparseTensor):
+            self._sparse_step(p, lr, momentum, group["dampening"])
+        elif p.grad is not None:
+            if momentum == 0:
+                p.data -= lr * p.grad
+            else:
+                # plain numpy, the update may run on a worker thread
+                velocity = (
+                    momentum * self.velocities.get(p, 0)
+                    + (1 - group["dampening"]) * p.grad
+                )
+                # Update the velocity
+                self.velocities[p] = velocity
+                p.data -= lr * velocity
+
+    def _sparse_step(self, p, lr: float, momentum: float, dampening: float):
+        # lazy update: only the rows present in the gradient are touched, the
+        # velocity of the other rows is not decayed
+        grad = p.grad.coalesce()
+        rows = tuple(grad.indices)
+        if momentum == 0:
+            p.data[rows] -= lr * grad.values
+            return
+        if p not in self.velocities:
+            self.velocities[p] = np.zeros_like(p.data)
+        velocity = self.velocities[p]
+        velocity[rows] = momentum * velocity[rows] + (1 - dampening) * grad.values
+        p.data[rows] -= lr * velocity[rows]
@@ -0,0 +1,268 @@
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List
+import copy
+import numpy as np
+from .autodiff import Tensor
+from .sparse import CSRTensor, _csr_matmul
+from .nn.module import Module, Linear
+from .nn.convolution import Conv
+from .nn.functional import conv, window_view, _pad, _im2col, _from_groups
+from .nn.helper import replace_modules
+from .optimizers import Optimizer, SGD
+
+
+def magnitude_mask(w: np.ndarray, amount: float) -> np.ndarray:
+    """Unstructured pruning of the `amount` fraction of smallest magnitude weights"""
+    k = int(round(amount * w.size))
+    mask = np.ones(w.shape, dtype=bool)
+    if k > 0:
+        mask.reshape(-1)[np.argpartition(np.abs(w).reshape(-1), k - 1)[:k]] = False
+    return mask
+
+
+def n_m_mask(w: np.ndarray, n: int = 2, m: int = 4) -> np.ndarray:
+    """N:M pruning: keeps the n largest of every m consecutive weights of a row
+
+    The rows are the output channels, w is flattened to (C_out, -1) which must be a
+    multiple of m.
+    """
+    blocks = np.abs(w).reshape(w.shape[0], -1, m)
+    mask = np.zeros(blocks.shape, dtype=bool)
+    np.put_along_axis(mask, np.argsort(blocks, axis=-1)[..., m - n :], True, axis=-1)
+    return mask.reshape(w.shape)
+
+
+def channel_mask(w: np.ndarray, amount: float) -> np.ndarray:
+    """Structured pruning: drops the `amount` fraction of output channels (dim 0)
+    with the smallest L1 norm"""
+    k = int(round(amount * w.shape[0]))
+    norms = np.abs(w.reshape(w.shape[0], -1)).sum(axis=1)
+    mask = np.ones(w.shape, dtype=bool)
+    mask[np.argsort(norms)[:k]] = False
+    return mask
+
+
+class Pruner:
+    """Keeps pruning masks of the weights of every Linear and Conv of a model
+
+    A hook masks the grads of the pruned weights as soon as backward() finalizes
+    them, ahead of the updates the Trainer runs inside backward. With the optimizer
+    given, the momentum built up before pruning is dropped as well, so the pruned
+    weights stay zero. apply() zeroes them again if anything else modified the
+    weights, remove() detaches the hooks.
+    """
+
+    def __init__(self, model: Module, optimizer: Optimizer = None) -> None:
+        self.model = model
+        self.optimizer = optimizer
+        self.masks: Dict[Tensor, np.ndarray] = {}
+        self._removers: Dict[Tensor, Callable[[], None]] = {}
+
+    def targets(self) -> List[Module]:
+        return [m for m in self.model.modules() if isinstance(m, (Linear, Conv))]
+
+    def prune(
+        self,
+        method: str = "magnitude",
+        amount: float = 0.5,
+        n: int = 2,
+        m: int = 4,
+        modules: Iterable[Module] = None,
+    ) -> None:
+        """Prunes the weights of modules (all Linear and Conv by default)
+
+        Args:
+            method (str, optional): "magnitude", "n:m" or "channel".
+            Defaults to "magnitude".
+            amount (float, optional): fraction of weights or channels to drop.
+            Defaults to 0.5.
+            n (int, optional): kept weights per block of m for "n:m". Defaults to 2.
+            m (int, optional): block size for "n:m". Defaults to 4.
+            modules (Iterable[Module], optional): modules to prune. Defaults to None.
+        """
+        for module in modules if modules is not None else self.targets():
+            w = module.weight
+            # weights that are already pruned stay pruned
+            data = np.where(self.masks.get(w, True), w.data, 0)
+            if method == "magnitude":
+                mask = magnitude_mask(data, amount)
+            elif method == "n:m":
+                mask = n_m_mask(data, n, m)
+            elif method == "channel":
+                mask = channel_mask(data, amount)
+            else:
+                raise ValueError(f"unknown pruning method {method}")
+            self.masks[w] = mask & self.masks.get(w, True)
+            if w not in self._removers:
+                self._removers[w] = w.register_post_accumulate_grad_hook(
+                    self._mask_grad, prepend=True
+                )
+            if isinstance(self.optimizer, SGD) and isinstance(
+                self.optimizer.velocities.get(w), np.ndarray
+            ):
+                self.optimizer.velocities[w] *= self.masks[w]
+        self.apply()
+
+    def apply(self) -> None:
+        for p, mask in self.masks.items():
+            p.data *= mask
+
+    def _mask_grad(self, p: Tensor) -> None:
+        if isinstance(p.grad, np.ndarray):
+            p.grad *= self.masks[p]
+
+    def mask_grads(self) -> None:
+        """Masks the grads by hand, backward() already does it through the hooks"""
+        for p in self.masks:
+            self._mask_grad(p)
+
+    def remove(self) -> None:
+        """Detaches the gradient hooks, the masks are kept"""
+        for remove in self._removers.values():
+            remove()
+        self._removers.clear()
+
+    def sparsity(self) -> float:
+        total = sum(mask.size for mask in self.masks.values())
+        kept = sum(mask.sum() for mask in self.masks.values())
+        return 1 - kept / total if total else 0.0
+
+
+class CompactLinear(Module):
+    """Inference only Linear without its pruned output features, they are not computed
+
+    The output keeps its full width, the pruned features only get their bias.
+    """
+
+    def __init__(self, linear: Linear) -> None:
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        self.kept = np.flatnonzero(linear.weight.data.any(axis=1))
+        self.weight = linear.weight.data[self.kept]
+        self.b = (
+            linear.b.data.reshape(-1) if linear.bias else np.zeros(self.out_features)
+        )
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        out = np.broadcast_to(self.b, x.shape[:-1] + (self.out_features,)).copy()
+        out[..., self.kept] += x.data @ self.weight.T
+        return Tensor(out)
+
+
+class CompactConv(Module):
+    """Inference only Conv without its pruned output channels, they are not computed
+
+    The output keeps all channels, the pruned ones only get their bias.
+    """
+
+    def __init__(self, module: Conv) -> None:
+        super().__init__()
+        w = module.weight.data
+        self.out_channels = module.out_channels
+        self.stride = module.stride[2:]
+        self.padding = module.padding
+        self.dilation = module.dilation
+        self.fused_relu = module.fused_relu
+        self.kept = np.flatnonzero(w.reshape(w.shape[0], -1).any(axis=1))
+        self.weight = w[self.kept]
+        self.b = module.b.data if module.bias else np.zeros(self.out_channels)
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        compact = conv(
+            x, Tensor(self.weight), None, self.stride, self.padding, self.dilation
+        )
+        n = len(compact.shape) - 2
+        out = np.broadcast_to(
+            self.b.reshape((-1,) + (1,) * n),
+            (x.shape[0], self.out_channels) + compact.shape[2:],
+        ).copy()
+        out[:, self.kept] += compact.data
+        if self.fused_relu:
+            np.maximum(out, 0, out=out)
+        return Tensor(out)
+
+
+class SparseLinear(Module):
+    """Inference only Linear with a CSR weight, the pruned weights are skipped"""
+
+    def __init__(self, linear: Linear) -> None:
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        self.weight = CSRTensor.from_dense(linear.weight.data)
+        self.b = linear.b.data.reshape(-1) if linear.bias else None
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        # (W @ x^T)^T, the CSR rows are the output features
+        x_t = np.ascontiguousarray(x.data.reshape(-1, self.in_features).T)
+        out = _csr_matmul(
+            self.weight.indptr, self.weight.indices, self.weight.values, x_t
+        ).T
+        if self.b is not None:
+            out = out + self.b
+        return Tensor(out.reshape(x.shape[:-1] + (self.out_features,)))
+
+
+class SparseConv(Module):
+    """Inference only Conv with a CSR weight
+
+    The (C_out, C_in * prod(k)) weight is applied to the im2col columns.
+    """
+
+    def __init__(self, module: Conv) -> None:
+        super().__init__()
+        assert module.groups == 1, "only dense (groups=1) convolutions are sparsified"
+        self.out_channels = module.out_channels
+        self.kernel_size = tuple(module.kernel_size)
+        self.stride = tuple(module.stride[2:])
+        self.padding = module.padding
+        self.dilation = tuple(module.dilation)
+        self.fused_relu = module.fused_relu
+        w = module.weight.data
+        self.weight = CSRTensor.from_dense(w.reshape(w.shape[0], -1))
+        self.b = module.b.data if module.bias else None
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        n = len(self.kernel_size)
+        windows = window_view(
+            _pad(x.data, self.padding), self.kernel_size, self.stride, self.dilation
+        )
+        cols = _im2col(windows, 1)
+        out = _csr_matmul(
+            self.weight.indptr, self.weight.indices, self.weight.values, cols[0]
+        )
+        out = _from_groups(out[None], x.shape[0], windows.shape[2 : 2 + n])
+        if self.b is not None:
+            out += self.b.reshape((-1,) + (1,) * n)
+        if self.fused_relu:
+            np.maximum(out, 0, out=out)
+        return Tensor(out)
+
+
+def export_pruned(
+    model: Module, sparse_threshold: float = 0.9, inplace: bool = False
+) -> Module:
+    """Rewrites pruned Linear/Conv layers into kernels that skip the zeros
+
+    Layers with whole output channels pruned become CompactLinear/CompactConv,
+    layers with at least sparse_threshold zero weights become SparseLinear/SparseConv,
+    the other layers are left dense. The CSR kernels only beat BLAS on very sparse
+    weights, hence the high default threshold. The exported layers are for inference.
+    """
+    model = model if inplace else copy.deepcopy(model)
+
+    def convert(module: Module) -> Module:
+        if not isinstance(module, (Linear, Conv)):
+            return module
+        is_conv = isinstance(module, Conv)
+        if is_conv and module.groups != 1:
+            return module
+        w = module.weight.data
+        if not w.reshape(w.shape[0], -1).any(axis=1).all():
+            return CompactConv(module) if is_conv else CompactLinear(module)
+        if np.mean(w == 0) >= sparse_threshold:
+            return SparseConv(module) if is_conv else SparseLinear(module)
+        return module
+
+    return replace_modules(model, convert)
@@ -0,0 +1,212 @@
+from __future__ import annotations
+from typing import Dict, Iterable, Tuple
+import copy
+import numpy as np
+from .autodiff import Tensor, no_grad
+from .nn.module import Module, Linear
+from .nn.convolution import Conv
+from .nn.functional import window_view, _im2col, _from_groups
+from .nn.helper import replace_modules
+
+# |int8 * int8| <= 2^14, so a float32 dot product of up to 2^10 such terms only
+# ever holds integers below 2^24 and is exact
+INT8_CHUNK = 2**24 // (128 * 128)
+
+
+def quantize_params(low: float, high: float) -> Tuple[float, int]:
+    """Asymmetric int8 scale and zero point covering [low, high]
+
+    The range is widened to contain 0 so that zero padding is exactly representable.
+    """
+    low, high = min(low, 0.0), max(high, 0.0)
+    scale = (high - low) / 255 if high > low else 1.0
+    zero_point = int(np.clip(np.round(-128 - low / scale), -128, 127))
+    return scale, zero_point
+
+
+def quantize(x: np.ndarray, scale: float, zero_point: int, dtype=np.int8) -> np.ndarray:
+    return np.clip(np.round(x / scale) + zero_point, -128, 127).astype(dtype)
+
+
+def dequantize(q: np.ndarray, scale: float, zero_point: int) -> np.ndarray:
+    return (q.astype(np.float64) - zero_point) * scale
+
+
+def quantize_per_channel(w: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric int8 quantization with one scale per output channel (dim 0)
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: int8 weight in [-127, 127] and (C_out,) scales,
+        the zero points are all 0.
+    """
+    amax = np.abs(w.reshape(w.shape[0], -1)).max(axis=1)
+    scale = np.where(amax > 0, amax / 127, 1.0)
+    q = np.round(w / scale.reshape((-1,) + (1,) * (w.ndim - 1)))
+    return np.clip(q, -127, 127).astype(np.int8), scale
+
+
+def _int8_gemm(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # int8 valued operands, the accumulators are exact integers stored as floats
+    K = a.shape[-1]
+    a, b = a.astype(np.float32, copy=False), b.astype(np.float32, copy=False)
+    if K <= INT8_CHUNK:
+        return a @ b
+    batch = np.broadcast_shapes(a.shape[:-2], b.shape[:-2])
+    out = np.zeros(batch + (a.shape[-2], b.shape[-1]), np.float64)
+    for k in range(0, K, INT8_CHUNK):
+        out += a[..., k : k + INT8_CHUNK] @ b[..., k : k + INT8_CHUNK, :]
+    return out
+
+
+def int8_matmul(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Exact int8 (..., M, K) @ int8 (..., K, N) -> int32
+
+    numpy has no integer BLAS, the product runs as float32 GEMMs over chunks of at
+    most INT8_CHUNK along K. Every chunk is exact and the chunks are summed in
+    float64, which is exact far beyond the int32 range.
+    """
+    return _int8_gemm(a, b).astype(np.int32)
+
+
+def requantize(
+    acc: np.ndarray,
+    multiplier: np.ndarray,
+    offset: np.ndarray,
+    scale: float = None,
+    zero_point: int = 0,
+) -> np.ndarray:
+    """Epilogue of a quantized GEMM: one multiply-add per accumulator
+
+    multiplier is input_scale * weight_scale and offset folds the bias together with
+    the input zero point correction. Returns floats, or int8 when output qparams are
+    given.
+    """
+    out = acc * multiplier + offset
+    return out if scale is None else quantize(out, scale, zero_point)
+
+
+def _epilogue_params(
+    weight: np.ndarray, weight_scale: np.ndarray, bias: np.ndarray, scale, zero_point
+) -> Tuple[np.ndarray, np.ndarray]:
+    # sum_k (qx - zp) * qw = qx @ qw - zp * sum_k qw, the second term is a constant
+    weight_sum = weight.reshape(weight.shape[0], -1).astype(np.int64).sum(axis=1)
+    multiplier = scale * weight_scale
+    offset = -zero_point * weight_sum * multiplier
+    if bias is not None:
+        offset = offset + bias.reshape(-1)
+    return multiplier, offset
+
+
+class QuantizedLinear(Module):
+    """Inference only Linear with per-channel int8 weights and int8 activations
+
+    Takes and returns float Tensors, the input is quantized with the calibrated
+    scale and zero point.
+    """
+
+    def __init__(self, linear: Linear, input_range: Tuple[float, float]) -> None:
+        super().__init__()
+        self.in_features = linear.in_features
+        self.out_features = linear.out_features
+        self.scale, self.zero_point = quantize_params(*input_range)
+        self.weight, self.weight_scale = quantize_per_channel(linear.weight.data)
+        self.multiplier, self.offset = _epilogue_params(
+            self.weight,
+            self.weight_scale,
+            linear.b.data if linear.bias else None,
+            self.scale,
+            self.zero_point,
+        )
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        assert x.shape[-1] == self.in_features
+        # the activations go straight to int8 valued float32, the GEMM operand type
+        q = quantize(x.data, self.scale, self.zero_point, np.float32)
+        acc = _int8_gemm(q.reshape(-1, self.in_features), self.weight.T)
+        out = requantize(acc, self.multiplier, self.offset)
+        return Tensor(out.reshape(x.shape[:-1] + (self.out_features,)))
+
+
+class QuantizedConv(Module):
+    """Inference only Conv1d/2d/3d with per-channel int8 weights and int8 activations"""
+
+    def __init__(self, conv: Conv, input_range: Tuple[float, float]) -> None:
+        super().__init__()
+        self.in_channels = conv.in_channels
+        self.out_channels = conv.out_channels
+        self.kernel_size = tuple(conv.kernel_size)
+        self.stride = tuple(conv.stride[2:])
+        self.padding = conv.padding
+        self.dilation = tuple(conv.dilation)
+        self.groups = conv.groups
+        self.fused_relu = conv.fused_relu
+        self.scale, self.zero_point = quantize_params(*input_range)
+        self.weight, self.weight_scale = quantize_per_channel(conv.weight.data)
+        self.multiplier, self.offset = _epilogue_params(
+            self.weight,
+            self.weight_scale,
+            conv.b.data if conv.bias else None,
+            self.scale,
+            self.zero_point,
+        )
+
+    def forward(self, x: Tensor, *args, **kwargs) -> Tensor:
+        N, n = x.shape[0], len(self.kernel_size)
+        q = quantize(x.data, self.scale, self.zero_point)
+        # padding with the zero point is padding with a real 0
+        q = np.pad(q, ((0, 0), (0, 0), *self.padding), constant_values=self.zero_point)
+        windows = window_view(q, self.kernel_size, self.stride, self.dilation)
+        out_dims = windows.shape[2 : 2 + n]
+        w = self.weight.reshape(self.groups, self.out_channels // self.groups, -1)
+        acc = _from_groups(_int8_gemm(w, _im2col(windows, self.groups)), N, out_dims)
+        shape = (-1,) + (1,) * n
+        out = requantize(
+            acc, self.multiplier.reshape(shape), self.offset.reshape(shape)
+        )
+        if self.fused_relu:
+            np.maximum(out, 0, out=out)
+        return Tensor(out)
+
+
+def calibrate(
+    model: Module, data: Iterable[Tensor]
+) -> Dict[Module, Tuple[float, float]]:
+    """Runs model on sample batches and records the input range of every Linear/Conv"""
+    targets = [m for m in model.modules() if isinstance(m, (Linear, Conv))]
+    ranges = {id(m): (np.inf, -np.inf) for m in targets}
+
+    def observe(module: Module, args: tuple) -> None:
+        low, high = ranges[id(module)]
+        x = args[0].data
+        ranges[id(module)] = (min(low, float(x.min())), max(high, float(x.max())))
+
+    removers = [module.register_forward_pre_hook(observe) for module in targets]
+    try:
+        with no_grad():
+            for x in data:
+                model(x)
+    finally:
+        for remove in removers:
+            remove()
+    return {m: ranges[id(m)] for m in targets if np.isfinite(ranges[id(m)][0])}
+
+
+def quantize_model(
+    model: Module, calibration_data: Iterable[Tensor], inplace: bool = False
+) -> Module:
+    """Post-training quantization of every Linear and Conv seen during calibration
+
+    The layers are replaced by QuantizedLinear/QuantizedConv, their float weights
+    are dropped from the parents' parameter lists.
+    """
+    model = model if inplace else copy.deepcopy(model)
+    ranges = calibrate(model, calibration_data)
+
+    def convert(module: Module) -> Module:
+        if module not in ranges:
+            return module
+        if isinstance(module, Linear):
+            return QuantizedLinear(module, ranges[module])
+        return QuantizedConv(module, ranges[module])
+
+    return replace_modules(model, convert)
@@ -0,0 +1,656 @@
+"""Export of a Module to a frozen inference graph and a minimal runtime to execute it
+
+export() runs the model once on an example input and records every op: the layers
+the runtime knows (Linear, Conv, BatchNorm, LayerNorm, pooling, activations) become
+single nodes and the Tensor ops of custom forward methods are recorded as they are
+called. The graph is specialized to the shape of the example input.
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Tuple
+import json
+import numpy as np
+from .autodiff import Tensor
+from .nn.module import Module, Linear, ReLU, Exp, Log, Sum, Mean, Max
+from .nn.convolution import Conv
+from .nn.normalization import BatchNorm, LayerNorm
+from .nn.pooling import AdaptivePool, Pool
+from .nn.functional import window_view, _pad, _im2col, _from_groups
+from .nn.functional import AdaptivePoolPlan, PoolPlan, _adaptive_avg
+from .nn.helper import batch_norm_scale_shift, fold_scale_shift
+
+
+class Node:
+    def __init__(
+        self, op: str, inputs: List[str], output: str, shape: tuple, attrs: dict = None
+    ) -> None:
+        self.op = op
+        self.inputs = inputs
+        self.output = output
+        self.shape = tuple(shape)
+        self.attrs = attrs if attrs is not None else {}
+
+    def __repr__(self):
+        return f"{self.output} = {self.op}({', '.join(self.inputs)}, {self.attrs})"
+
+
+class Graph:
+    def __init__(self, input: str, input_shape: tuple) -> None:
+        self.input = input
+        self.input_shape = tuple(input_shape)
+        self.output: str = None
+        self.nodes: List[Node] = []
+        self.constants: Dict[str, np.ndarray] = {}
+
+    def __repr__(self):
+        return "\n".join(repr(node) for node in self.nodes)
+
+    def save(self, path: str) -> None:
+        """Graph as JSON and the constants in a single .npz file"""
+        graph = {
+            "input": self.input,
+            "input_shape": self.input_shape,
+            "output": self.output,
+            "nodes": [vars(node) for node in self.nodes],
+        }
+        np.savez(path, __graph__=np.array(json.dumps(graph)), **self.constants)
+
+    @staticmethod
+    def load(path: str) -> Graph:
+        with np.load(path) as f:
+            description = json.loads(str(f["__graph__"]))
+            constants = {k: f[k] for k in f.files if k != "__graph__"}
+        graph = Graph(description["input"], description["input_shape"])
+        graph.output = description["output"]
+        graph.nodes = [
+            Node(n["op"], n["inputs"], n["output"], n["shape"], n["attrs"])
+            for n in description["nodes"]
+        ]
+        graph.constants = constants
+        return graph
+
+
+# kernels: (inputs, out buffer or None, **attrs) -> output array
+
+
+def _binary(ufunc: np.ufunc) -> Callable:
+    return lambda inputs, out: ufunc(inputs[0], inputs[1], out=out)
+
+
+def _unary(ufunc: np.ufunc) -> Callable:
+    return lambda inputs, out: ufunc(inputs[0], out=out)
+
+
+def _linear(inputs, out):
+    x, weight = inputs[:2]
+    out = np.matmul(x, weight.T, out=out)
+    if len(inputs) == 3:
+        out += inputs[2]
+    return out
+
+
+def _conv(inputs, out, stride, padding, dilation, groups, relu=False):
+    x, weight = inputs[:2]
+    n = weight.ndim - 2
+    windows = window_view(_pad(x, padding), weight.shape[2:], stride, dilation)
+    w = weight.reshape(groups, weight.shape[0] // groups, -1)
+    result = _from_groups(
+        w @ _im2col(windows, groups), x.shape[0], windows.shape[2 : 2 + n]
+    )
+    if out is None:
+        out = result
+    else:
+        np.copyto(out, result)
+    if len(inputs) == 3:
+        out += inputs[2].reshape((-1,) + (1,) * n)
+    return np.maximum(out, 0, out=out) if relu else out
+
+
+def _scale_shift(inputs, out, relu=False):
+    x, scale, shift = inputs
+    shape = (-1,) + (1,) * (x.ndim - 2)
+    out = np.multiply(x, scale.reshape(shape), out=out)
+    out += shift.reshape(shape)
+    return np.maximum(out, 0, out=out) if relu else out
+
+
+def _layer_norm(inputs, out, dims, eps):
+    x, gamma, beta = inputs
+    axis = tuple(range(x.ndim - dims, x.ndim))
+    centered = x - x.mean(axis=axis, keepdims=True)
+    std = np.sqrt((centered**2).mean(axis=axis, keepdims=True) + eps)
+    out = np.divide(centered, std, out=out)
+    out *= gamma
+    out += beta
+    return out
+
+
+def _pool(mode: str) -> Callable:
+    def kernel(
+        inputs,
+        out,
+        kernel_size,
+        stride,
+        padding,
+        pad_value,
+        ceil_mode=False,
+        count_include_pad=True,
+    ):
+        x = inputs[0]
+        plan = PoolPlan(
+            x.shape,
+            mode,
+            tuple(kernel_size),
+            tuple(stride),
+            tuple(tuple(p) for p in padding),
+            ceil_mode,
+            count_include_pad,
+        )
+        windows = plan.windows(plan.pad(x, float(pad_value)))
+        if mode == "max":
+            return np.max(windows, axis=plan.kernel_axes, out=out)
+        out = np.sum(windows, axis=plan.kernel_axes, out=out)
+        out /= plan.divisor
+        return out
+
+    return kernel
+
+
+def _adaptive_pool(mode: str) -> Callable:
+    def kernel(inputs, out, output_size, keepdim):
+        x = inputs[0]
+        if isinstance(output_size, list):
+            output_size = tuple(output_size)
+        plan = AdaptivePoolPlan(x.shape, mode, output_size, keepdim)
+        # the (N, C, bins) view of the output buffer
+        bins = None if out is None else out.reshape(x.shape[:2] + (-1,))
+        flat = x.reshape(plan.flat_shape)
+        if mode == "max":
+            windows = flat[:, :, None, :] if plan.is_global else flat[:, :, plan.gather]
+            result = np.max(windows, axis=-1, out=bins)
+        elif plan.is_global:
+            result = np.mean(flat, axis=-1, keepdims=True, out=bins)
+        else:
+            result = _adaptive_avg(x, plan.matrices)
+            if out is not None:
+                np.copyto(out, result.reshape(out.shape))
+        return result.reshape(plan.out_shape) if out is None else out
+
+    return kernel
+
+
+def _axis(dim):
+    return tuple(dim) if isinstance(dim, list) else dim
+
+
+def _reduce(reduce: Callable) -> Callable:
+    def kernel(inputs, out, dim, keepdim, correction=0.0):
+        x = inputs[0]
+        out = reduce(x, axis=_axis(dim), keepdims=keepdim, out=out)
+        if correction:
+            count = x.size / np.size(out)
+            out *= count / (count - correction)
+        return out
+
+    return kernel
+
+
+KERNELS: Dict[str, Callable] = {
+    "add": _binary(np.add),
+    "sub": _binary(np.subtract),
+    "mul": _binary(np.multiply),
+    "div": _binary(np.divide),
+    "pow": _binary(np.power),
+    "matmul": _binary(np.matmul),
+    "neg": _unary(np.negative),
+    "exp": _unary(np.exp),
+    "log": _unary(np.log),
+    "relu": lambda inputs, out: np.maximum(inputs[0], 0, out=out),
+    "linear": _linear,
+    "conv": _conv,
+    "scale_shift": _scale_shift,
+    "layer_norm": _layer_norm,
+    "max_pool": _pool("max"),
+    "avg_pool": _pool("avg"),
+    "adaptive_max_pool": _adaptive_pool("max"),
+    "adaptive_avg_pool": _adaptive_pool("avg"),
+    "sum": _reduce(np.sum),
+    "mean": _reduce(np.mean),
+    "var": lambda inputs, out, dim, correction: np.var(
+        inputs[0], axis=_axis(dim), ddof=correction, out=out
+    ),
+    "max": lambda inputs, out, dim: np.max(inputs[0], axis=_axis(dim), out=out),
+    "reshape": lambda inputs, out, shape: inputs[0].reshape(shape),
+    "permute": lambda inputs, out, order: inputs[0].transpose(order),
+}
+# ops whose output is a view of their input, they get no buffer
+VIEWS = ("reshape", "permute")
+
+
+def _leaf(module: Module) -> Tuple[str, List[np.ndarray], dict]:
+    """op, constant inputs and attributes of a layer the runtime executes as one node"""
+    if isinstance(module, Linear):
+        weights = [module.weight.data]
+        if module.bias:
+            weights.append(module.b.data.reshape(-1))
+        return "linear", weights, {}
+    if isinstance(module, Conv):
+        weights = [module.weight.data] + ([module.b.data] if module.bias else [])
+        attrs = {
+            "stride": list(module.stride[2:]),
+            "padding": [list(p) for p in module.padding],
+            "dilation": list(module.dilation),
+            "groups": module.groups,
+            "relu": module.fused_relu,
+        }
+        return "conv", weights, attrs
+    if isinstance(module, BatchNorm):
+        return "scale_shift", list(batch_norm_scale_shift(module)), {}
+    if isinstance(module, LayerNorm):
+        gamma, beta = module.gamma.data, module.beta.data
+        attrs = {"dims": len(module.normalized_shape), "eps": module.eps}
+        return "layer_norm", [gamma, beta], attrs
+    if isinstance(module, Pool):
+        attrs = {
+            "kernel_size": list(module.kernel_size),
+            "stride": list(module.stride[2:]),
+            "padding": [list(p) for p in module.padding],
+            "pad_value": float(module.pad_value),
+            "ceil_mode": module.ceil_mode,
+            "count_include_pad": module.count_include_pad,
+        }
+        return f"{module.mode}_pool", [], attrs
+    if isinstance(module, AdaptivePool):
+        output_size = module.output_size
+        if not isinstance(output_size, int):
+            output_size = list(output_size)
+        attrs = {"output_size": output_size, "keepdim": module.keepdim}
+        return f"adaptive_{module.mode}_pool", [], attrs
+    unary = {ReLU: "relu", Exp: "exp", Log: "log"}
+    if type(module) in unary:
+        return unary[type(module)], [], {}
+    reductions = {Sum: "sum", Mean: "mean"}
+    if type(module) in reductions:
+        return reductions[type(module)], [], {"dim": None, "keepdim": False}
+    if type(module) is Max:
+        return "max", [], {"dim": None}
+    return None
+
+
+# Tensor methods recorded when they are called outside of a leaf layer
+BINARY_METHODS = {
+    "__add__": ("add", False),
+    "__radd__": ("add", True),
+    "__sub__": ("sub", False),
+    "__rsub__": ("sub", True),
+    "__mul__": ("mul", False),
+    "__rmul__": ("mul", True),
+    "__truediv__": ("div", False),
+    "__pow__": ("pow", False),
+    "__matmul__": ("matmul", False),
+    "__rmatmul__": ("matmul", True),
+}
+UNARY_METHODS = {"__neg__": "neg", "relu": "relu", "exp": "exp", "log": "log"}
+SHAPE_METHODS = ("reshape", "flatten", "squeeze", "unsqueeze")
+REDUCE_METHODS = ("sum", "mean", "var", "max")
+
+
+class _Tracer:
+    def __init__(self, input: Tensor) -> None:
+        self.graph = Graph("input", input.shape)
+        self.names: Dict[int, str] = {id(input): "input"}
+        # keeps every traced Tensor alive so that ids are not reused
+        self.alive: List[Any] = [input]
+        self.depth = 0
+
+    def constant(self, value: np.ndarray) -> str:
+        name = f"c{len(self.graph.constants)}"
+        self.graph.constants[name] = np.asarray(value)
+        return name
+
+    def name(self, value: Any) -> str:
+        if not isinstance(value, Tensor):
+            return self.constant(value)
+        if id(value) not in self.names:
+            if value.parent:
+                raise NotImplementedError(f"export does not support the {value.op} op")
+            # a parameter or any Tensor that does not depend on the input
+            self.names[id(value)] = self.constant(value.data)
+            self.alive.append(value)
+        return self.names[id(value)]
+
+    def record(self, op: str, inputs: List[Any], output: Tensor, **attrs) -> None:
+        names = [self.name(i) for i in inputs]
+        self.names[id(output)] = f"v{len(self.graph.nodes)}"
+        self.alive.append(output)
+        self.graph.nodes.append(
+            Node(op, names, self.names[id(output)], output.shape, attrs)
+        )
+
+    def trace_method(self, method: str, original: Callable) -> Callable:
+        tracer = self
+
+        def traced(self, *args, **kwargs):
+            if tracer.depth > 0:
+                return original(self, *args, **kwargs)
+            tracer.depth += 1
+            try:
+                output = original(self, *args, **kwargs)
+            finally:
+                tracer.depth -= 1
+            tracer.record_method(method, self, args, kwargs, output)
+            return output
+
+        return traced
+
+    def record_method(self, method: str, x: Tensor, args, kwargs, output) -> None:
+        if method in BINARY_METHODS:
+            op, reflected = BINARY_METHODS[method]
+            other = args[0]
+            self.record(op, [other, x] if reflected else [x, other], output)
+        elif method in UNARY_METHODS:
+            self.record(UNARY_METHODS[method], [x], output)
+        elif method in SHAPE_METHODS:
+            self.record("reshape", [x], output, shape=list(output.shape))
+        elif method in ("permute", "transpose"):
+            order = list(range(len(x.shape)))
+            if method == "permute":
+                order = [int(o) for o in args[0]]
+            else:
+                dim0, dim1 = (d % len(x.shape) for d in args[:2])
+                order[dim0], order[dim1] = dim1, dim0
+            self.record("permute", [x], output, order=order)
+        elif method == "linear":
+            weights = [w for w in args[:2] if w is not None]
+            self.record("linear", [x] + weights, output)
+        elif method in REDUCE_METHODS:
+            dim = args[0] if args else kwargs.get("dim")
+            if isinstance(dim, (tuple, list)):
+                dim = [int(d) for d in dim]
+            elif dim is not None:
+                dim = int(dim)
+            if method == "max":
+                self.record("max", [x], output, dim=dim)
+                return
+            if method == "var":
+                unbiased = kwargs.get("unbiased", args[1] if len(args) > 1 else False)
+                self.record("var", [x], output, dim=dim, correction=float(unbiased))
+                return
+            keepdim = kwargs.get("keepdim", args[1] if len(args) > 1 else False)
+            unbiased = kwargs.get("unbiased", args[2] if len(args) > 2 else False)
+            self.record(
+                method,
+                [x],
+                output,
+                dim=dim,
+                keepdim=bool(keepdim),
+                correction=1.0 if unbiased else 0.0,
+            )
+
+    def trace_leaf(self, module: Module) -> Callable:
+        forward = module.forward
+        op, weights, attrs = _leaf(module)
+        tracer = self
+
+        def traced(x: Tensor, *args, **kwargs) -> Tensor:
+            if tracer.depth > 0:
+                return forward(x, *args, **kwargs)
+            tracer.depth += 1
+            try:
+                output = forward(x, *args, **kwargs)
+            finally:
+                tracer.depth -= 1
+            tracer.record(op, [x] + weights, output, **attrs)
+            return output
+
+        return traced
+
+
+def fold_batch_norms(graph: Graph) -> None:
+    """linear/conv -> scale_shift (an eval BatchNorm) becomes a single linear/conv"""
+    for node in list(graph.nodes):
+        consumers = _consumers(graph)
+        producers = {node.output: node for node in graph.nodes}
+        source = producers.get(node.inputs[0])
+        if (
+            node.op != "scale_shift"
+            or source is None
+            or source.op not in ("linear", "conv")
+            or len(consumers[source.output]) != 1
+            # a Linear only scales the channels of a BatchNorm for 2d inputs
+            or (source.op == "linear" and len(source.shape) != 2)
+            or not all(i in graph.constants for i in source.inputs[1:])
+        ):
+            continue
+        weight = graph.constants[source.inputs[1]]
+        bias = graph.constants[source.inputs[2]] if len(source.inputs) == 3 else None
+        scale, shift = (graph.constants[i] for i in node.inputs[1:])
+        weight, bias = fold_scale_shift(weight, bias, scale, shift)
+        source.inputs = [
+            source.inputs[0],
+            _add_constant(graph, weight),
+            _add_constant(graph, bias),
+        ]
+        _replace(graph, node, source)
+
+
+def fold_relus(graph: Graph) -> None:
+    """conv/scale_shift -> relu becomes a single node that applies ReLU in place"""
+    for node in list(graph.nodes):
+        producers = {node.output: node for node in graph.nodes}
+        source = producers.get(node.inputs[0])
+        if (
+            node.op == "relu"
+            and source is not None
+            and source.op in ("conv", "scale_shift")
+            and not source.attrs.get("relu", False)
+            and len(_consumers(graph)[source.output]) == 1
+        ):
+            source.attrs["relu"] = True
+            _replace(graph, node, source)
+
+
+def fold_views(graph: Graph) -> None:
+    """Collapses chains of reshape/permute and drops the ones that change nothing"""
+    producers = {node.output: node for node in graph.nodes}
+    shapes = {node.output: node.shape for node in graph.nodes}
+    shapes[graph.input] = graph.input_shape
+    for name, value in graph.constants.items():
+        shapes[name] = value.shape
+    consumers = _consumers(graph)
+    for node in list(graph.nodes):
+        if node.op not in VIEWS:
+            continue
+        source = producers.get(node.inputs[0])
+        if (
+            source is not None
+            and source.op == node.op
+            and len(consumers[source.output]) == 1
+        ):
+            # reshape(reshape(x)) = reshape(x), permute(permute(x)) = permute(x)
+            if node.op == "permute":
+                node.attrs["order"] = [
+                    source.attrs["order"][i] for i in node.attrs["order"]
+                ]
+            node.inputs = source.inputs
+            graph.nodes.remove(source)
+            consumers = _consumers(graph)
+        identity = (
+            tuple(node.attrs["order"]) == tuple(range(len(node.shape)))
+            if node.op == "permute"
+            else tuple(node.shape) == tuple(shapes[node.inputs[0]])
+        )
+        if identity and node.output != graph.output:
+            for consumer in consumers[node.output]:
+                consumer.inputs = [
+                    node.inputs[0] if i == node.output else i for i in consumer.inputs
+                ]
+            graph.nodes.remove(node)
+            consumers = _consumers(graph)
+
+
+def fold_constants(graph: Graph) -> None:
+    """Evaluates the nodes that only depend on constants"""
+    for node in list(graph.nodes):
+        if all(i in graph.constants for i in node.inputs):
+            inputs = [graph.constants[i] for i in node.inputs]
+            graph.constants[node.output] = np.array(
+                KERNELS[node.op](inputs, None, **node.attrs)
+            )
+            graph.nodes.remove(node)
+
+
+def eliminate_dead_nodes(graph: Graph) -> None:
+    """Removes the nodes and constants the output does not depend on"""
+    live = {graph.output}
+    for node in reversed(graph.nodes):
+        if node.output in live:
+            live.update(node.inputs)
+    graph.nodes = [node for node in graph.nodes if node.output in live]
+    graph.constants = {k: v for k, v in graph.constants.items() if k in live}
+
+
+def _consumers(graph: Graph) -> Dict[str, List[Node]]:
+    consumers = {graph.input: []}
+    consumers.update({name: [] for name in graph.constants})
+    for node in graph.nodes:
+        consumers[node.output] = []
+    for node in graph.nodes:
+        for i in node.inputs:
+            consumers[i].append(node)
+    return consumers
+
+
+def _add_constant(graph: Graph, value: np.ndarray) -> str:
+    name = f"c{len(graph.constants)}"
+    while name in graph.constants:
+        name += "_"
+    graph.constants[name] = value
+    return name
+
+
+def _replace(graph: Graph, node: Node, replacement: Node) -> None:
+    # replacement now computes node, which is removed
+    graph.nodes.remove(node)
+    old = replacement.output
+    replacement.output, replacement.shape = node.output, node.shape
+    for other in graph.nodes:
+        other.inputs = [replacement.output if i == old else i for i in other.inputs]
+    if graph.output == old:
+        graph.output = node.output
+
+
+def export(model: Module, example_input: Tensor, path: str = None) -> Graph:
+    """Traces model on example_input into an optimized inference graph
+
+    BatchNorms are folded into the preceding Linear/Conv, ReLUs are fused into the
+    preceding Conv, reshape/permute chains are collapsed, constant subgraphs are
+    evaluated and dead nodes removed.
+
+    Args:
+        model (Module): model to export, it is run in eval mode
+        example_input (Tensor): input the graph is specialized to
+        path (str, optional): .npz file the graph and its weights are saved to.
+        Defaults to None.
+
+    Returns:
+        Graph: graph to execute with Runtime
+    """
+    modules = list(model.modules())
+    eval_modes = [m.eval_mode for m in modules]
+    tracer = _Tracer(example_input)
+    methods = (
+        list(BINARY_METHODS)
+        + list(UNARY_METHODS)
+        + list(SHAPE_METHODS)
+        + list(REDUCE_METHODS)
+        + ["permute", "transpose", "linear"]
+    )
+    originals = {method: getattr(Tensor, method) for method in methods}
+    leaves = [m for m in modules if _leaf(m) is not None]
+    try:
+        for m in modules:
+            m.eval()
+        for method, original in originals.items():
+            setattr(Tensor, method, tracer.trace_method(method, original))
+        for m in leaves:
+            m.forward = tracer.trace_leaf(m)
+        output = model(example_input)
+    finally:
+        for method, original in originals.items():
+            setattr(Tensor, method, original)
+        for m in leaves:
+            del m.forward
+        for m, eval_mode in zip(modules, eval_modes):
+            m.eval_mode = eval_mode
+    graph = tracer.graph
+    graph.output = tracer.name(output)
+    fold_batch_norms(graph)
+    fold_relus(graph)
+    fold_views(graph)
+    fold_constants(graph)
+    eliminate_dead_nodes(graph)
+    if path is not None:
+        graph.save(path)
+    return graph
+
+
+class Runtime:
+    """Executes a Graph on numpy arrays
+
+    Every node writes into a buffer that is allocated once. Buffers are shared
+    between values whose lifetimes do not overlap, views keep their source alive.
+    """
+
+    def __init__(self, graph: Graph) -> None:
+        self.graph = graph
+        self.steps = [
+            (KERNELS[node.op], node.inputs, node.output, node.attrs)
+            for node in graph.nodes
+        ]
+        self.buffers = self._plan()
+
+    @staticmethod
+    def load(path: str) -> Runtime:
+        return Runtime(Graph.load(path))
+
+    def _plan(self) -> Dict[str, np.ndarray]:
+        graph = self.graph
+        # views alias the buffer of their source
+        root = {}
+        for node in graph.nodes:
+            root[node.output] = (
+                root.get(node.inputs[0], node.inputs[0])
+                if node.op in VIEWS
+                else node.output
+            )
+        last_use = {}
+        for step, node in enumerate(graph.nodes):
+            for i in node.inputs:
+                last_use[root.get(i, i)] = step
+        last_use[root.get(graph.output, graph.output)] = len(graph.nodes)
+        buffers, free = {}, {}
+        for step, node in enumerate(graph.nodes):
+            if node.op not in VIEWS:
+                key = tuple(node.shape)
+                buffers[node.output] = (
+                    free[key].pop() if free.get(key) else np.empty(key)
+                )
+            for i in set(node.inputs):
+                if i in buffers and last_use.get(i) == step and root.get(i, i) == i:
+                    free.setdefault(buffers[i].shape, []).append(buffers[i])
+        return buffers
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        x = x.data if isinstance(x, Tensor) else x
+        assert (
+            x.shape == self.graph.input_shape
+        ), f"the graph was exported for inputs of shape {self.graph.input_shape}"
+        values = dict(self.graph.constants)
+        values[self.graph.input] = x
+        for kernel, inputs, output, attrs in self.steps:
+            values[output] = kernel(
+                [values[i] for i in inputs], self.buffers.get(output), **attrs
+            )
+        # the output buffer is reused by the next call
+        return values[self.graph.output].copy()
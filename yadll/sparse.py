@@ -0,0 +1,178 @@
+from __future__ import annotations
+from typing import Tuple, Union
+import numpy as np
+from scipy.sparse import csr_matrix
+from .autodiff import Tensor
+
+
+def _csr_matmul(
+    indptr: np.ndarray, indices: np.ndarray, values: np.ndarray, dense: np.ndarray
+) -> np.ndarray:
+    # compiled CSR kernel of scipy (a scikit-image dependency), only the nonzeros
+    # are visited and nothing of size nnz * dense.shape[1:] is materialized
+    rows = len(indptr) - 1
+    matrix = csr_matrix((values, indices, indptr), shape=(rows, dense.shape[0]))
+    out = matrix @ dense.reshape(dense.shape[0], -1)
+    return np.asarray(out).reshape((rows,) + dense.shape[1:])
+
+
+class SparseTensor:
+    """Sparse tensor in COO format
+
+    values[i] is stored at indices[:, i]. values may have trailing dense dims, e.g. a
+    row-sparse gradient of a (vocab, dim) weight has indices of shape (1, nnz) and
+    values of shape (nnz, dim).
+    """
+
+    def __init__(
+        self, indices: np.ndarray, values: np.ndarray, shape: tuple, coalesced=False
+    ) -> None:
+        self.indices: np.ndarray = np.asarray(indices, dtype=np.int64)
+        self.values: np.ndarray = values
+        self.shape: Tuple = tuple(shape)
+        self.is_coalesced = coalesced
+
+    def __repr__(self):
+        return (
+            f"SparseTensor(indices={self.indices}, values={self.values}, {self.shape=})"
+        )
+
+    @property
+    def nnz(self) -> int:
+        return self.indices.shape[1]
+
+    @property
+    def sparse_dim(self) -> int:
+        return self.indices.shape[0]
+
+    @staticmethod
+    def from_dense(data: np.ndarray, sparse_dim: int = None) -> SparseTensor:
+        sparse_dim = sparse_dim if sparse_dim else data.ndim
+        mask = data.reshape(data.shape[:sparse_dim] + (-1,)).any(axis=-1)
+        indices = np.stack(np.nonzero(mask))
+        return SparseTensor(indices, data[tuple(indices)], data.shape, True)
+
+    def coalesce(self) -> SparseTensor:
+        """Sorts the indices and sums the values of duplicated indices"""
+        if self.is_coalesced:
+            return self
+        flat = np.ravel_multi_index(tuple(self.indices), self.shape[: self.sparse_dim])
+        unique, inverse = np.unique(flat, return_inverse=True)
+        values = np.zeros((len(unique),) + self.values.shape[1:], self.values.dtype)
+        np.add.at(values, inverse, self.values)
+        indices = np.stack(np.unravel_index(unique, self.shape[: self.sparse_dim]))
+        return SparseTensor(indices, values, self.shape, True)
+
+    def to_dense(self) -> np.ndarray:
+        out = np.zeros(self.shape, dtype=self.values.dtype)
+        np.add.at(out, tuple(self.indices), self.values)
+        return out
+
+    def to_csr(self) -> CSRTensor:
+        assert self.sparse_dim == 2, "only 2d sparse tensors can be converted to CSR"
+        coalesced = self.coalesce()
+        indptr = np.zeros(self.shape[0] + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(coalesced.indices[0], minlength=self.shape[0]), out=indptr[1:]
+        )
+        return CSRTensor(indptr, coalesced.indices[1], coalesced.values, self.shape)
+
+    def __add__(self, other: SparseTensor) -> SparseTensor:
+        assert self.shape == other.shape
+        return SparseTensor(
+            np.concatenate([self.indices, other.indices], axis=1),
+            np.concatenate([self.values, other.values]),
+            self.shape,
+        )
+
+    def __mul__(self, other: Union[int, float]) -> SparseTensor:
+        return SparseTensor(
+            self.indices, self.values * other, self.shape, self.is_coalesced
+        )
+
+    def __rmul__(self, other: Union[int, float]) -> SparseTensor:
+        return self * other
+
+    def __matmul__(self, other: Tensor) -> Tensor:
+        return self.to_csr() @ other
+
+
+class CSRTensor:
+    """2d sparse tensor in compressed sparse row format
+
+    The column indices and values of row i are indices[indptr[i]:indptr[i + 1]] and
+    values[indptr[i]:indptr[i + 1]].
+    """
+
+    def __init__(
+        self, indptr: np.ndarray, indices: np.ndarray, values: np.ndarray, shape: tuple
+    ) -> None:
+        self.indptr: np.ndarray = np.asarray(indptr, dtype=np.int64)
+        self.indices: np.ndarray = np.asarray(indices, dtype=np.int64)
+        self.values: np.ndarray = values
+        self.shape: Tuple = tuple(shape)
+        self._transpose = None
+
+    def __repr__(self):
+        return (
+            f"CSRTensor(indptr={self.indptr}, indices={self.indices}, "
+            f"values={self.values}, {self.shape=})"
+        )
+
+    @property
+    def nnz(self) -> int:
+        return len(self.values)
+
+    @staticmethod
+    def from_dense(data: np.ndarray) -> CSRTensor:
+        return SparseTensor.from_dense(data).to_csr()
+
+    def to_coo(self) -> SparseTensor:
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        return SparseTensor(
+            np.stack([rows, self.indices]), self.values, self.shape, True
+        )
+
+    def to_dense(self) -> np.ndarray:
+        return self.to_coo().to_dense()
+
+    @property
+    def T(self) -> CSRTensor:
+        # computed once, it is what the backward of sparse @ dense multiplies with
+        if self._transpose is None:
+            coo = self.to_coo()
+            self._transpose = SparseTensor(
+                coo.indices[::-1], coo.values, self.shape[::-1]
+            ).to_csr()
+        return self._transpose
+
+    def __matmul__(self, other: Tensor) -> Tensor:
+        """Sparse x dense matrix multiplication, only the nonzeros are visited
+
+        Args:
+            other (Tensor): (self.shape[1], ...) dense Tensor
+
+        Returns:
+            Tensor: (self.shape[0], ...) dense Tensor
+        """
+        output = Tensor(
+            _csr_matmul(self.indptr, self.indices, self.values, other.data),
+            requires_grad=True if other.requires_grad else False,
+            parent=(other,),
+            op="sparse_matmul",
+        )
+        if other.tangent is not None:
+            # the directions ride along as extra columns of the dense operand
+            tangent = np.moveaxis(other.tangent, 0, -1)
+            output.tangent = np.moveaxis(
+                _csr_matmul(self.indptr, self.indices, self.values, tangent), -1, 0
+            )
+
+        def _backward():
+            transpose = self.T
+            other.grad += _csr_matmul(
+                transpose.indptr, transpose.indices, transpose.values, output.grad
+            )
+
+        output._backward = _backward
+        return output
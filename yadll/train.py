@@ -0,0 +1,265 @@
+"""Training loop that overlaps data loading, optimizer updates and I/O with compute
+
+A serial loop waits for every stage: load a batch, forward, backward, optimizer
+step, zero the grads. The Trainer runs the stages that do not depend on each other
+on background threads:
+
+- the next batches are loaded (and transformed) by a producer thread while the
+  current one is trained on
+- a parameter is updated on a worker thread as soon as its gradient is final in
+  backward (post accumulate grad hook), while backward continues with the layers
+  in front of it, and its grad is zeroed in place right after
+- metrics and checkpoints are written by an I/O thread
+
+numpy releases the GIL in its loops, so the threads overlap on multi-core machines.
+
+    trainer = Trainer(model, SGD(model.parameters(), 0.1), loss_fn)
+    report = trainer.fit(batches, epochs=3)
+    report["samples_per_second"]
+"""
+
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Queue
+from threading import Thread
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+import time
+import numpy as np
+from .autodiff import Tensor
+from .nn.module import Module
+from .optimizers import Optimizer
+
+EVENTS = ("batch_start", "step_end", "epoch_end")
+
+
+def _state(model: Module) -> Iterator[Tuple[str, Tensor]]:
+    # parameters and buffers (e.g. BatchNorm running statistics) by dotted name
+    yield from model.named_parameters()
+    yield from model.named_buffers()
+
+
+def save_checkpoint(model: Module, path: str) -> None:
+    np.savez(path, **{name: t.data for name, t in _state(model)})
+
+
+def load_checkpoint(model: Module, path: str) -> None:
+    """Loads the parameters and buffers saved by save_checkpoint into model, in place"""
+    with np.load(path) as saved:
+        for name, t in _state(model):
+            t.data[...] = saved[name]
+
+
+class _Failure:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def prefetch(
+    data: Iterable, depth: int = 2, transform: Callable = None
+) -> Iterator[Any]:
+    """Iterates data on a producer thread that stays up to depth items ahead
+
+    Args:
+        data (Iterable): batches
+        depth (int, optional): number of loaded batches waiting. Defaults to 2.
+        transform (Callable, optional): applied to every batch on the producer
+        thread. Defaults to None.
+    """
+    queue, done = Queue(depth), object()
+
+    def produce():
+        try:
+            for batch in data:
+                queue.put(transform(batch) if transform else batch)
+            queue.put(done)
+        except BaseException as error:
+            queue.put(_Failure(error))
+
+    Thread(target=produce, daemon=True).start()
+    while True:
+        item = queue.get()
+        if item is done:
+            return
+        if isinstance(item, _Failure):
+            raise item.error
+        yield item
+
+
+class Trainer:
+    def __init__(
+        self,
+        model: Module,
+        optimizer: Optimizer,
+        loss_fn: Callable[..., Tensor],
+        accumulation_steps: int = 1,
+        prefetch: int = 2,
+        transform: Callable = None,
+        overlap_optimizer: bool = True,
+        log_fn: Callable[[Dict[str, float]], None] = None,
+        checkpoint_path: str = None,
+        checkpoint_every: int = 0,
+    ) -> None:
+        """
+        Args:
+            model (Module): model, called on the first element of every batch
+            optimizer (Optimizer): optimizer of the model parameters, it needs
+            update(p) when overlap_optimizer is set
+            loss_fn (Callable[..., Tensor]): loss_fn(output, *rest of the batch)
+            accumulation_steps (int, optional): batches whose gradients are summed
+            before an optimizer step, the loss is divided by it. Defaults to 1.
+            prefetch (int, optional): batches loaded ahead. Defaults to 2.
+            transform (Callable, optional): preprocessing of a batch, runs on the
+            loader thread. Defaults to None.
+            overlap_optimizer (bool, optional): update every parameter as soon as its
+            gradient is final in backward. Defaults to True.
+            log_fn (Callable[[Dict[str, float]], None], optional): receives the
+            metrics of every step on the I/O thread. Defaults to None.
+            checkpoint_path (str, optional): format string with {step} the
+            parameters are saved to. Defaults to None.
+            checkpoint_every (int, optional): optimizer steps between checkpoints.
+            Defaults to 0, no checkpoints.
+        """
+        self.model = model
+        self.optimizer = optimizer
+        self.loss_fn = loss_fn
+        self.accumulation_steps = accumulation_steps
+        self.prefetch = prefetch
+        self.transform = transform
+        self.log_fn = log_fn
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.hooks: Dict[str, List[Callable]] = {event: [] for event in EVENTS}
+        self.step = 0
+        self.report: Dict[str, float] = {}
+        self._updater = ThreadPoolExecutor(1)
+        self._io = ThreadPoolExecutor(1)
+        self._pending: List[Future] = []
+        self._io_pending: List[Future] = []
+        self._updated = set()
+        self._overlap = False
+        self._removers = (
+            [
+                p.register_post_accumulate_grad_hook(self._grad_ready)
+                for p in optimizer.params
+            ]
+            if overlap_optimizer
+            else []
+        )
+
+    def register_hook(self, event: str, hook: Callable) -> None:
+        """Calls hook(trainer, **info) on the training thread
+
+        batch_start gets batch, step_end gets metrics, epoch_end gets epoch.
+        """
+        assert event in EVENTS, f"event {event} is not one of {EVENTS}"
+        self.hooks[event].append(hook)
+
+    def _call(self, event: str, **info) -> None:
+        for hook in self.hooks[event]:
+            hook(self, **info)
+
+    def _grad_ready(self, p: Tensor) -> None:
+        if self._overlap:
+            self._updated.add(p)
+            self._pending.append(self._updater.submit(self._update, p))
+
+    def _update(self, p: Tensor) -> None:
+        self.optimizer.update(p)
+        p.zero_grad()
+
+    def _finish_updates(self) -> None:
+        # the next forward reads the parameters
+        for future in self._pending:
+            future.result()
+        self._pending.clear()
+        # parameters backward did not reach still take their step
+        for p in self.optimizer.params:
+            if p not in self._updated:
+                self._update(p)
+        self._updated.clear()
+
+    def _optimizer_step(self) -> None:
+        if self._removers:
+            self._finish_updates()
+        else:
+            self.optimizer.step()
+            self.optimizer.zero_grad()
+
+    def _background(self, fn: Callable, *args) -> None:
+        self._io_pending = [f for f in self._io_pending if not f.done()]
+        self._io_pending.append(self._io.submit(fn, *args))
+
+    def _save(self) -> None:
+        # the copy is taken now, training continues while the I/O thread writes it
+        snapshot = {name: t.data.copy() for name, t in _state(self.model)}
+        path = self.checkpoint_path.format(step=self.step)
+        self._background(lambda: np.savez(path, **snapshot))
+
+    def train_step(self, batch: Any, update: bool = True) -> float:
+        """Forward and backward of one batch, plus an optimizer step if update is set"""
+        inputs = [
+            x if isinstance(x, Tensor) else Tensor(np.asarray(x))
+            for x in (batch if isinstance(batch, (tuple, list)) else (batch,))
+        ]
+        loss = self.loss_fn(self.model(inputs[0]), *inputs[1:])
+        if self.accumulation_steps > 1:
+            loss = loss / float(self.accumulation_steps)
+        self._overlap = update and bool(self._removers)
+        loss.backward()
+        self._overlap = False
+        if update:
+            self._optimizer_step()
+        return float(loss.data) * self.accumulation_steps
+
+    def fit(self, data: Iterable, epochs: int = 1) -> Dict[str, float]:
+        """Trains on every batch of data for epochs, returns the throughput report
+
+        data is iterated once per epoch, a batch is a Tensor/array or a tuple whose
+        first element is the model input.
+        """
+        self.model.train()
+        samples, start = 0, time.perf_counter()
+        for epoch in range(epochs):
+            accumulated = 0
+            for batch in prefetch(data, self.prefetch, self.transform):
+                self._call("batch_start", batch=batch)
+                accumulated += 1
+                update = accumulated == self.accumulation_steps
+                loss = self.train_step(batch, update)
+                first = batch[0] if isinstance(batch, (tuple, list)) else batch
+                samples += len(first.data if isinstance(first, Tensor) else first)
+                if update:
+                    accumulated = 0
+                    self._end_step(loss)
+            if accumulated:
+                # the last batches of an epoch that did not fill an accumulation
+                self._optimizer_step()
+                self._end_step(loss)
+            self._call("epoch_end", epoch=epoch)
+        for future in self._io_pending:
+            future.result()
+        seconds = time.perf_counter() - start
+        self.report = {
+            "samples": samples,
+            "steps": self.step,
+            "seconds": seconds,
+            "samples_per_second": samples / seconds,
+        }
+        return self.report
+
+    def _end_step(self, loss: float) -> None:
+        self.step += 1
+        metrics = {"step": self.step, "loss": loss}
+        if self.log_fn is not None:
+            self._background(self.log_fn, metrics)
+        if self.checkpoint_every and self.step % self.checkpoint_every == 0:
+            self._save()
+        self._call("step_end", metrics=metrics)
+
+    def close(self) -> None:
+        """Removes the gradient hooks and stops the background threads"""
+        for remove in self._removers:
+            remove()
+        self._removers = []
+        self._updater.shutdown()
+        self._io.shutdown()